@@ -0,0 +1,111 @@
+"""
+Control de Admisión
+Concurrencia acotada por clase de ruta con cola de espera corta
+
+Cada clase (lecturas de catálogo, lecturas de detalle, escrituras) admite
+un número máximo de solicitudes simultáneas contra Oracle y una cola de
+espera limitada. Cuando la cola está llena, o la espera supera el máximo,
+la solicitud se rechaza de inmediato para que la latencia de las admitidas
+se mantenga acotada durante una sobrecarga.
+"""
+
+import asyncio
+import math
+import time
+from typing import Dict
+
+
+class SolicitudRechazada(Exception):
+    """La solicitud no fue admitida; reintentar después de `reintentar_en` segundos."""
+
+    def __init__(self, clase: str, motivo: str, reintentar_en: int):
+        super().__init__(f"{clase}: {motivo}")
+        self.clase = clase
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+
+class _Compuerta:
+    """Límite de concurrencia y cola de espera de una clase de ruta."""
+
+    def __init__(self, nombre: str, limite: int, cola: int, espera_max: float):
+        self.nombre = nombre
+        self.limite = limite
+        self.cola = cola
+        self.espera_max = espera_max
+        # Se crea dentro del event loop del servidor en el primer uso
+        self._semaforo = None
+
+        self.activos = 0
+        self.esperando = 0
+        self.admitidas = 0
+        self.rechazadas_cola = 0
+        self.rechazadas_espera = 0
+        # Tiempo medio de servicio (media móvil exponencial, segundos)
+        self.servicio_medio = 0.05
+
+    def _reintentar_en(self) -> int:
+        return max(1, math.ceil((self.esperando + 1) * self.servicio_medio / self.limite))
+
+    async def entrar(self) -> float:
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.limite)
+        if self._semaforo.locked() and self.esperando >= self.cola:
+            self.rechazadas_cola += 1
+            raise SolicitudRechazada(self.nombre, "cola llena", self._reintentar_en())
+
+        self.esperando += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), self.espera_max)
+        except asyncio.TimeoutError:
+            self.rechazadas_espera += 1
+            raise SolicitudRechazada(self.nombre, "espera máxima excedida", self._reintentar_en())
+        finally:
+            self.esperando -= 1
+
+        self.activos += 1
+        self.admitidas += 1
+        return time.monotonic()
+
+    def salir(self, inicio: float):
+        self.activos -= 1
+        self._semaforo.release()
+        duracion = time.monotonic() - inicio
+        self.servicio_medio = 0.9 * self.servicio_medio + 0.1 * duracion
+
+    def metricas(self) -> dict:
+        return {
+            "limite": self.limite,
+            "activos": self.activos,
+            "esperando": self.esperando,
+            "colaMax": self.cola,
+            "esperaMaxSeg": self.espera_max,
+            "admitidas": self.admitidas,
+            "rechazadasColaLlena": self.rechazadas_cola,
+            "rechazadasEspera": self.rechazadas_espera,
+            "servicioMedioMs": round(self.servicio_medio * 1000, 2),
+        }
+
+
+class ControlAdmision:
+    """
+    Conjunto de compuertas por clase de ruta.
+    `clases` asocia el nombre de la clase con (límite, cola, espera máxima).
+    """
+
+    def __init__(self, clases: Dict[str, tuple]):
+        self._compuertas = {
+            nombre: _Compuerta(nombre, limite, cola, espera)
+            for nombre, (limite, cola, espera) in clases.items()
+        }
+
+    async def entrar(self, clase: str) -> float:
+        """Espera un cupo en la clase; lanza SolicitudRechazada si no hay."""
+        return await self._compuertas[clase].entrar()
+
+    def salir(self, clase: str, inicio: float):
+        """Libera el cupo tomado con entrar()."""
+        self._compuertas[clase].salir(inicio)
+
+    def metricas(self) -> dict:
+        return {nombre: compuerta.metricas() for nombre, compuerta in self._compuertas.items()}
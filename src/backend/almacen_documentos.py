@@ -0,0 +1,269 @@
+"""
+Almacén de Documentos
+Contenido direccionado por hash con carga y descarga en streaming
+
+Los archivos se guardan una sola vez bajo su SHA-256
+(<directorio>/ab/cd/abcd...); subir el mismo PDF en varios expedientes no
+ocupa espacio adicional. DOCUMENTO.UBICADOC guarda "sha256:<hash>".
+
+- Carga: el cuerpo de la solicitud se escribe por bloques a un archivo
+  temporal mientras se calcula el hash; al terminar se mueve a su ruta
+  definitiva (o se descarta si el contenido ya existía).
+- Descarga: soporta Range (un rango por solicitud), ETag e If-None-Match.
+  Abrir el archivo, leer su tamaño y su tipo y leer cada bloque corre en
+  el threadpool, igual que la carga. Si el servidor ASGI ofrece la
+  extensión http.response.zerocopy se le entrega el descriptor para que
+  use sendfile; si no, el archivo se lee y se envía por bloques.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+PREFIJO = "sha256:"
+_RE_HASH = re.compile(r"^[0-9a-f]{64}$")
+_RE_RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Comillas, barra invertida y caracteres de control (CR/LF) no van en la cabecera
+_RE_NOMBRE_INVALIDO = re.compile(r'["\\\x00-\x1f\x7f]')
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """El contenido supera el tamaño máximo permitido."""
+
+
+class AlmacenDocumentos:
+    """Directorio de contenido direccionado por SHA-256."""
+
+    def __init__(self, directorio: str, tamano_max: int = 100 * 1024 * 1024):
+        self.directorio = os.path.abspath(directorio)
+        self.tamano_max = tamano_max
+        self._temporales = os.path.join(self.directorio, "tmp")
+
+    def ruta(self, hash_hex: str) -> Optional[str]:
+        """Ruta del contenido, o None si el hash no es válido."""
+        if not _RE_HASH.match(hash_hex):
+            return None
+        return os.path.join(self.directorio, hash_hex[:2], hash_hex[2:4], hash_hex)
+
+    def existe(self, hash_hex: str) -> bool:
+        ruta = self.ruta(hash_hex)
+        return ruta is not None and os.path.isfile(ruta)
+
+    async def guardar(self, bloques: AsyncIterator[bytes]) -> Tuple[str, int, bool]:
+        """
+        Guarda el contenido recibido por bloques.
+        Retorna (hash, tamaño, nuevo); nuevo=False si ya estaba almacenado.
+        La escritura, el fsync y el renombrado corren en el threadpool para
+        no bloquear el event loop.
+        """
+        descriptor, temporal = await run_in_threadpool(self._crear_temporal)
+        sha = hashlib.sha256()
+        tamano = 0
+        try:
+            with os.fdopen(descriptor, "wb") as archivo:
+                async for bloque in bloques:
+                    tamano += len(bloque)
+                    if tamano > self.tamano_max:
+                        raise ArchivoDemasiadoGrande(f"El archivo supera {self.tamano_max} bytes")
+                    await run_in_threadpool(_escribir_bloque, archivo, sha, bloque)
+                await run_in_threadpool(_sincronizar, archivo)
+            hash_hex = sha.hexdigest()
+            nuevo = await run_in_threadpool(self._mover, temporal, hash_hex)
+            return hash_hex, tamano, nuevo
+        except BaseException:
+            # Protegido de la cancelación: el temporal se borra aunque el cliente se desconecte
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(_descartar, temporal)
+            raise
+
+    def _crear_temporal(self) -> Tuple[int, str]:
+        os.makedirs(self._temporales, exist_ok=True)
+        return tempfile.mkstemp(dir=self._temporales)
+
+    def _mover(self, temporal: str, hash_hex: str) -> bool:
+        """Mueve el temporal a su ruta definitiva; False si el contenido ya existía."""
+        destino = self.ruta(hash_hex)
+        if os.path.exists(destino):
+            os.unlink(temporal)
+            return False
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporal, destino)
+        return True
+
+
+def _escribir_bloque(archivo, sha, bloque: bytes):
+    sha.update(bloque)
+    archivo.write(bloque)
+
+
+def _sincronizar(archivo):
+    archivo.flush()
+    os.fsync(archivo.fileno())
+
+
+def _descartar(temporal: str):
+    if os.path.exists(temporal):
+        os.unlink(temporal)
+
+
+def hash_de_ubicacion(ubica_doc: Optional[str]) -> Optional[str]:
+    """Hash de un UBICADOC "sha256:<hash>" (None si es una ubicación externa)."""
+    if ubica_doc and ubica_doc.startswith(PREFIJO):
+        return ubica_doc[len(PREFIJO):]
+    return None
+
+
+def tipo_contenido(archivo, nombre: Optional[str]) -> str:
+    """Tipo por la extensión del nombre sugerido o, si no la hay, por la firma del archivo abierto."""
+    if nombre:
+        tipo, _ = mimetypes.guess_type(nombre)
+        if tipo:
+            return tipo
+    archivo.seek(0)
+    if archivo.read(5) == b"%PDF-":
+        return "application/pdf"
+    return "application/octet-stream"
+
+
+def _leer_bloque(archivo, posicion: int, largo: int) -> bytes:
+    archivo.seek(posicion)
+    return archivo.read(largo)
+
+
+def disposicion_contenido(nombre: str) -> bytes:
+    """
+    Content-Disposition para un nombre sugerido por el cliente: `filename`
+    con una versión ASCII saneada y `filename*` (RFC 5987) con el nombre
+    completo en UTF-8.
+    """
+    limpio = _RE_NOMBRE_INVALIDO.sub("", nombre)
+    nombre_ascii = limpio.encode("ascii", "replace").decode("ascii").replace("?", "_")
+    return f"inline; filename=\"{nombre_ascii}\"; filename*=UTF-8''{quote(limpio, safe='')}".encode("ascii")
+
+
+def rango_solicitado(cabecera: Optional[str], tamano: int) -> Optional[Tuple[int, int]]:
+    """
+    (inicio, fin inclusivo) de la cabecera Range, o None si no hay Range.
+    Lanza ValueError si el rango no es satisfacible.
+    """
+    if not cabecera:
+        return None
+    coincidencia = _RE_RANGO.match(cabecera.strip())
+    if not coincidencia or coincidencia.groups() == ("", ""):
+        raise ValueError(cabecera)
+    inicio, fin = coincidencia.groups()
+    if inicio == "":
+        # bytes=-n: los últimos n bytes
+        largo = int(fin)
+        if largo == 0:
+            raise ValueError(cabecera)
+        return max(0, tamano - largo), tamano - 1
+    inicio = int(inicio)
+    fin = tamano - 1 if fin == "" else min(int(fin), tamano - 1)
+    if inicio >= tamano or fin < inicio:
+        raise ValueError(cabecera)
+    return inicio, fin
+
+
+class RespuestaContenido(Response):
+    """
+    Respuesta para un archivo del almacén con soporte de Range, ETag y
+    HEAD; usa sendfile cuando el servidor lo permite. Las cabeceras se
+    calculan al enviar, según la solicitud, y toda la E/S del archivo
+    corre en el threadpool.
+    """
+
+    def __init__(self, ruta: str, hash_hex: str, nombre: Optional[str] = None,
+                 tamano_bloque: int = 1024 * 1024):
+        self.ruta = ruta
+        self.hash_hex = hash_hex
+        self.nombre = nombre
+        self.tamano_bloque = tamano_bloque
+        self.background = None
+
+    def _abrir(self):
+        """Abre el archivo y obtiene su tamaño y su tipo de contenido."""
+        archivo = open(self.ruta, "rb")
+        try:
+            return archivo, os.fstat(archivo.fileno()).st_size, tipo_contenido(archivo, self.nombre)
+        except BaseException:
+            archivo.close()
+            raise
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        archivo, tamano, tipo = await run_in_threadpool(self._abrir)
+        try:
+            await self._enviar(scope, send, archivo, tamano, tipo)
+        finally:
+            archivo.close()
+
+    async def _enviar(self, scope: Scope, send: Send, archivo, tamano: int, tipo: str):
+        cabeceras_solicitud = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        etag = f'"{self.hash_hex}"'
+        cabeceras = [
+            (b"accept-ranges", b"bytes"),
+            (b"etag", etag.encode()),
+            (b"cache-control", b"public, max-age=31536000, immutable"),
+            (b"content-type", tipo.encode()),
+        ]
+        if self.nombre:
+            cabeceras.append((b"content-disposition", disposicion_contenido(self.nombre)))
+
+        if cabeceras_solicitud.get("if-none-match") == etag:
+            await send({"type": "http.response.start", "status": 304, "headers": cabeceras})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        try:
+            rango = rango_solicitado(cabeceras_solicitud.get("range"), tamano)
+        except ValueError:
+            await send({
+                "type": "http.response.start",
+                "status": 416,
+                "headers": cabeceras + [(b"content-range", f"bytes */{tamano}".encode())],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if rango is None:
+            estado, inicio, fin = 200, 0, tamano - 1
+        else:
+            estado, (inicio, fin) = 206, rango
+            cabeceras.append((b"content-range", f"bytes {inicio}-{fin}/{tamano}".encode()))
+        largo = max(0, fin - inicio + 1)
+        cabeceras.append((b"content-length", str(largo).encode()))
+        await send({"type": "http.response.start", "status": estado, "headers": cabeceras})
+
+        if scope["method"] == "HEAD" or largo == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            await send({
+                "type": "http.response.zerocopy",
+                "file": archivo.fileno(),
+                "offset": inicio,
+                "count": largo,
+                "more_body": False,
+            })
+            return
+        posicion = inicio
+        while posicion <= fin:
+            bloque = await run_in_threadpool(
+                _leer_bloque, archivo, posicion, min(self.tamano_bloque, fin + 1 - posicion)
+            )
+            if not bloque:
+                # El archivo se acortó mientras se enviaba: se cierra el cuerpo
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            posicion += len(bloque)
+            await send({"type": "http.response.body", "body": bloque, "more_body": posicion <= fin})
@@ -0,0 +1,200 @@
+"""
+Analítica de Duración de Etapas
+Tiempo en cada ETAPAPROCESAL por especialización o por lugar
+
+La duración de una etapa es la diferencia entre su fechaEtapa y la del
+siguiente expediente del mismo caso. EXPEDIENTE se lee una sola vez en
+bloque hacia arreglos columnares de NumPy (códigos categóricos enteros y
+días como float) y las transiciones, agrupaciones y percentiles se
+calculan de forma vectorizada. Los arreglos y los resultados por ventana
+de tiempo se guardan en caché durante `ttl` segundos.
+"""
+
+import threading
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+EPOCA = date(1970, 1, 1)
+
+# Agrupaciones disponibles: nombre -> columna categórica
+AGRUPACIONES = {
+    "especializacion": "codEspecializacion",
+    "lugar": "codLugar",
+}
+
+PERCENTILES = (50, 90)
+
+CONSULTA_HISTORIAL = """
+    SELECT e.noCaso, TRUNC(e.fechaEtapa) - DATE '1970-01-01',
+           e.codEspecializacion, ee.codEtapa, e.codLugar
+    FROM Expediente e
+    INNER JOIN Especia_Etapa ee
+        ON ee.codEspecializacion = e.codEspecializacion
+        AND ee.pasoEtapa = e.pasoEtapa
+    ORDER BY e.noCaso, e.fechaEtapa, e.pasoEtapa, e.consecExpe
+"""
+
+
+class _Historial:
+    """Arreglos columnares de EXPEDIENTE con las duraciones ya calculadas."""
+
+    def __init__(self, filas_caso, filas_dia, categoricas: Dict[str, list],
+                 nombres_etapa: Dict[str, str]):
+        self.nombres_etapa = nombres_etapa
+        caso = np.asarray(filas_caso, dtype=np.int64)
+        dia = np.asarray(filas_dia, dtype=np.float64)
+        # Categorías: valores únicos y código entero por fila
+        self.valores: Dict[str, np.ndarray] = {}
+        self.codigos: Dict[str, np.ndarray] = {}
+        for columna, datos in categoricas.items():
+            valores, codigos = np.unique(np.asarray(datos, dtype=object).astype(str), return_inverse=True)
+            self.valores[columna] = valores
+            self.codigos[columna] = codigos
+
+        # Una etapa termina cuando empieza la siguiente del mismo caso;
+        # la última etapa de cada caso sigue abierta y no tiene duración.
+        cerrada = np.zeros(len(caso), dtype=bool)
+        cerrada[:-1] = caso[1:] == caso[:-1]
+        duracion = np.full(len(caso), np.nan)
+        duracion[:-1] = dia[1:] - dia[:-1]
+
+        self.indices = np.nonzero(cerrada)[0]
+        self.dia = dia[self.indices]
+        self.duracion = duracion[self.indices]
+        self.filas = len(caso)
+
+
+def _agregar(claves: np.ndarray, duraciones: np.ndarray) -> Tuple[np.ndarray, dict]:
+    """
+    Estadísticas por clave entera. Ordena una vez por (clave, duración) y
+    obtiene conteo, promedio, máximo y percentiles por segmento.
+    """
+    orden = np.lexsort((duraciones, claves))
+    claves = claves[orden]
+    duraciones = duraciones[orden]
+    inicios = np.flatnonzero(np.r_[True, claves[1:] != claves[:-1]])
+    conteos = np.diff(np.r_[inicios, len(claves)])
+    fin = inicios + conteos - 1
+
+    estadisticas = {
+        "n": conteos,
+        "promedioDias": np.add.reduceat(duraciones, inicios) / conteos,
+        "maxDias": duraciones[fin],
+    }
+    for p in PERCENTILES:
+        # Interpolación lineal dentro de cada segmento ya ordenado
+        posicion = inicios + (conteos - 1) * (p / 100.0)
+        abajo = np.floor(posicion).astype(np.int64)
+        arriba = np.minimum(abajo + 1, fin)
+        fraccion = posicion - abajo
+        estadisticas[f"p{p}Dias"] = duraciones[abajo] * (1 - fraccion) + duraciones[arriba] * fraccion
+    return claves[inicios], estadisticas
+
+
+class AnaliticaEtapas:
+    """
+    Caché del historial de etapas y de los resultados por
+    (agrupación, desde, hasta).
+    """
+
+    def __init__(self, ttl: float = 600.0, max_resultados: int = 64, tamano_lote: int = 10000):
+        self.ttl = ttl
+        self.max_resultados = max_resultados
+        self.tamano_lote = tamano_lote
+        self._historial: Optional[_Historial] = None
+        self._cargado_en = 0.0
+        self._resultados: Dict[tuple, Tuple[float, list]] = {}
+        self._lock = threading.Lock()
+
+    def _cargar(self, connection) -> _Historial:
+        casos, dias = [], []
+        categoricas = {"codEspecializacion": [], "codEtapa": [], "codLugar": []}
+        cursor = connection.cursor()
+        try:
+            cursor.arraysize = self.tamano_lote
+            cursor.prefetchrows = self.tamano_lote
+            cursor.execute("SELECT codEtapa, nomEtapa FROM EtapaProcesal")
+            nombres_etapa = dict(cursor.fetchall())
+            cursor.execute(CONSULTA_HISTORIAL)
+            while True:
+                lote = cursor.fetchmany()
+                if not lote:
+                    break
+                columnas = list(zip(*lote))
+                casos.extend(columnas[0])
+                dias.extend(columnas[1])
+                categoricas["codEspecializacion"].extend(columnas[2])
+                categoricas["codEtapa"].extend(columnas[3])
+                categoricas["codLugar"].extend(columnas[4])
+        finally:
+            cursor.close()
+        return _Historial(casos, dias, categoricas, nombres_etapa)
+
+    def historial(self, connection) -> _Historial:
+        """Historial en caché, recargado cuando vence el ttl."""
+        with self._lock:
+            if self._historial is None or time.monotonic() - self._cargado_en >= self.ttl:
+                self._historial = self._cargar(connection)
+                self._cargado_en = time.monotonic()
+                self._resultados.clear()
+            return self._historial
+
+    def duraciones(self, connection, agrupar: str = "especializacion",
+                   desde: Optional[date] = None, hasta: Optional[date] = None) -> List[dict]:
+        """
+        Duración (días) de cada etapa por especialización o lugar, para
+        las etapas iniciadas entre `desde` y `hasta` (inclusivos).
+        """
+        columna = AGRUPACIONES[agrupar]
+        historial = self.historial(connection)
+        clave_cache = (agrupar, desde, hasta)
+        guardado = self._resultados.get(clave_cache)
+        if guardado is not None and guardado[0] == self._cargado_en:
+            return guardado[1]
+
+        mascara = np.ones(len(historial.indices), dtype=bool)
+        if desde is not None:
+            mascara &= historial.dia >= (desde - EPOCA).days
+        if hasta is not None:
+            mascara &= historial.dia <= (hasta - EPOCA).days
+        filas = historial.indices[mascara]
+        duraciones = historial.duracion[mascara]
+        if len(filas) == 0:
+            return []
+
+        etapa = historial.codigos["codEtapa"][filas]
+        grupo = historial.codigos[columna][filas]
+        n_grupos = len(historial.valores[columna])
+        claves, estadisticas = _agregar(etapa * n_grupos + grupo, duraciones)
+
+        resultado = []
+        for i, clave in enumerate(claves.tolist()):
+            cod_etapa = str(historial.valores["codEtapa"][clave // n_grupos])
+            fila = {
+                "codEtapa": cod_etapa,
+                "nomEtapa": historial.nombres_etapa.get(cod_etapa),
+                columna: str(historial.valores[columna][clave % n_grupos]),
+                "n": int(estadisticas["n"][i]),
+            }
+            for nombre, valores in estadisticas.items():
+                if nombre != "n":
+                    fila[nombre] = round(float(valores[i]), 2)
+            resultado.append(fila)
+
+        with self._lock:
+            if len(self._resultados) >= self.max_resultados:
+                self._resultados.pop(next(iter(self._resultados)))
+            self._resultados[clave_cache] = (self._cargado_en, resultado)
+        return resultado
+
+    def estado(self) -> dict:
+        historial = self._historial
+        return {
+            "filas": historial.filas if historial else 0,
+            "etapasCerradas": len(historial.indices) if historial else 0,
+            "edadSeg": round(time.monotonic() - self._cargado_en, 1) if historial else None,
+            "resultadosEnCache": len(self._resultados),
+        }
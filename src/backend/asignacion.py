@@ -0,0 +1,195 @@
+"""
+Motor de Asignación de Abogados
+Recomendación del abogado menos cargado por especialización
+
+Se mantiene en memoria la cantidad de expedientes abiertos (de casos sin
+fecha fin) asignados a cada cédula. La carga inicial sale de EXPEDIENTE y
+luego se ajusta con cada asignación o reasignación hecha por la API, sin
+ejecutar COUNT/GROUP BY por solicitud. Cada especialización tiene un
+montículo (heap) de (carga, cédula) con invalidación perezosa: al cambiar
+una carga se inserta una entrada nueva y las obsoletas se descartan al
+llegar a la cima. Una resincronización periódica corrige las diferencias
+causadas por otros procesos o escrituras fuera de la API.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class MotorAsignacion:
+    """
+    Contadores de carga por abogado y montículos por especialización,
+    compartidos por todas las solicitudes del proceso.
+    """
+
+    def __init__(self, intervalo_resincronizacion: float = 300.0):
+        self.intervalo_resincronizacion = intervalo_resincronizacion
+        self._carga: Dict[str, int] = {}
+        self._abogados: Dict[str, dict] = {}
+        self._miembros: Dict[str, Set[str]] = {}
+        self._especialidades: Dict[str, Set[str]] = {}
+        self._heaps: Dict[str, list] = {}
+        self._cargado = False
+        self._ultima_sincronizacion = 0.0
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+
+    @property
+    def cargado(self) -> bool:
+        return self._cargado
+
+    # ------------------------------------------------------------------
+    # Carga desde la base de datos
+    # ------------------------------------------------------------------
+    def cargar(self, connection):
+        """Lee especializaciones de abogados y expedientes abiertos por cédula."""
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT a.cedula, a.nombre, a.apellido, ea.codEspecializacion
+                FROM Abogado a
+                INNER JOIN Especializacion_Abogado ea ON a.cedula = ea.cedula
+            """)
+            filas_abogados = cursor.fetchall()
+            cursor.execute("""
+                SELECT e.cedula, COUNT(*)
+                FROM Expediente e
+                INNER JOIN Caso c ON c.noCaso = e.noCaso
+                WHERE e.cedula IS NOT NULL
+                AND c.fechaFin IS NULL
+                GROUP BY e.cedula
+            """)
+            conteos = dict(cursor.fetchall())
+        finally:
+            cursor.close()
+
+        abogados, miembros, especialidades = {}, {}, {}
+        for cedula, nombre, apellido, cod_esp in filas_abogados:
+            abogados[cedula] = {"cedula": cedula, "nombre": nombre, "apellido": apellido}
+            miembros.setdefault(cod_esp, set()).add(cedula)
+            especialidades.setdefault(cedula, set()).add(cod_esp)
+
+        with self._lock:
+            self._abogados = abogados
+            self._miembros = miembros
+            self._especialidades = especialidades
+            self._carga = {cedula: conteos.get(cedula, 0) for cedula in abogados}
+            self._heaps = {cod_esp: self._construir_heap(cod_esp) for cod_esp in miembros}
+            self._cargado = True
+            self._ultima_sincronizacion = time.monotonic()
+        logger.info("Cargas de abogados sincronizadas: %d abogados", len(abogados))
+
+    def necesita_sincronizacion(self) -> bool:
+        """
+        Indica si la próxima llamada a sincronizar() leería la base (para
+        tomar una conexión solo entonces). Falso si otro hilo ya está leyendo.
+        """
+        if not self._cargado:
+            return True
+        return (time.monotonic() - self._ultima_sincronizacion >= self.intervalo_resincronizacion
+                and not self._lock_carga.locked())
+
+    def sincronizar(self, connection, forzar: bool = False):
+        """Recarga los contadores si pasó el intervalo de resincronización."""
+        if (not forzar and self._cargado
+                and time.monotonic() - self._ultima_sincronizacion < self.intervalo_resincronizacion):
+            return
+        # Sin datos cargados se espera al hilo que los está cargando
+        if not self._lock_carga.acquire(blocking=forzar or not self._cargado):
+            return
+        try:
+            if forzar or not self._cargado or (
+                    time.monotonic() - self._ultima_sincronizacion >= self.intervalo_resincronizacion):
+                self.cargar(connection)
+        finally:
+            self._lock_carga.release()
+
+    # ------------------------------------------------------------------
+    # Montículos
+    # ------------------------------------------------------------------
+    def _construir_heap(self, cod_esp: str) -> list:
+        heap = [(self._carga[cedula], cedula) for cedula in self._miembros[cod_esp]]
+        heapq.heapify(heap)
+        return heap
+
+    def _vigente(self, cod_esp: str, entrada: tuple) -> bool:
+        carga, cedula = entrada
+        return self._carga.get(cedula) == carga and cedula in self._miembros.get(cod_esp, ())
+
+    def _limpiar_cima(self, cod_esp: str) -> list:
+        heap = self._heaps[cod_esp]
+        while heap and not self._vigente(cod_esp, heap[0]):
+            heapq.heappop(heap)
+        return heap
+
+    def ajustar(self, cedula: Optional[str], delta: int):
+        """Suma `delta` a la carga de la cédula (asignación +1, liberación -1)."""
+        if not cedula:
+            return
+        with self._lock:
+            if cedula not in self._carga:
+                return  # Abogado sin especialización registrada
+            self._carga[cedula] = max(0, self._carga[cedula] + delta)
+            entrada = (self._carga[cedula], cedula)
+            for cod_esp in self._especialidades.get(cedula, ()):
+                heap = self._heaps[cod_esp]
+                heapq.heappush(heap, entrada)
+                # Compactar cuando las entradas obsoletas dominan el montículo
+                if len(heap) > 4 * len(self._miembros[cod_esp]) + 16:
+                    self._heaps[cod_esp] = self._construir_heap(cod_esp)
+
+    def reasignar(self, anterior: Optional[str], nueva: Optional[str]):
+        """Mueve un expediente abierto de un abogado a otro."""
+        if anterior == nueva:
+            return
+        self.ajustar(anterior, -1)
+        self.ajustar(nueva, 1)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def carga(self, cedula: str) -> Optional[int]:
+        return self._carga.get(cedula)
+
+    def recomendar(self, cod_esp: str, cantidad: int = 1) -> List[dict]:
+        """
+        Los `cantidad` abogados menos cargados de la especialización
+        (empate: menor cédula). Con cantidad=1 el costo es O(log n).
+        """
+        with self._lock:
+            if cod_esp not in self._heaps:
+                return []
+            heap = self._limpiar_cima(cod_esp)
+            if cantidad == 1:
+                elegidos = heap[:1]
+            else:
+                elegidos, vistos, extraidos = [], set(), []
+                while heap and len(elegidos) < cantidad:
+                    entrada = heapq.heappop(heap)
+                    extraidos.append(entrada)
+                    if self._vigente(cod_esp, entrada) and entrada[1] not in vistos:
+                        vistos.add(entrada[1])
+                        elegidos.append(entrada)
+                for entrada in extraidos:
+                    if self._vigente(cod_esp, entrada):
+                        heapq.heappush(heap, entrada)
+            return [
+                {**self._abogados[cedula], "expedientesAbiertos": carga}
+                for carga, cedula in elegidos
+            ]
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "cargado": self._cargado,
+                "abogados": len(self._carga),
+                "especializaciones": {
+                    cod_esp: {"abogados": len(self._miembros[cod_esp]), "entradasHeap": len(heap)}
+                    for cod_esp, heap in self._heaps.items()
+                },
+            }
@@ -0,0 +1,117 @@
+"""
+Benchmark de Arranque
+Tiempo de importación de main.py y tiempo hasta la primera solicitud atendida
+
+Cada repetición corre en un proceso nuevo (arranque en frío):
+- importar: tiempo de `import main` (y del proceso completo).
+- primera solicitud: desde lanzar uvicorn hasta que GET /api/health
+  responde 200. La precarga de estructuras corre en segundo plano, así
+  que no debe sumar a este tiempo aunque la base no esté disponible.
+
+Uso (desde src/backend):
+    python benchmark_arranque.py                  # 5 repeticiones
+    python benchmark_arranque.py -n 10 --modulos  # además, los módulos más lentos de importar
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import List
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Sin archivo de consultas lentas para no escribir logs durante el benchmark
+ENTORNO = {**os.environ, "CONSULTAS_LOG": ""}
+
+
+def medir_importacion() -> tuple:
+    """(segundos de `import main`, segundos del proceso completo)."""
+    codigo = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    inicio = time.perf_counter()
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=DIRECTORIO, env=ENTORNO,
+        capture_output=True, text=True, check=True,
+    )
+    return float(salida.stdout.strip().splitlines()[-1]), time.perf_counter() - inicio
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def medir_primera_solicitud(limite: float = 60.0) -> float:
+    """Segundos desde lanzar uvicorn hasta el primer 200 de /api/health."""
+    puerto = puerto_libre()
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=DIRECTORIO, env=ENTORNO, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - inicio < limite:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/api/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - inicio
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError(f"El servidor no respondió en {limite}s")
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def modulos_lentos(cantidad: int) -> List[tuple]:
+    """Módulos con mayor tiempo propio de importación (python -X importtime)."""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=DIRECTORIO, env=ENTORNO, capture_output=True, text=True, check=True,
+    )
+    filas = []
+    for linea in salida.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, modulo = linea[len("import time:"):].split("|")
+        filas.append((int(propio) / 1000, int(acumulado) / 1000, modulo.strip()))
+    return sorted(filas, reverse=True)[:cantidad]
+
+
+def resumen(nombre: str, valores: List[float]):
+    print(f"  {nombre:<24} mediana {statistics.median(valores) * 1000:8.1f} ms"
+          f"   min {min(valores) * 1000:8.1f}   max {max(valores) * 1000:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de la API")
+    parser.add_argument("-n", "--repeticiones", type=int, default=5)
+    parser.add_argument("--modulos", action="store_true", help="Mostrar los módulos más lentos de importar")
+    args = parser.parse_args()
+
+    importaciones, procesos, primeras = [], [], []
+    for _ in range(args.repeticiones):
+        importar, proceso = medir_importacion()
+        importaciones.append(importar)
+        procesos.append(proceso)
+        primeras.append(medir_primera_solicitud())
+
+    print(f"Arranque en frío ({args.repeticiones} repeticiones)")
+    resumen("import main", importaciones)
+    resumen("proceso (import + salida)", procesos)
+    resumen("primera solicitud", primeras)
+
+    if args.modulos:
+        print("\nMódulos más lentos (tiempo propio / acumulado, ms)")
+        for propio, acumulado, modulo in modulos_lentos(15):
+            print(f"  {propio:8.1f} {acumulado:8.1f}  {modulo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Búsqueda de Texto
+Consultas sobre sucesos, resultados y documentos con Oracle Text
+
+DESCSUCESO, DESCRESUL y UBICADOC tienen índices CTXSYS.CONTEXT con
+SYNC (ON COMMIT): cada INSERT de los endpoints de creación queda
+indexado al confirmar la transacción, sin mantenimiento desde la API.
+CONTAINS resuelve la búsqueda en el índice invertido, de modo que el
+costo depende de las coincidencias y no del tamaño de las tablas; SCORE
+da el puntaje para ordenar.
+"""
+
+import re
+from typing import List, Optional
+
+MODOS = ("frase", "todas", "alguna")
+
+# Palabras (letras y dígitos) del texto de búsqueda
+_RE_PALABRAS = re.compile(r"[^\W_]+", re.UNICODE)
+
+CONSULTA_BUSQUEDA = """
+    SELECT t.tipo, t.codEspecializacion, t.pasoEtapa, t.noCaso, t.consecExpe,
+           t.consecutivo, t.texto, t.puntaje, c.codCliente
+    FROM (
+        SELECT 'suceso' AS tipo, s.codEspecializacion, s.pasoEtapa, s.noCaso, s.consecExpe,
+               s.conSuceso AS consecutivo, s.descSuceso AS texto, SCORE(1) AS puntaje
+        FROM Suceso s
+        WHERE CONTAINS(s.descSuceso, :expresion, 1) > 0
+        UNION ALL
+        SELECT 'resultado', r.codEspecializacion, r.pasoEtapa, r.noCaso, r.consecExpe,
+               r.conResul, r.descResul, SCORE(2)
+        FROM Resultado r
+        WHERE CONTAINS(r.descResul, :expresion, 2) > 0
+        UNION ALL
+        SELECT 'documento', d.codEspecializacion, d.pasoEtapa, d.noCaso, d.consecExpe,
+               d.conDoc, d.ubicaDoc, SCORE(3)
+        FROM Documento d
+        WHERE CONTAINS(d.ubicaDoc, :expresion, 3) > 0
+    ) t
+    INNER JOIN Caso c ON c.noCaso = t.noCaso
+    WHERE t.tipo IN (SELECT column_value FROM TABLE(:tipos))
+    {filtros}
+    ORDER BY t.puntaje DESC, t.noCaso, t.consecExpe, t.tipo, t.consecutivo
+    OFFSET :offset ROWS FETCH NEXT :limite ROWS ONLY
+"""
+
+TIPOS = ("suceso", "resultado", "documento")
+
+
+def expresion_texto(texto: str, modo: str = "frase") -> Optional[str]:
+    """
+    Convierte el texto del usuario en una expresión CONTAINS segura.
+    Cada palabra va entre llaves para que operadores y palabras reservadas
+    (AND, NOT, %, ...) se traten como texto.
+      frase  -> las palabras seguidas, en ese orden
+      todas  -> todas las palabras en cualquier orden
+      alguna -> cualquiera de las palabras (más coincidencias, más puntaje)
+    Retorna None si el texto no tiene palabras.
+    """
+    palabras = _RE_PALABRAS.findall(texto)
+    if not palabras:
+        return None
+    escapadas = ["{" + p + "}" for p in palabras]
+    if modo == "frase":
+        return " ".join(escapadas)
+    if modo == "todas":
+        return " AND ".join(escapadas)
+    return " ACCUM ".join(escapadas)
+
+
+def buscar(connection, texto: str, modo: str = "frase", tipos: Optional[List[str]] = None,
+           no_caso: Optional[int] = None, cod_cliente: Optional[str] = None,
+           cod_especializacion: Optional[str] = None,
+           limite: int = 20, offset: int = 0) -> List[dict]:
+    """Coincidencias ordenadas por puntaje, opcionalmente acotadas por caso, cliente o especialización."""
+    expresion = expresion_texto(texto, modo)
+    if expresion is None:
+        return []
+    filtros, parametros = [], {
+        "expresion": expresion,
+        "tipos": connection.gettype("SYS.ODCIVARCHAR2LIST").newobject(list(tipos or TIPOS)),
+        "offset": offset,
+        "limite": limite,
+    }
+    if no_caso is not None:
+        filtros.append("AND t.noCaso = :noCaso")
+        parametros["noCaso"] = no_caso
+    if cod_cliente is not None:
+        filtros.append("AND c.codCliente = :codCliente")
+        parametros["codCliente"] = cod_cliente
+    if cod_especializacion is not None:
+        filtros.append("AND t.codEspecializacion = :codEsp")
+        parametros["codEsp"] = cod_especializacion
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(CONSULTA_BUSQUEDA.format(filtros="\n    ".join(filtros)), parametros)
+        return [
+            {
+                "tipo": fila[0],
+                "codEspecializacion": fila[1],
+                "pasoEtapa": fila[2],
+                "noCaso": fila[3],
+                "consecExpe": fila[4],
+                "consecutivo": fila[5],
+                "texto": fila[6],
+                "puntaje": fila[7],
+                "codCliente": fila[8],
+            }
+            for fila in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
@@ -0,0 +1,163 @@
+"""
+Caché de Clientes
+Clientes por número de documento, con LRU acotado y caché de "no encontrado"
+
+obtener_cliente_por_documento es la primera llamada de casi toda atención
+en recepción y se repite para el mismo documento varias veces seguidas.
+- Las entradas vencen a los `ttl` segundos; los documentos inexistentes se
+  recuerdan solo `ttl_negativo` segundos, para no consultar Oracle una y
+  otra vez por un documento mal digitado sin ocultar por mucho tiempo un
+  cliente recién creado.
+- Si varias solicitudes piden el mismo documento mientras se está
+  consultando, esperan esa consulta en lugar de lanzar otra.
+- `invalidar` descarta un documento (o todos); una consulta que estaba en
+  curso al invalidar no guarda su resultado.
+
+CLIENTE.NDOCUMENTO no es única: cada entrada guarda la lista de clientes
+con ese documento, ordenada por codCliente.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class CacheClientes:
+    """LRU de documento -> lista de clientes (vacía = no encontrado)."""
+
+    def __init__(self, capacidad: int = 10000, ttl: float = 300.0, ttl_negativo: float = 30.0):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._entradas: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+        # Consultas en curso por documento (solo se usan desde el event loop)
+        self._en_curso: Dict[str, asyncio.Future] = {}
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_negativos = 0
+        self.fallos = 0
+        self.esperas = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    def consultar(self, documento: str) -> Tuple[bool, List[dict]]:
+        """(encontrado en caché, clientes). Cuenta acierto o fallo."""
+        with self._lock:
+            entrada = self._entradas.get(documento)
+            if entrada is None or entrada[0] <= time.monotonic():
+                if entrada is not None:
+                    del self._entradas[documento]
+                self.fallos += 1
+                return False, []
+            self._entradas.move_to_end(documento)
+            self.aciertos += 1
+            if not entrada[1]:
+                self.aciertos_negativos += 1
+            return True, entrada[1]
+
+    def guardar(self, documento: str, clientes: List[dict], generacion: Optional[int] = None):
+        """
+        Guarda el resultado de una consulta. Si se pasa la generación leída
+        antes de consultar y hubo una invalidación desde entonces, se descarta.
+        """
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            vigencia = self.ttl if clientes else self.ttl_negativo
+            self._entradas[documento] = (time.monotonic() + vigencia, clientes)
+            self._entradas.move_to_end(documento)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def invalidar(self, documento: Optional[str] = None):
+        """Descarta un documento, o toda la caché si documento es None."""
+        with self._lock:
+            self._generacion += 1
+            self.invalidaciones += 1
+            if documento is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(documento, None)
+
+    async def obtener(self, documento: str, cargar: Callable[[], Awaitable[List[dict]]]) -> List[dict]:
+        """
+        Clientes del documento, desde la caché o con `cargar()` (una sola
+        consulta por documento aunque lleguen varias solicitudes a la vez).
+        Si la consulta falla, todas las solicitudes que la esperaban reciben
+        el mismo error.
+        """
+        encontrado, clientes = self.consultar(documento)
+        if encontrado:
+            return clientes
+        while documento in self._en_curso:
+            en_curso = self._en_curso[documento]
+            self.esperas += 1
+            try:
+                return await asyncio.shield(en_curso)
+            except asyncio.CancelledError:
+                if not en_curso.cancelled():
+                    raise  # Se canceló esta solicitud
+                # Se canceló la solicitud que consultaba (cliente desconectado): se reintenta
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_curso[documento] = futuro
+        generacion = self._generacion
+        try:
+            clientes = await cargar()
+            self.guardar(documento, clientes, generacion)
+            futuro.set_result(clientes)
+            return clientes
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except Exception as e:
+            futuro.set_exception(e)
+            futuro.exception()  # Evita el aviso si nadie más la esperaba
+            raise
+        finally:
+            del self._en_curso[documento]
+
+    def obtener_varios(self, documentos: Iterable[str],
+                       cargar: Callable[[List[str]], Dict[str, List[dict]]]) -> Dict[str, List[dict]]:
+        """
+        Clientes de varios documentos; los que no están en caché se leen
+        juntos con `cargar(faltantes)` y se guardan.
+        """
+        resultado, faltantes = {}, []
+        for documento in dict.fromkeys(documentos):
+            encontrado, clientes = self.consultar(documento)
+            if encontrado:
+                resultado[documento] = clientes
+            else:
+                faltantes.append(documento)
+        if faltantes:
+            generacion = self._generacion
+            leidos = cargar(faltantes)
+            for documento in faltantes:
+                clientes = leidos.get(documento, [])
+                self.guardar(documento, clientes, generacion)
+                resultado[documento] = clientes
+        return resultado
+
+    def estado(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "capacidad": self.capacidad,
+                "entradas": len(self._entradas),
+                "negativas": sum(1 for _, clientes in self._entradas.values() if not clientes),
+                "ttlSeg": self.ttl,
+                "ttlNegativoSeg": self.ttl_negativo,
+                "aciertos": self.aciertos,
+                "aciertosNegativos": self.aciertos_negativos,
+                "fallos": self.fallos,
+                "razonAciertos": round(self.aciertos / consultas, 3) if consultas else None,
+                "esperasCompartidas": self.esperas,
+                "consultasEnCurso": len(self._en_curso),
+                "expulsiones": self.expulsiones,
+                "invalidaciones": self.invalidaciones,
+            }
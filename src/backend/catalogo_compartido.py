@@ -0,0 +1,493 @@
+"""
+Catálogo Compartido
+Instantánea de solo lectura de los catálogos, mapeada en memoria por todos los workers
+
+ESPECIALIZACION, ABOGADO (por especialización), LUGAR y ESPECIA_ETAPA se
+serializan en un único archivo binario versionado. Cada worker lo mapea
+con mmap: el sistema operativo comparte las mismas páginas entre todos los
+procesos, de modo que la memoria de catálogos no crece al agregar workers,
+y las lecturas decodifican solo las celdas que se consultan.
+
+Formato (enteros little-endian):
+  cabecera   MAGICO, formato, versión, fecha de construcción, tamaño total
+             y largo del directorio
+  directorio JSON con columnas, tipos y posición de las secciones de cada tabla
+  por tabla  offsets (u32 por celda, más uno final), marcas de NULL (un byte
+             por celda), datos UTF-8 concatenados y un arreglo u32 por índice
+             con las filas ordenadas por las columnas del índice
+
+Reconstrucción: se escribe un archivo temporal en el mismo directorio y se
+reemplaza con os.replace, así que los lectores ven la versión anterior o la
+nueva completa, nunca un archivo a medias. Cada worker revisa el archivo a
+lo sumo una vez por segundo y, si cambió, mapea la versión nueva; la
+anterior se libera cuando terminan las solicitudes que la usan. Solo un
+proceso reconstruye por vez (flock sobre un archivo de cerrojo permanente,
+que el sistema libera si el proceso termina): la carga sobre Oracle no
+depende de la cantidad de workers.
+
+Cambios: el archivo guarda una marca por tabla (COUNT y MAX(ORA_ROWSCN)).
+Quien tiene el cerrojo la compara con la de la base, una consulta barata,
+y reconstruye solo si difiere; además se reconstruye siempre al cumplir
+la antigüedad máxima. Un cambio en los catálogos se ve, entonces, en el
+siguiente intervalo de verificación y no al vencer la instantánea.
+
+En Windows un archivo mapeado no puede reemplazarse, así que allí el
+archivo se lee completo en memoria en lugar de mapearse.
+
+Uso (desde src/backend):
+    python catalogo_compartido.py --construir
+    python catalogo_compartido.py --mostrar
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import oracledb
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+MAGICO = b"CATALOGO"
+FORMATO = 1
+_CABECERA = struct.Struct("<8sIQdQI")
+_U32 = struct.Struct("<I")
+
+# Tabla -> consulta, columnas (nombre, tipo) e índices (nombre -> columnas).
+# Tipos: "s" texto, "i" entero. El primer índice define el orden de las filas.
+TABLAS = {
+    "especializacion": {
+        "sql": "SELECT codEspecializacion, nomEspecializacion FROM Especializacion",
+        "columnas": [("codEspecializacion", "s"), ("nomEspecializacion", "s")],
+        "indices": {"pk": ["codEspecializacion"]},
+    },
+    "abogado_especializacion": {
+        "sql": """
+            SELECT ea.codEspecializacion, a.cedula, a.nombre, a.apellido, a.nTarjetaProfesional
+            FROM Abogado a
+            INNER JOIN Especializacion_Abogado ea ON a.cedula = ea.cedula
+        """,
+        "columnas": [("codEspecializacion", "s"), ("cedula", "s"), ("nombre", "s"),
+                     ("apellido", "s"), ("nTarjetaProfesional", "s")],
+        "indices": {"especializacion": ["codEspecializacion", "apellido", "nombre"]},
+    },
+    "lugar": {
+        "sql": """
+            SELECT codLugar, lug_codLugar, idTipoLugar, nomLugar, direLugar, telLugar, emailLugar
+            FROM Lugar
+        """,
+        "columnas": [("codLugar", "s"), ("lugCodLugar", "s"), ("idTipoLugar", "s"), ("nomLugar", "s"),
+                     ("direLugar", "s"), ("telLugar", "s"), ("emailLugar", "s")],
+        "indices": {"pk": ["codLugar"], "padre": ["lugCodLugar", "nomLugar"]},
+    },
+    "especia_etapa": {
+        "sql": """
+            SELECT ee.codEspecializacion, ee.pasoEtapa, ee.codEtapa, et.nomEtapa,
+                   ee.idImpugna, ee.nInstancia
+            FROM Especia_Etapa ee
+            INNER JOIN EtapaProcesal et ON ee.codEtapa = et.codEtapa
+        """,
+        "columnas": [("codEspecializacion", "s"), ("pasoEtapa", "i"), ("codEtapa", "s"),
+                     ("nomEtapa", "s"), ("idImpugna", "s"), ("nInstancia", "i")],
+        "indices": {"pk": ["codEspecializacion", "pasoEtapa"]},
+    },
+}
+
+
+# Tablas base de los catálogos -> marca de cambios (una sola ida a la base)
+CONSULTA_MARCA = " UNION ALL ".join(
+    f"SELECT '{tabla}', COUNT(*), MAX(ORA_ROWSCN) FROM {tabla}"
+    for tabla in ("Especializacion", "Abogado", "Especializacion_Abogado", "Lugar",
+                  "Especia_Etapa", "EtapaProcesal")
+)
+
+
+class CatalogoInvalido(Exception):
+    """El archivo no es una instantánea de catálogos válida."""
+
+
+def _clave(valores) -> tuple:
+    # NULL ordena antes que cualquier valor
+    return tuple((0, "") if v is None else (1, v) for v in valores)
+
+
+def _alinear(datos: bytearray):
+    datos.extend(b"\0" * (-len(datos) % 4))
+
+
+# ----------------------------------------------------------------------
+# Construcción
+# ----------------------------------------------------------------------
+def _serializar_tabla(filas: List[tuple], definicion: dict, base: int, salida: bytearray) -> dict:
+    """Agrega las secciones de una tabla a `salida`; `base` es su posición en el archivo."""
+    columnas = [c for c, _ in definicion["columnas"]]
+    indices = definicion["indices"]
+    primero = next(iter(indices.values()))
+    posicion = {c: i for i, c in enumerate(columnas)}
+    filas = sorted(filas, key=lambda f: _clave(f[posicion[c]] for c in primero))
+
+    offsets, nulos, datos = [0], bytearray(), bytearray()
+    for fila in filas:
+        for valor in fila:
+            nulos.append(valor is None)
+            if valor is not None:
+                datos.extend(str(valor).encode("utf-8"))
+            offsets.append(len(datos))
+
+    meta = {
+        "columnas": columnas,
+        "tipos": "".join(t for _, t in definicion["columnas"]),
+        "filas": len(filas),
+        "indices": {},
+    }
+    meta["offsets"] = base + len(salida)
+    salida.extend(struct.pack(f"<{len(offsets)}I", *offsets))
+    meta["nulos"] = base + len(salida)
+    salida.extend(nulos)
+    _alinear(salida)
+    meta["datos"] = base + len(salida)
+    salida.extend(datos)
+    _alinear(salida)
+    for nombre, cols in indices.items():
+        orden = sorted(range(len(filas)), key=lambda i: _clave(filas[i][posicion[c]] for c in cols))
+        meta["indices"][nombre] = {"columnas": cols, "pos": base + len(salida)}
+        salida.extend(struct.pack(f"<{len(orden)}I", *orden))
+    return meta
+
+
+def leer_marca(connection) -> Dict[str, list]:
+    """{tabla: [filas, MAX(ORA_ROWSCN)]} de las tablas base de los catálogos."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(CONSULTA_MARCA)
+        return {tabla: [filas, scn] for tabla, filas, scn in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def construir(connection, ruta: str, version: int, marca: Optional[Dict[str, list]] = None) -> dict:
+    """
+    Lee los catálogos y escribe la instantánea en `ruta` de forma atómica.
+    `marca` (leída antes que las tablas) se guarda en el directorio.
+    Retorna {tabla: filas}.
+    """
+    cursor = connection.cursor()
+    try:
+        leidas = {}
+        for nombre, definicion in TABLAS.items():
+            cursor.execute(definicion["sql"])
+            leidas[nombre] = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    # Las posiciones del directorio dependen de su propio largo: se reserva
+    # un espacio fijo y se verifica que alcance.
+    reserva = 4096
+    while True:
+        inicio_datos = _CABECERA.size + reserva
+        cuerpo = bytearray()
+        directorio = {
+            nombre: _serializar_tabla(leidas[nombre], definicion, inicio_datos, cuerpo)
+            for nombre, definicion in TABLAS.items()
+        }
+        texto = json.dumps({"tablas": directorio, "marca": marca}, separators=(",", ":")).encode("utf-8")
+        if len(texto) <= reserva:
+            break
+        reserva *= 2
+
+    tamano = inicio_datos + len(cuerpo)
+    cabecera = _CABECERA.pack(MAGICO, FORMATO, version, time.time(), tamano, len(texto))
+    directorio_ruta = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio_ruta, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio_ruta, prefix=".catalogo-")
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(cabecera)
+            archivo.write(texto.ljust(reserva, b" "))
+            archivo.write(cuerpo)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.unlink(temporal)
+        raise
+    return {nombre: len(filas) for nombre, filas in leidas.items()}
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+class _Tabla:
+    """Vista de una tabla dentro del archivo mapeado (sin copiar filas)."""
+
+    def __init__(self, vista: memoryview, meta: dict):
+        self._vista = vista
+        self.columnas: List[str] = meta["columnas"]
+        self._tipos = meta["tipos"]
+        self.filas: int = meta["filas"]
+        self._offsets = meta["offsets"]
+        self._nulos = meta["nulos"]
+        self._datos = meta["datos"]
+        self._indices = meta["indices"]
+        self._fila_offsets = struct.Struct(f"<{len(self.columnas) + 1}I")
+
+    def _celda(self, celda: int, inicio: int, fin: int):
+        if self._vista[self._nulos + celda]:
+            return None
+        texto = str(self._vista[self._datos + inicio:self._datos + fin], "utf-8")
+        return int(texto) if self._tipos[celda % len(self._tipos)] == "i" else texto
+
+    def fila(self, numero: int, columnas: Optional[List[str]] = None) -> dict:
+        ancho = len(self.columnas)
+        primera = numero * ancho
+        limites = self._fila_offsets.unpack_from(self._vista, self._offsets + 4 * primera)
+        return {
+            nombre: self._celda(primera + i, limites[i], limites[i + 1])
+            for i, nombre in enumerate(self.columnas)
+            if columnas is None or nombre in columnas
+        }
+
+    def _valor(self, numero: int, columna: int):
+        celda = numero * len(self.columnas) + columna
+        inicio, fin = struct.unpack_from("<2I", self._vista, self._offsets + 4 * celda)
+        return self._celda(celda, inicio, fin)
+
+    def __iter__(self) -> Iterator[dict]:
+        for numero in range(self.filas):
+            yield self.fila(numero)
+
+    def buscar(self, indice: str, *clave, columnas: Optional[List[str]] = None) -> List[dict]:
+        """
+        Filas cuyas primeras columnas del índice coinciden con `clave`,
+        en el orden del índice (búsqueda binaria sobre el archivo).
+        """
+        meta = self._indices[indice]
+        posiciones = [self.columnas.index(c) for c in meta["columnas"][:len(clave)]]
+        pos = meta["pos"]
+        objetivo = _clave(clave)
+
+        def fila_en(i: int) -> int:
+            return _U32.unpack_from(self._vista, pos + 4 * i)[0]
+
+        def clave_en(i: int) -> tuple:
+            numero = fila_en(i)
+            return _clave(self._valor(numero, c) for c in posiciones)
+
+        inicio = bisect.bisect_left(range(self.filas), objetivo, key=clave_en)
+        fin = bisect.bisect_right(range(self.filas), objetivo, lo=inicio, key=clave_en)
+        return [self.fila(fila_en(i), columnas) for i in range(inicio, fin)]
+
+
+class Instantanea:
+    """Una versión del catálogo mapeada en memoria."""
+
+    def __init__(self, ruta: str):
+        with open(ruta, "rb") as archivo:
+            if os.name == "nt":
+                self._mapa = archivo.read()
+            else:
+                self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        vista = memoryview(self._mapa)
+        if len(vista) < _CABECERA.size:
+            raise CatalogoInvalido(ruta)
+        magico, formato, self.version, self.construido, tamano, largo = _CABECERA.unpack_from(vista)
+        if magico != MAGICO or formato != FORMATO or tamano != len(vista):
+            raise CatalogoInvalido(ruta)
+        directorio = json.loads(bytes(vista[_CABECERA.size:_CABECERA.size + largo]))
+        self.tamano = tamano
+        self.marca: Optional[Dict[str, list]] = directorio.get("marca")
+        self.tablas: Dict[str, _Tabla] = {
+            nombre: _Tabla(vista, meta) for nombre, meta in directorio["tablas"].items()
+        }
+
+    def __getitem__(self, tabla: str) -> _Tabla:
+        return self.tablas[tabla]
+
+
+class CatalogoCompartido:
+    """
+    Acceso a la instantánea vigente y reconstrucción coordinada entre procesos.
+    """
+
+    def __init__(self, ruta: str, refresco: float = 300.0, verificar_cada: float = 1.0):
+        self.ruta = os.path.abspath(ruta)
+        self.refresco = refresco
+        self.verificar_cada = verificar_cada
+        self._cerrojo = self.ruta + ".lock"
+        self._actual: Optional[Instantanea] = None
+        self._firma = None
+        self._ultima_verificacion = 0.0
+        self._lock = threading.Lock()
+        self.cambios_version = 0
+        self.reconstrucciones = 0
+        self.ultimo_error: Optional[str] = None
+
+    def _estado_archivo(self) -> Optional[os.stat_result]:
+        try:
+            return os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+
+    def instantanea(self) -> Optional[Instantanea]:
+        """
+        Versión vigente (None si todavía no existe el archivo). Si el
+        archivo cambió se mapea la versión nueva; quien ya tenía la
+        anterior la sigue usando hasta terminar.
+        """
+        ahora = time.monotonic()
+        if ahora - self._ultima_verificacion < self.verificar_cada:
+            return self._actual
+        with self._lock:
+            if ahora - self._ultima_verificacion < self.verificar_cada:
+                return self._actual
+            self._ultima_verificacion = ahora
+            estado = self._estado_archivo()
+            if estado is None:
+                return self._actual  # Se conserva la última versión leída
+            firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+            if firma != self._firma:
+                try:
+                    nueva = Instantanea(self.ruta)
+                except (OSError, ValueError, CatalogoInvalido) as e:
+                    self.ultimo_error = f"{type(e).__name__}: {e}"
+                    logger.warning("Instantánea de catálogos no válida: %s", self.ultimo_error)
+                    return self._actual
+                if self._actual is not None:
+                    self.cambios_version += 1
+                self._actual, self._firma = nueva, firma
+                logger.info("Catálogos: versión %d mapeada", nueva.version)
+            return self._actual
+
+    def vencida(self) -> bool:
+        """True si el archivo no existe o es más antiguo que el intervalo de refresco."""
+        estado = self._estado_archivo()
+        return estado is None or time.time() - estado.st_mtime >= self.refresco
+
+    def _tomar_cerrojo(self) -> Optional[int]:
+        """
+        Cerrojo exclusivo entre procesos sobre un archivo que no se borra.
+        Retorna el descriptor, o None si otro proceso lo tiene. El sistema
+        lo libera si el proceso termina, así que no quedan cerrojos vencidos.
+        """
+        os.makedirs(os.path.dirname(self._cerrojo), exist_ok=True)
+        descriptor = os.open(self._cerrojo, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(descriptor, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(descriptor)
+            return None
+        return descriptor
+
+    def _soltar_cerrojo(self, descriptor: int):
+        if fcntl is None:
+            msvcrt.locking(descriptor, msvcrt.LK_UNLCK, 1)
+        # Con flock, cerrar el descriptor libera el cerrojo
+        os.close(descriptor)
+
+    def _marca_en_disco(self) -> Optional[Dict[str, list]]:
+        # Forzar la lectura del archivo: otro proceso pudo reconstruirlo recién
+        self._ultima_verificacion = 0.0
+        actual = self.instantanea()
+        return actual.marca if actual is not None else None
+
+    def reconstruir(self, connection, forzar: bool = False) -> Optional[dict]:
+        """
+        Reconstruye el archivo si está vencido, si la marca de las tablas
+        en la base difiere de la guardada o si forzar. Retorna
+        {tabla: filas}, o None si no hacía falta u otro proceso tiene el
+        cerrojo.
+        """
+        cerrojo = self._tomar_cerrojo()
+        if cerrojo is None:
+            return None
+        try:
+            marca = leer_marca(connection)
+            if not forzar and not self.vencida() and marca == self._marca_en_disco():
+                return None
+            version = self._version_en_disco() + 1
+            inicio = time.perf_counter()
+            filas = construir(connection, self.ruta, version, marca)
+            self.reconstrucciones += 1
+            self.ultimo_error = None
+            logger.info("Catálogos: versión %d construida en %.0f ms", version,
+                        (time.perf_counter() - inicio) * 1000)
+            self._ultima_verificacion = 0.0
+            return filas
+        except oracledb.Error as e:
+            self.ultimo_error = str(e)
+            raise
+        finally:
+            self._soltar_cerrojo(cerrojo)
+
+    def _version_en_disco(self) -> int:
+        try:
+            with open(self.ruta, "rb") as archivo:
+                magico, formato, version, *_ = _CABECERA.unpack(archivo.read(_CABECERA.size))
+            return version if magico == MAGICO else 0
+        except (FileNotFoundError, struct.error):
+            return 0
+
+    def estado(self) -> dict:
+        actual = self._actual
+        return {
+            "archivo": self.ruta,
+            "disponible": actual is not None,
+            "version": actual.version if actual else None,
+            "construido": datetime.fromtimestamp(actual.construido).isoformat(timespec="seconds") if actual else None,
+            "tamanoBytes": actual.tamano if actual else None,
+            "tablas": {nombre: t.filas for nombre, t in actual.tablas.items()} if actual else {},
+            "refrescoSeg": self.refresco,
+            "cambiosVersion": self.cambios_version,
+            "reconstrucciones": self.reconstrucciones,
+            "ultimoError": self.ultimo_error,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instantánea compartida de catálogos")
+    parser.add_argument("--archivo", default=os.getenv("CATALOGO_ARCHIVO") or os.path.join("cache", "catalogo.bin"))
+    accion = parser.add_mutually_exclusive_group(required=True)
+    accion.add_argument("--construir", action="store_true", help="Leer los catálogos de Oracle y escribir una versión nueva")
+    accion.add_argument("--mostrar", action="store_true", help="Mostrar versión y filas del archivo actual")
+    args = parser.parse_args()
+
+    catalogo = CatalogoCompartido(args.archivo)
+    if args.construir:
+        connection = oracledb.connect(
+            user=os.getenv("DB_USER", "tu_usuario"),
+            password=os.getenv("DB_PASSWORD", "tu_contraseña"),
+            dsn=f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '1521')}/{os.getenv('DB_SERVICE', 'XE')}",
+        )
+        try:
+            filas = catalogo.reconstruir(connection, forzar=True)
+        finally:
+            connection.close()
+        if filas is None:
+            print("Otro proceso está reconstruyendo el catálogo")
+            return
+    if catalogo.instantanea() is None:
+        print(f"No existe {catalogo.ruta}")
+        return
+    print(json.dumps(catalogo.estado(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
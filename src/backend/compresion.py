@@ -0,0 +1,272 @@
+"""
+Compresión de Respuestas
+Middleware ASGI que negocia gzip, brotli o zstd según Accept-Encoding
+
+- Solo se comprimen tipos de texto (JSON, text/*, CSV, XML) de al menos
+  `minimo` bytes; las respuestas más pequeñas salen sin cambios.
+- Las respuestas en streaming se comprimen bloque por bloque y cada
+  bloque se vacía (flush) para que el cliente lo reciba sin esperar el
+  final.
+- Los bloques grandes se comprimen en el threadpool para no bloquear el
+  event loop (zlib, brotli y zstandard liberan el GIL al comprimir).
+- No se tocan respuestas parciales (Range), archivos del almacén,
+  eventos SSE ni respuestas que ya traen Content-Encoding.
+
+brotli y zstd se ofrecen solo si los paquetes Brotli y zstandard están
+instalados (se importan en la primera respuesta que los usa); gzip está
+siempre disponible.
+"""
+
+import importlib
+import importlib.util
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Algoritmo -> módulo que lo implementa
+MODULOS = {"gzip": "zlib", "br": "brotli", "zstd": "zstandard"}
+
+TIPOS_COMPRIMIBLES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+TIPOS_EXCLUIDOS = ("text/event-stream",)
+
+
+class _Compresor:
+    """Interfaz común de los compresores incrementales."""
+
+    def __init__(self, algoritmo: str, nivel: int):
+        self.algoritmo = algoritmo
+        self._modulo = importlib.import_module(MODULOS[algoritmo])
+        if algoritmo == "gzip":
+            self._objeto = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+        elif algoritmo == "br":
+            self._objeto = self._modulo.Compressor(quality=nivel)
+        else:
+            self._objeto = self._modulo.ZstdCompressor(level=nivel).compressobj()
+
+    def comprimir(self, datos: bytes, final: bool) -> bytes:
+        """Comprime `datos` y vacía el compresor (o lo termina si final)."""
+        if self.algoritmo == "gzip":
+            return self._objeto.compress(datos) + self._objeto.flush(
+                zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+            )
+        if self.algoritmo == "br":
+            salida = self._objeto.process(datos)
+            return salida + (self._objeto.finish() if final else self._objeto.flush())
+        salida = self._objeto.compress(datos)
+        return salida + self._objeto.flush(
+            self._modulo.COMPRESSOBJ_FLUSH_FINISH if final else self._modulo.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+
+def algoritmos_disponibles(preferencia: List[str]) -> List[str]:
+    """Algoritmos de la lista de preferencia cuyo paquete está instalado."""
+    return [a for a in preferencia if a in MODULOS and importlib.util.find_spec(MODULOS[a]) is not None]
+
+
+def negociar(accept_encoding: str, disponibles: List[str]) -> Optional[str]:
+    """
+    Elige el algoritmo con mayor q en Accept-Encoding; en empate gana el
+    primero de `disponibles`. Retorna None si ninguno es aceptado.
+    """
+    calidades: Dict[str, float] = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        calidades[nombre.strip().lower()] = q
+    comodin = calidades.get("*", 0.0)
+    mejor, mejor_q = None, 0.0
+    for algoritmo in disponibles:
+        q = calidades.get(algoritmo, comodin)
+        if q > mejor_q:
+            mejor, mejor_q = algoritmo, q
+    return mejor
+
+
+class MetricasCompresion:
+    """Bytes antes y después de comprimir y tiempo de CPU por algoritmo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_algoritmo: Dict[str, dict] = {}
+        self.omitidas_pequenas = 0
+        self.omitidas_tipo = 0
+
+    def _fila(self, algoritmo: str) -> dict:
+        return self._por_algoritmo.setdefault(algoritmo, {
+            "respuestas": 0, "bytesEntrada": 0, "bytesSalida": 0, "cpuSeg": 0.0, "bloquesEnHilo": 0,
+        })
+
+    def registrar(self, algoritmo: str, entrada: int, salida: int, cpu: float, en_hilo: bool):
+        with self._lock:
+            m = self._fila(algoritmo)
+            m["bytesEntrada"] += entrada
+            m["bytesSalida"] += salida
+            m["cpuSeg"] += cpu
+            m["bloquesEnHilo"] += en_hilo
+
+    def respuesta(self, algoritmo: str):
+        with self._lock:
+            self._fila(algoritmo)["respuestas"] += 1
+
+    def omitida(self, pequena: bool):
+        with self._lock:
+            if pequena:
+                self.omitidas_pequenas += 1
+            else:
+                self.omitidas_tipo += 1
+
+    def resumen(self) -> dict:
+        with self._lock:
+            algoritmos = {}
+            for algoritmo, m in self._por_algoritmo.items():
+                algoritmos[algoritmo] = {
+                    "respuestas": m["respuestas"],
+                    "bytesEntrada": m["bytesEntrada"],
+                    "bytesSalida": m["bytesSalida"],
+                    "bytesAhorrados": m["bytesEntrada"] - m["bytesSalida"],
+                    "razon": round(m["bytesSalida"] / m["bytesEntrada"], 3) if m["bytesEntrada"] else None,
+                    "cpuMs": round(m["cpuSeg"] * 1000, 1),
+                    "cpuMsPorMB": round(m["cpuSeg"] * 1000 / (m["bytesEntrada"] / 1e6), 2) if m["bytesEntrada"] else None,
+                    "bloquesEnHilo": m["bloquesEnHilo"],
+                }
+            return {
+                "algoritmos": algoritmos,
+                "omitidasPequenas": self.omitidas_pequenas,
+                "omitidasTipo": self.omitidas_tipo,
+            }
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas HTTP según Accept-Encoding.
+    niveles: {"gzip": 6, "br": 4, "zstd": 3}
+    """
+
+    def __init__(self, app: ASGIApp, minimo: int = 1024, niveles: Optional[Dict[str, int]] = None,
+                 preferencia: Optional[List[str]] = None, umbral_hilo: int = 64 * 1024,
+                 metricas: Optional[MetricasCompresion] = None):
+        self.app = app
+        self.minimo = minimo
+        self.niveles = {"gzip": 6, "br": 4, "zstd": 3, **(niveles or {})}
+        self.disponibles = algoritmos_disponibles(preferencia or ["zstd", "br", "gzip"])
+        self.umbral_hilo = umbral_hilo
+        self.metricas = metricas or MetricasCompresion()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        algoritmo = negociar(Headers(scope=scope).get("accept-encoding", ""), self.disponibles)
+        if algoritmo is None:
+            await self.app(scope, receive, send)
+            return
+        await _Respuesta(self, algoritmo, send).ejecutar(scope, receive)
+
+    def comprimible(self, estado: int, cabeceras: Headers) -> bool:
+        tipo = cabeceras.get("content-type", "").lower()
+        return (
+            estado == 200
+            and "content-encoding" not in cabeceras
+            and "content-range" not in cabeceras
+            and "accept-ranges" not in cabeceras
+            and tipo.startswith(TIPOS_COMPRIMIBLES)
+            and not tipo.startswith(TIPOS_EXCLUIDOS)
+        )
+
+
+class _Respuesta:
+    """Estado de compresión de una respuesta."""
+
+    def __init__(self, middleware: CompresionMiddleware, algoritmo: str, send: Send):
+        self.middleware = middleware
+        self.algoritmo = algoritmo
+        self.send = send
+        self.inicio: Optional[Message] = None
+        self.pendiente = b""
+        self.compresor: Optional[_Compresor] = None
+        # None: aún no se decide; False: pasar sin comprimir
+        self.comprimir: Optional[bool] = None
+
+    async def ejecutar(self, scope: Scope, receive: Receive):
+        await self.middleware.app(scope, receive, self.enviar)
+
+    async def enviar(self, mensaje: Message):
+        if mensaje["type"] == "http.response.start":
+            cabeceras = Headers(raw=mensaje["headers"])
+            if not self.middleware.comprimible(mensaje["status"], cabeceras):
+                self.comprimir = False
+                self.middleware.metricas.omitida(pequena=False)
+                await self.send(mensaje)
+                return
+            largo = cabeceras.get("content-length")
+            if largo is not None and int(largo) < self.middleware.minimo:
+                self.comprimir = False
+                self.middleware.metricas.omitida(pequena=True)
+                await self.send(mensaje)
+                return
+            self.inicio = mensaje
+            return
+
+        if self.comprimir is False or mensaje["type"] != "http.response.body":
+            await self.send(mensaje)
+            return
+
+        cuerpo = mensaje.get("body", b"")
+        mas = mensaje.get("more_body", False)
+        if self.comprimir is None:
+            # Se acumula hasta saber si la respuesta supera el mínimo
+            self.pendiente += cuerpo
+            if len(self.pendiente) < self.middleware.minimo and mas:
+                return
+            if len(self.pendiente) < self.middleware.minimo:
+                self.comprimir = False
+                self.middleware.metricas.omitida(pequena=True)
+                await self.send(self.inicio)
+                await self.send({"type": "http.response.body", "body": self.pendiente, "more_body": False})
+                return
+            self.comprimir = True
+            self.compresor = _Compresor(self.algoritmo, self.middleware.niveles[self.algoritmo])
+            self.middleware.metricas.respuesta(self.algoritmo)
+            cabeceras = MutableHeaders(raw=self.inicio["headers"])
+            del cabeceras["content-length"]
+            cabeceras["content-encoding"] = self.algoritmo
+            cabeceras.add_vary_header("Accept-Encoding")
+            await self.send(self.inicio)
+            cuerpo, self.pendiente = self.pendiente, b""
+
+        await self.send({
+            "type": "http.response.body",
+            "body": await self._comprimir(cuerpo, final=not mas),
+            "more_body": mas,
+        })
+
+    async def _comprimir(self, datos: bytes, final: bool) -> bytes:
+        en_hilo = len(datos) >= self.middleware.umbral_hilo
+
+        def trabajo():
+            inicio = time.thread_time()
+            salida = self.compresor.comprimir(datos, final)
+            return salida, time.thread_time() - inicio
+
+        if en_hilo:
+            salida, cpu = await run_in_threadpool(trabajo)
+        else:
+            salida, cpu = trabajo()
+        self.middleware.metricas.registrar(self.algoritmo, len(datos), len(salida), cpu, en_hilo)
+        return salida
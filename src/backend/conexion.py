@@ -0,0 +1,256 @@
+"""
+Capa de Conexiones a Oracle
+Pools de sesiones y enrutamiento lectura/escritura
+
+Las solicitudes de solo lectura (GET) se atienden con el pool de lectura,
+apuntado a una réplica o standby, y las mutaciones con el pool primario.
+Si la réplica no responde o su retraso supera la tolerancia configurada,
+las lecturas vuelven automáticamente a la primaria.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple, Type
+
+import oracledb
+
+logger = logging.getLogger(__name__)
+
+# Consulta por defecto para medir el retraso de aplicación de un standby
+# (Active Data Guard). Retorna segundos; sin filas se asume retraso cero,
+# que es lo que ocurre con una segunda instancia local sin Data Guard.
+CONSULTA_RETRASO_DATAGUARD = """
+    SELECT EXTRACT(DAY FROM lag) * 86400 + EXTRACT(HOUR FROM lag) * 3600
+           + EXTRACT(MINUTE FROM lag) * 60 + EXTRACT(SECOND FROM lag)
+    FROM (
+        SELECT TO_DSINTERVAL(value) AS lag
+        FROM v$dataguard_stats
+        WHERE name = 'apply lag'
+    )
+"""
+
+# Códigos de error del driver para llamadas que exceden call_timeout
+# (modo thin, modo thick y servidor) y para llamadas canceladas.
+ERRORES_TIMEOUT = {"DPY-4024", "DPI-1067", "ORA-03156"}
+ERRORES_CANCELACION = {"ORA-01013"}
+
+
+def codigo_error(error: oracledb.Error) -> Optional[str]:
+    """Código completo (ej: 'ORA-01013') de un error de oracledb."""
+    detalle = error.args[0] if error.args else None
+    return getattr(detalle, "full_code", None)
+
+
+def es_timeout(error: oracledb.Error) -> bool:
+    """Indica si el error se debe a un timeout o a una cancelación."""
+    return codigo_error(error) in ERRORES_TIMEOUT | ERRORES_CANCELACION
+
+
+@dataclass
+class ConfigPool:
+    """Parámetros de conexión y tamaño de un pool de sesiones."""
+    user: str
+    password: str
+    host: str
+    port: int
+    service: str
+    min: int = 1
+    max: int = 10
+    increment: int = 1
+
+    @property
+    def dsn(self) -> str:
+        return f"{self.host}:{self.port}/{self.service}"
+
+
+class EnrutadorConexiones:
+    """
+    Mantiene el pool primario y, opcionalmente, un pool de réplica.
+    Los pools se crean de forma perezosa en el primer uso, de modo que
+    cada proceso (worker) construye los suyos.
+    """
+
+    def __init__(
+        self,
+        primaria: ConfigPool,
+        replica: Optional[ConfigPool] = None,
+        tolerancia_retraso: float = 30.0,
+        intervalo_verificacion: float = 10.0,
+        espera_reintento: float = 30.0,
+        consulta_retraso: Optional[str] = CONSULTA_RETRASO_DATAGUARD,
+        tipo_conexion: Type[oracledb.Connection] = oracledb.Connection,
+    ):
+        self.primaria = primaria
+        self.replica = replica
+        self.tolerancia_retraso = tolerancia_retraso
+        self.intervalo_verificacion = intervalo_verificacion
+        self.espera_reintento = espera_reintento
+        self.consulta_retraso = consulta_retraso
+        self.tipo_conexion = tipo_conexion
+
+        self._lock = threading.Lock()
+        self._lock_verificacion = threading.Lock()
+        self._pool_primario: Optional[oracledb.ConnectionPool] = None
+        self._pool_replica: Optional[oracledb.ConnectionPool] = None
+
+        # Estado de salud de la réplica
+        self._replica_suspendida_hasta = 0.0
+        self._ultima_verificacion = 0.0
+        self._retraso_replica: Optional[float] = None
+        self._lecturas_replica = 0
+        self._lecturas_desviadas = 0
+
+    # ------------------------------------------------------------------
+    # Creación de pools
+    # ------------------------------------------------------------------
+    def _crear_pool(self, config: ConfigPool) -> oracledb.ConnectionPool:
+        return oracledb.create_pool(
+            user=config.user,
+            password=config.password,
+            dsn=config.dsn,
+            min=config.min,
+            max=config.max,
+            increment=config.increment,
+            connectiontype=self.tipo_conexion,
+        )
+
+    def pool_primario(self) -> oracledb.ConnectionPool:
+        if self._pool_primario is None:
+            with self._lock:
+                if self._pool_primario is None:
+                    self._pool_primario = self._crear_pool(self.primaria)
+        return self._pool_primario
+
+    def pool_replica(self) -> oracledb.ConnectionPool:
+        if self._pool_replica is None:
+            with self._lock:
+                if self._pool_replica is None:
+                    self._pool_replica = self._crear_pool(self.replica)
+        return self._pool_replica
+
+    def cerrar(self):
+        """Cierra los pools abiertos (apagado de la aplicación)."""
+        with self._lock:
+            for pool in (self._pool_primario, self._pool_replica):
+                if pool is not None:
+                    try:
+                        pool.close(force=True)
+                    except oracledb.Error as e:
+                        logger.warning("Error al cerrar pool: %s", e)
+            self._pool_primario = None
+            self._pool_replica = None
+
+    # ------------------------------------------------------------------
+    # Enrutamiento
+    # ------------------------------------------------------------------
+    def _replica_elegible(self) -> bool:
+        if self.replica is None:
+            return False
+        if time.monotonic() < self._replica_suspendida_hasta:
+            return False
+        # Con retraso excesivo se espera al siguiente intervalo para volver a medir
+        if (self._retraso_replica is not None
+                and self._retraso_replica > self.tolerancia_retraso
+                and time.monotonic() - self._ultima_verificacion < self.intervalo_verificacion):
+            return False
+        return True
+
+    def _suspender_replica(self, motivo: str):
+        self._replica_suspendida_hasta = time.monotonic() + self.espera_reintento
+        logger.warning(
+            "Réplica suspendida %.0fs (%s); lecturas van a la primaria",
+            self.espera_reintento, motivo,
+        )
+
+    def _verificar_retraso(self, connection) -> bool:
+        """
+        Mide el retraso de la réplica como mucho una vez por intervalo.
+        Retorna False si la réplica no debe usarse para esta lectura.
+        """
+        if not self.consulta_retraso:
+            return True
+        ahora = time.monotonic()
+        if ahora - self._ultima_verificacion < self.intervalo_verificacion:
+            return self._retraso_replica is None or self._retraso_replica <= self.tolerancia_retraso
+        # Solo un hilo verifica; los demás usan el último valor conocido
+        if not self._lock_verificacion.acquire(blocking=False):
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.consulta_retraso)
+            fila = cursor.fetchone()
+            cursor.close()
+            self._retraso_replica = float(fila[0]) if fila and fila[0] is not None else 0.0
+        except oracledb.Error as e:
+            logger.warning("No se pudo medir el retraso de la réplica: %s", e)
+            self._retraso_replica = None
+            self._suspender_replica("retraso desconocido")
+            return False
+        finally:
+            self._ultima_verificacion = ahora
+            self._lock_verificacion.release()
+
+        if self._retraso_replica > self.tolerancia_retraso:
+            logger.warning(
+                "Retraso de réplica %.1fs supera la tolerancia de %.1fs",
+                self._retraso_replica, self.tolerancia_retraso,
+            )
+            return False
+        return True
+
+    def adquirir(self, solo_lectura: bool) -> Tuple[oracledb.Connection, oracledb.ConnectionPool]:
+        """
+        Obtiene una conexión del pool adecuado.
+        Retorna la conexión junto con el pool al que debe devolverse.
+        """
+        if solo_lectura and self._replica_elegible():
+            pool = None
+            connection = None
+            try:
+                pool = self.pool_replica()
+                connection = pool.acquire()
+                if self._verificar_retraso(connection):
+                    self._lecturas_replica += 1
+                    return connection, pool
+                pool.release(connection)
+            except oracledb.Error as e:
+                if connection is not None:
+                    try:
+                        pool.drop(connection)
+                    except oracledb.Error:
+                        pass
+                self._suspender_replica(str(e))
+            self._lecturas_desviadas += 1
+
+        pool = self.pool_primario()
+        return pool.acquire(), pool
+
+    def liberar(self, connection, pool, descartar: bool = False):
+        """Devuelve la conexión a su pool (o la descarta si quedó inválida)."""
+        try:
+            if descartar:
+                pool.drop(connection)
+            else:
+                pool.release(connection)
+        except oracledb.Error as e:
+            logger.warning("Error al liberar conexión: %s", e)
+
+    def estado(self) -> dict:
+        """Resumen del estado de los pools para monitoreo."""
+        def resumen(pool):
+            if pool is None:
+                return None
+            return {"abiertas": pool.opened, "ocupadas": pool.busy, "max": pool.max}
+
+        return {
+            "primaria": resumen(self._pool_primario),
+            "replica": resumen(self._pool_replica),
+            "replicaConfigurada": self.replica is not None,
+            "replicaDisponible": self._replica_elegible(),
+            "retrasoReplica": self._retraso_replica,
+            "toleranciaRetraso": self.tolerancia_retraso,
+            "lecturasReplica": self._lecturas_replica,
+            "lecturasDesviadasPrimaria": self._lecturas_desviadas,
+        }
@@ -0,0 +1,320 @@
+"""
+Registro de Consultas Lentas
+Instrumentación de cursores, captura de binds y agregación por sentencia
+
+Los pools crean conexiones de tipo ConexionInstrumentada, cuyos cursores
+miden cada sentencia (ejecución + fetch), cuentan las filas obtenidas y
+anotan el endpoint que la originó. Todas las ejecuciones se agregan por
+texto SQL normalizado apenas termina cada execute() o fetch (un cursor que
+se abandona sin cerrar no pierde su medición); las que superan el umbral,
+y una muestra de las rápidas, se escriben además en un log rotativo con
+sus binds. Solo se escriben los valores de los binds declarados visibles.
+
+Si la solicitud se está trazando, cada execute() abre un span db.execute
+y los fetch de esa sentencia se acumulan en un span db.fetch con las filas.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import oracledb
+
+import trazas
+
+# Patrones para normalizar el texto SQL
+_RE_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"(?<![:\w])\d+(?:\.\d+)?\b")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+LARGO_MAXIMO_BIND = 100
+
+
+@lru_cache(maxsize=2048)
+def normalizar_sql(sql: str) -> str:
+    """
+    Texto SQL canónico para agrupar: sin comentarios, literales
+    reemplazados por '?' y espacios colapsados.
+    """
+    sql = _RE_COMENTARIOS.sub(" ", sql)
+    sql = _RE_CADENAS.sub("?", sql)
+    sql = _RE_NUMEROS.sub("?", sql)
+    return _RE_ESPACIOS.sub(" ", sql).strip()
+
+
+class RegistroConsultas:
+    """
+    Agrega estadísticas por sentencia normalizada y registra en archivo
+    las ejecuciones lentas (>= umbral) y una fracción de las rápidas.
+    """
+
+    def __init__(
+        self,
+        umbral_ms: float = 500.0,
+        muestreo: float = 0.01,
+        visibles: str = "",
+        archivo: Optional[str] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        respaldos: int = 5,
+        max_sentencias: int = 500,
+    ):
+        self.umbral_ms = umbral_ms
+        self.muestreo = muestreo
+        # Binds cuyo valor se escribe en el log ("*" = todos); el resto se oculta
+        self.visibles = {n.strip().lower() for n in visibles.split(",") if n.strip()}
+        self.max_sentencias = max_sentencias
+
+        self._lock = threading.Lock()
+        self._estadisticas = {}
+        self._log = None
+        if archivo:
+            os.makedirs(os.path.dirname(os.path.abspath(archivo)), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                archivo, maxBytes=max_bytes, backupCount=respaldos, delay=True, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log = logging.getLogger("consultas_lentas")
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            for anterior in list(self._log.handlers):
+                self._log.removeHandler(anterior)
+                anterior.close()
+            self._log.addHandler(handler)
+
+    # ------------------------------------------------------------------
+    # Captura
+    # ------------------------------------------------------------------
+    def _redactar_valor(self, nombre, valor):
+        if "*" not in self.visibles and str(nombre).lower() not in self.visibles:
+            return "***"
+        if isinstance(valor, str) and len(valor) > LARGO_MAXIMO_BIND:
+            return valor[:LARGO_MAXIMO_BIND] + "..."
+        if isinstance(valor, (str, int, float, bool)) or valor is None:
+            return valor
+        return str(valor)
+
+    def redactar_binds(self, parametros):
+        if parametros is None:
+            return None
+        if isinstance(parametros, dict):
+            return {k: self._redactar_valor(k, v) for k, v in parametros.items()}
+        if isinstance(parametros, (list, tuple)):
+            return [self._redactar_valor(i + 1, v) for i, v in enumerate(parametros)]
+        return str(parametros)
+
+    def registrar(self, sql: str, parametros, ms: float, filas: int,
+                  endpoint: Optional[str], error: Optional[str] = None,
+                  previo: Optional[Tuple[float, int]] = None):
+        """
+        Agrega una ejecución y la escribe en el log si es lenta o muestreada.
+        `ms` y `filas` son los totales de la ejecución hasta ahora; `previo`
+        es lo ya registrado de la misma ejecución (los fetch posteriores a
+        execute() solo suman la diferencia y no cuentan otra ejecución).
+        Se escribe en el log cuando la ejecución cruza el umbral.
+        """
+        clave = normalizar_sql(sql)
+        nueva = previo is None
+        ms_previo, filas_previas = previo or (0.0, 0)
+        lenta = ms >= self.umbral_ms and (nueva or ms_previo < self.umbral_ms)
+        with self._lock:
+            est = self._estadisticas.get(clave)
+            if est is None:
+                if len(self._estadisticas) >= self.max_sentencias:
+                    # Descartar la sentencia menos costosa para acotar memoria
+                    menor = min(self._estadisticas, key=lambda k: self._estadisticas[k]["totalMs"])
+                    del self._estadisticas[menor]
+                est = self._estadisticas[clave] = {
+                    "ejecuciones": 0, "lentas": 0, "errores": 0,
+                    "totalMs": 0.0, "maxMs": 0.0, "filas": 0, "endpoints": {},
+                }
+            if nueva:
+                est["ejecuciones"] += 1
+                if endpoint:
+                    est["endpoints"][endpoint] = est["endpoints"].get(endpoint, 0) + 1
+            est["totalMs"] += ms - ms_previo
+            est["maxMs"] = max(est["maxMs"], ms)
+            est["filas"] += filas - filas_previas
+            if lenta:
+                est["lentas"] += 1
+            if error:
+                est["errores"] += 1
+
+        muestreada = nueva and random.random() < self.muestreo
+        if self._log is not None and (lenta or error or muestreada):
+            self._log.info(json.dumps({
+                "fecha": datetime.now().isoformat(timespec="milliseconds"),
+                "lenta": lenta,
+                "ms": round(ms, 2),
+                "filas": filas,
+                "endpoint": endpoint,
+                "sql": clave,
+                "binds": self.redactar_binds(parametros),
+                "error": error,
+            }, ensure_ascii=False, default=str))
+
+    # ------------------------------------------------------------------
+    # Reportes
+    # ------------------------------------------------------------------
+    def top(self, n: int = 10, orden: str = "totalMs") -> list:
+        """Las n sentencias con mayor valor del criterio indicado."""
+        with self._lock:
+            filas = [
+                {
+                    "sql": sql,
+                    **{k: v for k, v in est.items() if k != "endpoints"},
+                    "promedioMs": est["totalMs"] / est["ejecuciones"],
+                    "endpoints": dict(est["endpoints"]),
+                }
+                for sql, est in self._estadisticas.items()
+            ]
+        filas.sort(key=lambda f: f.get(orden, 0), reverse=True)
+        for f in filas:
+            f["totalMs"] = round(f["totalMs"], 2)
+            f["maxMs"] = round(f["maxMs"], 2)
+            f["promedioMs"] = round(f["promedioMs"], 2)
+        return filas[:n]
+
+    def reiniciar(self):
+        with self._lock:
+            self._estadisticas.clear()
+
+
+# Registro global que usan los cursores
+registro = RegistroConsultas()
+
+
+def configurar(**opciones) -> RegistroConsultas:
+    """Reemplaza el registro global con las opciones indicadas."""
+    global registro
+    registro = RegistroConsultas(**opciones)
+    return registro
+
+
+class CursorInstrumentado(oracledb.Cursor):
+    """
+    Cursor que mide cada sentencia (execute() más sus fetch) y la registra
+    al terminar cada una de esas llamadas.
+    """
+
+    _sql = None
+    _parametros = None
+    _ms = 0.0
+    _filas = 0
+    _registrado = None
+    _span_fetch = None
+
+    def _registrar(self):
+        if self._sql is not None:
+            registro.registrar(
+                self._sql, self._parametros, self._ms, self._filas,
+                getattr(self.connection, "endpoint", None), previo=self._registrado,
+            )
+            self._registrado = (self._ms, self._filas)
+
+    def _medir(self, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            self._ms += (time.perf_counter() - inicio) * 1000
+
+    def _iniciar(self, statement, parametros):
+        self._sql = statement
+        self._parametros = parametros
+        self._ms = 0.0
+        self._filas = 0
+        self._registrado = None
+        self._span_fetch = None
+
+    def _trazar(self, nombre, statement):
+        if trazas.span_actual() is None:
+            return trazas.span(nombre)
+        return trazas.span(nombre, **{"db.statement": normalizar_sql(statement)[:500]})
+
+    def _iniciar_fetch(self):
+        if self._span_fetch is None and self._sql is not None:
+            self._span_fetch = trazas.iniciar("db.fetch", llamadas=0)
+
+    def _terminar_fetch(self):
+        self._registrar()
+        if self._span_fetch is not None:
+            self._span_fetch.atributos["llamadas"] += 1
+            self._span_fetch.atributos["db.filas"] = self._filas
+            self._span_fetch.terminar()
+
+    def execute(self, statement, parameters=None, **keyword_parameters):
+        self._iniciar(statement, parameters if parameters is not None else keyword_parameters or None)
+        try:
+            with self._trazar("db.execute", statement) as s:
+                resultado = self._medir(super().execute, statement, parameters, **keyword_parameters)
+                if s is not None and self.description is None:
+                    s.atributos["db.filasAfectadas"] = self.rowcount
+        except oracledb.Error as e:
+            registro.registrar(statement, self._parametros, self._ms, 0,
+                               getattr(self.connection, "endpoint", None), error=str(e))
+            self._sql = None
+            raise
+        self._registrar()
+        return resultado
+
+    def executemany(self, statement, parameters, *args, **kwargs):
+        self._iniciar(statement, None)
+        try:
+            with self._trazar("db.executemany", statement) as s:
+                resultado = self._medir(super().executemany, statement, parameters, *args, **kwargs)
+                if s is not None and self.description is None:
+                    s.atributos["db.filasAfectadas"] = self.rowcount
+        except oracledb.Error as e:
+            registro.registrar(statement, None, self._ms, 0,
+                               getattr(self.connection, "endpoint", None), error=str(e))
+            self._sql = None
+            raise
+        self._registrar()
+        return resultado
+
+    def fetchone(self):
+        self._iniciar_fetch()
+        fila = self._medir(super().fetchone)
+        if fila is not None:
+            self._filas += 1
+        self._terminar_fetch()
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        self._iniciar_fetch()
+        filas = self._medir(super().fetchmany, *args, **kwargs)
+        self._filas += len(filas)
+        self._terminar_fetch()
+        return filas
+
+    def fetchall(self):
+        self._iniciar_fetch()
+        filas = self._medir(super().fetchall)
+        self._filas += len(filas)
+        self._terminar_fetch()
+        return filas
+
+    def close(self):
+        self._sql = None
+        super().close()
+
+
+class ConexionInstrumentada(oracledb.Connection):
+    """
+    Conexión cuyos cursores registran sus sentencias.
+    `endpoint` lo asigna get_db_connection en cada solicitud.
+    """
+
+    endpoint = None
+
+    def cursor(self, scrollable: bool = False) -> CursorInstrumentado:
+        return CursorInstrumentado(self, scrollable)
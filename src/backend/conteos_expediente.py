@@ -0,0 +1,158 @@
+"""
+Contadores de Expediente
+Conteos desnormalizados de sucesos, resultados y documentos
+
+EXPEDIENTE guarda en NSUCESOS, NRESULTADOS y NDOCUMENTOS la cantidad de
+filas hijas de cada expediente. Los endpoints de creación los incrementan
+en la misma transacción del INSERT, de modo que las vistas de lista los
+leen sin agregar. Este módulo también sirve como tarea de verificación y
+reconstrucción para corregir diferencias (cargas masivas, borrados o
+escrituras fuera de la API).
+
+Uso (desde src/backend):
+    python conteos_expediente.py                 # Verificar (exit 1 si hay diferencias)
+    python conteos_expediente.py --reconstruir   # Recalcular los contadores con diferencias
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Optional, Tuple
+
+import oracledb
+
+# Tabla hija -> columna contador en EXPEDIENTE
+CONTADORES = {
+    "Suceso": "nSucesos",
+    "Resultado": "nResultados",
+    "Documento": "nDocumentos",
+}
+
+CONTEOS_REALES = """
+    SELECT e.codEspecializacion, e.pasoEtapa, e.noCaso, e.consecExpe,
+           e.nSucesos, NVL(s.n, 0) AS sucesos,
+           e.nResultados, NVL(r.n, 0) AS resultados,
+           e.nDocumentos, NVL(d.n, 0) AS documentos
+    FROM Expediente e
+    LEFT JOIN (
+        SELECT codEspecializacion, pasoEtapa, noCaso, consecExpe, COUNT(*) AS n
+        FROM Suceso GROUP BY codEspecializacion, pasoEtapa, noCaso, consecExpe
+    ) s ON s.codEspecializacion = e.codEspecializacion AND s.pasoEtapa = e.pasoEtapa
+       AND s.noCaso = e.noCaso AND s.consecExpe = e.consecExpe
+    LEFT JOIN (
+        SELECT codEspecializacion, pasoEtapa, noCaso, consecExpe, COUNT(*) AS n
+        FROM Resultado GROUP BY codEspecializacion, pasoEtapa, noCaso, consecExpe
+    ) r ON r.codEspecializacion = e.codEspecializacion AND r.pasoEtapa = e.pasoEtapa
+       AND r.noCaso = e.noCaso AND r.consecExpe = e.consecExpe
+    LEFT JOIN (
+        SELECT codEspecializacion, pasoEtapa, noCaso, consecExpe, COUNT(*) AS n
+        FROM Documento GROUP BY codEspecializacion, pasoEtapa, noCaso, consecExpe
+    ) d ON d.codEspecializacion = e.codEspecializacion AND d.pasoEtapa = e.pasoEtapa
+       AND d.noCaso = e.noCaso AND d.consecExpe = e.consecExpe
+    WHERE e.nSucesos <> NVL(s.n, 0)
+    OR e.nResultados <> NVL(r.n, 0)
+    OR e.nDocumentos <> NVL(d.n, 0)
+"""
+
+
+def incrementar(cursor, tabla: str, clave: dict) -> Tuple[bool, Optional[str]]:
+    """
+    Suma 1 al contador de `tabla` en el expediente indicado por `clave`
+    (codEsp, pasoEtapa, noCaso, consecExpe). Debe llamarse antes del
+    INSERT de la fila hija: el UPDATE bloquea el expediente y serializa
+    el cálculo del siguiente consecutivo. Retorna (existe, cédula del
+    abogado asignado); existe=False si el expediente no existe.
+    """
+    columna = CONTADORES[tabla]
+    cedula = cursor.var(str)
+    cursor.execute(f"""
+        UPDATE Expediente
+        SET {columna} = {columna} + 1
+        WHERE codEspecializacion = :codEsp
+        AND pasoEtapa = :pasoEtapa
+        AND noCaso = :noCaso
+        AND consecExpe = :consecExpe
+        RETURNING cedula INTO :cedula
+    """, {**clave, "cedula": cedula})
+    if cursor.rowcount != 1:
+        return False, None
+    return True, cedula.getvalue()[0]
+
+
+def diferencias(connection) -> List[dict]:
+    """Expedientes cuyos contadores no coinciden con las filas hijas."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(CONTEOS_REALES)
+        return [
+            {
+                "clave": fila[0:4],
+                "nSucesos": (fila[4], fila[5]),
+                "nResultados": (fila[6], fila[7]),
+                "nDocumentos": (fila[8], fila[9]),
+            }
+            for fila in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+
+
+def reconstruir(connection) -> int:
+    """Recalcula los contadores con diferencias. Retorna las filas corregidas."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            MERGE INTO Expediente e
+            USING ({CONTEOS_REALES}) c
+            ON (e.codEspecializacion = c.codEspecializacion AND e.pasoEtapa = c.pasoEtapa
+                AND e.noCaso = c.noCaso AND e.consecExpe = c.consecExpe)
+            WHEN MATCHED THEN UPDATE SET
+                e.nSucesos = c.sucesos,
+                e.nResultados = c.resultados,
+                e.nDocumentos = c.documentos
+        """)
+        corregidas = cursor.rowcount
+        connection.commit()
+        return corregidas
+    except oracledb.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificación de contadores de expediente")
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="Corregir los contadores con diferencias")
+    args = parser.parse_args()
+
+    connection = oracledb.connect(
+        user=os.getenv("DB_USER", "tu_usuario"),
+        password=os.getenv("DB_PASSWORD", "tu_contraseña"),
+        dsn=f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '1521')}/{os.getenv('DB_SERVICE', 'XE')}",
+    )
+    try:
+        if args.reconstruir:
+            print(f"Contadores corregidos: {reconstruir(connection)} expedientes")
+            return
+        encontradas = diferencias(connection)
+    finally:
+        connection.close()
+
+    for d in encontradas:
+        detalle = ", ".join(
+            f"{columna} {guardado} != {real}"
+            for columna, (guardado, real) in d.items()
+            if columna != "clave" and guardado != real
+        )
+        print(f"  - Expediente {d['clave']}: {detalle}")
+    if encontradas:
+        print(f"\n{len(encontradas)} expedientes con contadores desactualizados "
+              "(usar --reconstruir)")
+        sys.exit(1)
+    print("Contadores de expediente consistentes.")
+
+
+if __name__ == "__main__":
+    main()
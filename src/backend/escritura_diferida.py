@@ -0,0 +1,597 @@
+"""
+Escritura Diferida
+Cola durable de sucesos y documentos que se aplica a Oracle en segundo plano
+
+Las cargas masivas no necesitan esperar el COMMIT de cada fila: con
+`Prefer: respond-async` la solicitud se agrega a un diario local y se
+responde 202 en cuanto la línea está en disco. Un drenador la aplica
+después a Oracle en lotes.
+
+- Diario: archivo de líneas JSON (solo se agrega al final) compartido por
+  todos los workers del host. Se escribe con O_APPEND bajo un cerrojo de
+  archivo, así que las entradas quedan en el orden en que se aceptaron; el
+  drenador las aplica en ese orden, lo que conserva el orden de cada
+  expediente.
+- Confirmación en grupo: las solicitudes que llegan mientras se hace un
+  fsync esperan el siguiente, que las cubre a todas (un fsync por grupo y
+  no por solicitud). En Oracle, cada lote de hasta `lote` entradas es una
+  sola transacción.
+- Recuperación: la posición aplicada del diario se guarda en la tabla
+  COLA_DIFERIDA en la misma transacción que el lote; al reiniciar se sigue
+  desde ahí, sin repetir ni perder entradas. Una línea a medio escribir
+  (caída durante la escritura, nunca confirmada al cliente) se descarta.
+- Un solo drenador por host: el worker que tiene el cerrojo del drenador;
+  si termina, otro lo toma.
+- Contrapresión: si lo pendiente supera `max_bytes`, agregar() lanza
+  ColaLlena (la API responde 503 con Retry-After).
+- Una entrada que Oracle rechaza por sus datos (expediente inexistente,
+  restricción, valor demasiado largo) se anota en rechazados.jsonl y el
+  lote sigue; los errores de conexión y los timeouts reintentan el lote.
+  Si el lote falla `max_intentos` veces en la misma entrada (timeout o
+  error inesperado del aplicador, no una caída de la conexión), esa
+  entrada se anota como rechazada y la posición avanza.
+- Cuando todo el diario está aplicado y pasa de VACIAR_DESDE bytes, se
+  vacía y empieza con un id nuevo.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import oracledb
+from starlette.concurrency import run_in_threadpool
+
+from conexion import es_timeout
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Primera línea del diario: "DIARIO <id>\n" (id hexadecimal de 32 caracteres)
+CABECERA = b"DIARIO %s\n"
+LARGO_CABECERA = len(CABECERA % (b"0" * 32))
+VACIAR_DESDE = 1024 * 1024
+# Ids de diarios ya vaciados que se recuerdan para consultar tickets
+DIARIOS_ANTERIORES = 20
+
+
+class ColaLlena(Exception):
+    """La cola supera el máximo de bytes pendientes."""
+
+    def __init__(self, pendientes: int, reintentar_en: int):
+        super().__init__(f"{pendientes} bytes pendientes")
+        self.pendientes = pendientes
+        self.reintentar_en = reintentar_en
+
+
+class EntradaRechazada(Exception):
+    """La entrada no se puede aplicar por sus datos (no se reintenta)."""
+
+
+def _bloquear(fd: int, esperar: bool = True) -> bool:
+    """Cerrojo exclusivo de archivo entre procesos."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK if esperar else msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        if esperar:
+            raise
+        return False
+
+
+def _desbloquear(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _leer(fd: int, largo: int, posicion: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, largo, posicion)
+    os.lseek(fd, posicion, os.SEEK_SET)
+    return os.read(fd, largo)
+
+
+class ColaDiferida:
+    """
+    Diario local + drenador hacia Oracle.
+    aplicadores: tipo -> función(cursor, datos) que inserta la entrada sin
+    confirmar y retorna una acción opcional para después del COMMIT (p. ej.
+    publicar el evento). Lanza EntradaRechazada si los datos no son válidos.
+    """
+
+    def __init__(self, directorio: str, enrutador, aplicadores: Dict[str, Callable],
+                 lote: int = 500, max_bytes: int = 64 * 1024 * 1024, espera_grupo: float = 0.002,
+                 intervalo: float = 1.0, timeout_ms: int = 60000, reintentar_en: int = 5,
+                 max_intentos: int = 5):
+        self.directorio = directorio
+        self.ruta = os.path.join(directorio, "diferida.log")
+        self._ruta_posicion = os.path.join(directorio, "diferida.pos")
+        self._ruta_rechazados = os.path.join(directorio, "rechazados.jsonl")
+        self.clave = f"{socket.gethostname()}:{os.path.abspath(self.ruta)}"[-200:]
+        self.enrutador = enrutador
+        self.aplicadores = aplicadores
+        self.lote = lote
+        self.max_bytes = max_bytes
+        self.espera_grupo = espera_grupo
+        self.intervalo = intervalo
+        self.timeout_ms = timeout_ms
+        self.reintentar_en = reintentar_en
+        self.max_intentos = max_intentos
+
+        self._fd: Optional[int] = None
+        self._fd_cerrojo: Optional[int] = None
+        self._fd_drenador: Optional[int] = None
+        self._lock_apertura = threading.Lock()
+        # Escritura del diario entre hilos de este proceso (el cerrojo de
+        # archivo es entre procesos)
+        self._lock = threading.Lock()
+        # Confirmación en grupo
+        self._cond = threading.Condition()
+        self._escritas = 0
+        self._sincronizadas = 0
+        self._sincronizando = False
+        self._pendientes = (0.0, 0)  # (instante de lectura, bytes)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._aviso: Optional[asyncio.Event] = None
+        # Drenador: diario y posición aplicada según Oracle
+        self.es_drenador = False
+        self._diario: Optional[str] = None
+        self._posicion: Optional[int] = None
+        self._anteriores: List[str] = []
+        # Entrada que se estaba aplicando cuando falló el lote, intentos
+        # fallidos por ticket y entradas que agotaron sus intentos
+        self._entrada_en_curso: Optional[str] = None
+        self._intentos: Dict[str, int] = {}
+        self._agotadas: Dict[str, str] = {}
+
+        self.aceptadas = 0
+        self.rechazadas_cola_llena = 0
+        self.sincronizaciones = 0
+        self.lotes = 0
+        self.aplicadas = 0
+        self.rechazadas = 0
+        self.reintentos = 0
+        self.agotadas = 0
+        self.vaciados = 0
+        self.ultimo_lote: Optional[dict] = None
+        self.ultimo_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Diario
+    # ------------------------------------------------------------------
+
+    def _abrir(self) -> int:
+        if self._fd is None:
+            with self._lock_apertura:
+                if self._fd is None:
+                    os.makedirs(self.directorio, exist_ok=True)
+                    self._fd_cerrojo = os.open(self.ruta + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+                    self._fd = os.open(
+                        self.ruta, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644
+                    )
+        return self._fd
+
+    def _preparar(self) -> Tuple[str, int]:
+        """
+        Con el cerrojo tomado: escribe la cabecera si el diario está vacío y
+        descarta una línea incompleta al final. Retorna (id, tamaño).
+        """
+        tamano = os.fstat(self._fd).st_size
+        if tamano < LARGO_CABECERA:
+            return self._nuevo_diario()
+        cabecera = _leer(self._fd, LARGO_CABECERA, 0)
+        if not cabecera.startswith(b"DIARIO ") or not cabecera.endswith(b"\n"):
+            raise ValueError(f"{self.ruta} no es un diario de escritura diferida")
+        fin = tamano
+        if _leer(self._fd, 1, tamano - 1) != b"\n":
+            while fin > LARGO_CABECERA:
+                desde = max(LARGO_CABECERA, fin - 65536)
+                salto = _leer(self._fd, fin - desde, desde).rfind(b"\n")
+                if salto >= 0:
+                    fin = desde + salto + 1
+                    break
+                fin = desde
+        if fin != tamano:
+            logger.warning("Diario %s: se descartan %d bytes de una línea incompleta", self.ruta, tamano - fin)
+            os.ftruncate(self._fd, fin)
+        return cabecera[7:-1].decode("ascii"), fin
+
+    def _nuevo_diario(self) -> Tuple[str, int]:
+        """Vacía el diario y escribe la cabecera con un id nuevo (con el cerrojo tomado)."""
+        diario = uuid.uuid4().hex
+        os.ftruncate(self._fd, 0)
+        os.write(self._fd, CABECERA % diario.encode("ascii"))
+        os.fsync(self._fd)
+        return diario, LARGO_CABECERA
+
+    def agregar(self, tipo: str, datos: dict) -> str:
+        """
+        Agrega una entrada y espera a que esté en disco. Retorna el ticket
+        (id del diario y posición donde termina la entrada).
+        Lanza ColaLlena si hay demasiado pendiente.
+        """
+        pendientes = self.pendientes()
+        if pendientes > self.max_bytes:
+            self.rechazadas_cola_llena += 1
+            raise ColaLlena(pendientes, self.reintentar_en)
+        linea = json.dumps(
+            {"tipo": tipo, "datos": datos, "recibida": time.time()},
+            ensure_ascii=False, separators=(",", ":"), default=str,
+        ).encode("utf-8") + b"\n"
+        fd = self._abrir()
+        with self._lock:
+            _bloquear(self._fd_cerrojo)
+            try:
+                diario, _ = self._preparar()
+                os.write(fd, linea)
+                fin = os.fstat(fd).st_size
+            finally:
+                _desbloquear(self._fd_cerrojo)
+            self._escritas += 1
+            numero = self._escritas
+        self._sincronizar(numero)
+        self.aceptadas += 1
+        if self._aviso is not None:
+            self._loop.call_soon_threadsafe(self._aviso.set)
+        return f"{diario}-{fin}"
+
+    def _sincronizar(self, numero: int):
+        """
+        Espera a que la escritura `numero` esté en disco. El primer hilo que
+        llega hace el fsync para todas las escrituras hechas hasta ese
+        momento; los demás esperan ese fsync o el siguiente.
+        """
+        with self._cond:
+            while self._sincronizadas < numero:
+                if not self._sincronizando:
+                    self._sincronizando = True
+                    break
+                self._cond.wait()
+            else:
+                return
+        objetivo = self._sincronizadas
+        try:
+            if self.espera_grupo:
+                time.sleep(self.espera_grupo)  # Deja que se sumen más escrituras al grupo
+            objetivo = self._escritas
+            os.fsync(self._fd)
+            self.sincronizaciones += 1
+        except OSError:
+            objetivo = self._sincronizadas  # Los que esperaban reintentan el fsync
+            raise
+        finally:
+            with self._cond:
+                self._sincronizadas = max(self._sincronizadas, objetivo)
+                self._sincronizando = False
+                self._cond.notify_all()
+
+    def _en_disco(self) -> Tuple[Optional[str], int, dict]:
+        """(id del diario, tamaño, última posición aplicada publicada por el drenador)."""
+        try:
+            with open(self.ruta, "rb") as f:
+                cabecera = f.read(LARGO_CABECERA)
+                tamano = os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return None, 0, {}
+        diario = cabecera[7:-1].decode("ascii") if len(cabecera) == LARGO_CABECERA else None
+        try:
+            with open(self._ruta_posicion, encoding="utf-8") as f:
+                posicion = json.load(f)
+        except (FileNotFoundError, ValueError):
+            posicion = {}
+        return diario, tamano, posicion
+
+    def pendientes(self) -> int:
+        """Bytes del diario aún no aplicados (se relee como mucho una vez por segundo)."""
+        leido, pendientes = self._pendientes
+        if time.monotonic() - leido < 1.0:
+            return pendientes
+        diario, tamano, aplicado = self._en_disco()
+        if diario is None:
+            pendientes = 0
+        elif aplicado.get("diario") == diario:
+            pendientes = max(0, tamano - aplicado.get("posicion", LARGO_CABECERA))
+        else:
+            pendientes = max(0, tamano - LARGO_CABECERA)
+        self._pendientes = (time.monotonic(), pendientes)
+        return pendientes
+
+    # ------------------------------------------------------------------
+    # Drenador
+    # ------------------------------------------------------------------
+
+    def _tomar_drenador(self) -> bool:
+        os.makedirs(self.directorio, exist_ok=True)
+        if self._fd_drenador is None:
+            self._fd_drenador = os.open(os.path.join(self.directorio, "drenador.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self.es_drenador = _bloquear(self._fd_drenador, esperar=False)
+        if self.es_drenador:
+            logger.info("Drenador de escritura diferida activo en el proceso %d", os.getpid())
+        return self.es_drenador
+
+    async def drenar(self):
+        """
+        Tarea de fondo de cada worker: el que obtiene el cerrojo del drenador
+        aplica lotes mientras haya entradas; los demás reintentan tomarlo.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._aviso = asyncio.Event()
+        espera = self.intervalo
+        while True:
+            if not self.es_drenador and not await run_in_threadpool(self._tomar_drenador):
+                await asyncio.sleep(self.intervalo * 5)
+                continue
+            self._aviso.clear()
+            try:
+                procesadas = await run_in_threadpool(self.aplicar_lote)
+                espera = self.intervalo
+            except Exception as e:
+                self.reintentos += 1
+                self.ultimo_error = f"{type(e).__name__}: {e}"
+                self._contar_intento(self.ultimo_error)
+                logger.warning("Escritura diferida: lote no aplicado, se reintenta en %.0fs: %s",
+                               espera, self.ultimo_error)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 60.0)
+                continue
+            if procesadas == 0:
+                try:
+                    await asyncio.wait_for(self._aviso.wait(), self.intervalo)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _contar_intento(self, error: str):
+        """
+        Suma un intento fallido a la entrada en curso; al llegar a
+        max_intentos, el próximo lote la rechaza en lugar de aplicarla.
+        """
+        ticket, self._entrada_en_curso = self._entrada_en_curso, None
+        if ticket is None:
+            return  # Falla del lote o de la conexión, no de una entrada
+        intentos = self._intentos.get(ticket, 0) + 1
+        self._intentos[ticket] = intentos
+        if intentos >= self.max_intentos:
+            logger.error("Escritura diferida: la entrada %s falló %d veces y se rechaza", ticket, intentos)
+            self._agotadas[ticket] = f"Sin aplicar tras {intentos} intentos: {error}"
+
+    def _leer_entradas(self) -> Tuple[Optional[str], List[Tuple[int, bytes]]]:
+        """
+        Siguientes entradas completas desde la posición aplicada (hasta
+        `lote`). Antes se sincroniza el diario: lo que llega a Oracle ya
+        está en disco en el diario.
+        """
+        os.fsync(self._abrir())
+        with open(self.ruta, "rb") as f:
+            cabecera = f.read(LARGO_CABECERA)
+            if len(cabecera) < LARGO_CABECERA:
+                return None, []
+            diario = cabecera[7:-1].decode("ascii")
+            if diario != self._diario:
+                # Diario nuevo (vaciado o reemplazado): se aplica desde el inicio
+                if self._diario is not None:
+                    self._recordar_anterior(self._diario)
+                self._diario, self._posicion = diario, LARGO_CABECERA
+            f.seek(self._posicion)
+            entradas, posicion = [], self._posicion
+            for _ in range(self.lote):
+                linea = f.readline()
+                if not linea.endswith(b"\n"):
+                    break  # Fin del diario o línea aún incompleta
+                posicion += len(linea)
+                entradas.append((posicion, linea))
+        return diario, entradas
+
+    def aplicar_lote(self) -> int:
+        """Aplica las siguientes entradas en una transacción. Retorna cuántas procesó."""
+        connection, pool = self.enrutador.adquirir(solo_lectura=False)
+        descartar = False
+        try:
+            connection.endpoint = "escritura_diferida"
+            connection.call_timeout = self.timeout_ms
+            cursor = connection.cursor()
+            if self._posicion is None:
+                cursor.execute("SELECT diario, posicion FROM Cola_Diferida WHERE clave = :clave",
+                               {"clave": self.clave})
+                fila = cursor.fetchone()
+                self._diario, self._posicion = fila if fila else (None, None)
+            diario, entradas = self._leer_entradas()
+            if not entradas:
+                if diario is not None:
+                    self._vaciar_si_aplicado()
+                return 0
+
+            inicio = time.perf_counter()
+            acciones, rechazos = [], []
+            for fin, linea in entradas:
+                ticket = f"{diario}-{fin}"
+                try:
+                    entrada = json.loads(linea)
+                    aplicador = self.aplicadores[entrada["tipo"]]
+                except (ValueError, KeyError) as e:
+                    rechazos.append({"ticket": ticket, "motivo": f"Entrada ilegible: {e}",
+                                     "linea": linea.decode("utf-8", "replace").rstrip("\n")})
+                    continue
+                if ticket in self._agotadas:
+                    rechazos.append({"ticket": ticket, "tipo": entrada["tipo"],
+                                     "motivo": self._agotadas[ticket], "datos": entrada["datos"]})
+                    continue
+                self._entrada_en_curso = ticket
+                cursor.execute("SAVEPOINT entrada")
+                try:
+                    acciones.append(aplicador(cursor, entrada["datos"]))
+                    continue
+                except EntradaRechazada as e:
+                    motivo = str(e)
+                except oracledb.Error as e:
+                    if es_timeout(e) or not connection.is_healthy():
+                        descartar = not connection.is_healthy()
+                        if descartar:
+                            # Base o red caída: no es culpa de la entrada
+                            self._entrada_en_curso = None
+                        raise
+                    motivo = str(e)
+                except (ValueError, TypeError) as e:
+                    motivo = f"Datos inválidos: {e}"
+                cursor.execute("ROLLBACK TO SAVEPOINT entrada")
+                rechazos.append({"ticket": ticket, "tipo": entrada["tipo"], "motivo": motivo,
+                                 "datos": entrada["datos"]})
+            self._entrada_en_curso = None
+
+            posicion = entradas[-1][0]
+            cursor.execute("""
+                MERGE INTO Cola_Diferida c
+                USING (SELECT :clave AS clave FROM dual) s ON (c.clave = s.clave)
+                WHEN MATCHED THEN UPDATE SET diario = :diario, posicion = :posicion, actualizada = SYSDATE
+                WHEN NOT MATCHED THEN INSERT (clave, diario, posicion, actualizada)
+                VALUES (:clave, :diario, :posicion, SYSDATE)
+            """, {"clave": self.clave, "diario": diario, "posicion": posicion})
+            connection.commit()
+            cursor.close()
+        except BaseException:
+            try:
+                connection.rollback()
+            except oracledb.Error:
+                descartar = True
+            raise
+        finally:
+            self.enrutador.liberar(connection, pool, descartar)
+
+        self._posicion = posicion
+        self.agotadas += sum(1 for rechazo in rechazos if rechazo["ticket"] in self._agotadas)
+        self._intentos.clear()
+        self._agotadas.clear()
+        if rechazos:
+            self._anotar_rechazos(rechazos)
+        self._publicar_posicion()
+        for accion in acciones:
+            if accion is not None:
+                try:
+                    accion()
+                except Exception:
+                    logger.exception("Escritura diferida: falló la acción posterior al COMMIT")
+        self.lotes += 1
+        self.aplicadas += len(acciones)
+        self.rechazadas += len(rechazos)
+        self.ultimo_error = None
+        self.ultimo_lote = {
+            "entradas": len(entradas),
+            "rechazadas": len(rechazos),
+            "ms": round((time.perf_counter() - inicio) * 1000, 1),
+        }
+        self._vaciar_si_aplicado()
+        return len(entradas)
+
+    def _vaciar_si_aplicado(self):
+        """Vacía el diario si todo está aplicado y ya ocupa más de VACIAR_DESDE."""
+        if self._posicion is None or self._posicion < VACIAR_DESDE:
+            return
+        self._abrir()
+        with self._lock:
+            _bloquear(self._fd_cerrojo)
+            try:
+                diario, tamano = self._preparar()
+                if diario != self._diario or tamano != self._posicion:
+                    return  # Llegaron entradas nuevas
+                nuevo, posicion = self._nuevo_diario()
+            finally:
+                _desbloquear(self._fd_cerrojo)
+        # COLA_DIFERIDA se actualiza con el próximo lote (un id distinto
+        # significa "aplicar desde el inicio")
+        self._recordar_anterior(self._diario)
+        self._diario, self._posicion = nuevo, posicion
+        self.vaciados += 1
+        self._publicar_posicion()
+
+    def _recordar_anterior(self, diario: str):
+        self._anteriores = (self._anteriores + [diario])[-DIARIOS_ANTERIORES:]
+
+    def _publicar_posicion(self):
+        """Posición aplicada para los demás workers (contrapresión y tickets)."""
+        temporal = f"{self._ruta_posicion}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"diario": self._diario, "posicion": self._posicion,
+                       "anteriores": self._anteriores, "actualizada": time.time()}, f)
+        os.replace(temporal, self._ruta_posicion)
+        self._pendientes = (0.0, 0)
+
+    def _anotar_rechazos(self, rechazos: List[dict]):
+        fecha = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(self._ruta_rechazados, "a", encoding="utf-8") as f:
+            for rechazo in rechazos:
+                logger.warning("Escritura diferida: entrada %s rechazada: %s", rechazo["ticket"], rechazo["motivo"])
+                f.write(json.dumps({**rechazo, "fecha": fecha}, ensure_ascii=False, default=str) + "\n")
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def estado_ticket(self, ticket: str) -> Optional[dict]:
+        """pendiente, aplicada o rechazada (con el motivo); None si el ticket no se conoce."""
+        diario, _, posicion = ticket.partition("-")
+        try:
+            posicion = int(posicion)
+        except ValueError:
+            return None
+        try:
+            with open(self._ruta_rechazados, encoding="utf-8") as f:
+                for linea in f:
+                    if f'"{ticket}"' in linea:
+                        rechazo = json.loads(linea)
+                        if rechazo.get("ticket") == ticket:
+                            return {"ticket": ticket, "estado": "rechazada", "motivo": rechazo["motivo"]}
+        except FileNotFoundError:
+            pass
+        actual, tamano, aplicado = self._en_disco()
+        if diario == aplicado.get("diario") and posicion <= aplicado.get("posicion", 0):
+            return {"ticket": ticket, "estado": "aplicada"}
+        if diario in aplicado.get("anteriores", ()):
+            return {"ticket": ticket, "estado": "aplicada"}
+        if diario == actual and posicion <= tamano:
+            return {"ticket": ticket, "estado": "pendiente"}
+        return None
+
+    def estado(self) -> dict:
+        return {
+            "directorio": self.directorio,
+            "drenador": self.es_drenador,
+            "pendientesBytes": self.pendientes(),
+            "maxBytes": self.max_bytes,
+            "lote": self.lote,
+            "aceptadas": self.aceptadas,
+            "rechazadasColaLlena": self.rechazadas_cola_llena,
+            "sincronizaciones": self.sincronizaciones,
+            "entradasPorSincronizacion": round(self._escritas / self.sincronizaciones, 2) if self.sincronizaciones else None,
+            "lotes": self.lotes,
+            "aplicadas": self.aplicadas,
+            "rechazadas": self.rechazadas,
+            "reintentos": self.reintentos,
+            "maxIntentos": self.max_intentos,
+            "rechazadasPorIntentos": self.agotadas,
+            "vaciados": self.vaciados,
+            "ultimoLote": self.ultimo_lote,
+            "ultimoError": self.ultimo_error,
+        }
+
+    def cerrar(self):
+        for fd in (self._fd, self._fd_cerrojo, self._fd_drenador):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._fd_cerrojo = self._fd_drenador = None
+        self.es_drenador = False
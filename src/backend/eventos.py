@@ -0,0 +1,245 @@
+"""
+Bus de Eventos
+Cambios de casos y expedientes para suscriptores SSE (Server-Sent Events)
+
+Los endpoints de escritura publican un evento después del commit. Cada
+conexión a /api/eventos es una suscripción filtrada por caso o por
+abogado, con un búfer acotado:
+- Los eventos con la misma clave (tipo + caso + expediente) se fusionan:
+  diez sucesos seguidos en un expediente llegan como uno con n=10.
+- Los eventos que llegan dentro de `ventana` segundos se envían juntos.
+- Si el búfer se llena se descarta su contenido y se envía un único
+  evento "resync" para que el cliente vuelva a consultar.
+
+El bus vive en el proceso. Con varios workers (servidor.py) cada evento
+publicado se envía además al maestro por un Pipe y el maestro lo
+retransmite a los demás workers, de modo que una suscripción recibe las
+escrituras atendidas por cualquier worker. Por el mismo canal viajan
+avisos entre workers (`difundir` / `al_recibir`), p. ej. invalidar una
+caché en todos. Sin maestro (uvicorn directo) el bus es solo local.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Extremo del Pipe hacia el maestro de servidor.py; el maestro lo asigna en
+# cada worker antes de que uvicorn importe main
+canal_relevo = None
+
+
+class LimiteSuscripciones(Exception):
+    """Se alcanzó el máximo de suscripciones abiertas."""
+
+
+class Suscripcion:
+    """Búfer de eventos pendientes de una conexión SSE."""
+
+    def __init__(self, no_caso: Optional[int], cedula: Optional[str], max_pendientes: int,
+                 loop: asyncio.AbstractEventLoop):
+        self.no_caso = no_caso
+        self.cedula = cedula
+        self.max_pendientes = max_pendientes
+        self.loop = loop
+        self.desbordada = False
+        self._pendientes: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._hay_eventos = asyncio.Event()
+
+    def interesa(self, no_caso: Optional[int], cedulas: Iterable[str]) -> bool:
+        if self.no_caso is not None and self.no_caso != no_caso:
+            return False
+        if self.cedula is not None and self.cedula not in cedulas:
+            return False
+        return True
+
+    def _recibir(self, clave: tuple, evento: dict):
+        """Agrega un evento al búfer (se ejecuta en el event loop de la conexión)."""
+        anterior = self._pendientes.pop(clave, None)
+        if anterior is not None:
+            evento = {**evento, "n": anterior["n"] + evento["n"]}
+        elif len(self._pendientes) >= self.max_pendientes:
+            self._pendientes.clear()
+            self.desbordada = True
+        self._pendientes[clave] = evento
+        self._hay_eventos.set()
+
+    async def siguiente(self, ventana: float, espera: float) -> List[dict]:
+        """
+        Espera hasta `espera` segundos por eventos y retorna el lote
+        acumulado durante `ventana` segundos (lista vacía si no hubo).
+        """
+        try:
+            await asyncio.wait_for(self._hay_eventos.wait(), espera)
+        except asyncio.TimeoutError:
+            return []
+        await asyncio.sleep(ventana)
+        self._hay_eventos.clear()
+        if self.desbordada:
+            self.desbordada = False
+            self._pendientes.clear()
+            return [{"tipo": "resync", "noCaso": self.no_caso, "cedula": self.cedula}]
+        eventos = list(self._pendientes.values())
+        self._pendientes.clear()
+        return eventos
+
+
+class BusEventos:
+    """
+    Publicación de cambios hacia las suscripciones abiertas. `publicar`
+    puede llamarse desde cualquier hilo (los endpoints síncronos corren en
+    el threadpool); cada evento se entrega en el event loop del suscriptor.
+    """
+
+    def __init__(self, max_suscripciones: int = 200, max_pendientes: int = 100):
+        self.max_suscripciones = max_suscripciones
+        self.max_pendientes = max_pendientes
+        # Referencias débiles: una conexión que se corta antes de empezar
+        # el stream no deja la suscripción registrada.
+        self._suscripciones: "weakref.WeakSet[Suscripcion]" = weakref.WeakSet()
+        self._secuencia = itertools.count(1)
+        self._lock = threading.Lock()
+        self._canal = None
+        self._lock_canal = threading.Lock()
+        self._avisos: Dict[str, Callable[[Any], None]] = {}
+        self.publicados = 0
+        self.entregados = 0
+        self.enviados = 0
+        self.recibidos = 0
+
+    def suscribir(self, no_caso: Optional[int] = None, cedula: Optional[str] = None) -> Suscripcion:
+        """Crea una suscripción; debe llamarse desde el event loop."""
+        with self._lock:
+            if len(self._suscripciones) >= self.max_suscripciones:
+                raise LimiteSuscripciones(f"Máximo {self.max_suscripciones} suscripciones")
+            suscripcion = Suscripcion(no_caso, cedula, self.max_pendientes, asyncio.get_running_loop())
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def conectar(self, canal):
+        """
+        Conecta el bus al maestro: lo publicado aquí se le envía por `canal`
+        y lo que retransmite de otros workers se entrega localmente.
+        """
+        self._canal = canal
+        threading.Thread(target=self._recibir_relevo, args=(canal,), daemon=True,
+                         name="eventos-relevo").start()
+
+    def _recibir_relevo(self, canal):
+        while True:
+            try:
+                mensaje = canal.recv()
+            except (EOFError, OSError):
+                logger.warning("Canal de eventos con el maestro cerrado; el bus queda local")
+                self._canal = None
+                return
+            with self._lock:
+                self.recibidos += 1
+            if mensaje[0] == "evento":
+                _, no_caso, cedulas, clave, evento = mensaje
+                self._entregar(no_caso, set(cedulas), clave, evento)
+                continue
+            _, tema, dato = mensaje
+            funcion = self._avisos.get(tema)
+            if funcion is None:
+                continue
+            try:
+                funcion(dato)
+            except Exception:
+                logger.exception("Error al aplicar el aviso %s de otro worker", tema)
+
+    def _enviar(self, mensaje: tuple) -> bool:
+        """Envía un mensaje al maestro; False si no hay relevo o falló."""
+        canal = self._canal
+        if canal is None:
+            return False
+        try:
+            # Connection.send no es seguro entre hilos
+            with self._lock_canal:
+                canal.send(mensaje)
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo enviar el mensaje al maestro: %s", e)
+            return False
+        with self._lock:
+            self.enviados += 1
+        return True
+
+    @property
+    def relevo_activo(self) -> bool:
+        return self._canal is not None
+
+    def al_recibir(self, tema: str, funcion: Callable[[Any], None]):
+        """Registra `funcion(dato)` para los avisos `tema` que difunden otros workers."""
+        self._avisos[tema] = funcion
+
+    def difundir(self, tema: str, dato: Any = None) -> bool:
+        """
+        Envía un aviso a los demás workers (quien lo difunde lo aplica por
+        su cuenta). Retorna False si el proceso no está conectado al maestro.
+        """
+        return self._enviar(("aviso", tema, dato))
+
+    def publicar(self, tipo: str, no_caso: int, expediente: Optional[dict] = None,
+                 cedulas: Iterable[Optional[str]] = (), **datos):
+        """
+        Publica un cambio. `expediente` es la clave (codEsp, pasoEtapa,
+        noCaso, consecExpe) cuando el cambio es de un expediente; `cedulas`
+        son los abogados afectados (anterior y nuevo en una reasignación).
+        """
+        cedulas = {c for c in cedulas if c}
+        evento = {"tipo": tipo, "noCaso": no_caso, "n": 1}
+        clave_expediente = None
+        if expediente is not None:
+            clave_expediente = (expediente["codEsp"], expediente["pasoEtapa"], expediente["consecExpe"])
+            evento.update({
+                "codEspecializacion": expediente["codEsp"],
+                "pasoEtapa": expediente["pasoEtapa"],
+                "consecExpe": expediente["consecExpe"],
+            })
+        evento.update(datos)
+        clave = (tipo, no_caso, clave_expediente)
+
+        with self._lock:
+            self.publicados += 1
+        self._entregar(no_caso, cedulas, clave, evento)
+        self._enviar(("evento", no_caso, sorted(cedulas), clave, evento))
+
+    def _entregar(self, no_caso: Optional[int], cedulas: set, clave: tuple, evento: dict):
+        with self._lock:
+            destinos = [s for s in self._suscripciones if s.interesa(no_caso, cedulas)]
+            self.entregados += len(destinos)
+        for suscripcion in destinos:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._recibir, clave, evento)
+            except RuntimeError:
+                # El event loop de la conexión ya se cerró
+                self.cancelar(suscripcion)
+
+    def formato_sse(self, evento: dict) -> str:
+        """Serializa un evento en el formato text/event-stream."""
+        return (
+            f"id: {next(self._secuencia)}\n"
+            f"event: {evento['tipo']}\n"
+            f"data: {json.dumps(evento, default=str)}\n\n"
+        )
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "suscripciones": len(self._suscripciones),
+                "publicados": self.publicados,
+                "entregados": self.entregados,
+                "relevo": self.relevo_activo,
+                "enviadosAlMaestro": self.enviados,
+                "recibidosDeOtrosWorkers": self.recibidos,
+            }
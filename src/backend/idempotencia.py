@@ -0,0 +1,390 @@
+"""
+Idempotencia
+Cabecera Idempotency-Key en los endpoints de creación
+
+Cuando vence el timeout del gateway el cliente reintenta el POST, y cada
+reintento vuelve a ejecutar la inserción completa (MAX()+INSERT+COMMIT)
+y crea filas duplicadas. Con Idempotency-Key la primera solicitud se
+ejecuta normalmente y su respuesta se guarda; los reintentos con la misma
+clave reciben esa misma respuesta (cabecera Idempotent-Replayed) sin
+llegar al endpoint.
+
+- La clave vale para una ruta y un contenido: reutilizarla con otro
+  cuerpo responde 422.
+- Un reintento que llega mientras la primera solicitud sigue en curso la
+  espera hasta `espera` segundos; si no termina, responde 409.
+- Se guardan las respuestas 2xx y 4xx (salvo 408, 409, 425 y 429); un 5xx
+  libera la clave para que el reintento vuelva a ejecutarse.
+- En memoria se conservan las `capacidad` claves más recientes durante
+  `ttl` segundos. Con persistencia, la clave además se reserva en la
+  tabla IDEMPOTENCIA antes de ejecutar, lo que cubre reintentos que llegan
+  a otro worker o después de un reinicio.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import oracledb
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+CABECERA = "idempotency-key"
+LARGO_MAX_CLAVE = 255
+# Cabeceras de la respuesta original que se repiten
+CABECERAS_GUARDADAS = ("content-type", "location")
+ESTADOS_NO_GUARDADOS = {408, 409, 425, 429}
+
+
+class SolicitudEnCurso(Exception):
+    """Otra solicitud con la misma clave todavía no termina."""
+
+
+class Registro:
+    """Respuesta guardada para una clave."""
+
+    __slots__ = ("huella", "estado", "cabeceras", "cuerpo", "expira")
+
+    def __init__(self, huella: str, estado: int, cabeceras: List[Tuple[str, str]], cuerpo: bytes,
+                 expira: float):
+        self.huella = huella
+        self.estado = estado
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+        self.expira = expira
+
+
+def guardable(estado: int) -> bool:
+    return 200 <= estado < 500 and estado not in ESTADOS_NO_GUARDADOS
+
+
+class PersistenciaIdempotencia:
+    """
+    Tabla IDEMPOTENCIA: una fila por clave, con ESTADO NULL mientras la
+    solicitud está en curso. Una reserva sin completar por más de
+    `reserva_vencida` segundos (el worker terminó a mitad) se puede retomar.
+    """
+
+    def __init__(self, enrutador, ttl: float, reserva_vencida: float = 120.0,
+                 intervalo_purga: float = 3600.0):
+        self.enrutador = enrutador
+        self.ttl = ttl
+        self.reserva_vencida = reserva_vencida
+        self.intervalo_purga = intervalo_purga
+        self._ultima_purga = time.monotonic()
+
+    def _ejecutar(self, operacion):
+        connection, pool = self.enrutador.adquirir(solo_lectura=False)
+        try:
+            cursor = connection.cursor()
+            try:
+                return operacion(connection, cursor)
+            finally:
+                cursor.close()
+        finally:
+            self.enrutador.liberar(connection, pool)
+
+    def reservar(self, clave: str, huella: str):
+        """
+        Retorna None si la clave quedó reservada para esta solicitud, el
+        Registro guardado si ya tiene respuesta, o lanza SolicitudEnCurso.
+        """
+        def operacion(connection, cursor):
+            for _ in range(2):
+                try:
+                    cursor.execute("""
+                        INSERT INTO Idempotencia (clave, huella, reservada, expira)
+                        VALUES (:clave, :huella, SYSDATE, SYSDATE + :ttl / 86400)
+                    """, {"clave": clave, "huella": huella, "ttl": self.ttl})
+                    connection.commit()
+                    return None
+                except oracledb.IntegrityError:
+                    connection.rollback()
+                cursor.execute("""
+                    SELECT huella, estado, cabeceras, cuerpo,
+                           CASE WHEN expira < SYSDATE THEN 1 ELSE 0 END,
+                           CASE WHEN reservada < SYSDATE - :vencida / 86400 THEN 1 ELSE 0 END
+                    FROM Idempotencia
+                    WHERE clave = :clave
+                """, {"clave": clave, "vencida": self.reserva_vencida})
+                fila = cursor.fetchone()
+                if fila is None:
+                    continue  # Se borró entre el INSERT y el SELECT
+                huella_guardada, estado, cabeceras, cuerpo, expirada, abandonada = fila
+                if expirada:
+                    cursor.execute("DELETE FROM Idempotencia WHERE clave = :clave AND expira < SYSDATE",
+                                   {"clave": clave})
+                    connection.commit()
+                    continue
+                if estado is not None:
+                    return Registro(
+                        huella_guardada, estado, [tuple(c) for c in json.loads(cabeceras or "[]")],
+                        (cuerpo.read() if cuerpo is not None else "").encode("utf-8"),
+                        time.monotonic() + self.ttl,
+                    )
+                if abandonada:
+                    cursor.execute("""
+                        UPDATE Idempotencia SET huella = :huella, reservada = SYSDATE
+                        WHERE clave = :clave AND estado IS NULL
+                    """, {"clave": clave, "huella": huella})
+                    connection.commit()
+                    if cursor.rowcount == 1:
+                        return None
+                raise SolicitudEnCurso(clave)
+            raise SolicitudEnCurso(clave)
+
+        return self._ejecutar(operacion)
+
+    def completar(self, clave: str, registro: Registro):
+        def operacion(connection, cursor):
+            cursor.setinputsizes(cuerpo=oracledb.DB_TYPE_CLOB)
+            cursor.execute("""
+                UPDATE Idempotencia SET estado = :estado, cabeceras = :cabeceras, cuerpo = :cuerpo
+                WHERE clave = :clave
+            """, {
+                "clave": clave,
+                "estado": registro.estado,
+                "cabeceras": json.dumps(registro.cabeceras),
+                "cuerpo": registro.cuerpo.decode("utf-8", "replace"),
+            })
+            if time.monotonic() - self._ultima_purga >= self.intervalo_purga:
+                self._ultima_purga = time.monotonic()
+                cursor.execute("DELETE FROM Idempotencia WHERE expira < SYSDATE")
+            connection.commit()
+
+        self._ejecutar(operacion)
+
+    def liberar(self, clave: str):
+        def operacion(connection, cursor):
+            cursor.execute("DELETE FROM Idempotencia WHERE clave = :clave AND estado IS NULL", {"clave": clave})
+            connection.commit()
+
+        self._ejecutar(operacion)
+
+
+class AlmacenIdempotencia:
+    """Claves recientes y sus respuestas (LRU en memoria + tabla opcional)."""
+
+    def __init__(self, capacidad: int = 10000, ttl: float = 86400.0, espera: float = 10.0,
+                 persistencia: Optional[PersistenciaIdempotencia] = None):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.espera = espera
+        self.persistencia = persistencia
+        self._registros: "OrderedDict[str, Registro]" = OrderedDict()
+        # Claves en ejecución en este proceso (solo se usan desde el event loop)
+        self._en_curso: Dict[str, asyncio.Event] = {}
+        self._lock = threading.Lock()
+        self.ejecutadas = 0
+        self.repetidas = 0
+        self.conflictos = 0
+        self.rechazadas_en_curso = 0
+        self.errores_persistencia = 0
+
+    def _buscar(self, clave: str) -> Optional[Registro]:
+        with self._lock:
+            registro = self._registros.get(clave)
+            if registro is None:
+                return None
+            if registro.expira <= time.monotonic():
+                del self._registros[clave]
+                return None
+            self._registros.move_to_end(clave)
+            return registro
+
+    def _guardar(self, clave: str, registro: Registro):
+        with self._lock:
+            self._registros[clave] = registro
+            self._registros.move_to_end(clave)
+            while len(self._registros) > self.capacidad:
+                self._registros.popitem(last=False)
+
+    def _soltar(self, clave: str):
+        evento = self._en_curso.pop(clave, None)
+        if evento is not None:
+            evento.set()
+
+    async def reservar(self, clave: str, huella: str) -> Optional[Registro]:
+        """
+        None si esta solicitud debe ejecutarse (y luego llamar a completar
+        o liberar); el Registro guardado si es un reintento. Lanza
+        SolicitudEnCurso si la original no terminó dentro de `espera`.
+        """
+        limite = time.monotonic() + self.espera
+        while True:
+            registro = self._buscar(clave)
+            if registro is not None:
+                return registro
+            evento = self._en_curso.get(clave)
+            if evento is None:
+                break
+            try:
+                await asyncio.wait_for(evento.wait(), max(0.0, limite - time.monotonic()))
+            except asyncio.TimeoutError:
+                self.rechazadas_en_curso += 1
+                raise SolicitudEnCurso(clave)
+
+        self._en_curso[clave] = asyncio.Event()
+        if self.persistencia is None:
+            return None
+        try:
+            registro = await run_in_threadpool(self.persistencia.reservar, clave, huella)
+        except SolicitudEnCurso:
+            self._soltar(clave)
+            self.rechazadas_en_curso += 1
+            raise
+        except oracledb.Error as e:
+            # Sin la tabla se sigue con la protección en memoria
+            self.errores_persistencia += 1
+            logger.warning("No se pudo reservar la clave de idempotencia en la base: %s", e)
+            return None
+        if registro is not None:
+            self._guardar(clave, registro)
+            self._soltar(clave)
+        return registro
+
+    async def completar(self, clave: str, huella: str, estado: int, cabeceras: List[Tuple[str, str]],
+                        cuerpo: bytes):
+        registro = Registro(huella, estado, cabeceras, cuerpo, time.monotonic() + self.ttl)
+        self._guardar(clave, registro)
+        self.ejecutadas += 1
+        self._soltar(clave)
+        if self.persistencia is not None:
+            try:
+                await run_in_threadpool(self.persistencia.completar, clave, registro)
+            except oracledb.Error as e:
+                self.errores_persistencia += 1
+                logger.warning("No se pudo guardar la respuesta idempotente en la base: %s", e)
+
+    async def liberar(self, clave: str):
+        self._soltar(clave)
+        if self.persistencia is not None:
+            try:
+                await run_in_threadpool(self.persistencia.liberar, clave)
+            except oracledb.Error as e:
+                self.errores_persistencia += 1
+                logger.warning("No se pudo liberar la clave de idempotencia en la base: %s", e)
+
+    def estado(self) -> dict:
+        with self._lock:
+            entradas = len(self._registros)
+        return {
+            "capacidad": self.capacidad,
+            "entradas": entradas,
+            "enCurso": len(self._en_curso),
+            "ttlSeg": self.ttl,
+            "persistencia": self.persistencia is not None,
+            "ejecutadas": self.ejecutadas,
+            "repetidas": self.repetidas,
+            "conflictos": self.conflictos,
+            "rechazadasEnCurso": self.rechazadas_en_curso,
+            "erroresPersistencia": self.errores_persistencia,
+        }
+
+
+class IdempotenciaMiddleware:
+    """Aplica Idempotency-Key a los POST de las rutas indicadas."""
+
+    def __init__(self, app: ASGIApp, almacen: AlmacenIdempotencia, rutas: Iterable[str]):
+        self.app = app
+        self.almacen = almacen
+        self.rutas = set(rutas)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.rutas:
+            await self.app(scope, receive, send)
+            return
+        llave = Headers(scope=scope).get(CABECERA)
+        if llave is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(llave) <= LARGO_MAX_CLAVE:
+            await _responder(send, 400, {"detail": f"Idempotency-Key debe tener entre 1 y {LARGO_MAX_CLAVE} caracteres"})
+            return
+
+        # El cuerpo se lee completo para calcular la huella y se reentrega al endpoint
+        partes = []
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                return
+            partes.append(mensaje.get("body", b""))
+            if not mensaje.get("more_body", False):
+                break
+        cuerpo = b"".join(partes)
+        huella = hashlib.sha256(scope["path"].encode() + b"\n" + cuerpo).hexdigest()
+        clave = f"{scope['path']}|{llave}"
+
+        try:
+            registro = await self.almacen.reservar(clave, huella)
+        except SolicitudEnCurso:
+            await _responder(send, 409, {"detail": "Hay una solicitud en curso con la misma Idempotency-Key"},
+                             [(b"retry-after", b"1")])
+            return
+        if registro is not None:
+            if registro.huella != huella:
+                self.almacen.conflictos += 1
+                await _responder(send, 422, {"detail": "La Idempotency-Key ya se usó con otro contenido"})
+                return
+            self.almacen.repetidas += 1
+            cabeceras = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in registro.cabeceras]
+            cabeceras += [
+                (b"content-length", str(len(registro.cuerpo)).encode()),
+                (b"idempotent-replayed", b"true"),
+            ]
+            await send({"type": "http.response.start", "status": registro.estado, "headers": cabeceras})
+            await send({"type": "http.response.body", "body": registro.cuerpo})
+            return
+
+        entregado = False
+
+        async def recibir() -> Message:
+            nonlocal entregado
+            if not entregado:
+                entregado = True
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+            return await receive()
+
+        respuesta = {"estado": 500, "cabeceras": [], "cuerpo": []}
+
+        async def enviar(mensaje: Message):
+            if mensaje["type"] == "http.response.start":
+                respuesta["estado"] = mensaje["status"]
+                respuesta["cabeceras"] = [
+                    (k.decode("latin-1"), v.decode("latin-1"))
+                    for k, v in mensaje.get("headers", [])
+                    if k.decode("latin-1").lower() in CABECERAS_GUARDADAS
+                ]
+            elif mensaje["type"] == "http.response.body":
+                respuesta["cuerpo"].append(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, recibir, enviar)
+        except BaseException:
+            await asyncio.shield(self.almacen.liberar(clave))
+            raise
+        if guardable(respuesta["estado"]):
+            await self.almacen.completar(clave, huella, respuesta["estado"], respuesta["cabeceras"],
+                                         b"".join(respuesta["cuerpo"]))
+        else:
+            await self.almacen.liberar(clave)
+
+
+async def _responder(send: Send, estado: int, contenido: dict, cabeceras: Optional[list] = None):
+    cuerpo = json.dumps(contenido).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": estado,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(cuerpo)).encode())]
+                   + (cabeceras or []),
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,240 @@
+"""
+Jerarquía de Lugares
+Árbol en memoria de LUGAR para consultas de ancestros y subárboles
+
+LUGAR se referencia a sí misma mediante LUG_CODLUGAR (ciudad → juzgado →
+despacho ...). El árbol se carga una vez y se numera con un recorrido en
+profundidad (intervalos de entrada/salida), de modo que:
+  - "¿A es ancestro de B?" es una comparación de enteros
+  - el subárbol de un lugar es un segmento contiguo del recorrido
+Los cambios en LUGAR se detectan con una marca (COUNT, MAX(ORA_ROWSCN) y
+una suma de ORA_HASH del contenido de cada fila) y solo se leen las filas
+con ORA_ROWSCN posterior; si esas filas no explican el cambio se recarga
+todo, y cada `intervalo_recarga` segundos se recarga completo igualmente.
+El árbol nuevo se reemplaza de forma atómica. Si existe la
+instantánea compartida de catálogos (catalogo_compartido.py), el árbol se
+arma desde ella y se reconstruye cuando cambia su versión, sin consultar
+Oracle desde cada proceso.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS = ("codLugar", "lugCodLugar", "idTipoLugar", "nomLugar")
+
+# Marca de cambios: un borrado seguido de un alta con el mismo total, o una
+# fila cuyo ORA_ROWSCN (por bloque) no avanzó, cambia la suma de huellas
+CONSULTA_MARCA = """
+    SELECT COUNT(*), MAX(ORA_ROWSCN),
+           SUM(ORA_HASH(codLugar || '|' || lug_codLugar || '|' || idTipoLugar || '|' || nomLugar))
+    FROM Lugar
+"""
+
+
+class _Arbol:
+    """Instantánea inmutable del árbol de lugares."""
+
+    def __init__(self, nodos: Dict[str, dict]):
+        self.nodos = nodos
+        self.hijos: Dict[Optional[str], List[str]] = {}
+        for cod, nodo in nodos.items():
+            padre = nodo["lugCodLugar"] if nodo["lugCodLugar"] in nodos else None
+            self.hijos.setdefault(padre, []).append(cod)
+        for lista in self.hijos.values():
+            lista.sort(key=lambda c: nodos[c]["nomLugar"])
+
+        # Recorrido en profundidad iterativo: orden[entrada[c]:salida[c]] es el subárbol de c
+        self.orden: List[str] = []
+        self.entrada: Dict[str, int] = {}
+        self.salida: Dict[str, int] = {}
+        self.nivel: Dict[str, int] = {}
+        pila = [(cod, 0, False) for cod in reversed(self.hijos.get(None, []))]
+        while pila:
+            cod, nivel, cerrar = pila.pop()
+            if cerrar:
+                self.salida[cod] = len(self.orden)
+                continue
+            if cod in self.entrada:
+                continue  # Protección ante ciclos en los datos
+            self.entrada[cod] = len(self.orden)
+            self.nivel[cod] = nivel
+            self.orden.append(cod)
+            pila.append((cod, nivel, True))
+            for hijo in reversed(self.hijos.get(cod, [])):
+                pila.append((hijo, nivel + 1, False))
+
+
+class JerarquiaLugares:
+    """
+    Árbol de LUGAR compartido por todas las solicitudes del proceso.
+    """
+
+    def __init__(self, intervalo_refresco: float = 60.0, intervalo_recarga: float = 3600.0):
+        self.intervalo_refresco = intervalo_refresco
+        self.intervalo_recarga = intervalo_recarga
+        self._arbol: Optional[_Arbol] = None
+        self._scn = 0
+        self._marca: Optional[tuple] = None
+        self._ultima_verificacion = 0.0
+        self._ultima_carga = 0.0
+        self._lock = threading.Lock()
+        # Versión de la instantánea de catálogos de la que se cargó (None: Oracle)
+        self.version: Optional[int] = None
+
+    @property
+    def cargada(self) -> bool:
+        return self._arbol is not None
+
+    # ------------------------------------------------------------------
+    # Carga y refresco
+    # ------------------------------------------------------------------
+    def _leer(self, cursor, desde_scn: Optional[int] = None) -> Dict[str, dict]:
+        sql = "SELECT codLugar, lug_codLugar, idTipoLugar, nomLugar, ORA_ROWSCN FROM Lugar"
+        if desde_scn is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql + " WHERE ORA_ROWSCN > :scn", {"scn": desde_scn})
+        nodos = {}
+        for fila in cursor.fetchall():
+            nodos[fila[0]] = dict(zip(COLUMNAS, fila[:4]))
+            self._scn = max(self._scn, fila[4] or 0)
+        return nodos
+
+    def _leer_marca(self, cursor) -> tuple:
+        cursor.execute(CONSULTA_MARCA)
+        total, scn, suma = cursor.fetchone()
+        return total, scn or 0, suma or 0
+
+    def cargar(self, connection):
+        """Carga completa del árbol."""
+        cursor = connection.cursor()
+        try:
+            # La marca se lee antes: un cambio concurrente se ve en la próxima verificación
+            marca = self._leer_marca(cursor)
+            self._scn = 0
+            nodos = self._leer(cursor)
+        finally:
+            cursor.close()
+        self._arbol = _Arbol(nodos)
+        self._marca = marca
+        self.version = None
+        self._ultima_verificacion = self._ultima_carga = time.monotonic()
+        logger.info("Jerarquía de lugares cargada: %d lugares", len(nodos))
+
+    def cargar_filas(self, filas, version: int):
+        """
+        Arma el árbol desde filas ya leídas (instantánea de catálogos) si
+        aún no corresponde a `version`.
+        """
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version == version:
+                return
+            nodos = {fila["codLugar"]: {c: fila[c] for c in COLUMNAS} for fila in filas}
+            self._arbol = _Arbol(nodos)
+            self.version = version
+            logger.info("Jerarquía de lugares cargada de la versión %d del catálogo: %d lugares",
+                        version, len(nodos))
+
+    def refrescar(self, connection, forzar: bool = False):
+        """
+        Aplica los cambios de LUGAR si pasó el intervalo de refresco.
+        Si la marca cambió, lee las filas con ORA_ROWSCN posterior a la
+        última carga; si no hay ninguna o el total no coincide (hubo
+        borrados) se recarga completo, igual que al vencer intervalo_recarga.
+        """
+        if not forzar and time.monotonic() - self._ultima_verificacion < self.intervalo_refresco:
+            return
+        # Sin árbol cargado se espera al hilo que lo está cargando
+        if not self._lock.acquire(blocking=forzar or self._arbol is None):
+            return  # Otro hilo ya está refrescando
+        try:
+            if self._arbol is None or time.monotonic() - self._ultima_carga >= self.intervalo_recarga:
+                self.cargar(connection)
+                return
+            cursor = connection.cursor()
+            try:
+                marca = self._leer_marca(cursor)
+                if marca == self._marca:
+                    self._ultima_verificacion = time.monotonic()
+                    return
+                cambios = self._leer(cursor, self._scn)
+            finally:
+                cursor.close()
+            nodos = dict(self._arbol.nodos)
+            nodos.update(cambios)
+            if not cambios or len(nodos) != marca[0]:
+                self.cargar(connection)
+                return
+            self._arbol = _Arbol(nodos)
+            self._marca = marca
+            self._ultima_verificacion = time.monotonic()
+            logger.info("Jerarquía de lugares actualizada: %d lugares modificados", len(cambios))
+        finally:
+            self._lock.release()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def _nodo(self, arbol: _Arbol, cod: str, nivel: Optional[int] = None) -> dict:
+        return {**arbol.nodos[cod], "nivel": arbol.nivel.get(cod) if nivel is None else nivel}
+
+    def existe(self, cod: str) -> bool:
+        return self._arbol is not None and cod in self._arbol.nodos
+
+    def ancestros(self, cod: str) -> List[dict]:
+        """Lugares desde el padre inmediato hasta la raíz."""
+        arbol = self._arbol
+        resultado = []
+        visitados = {cod}
+        padre = arbol.nodos[cod]["lugCodLugar"]
+        while padre in arbol.nodos and padre not in visitados:
+            resultado.append(self._nodo(arbol, padre))
+            visitados.add(padre)
+            padre = arbol.nodos[padre]["lugCodLugar"]
+        return resultado
+
+    def codigos_subarbol(self, cod: str, incluir_raiz: bool = True) -> List[str]:
+        """Códigos del subárbol de `cod` en orden de recorrido."""
+        arbol = self._arbol
+        if cod not in arbol.entrada:
+            return [cod] if incluir_raiz else []
+        inicio = arbol.entrada[cod] + (0 if incluir_raiz else 1)
+        return arbol.orden[inicio:arbol.salida[cod]]
+
+    def descendientes(self, cod: str, tipo: Optional[str] = None) -> List[dict]:
+        """Todos los lugares bajo `cod` (opcionalmente de un tipo)."""
+        arbol = self._arbol
+        base = arbol.nivel.get(cod, 0)
+        return [
+            self._nodo(arbol, c, arbol.nivel[c] - base)
+            for c in self.codigos_subarbol(cod, incluir_raiz=False)
+            if tipo is None or arbol.nodos[c]["idTipoLugar"] == tipo
+        ]
+
+    def es_ancestro(self, ancestro: str, cod: str) -> bool:
+        arbol = self._arbol
+        if ancestro not in arbol.entrada or cod not in arbol.entrada:
+            return False
+        return arbol.entrada[ancestro] < arbol.entrada[cod] < arbol.salida[ancestro]
+
+    def subarbol(self, cod: str) -> dict:
+        """Subárbol anidado con los hijos de cada lugar."""
+        arbol = self._arbol
+        raiz = {**arbol.nodos[cod], "hijos": []}
+        pila = [raiz]
+        while pila:
+            nodo = pila.pop()
+            for hijo in arbol.hijos.get(nodo["codLugar"], []):
+                if arbol.entrada.get(hijo, -1) <= arbol.entrada.get(nodo["codLugar"], -1):
+                    continue
+                sub = {**arbol.nodos[hijo], "hijos": []}
+                nodo["hijos"].append(sub)
+                pila.append(sub)
+        return raiz
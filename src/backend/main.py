@@ -6,36 +6,441 @@ NOTA: Este backend usa las tablas exactas del schema SQL en src/db/initDB.sql
 Relaciones complejas manejadas mediante JOIN y subconsultas.
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 import oracledb
 import os
-from typing import List, Optional, Dict, Any
-from datetime import date, datetime
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import date, datetime, timedelta
+from functools import partial
 from pydantic import BaseModel
 
+from admision import ControlAdmision, SolicitudRechazada
+from cache_clientes import CacheClientes
+from catalogo_compartido import CatalogoCompartido
+import almacen_documentos
+from almacen_documentos import AlmacenDocumentos, ArchivoDemasiadoGrande, RespuestaContenido
+from compresion import CompresionMiddleware, MetricasCompresion, algoritmos_disponibles
+import consultas_lentas
+import pagos
+import resumen_casos
+from conteos_expediente import incrementar as incrementar_contador
+from escritura_diferida import ColaDiferida, ColaLlena, EntradaRechazada
+import eventos
+from eventos import BusEventos, LimiteSuscripciones
+from idempotencia import AlmacenIdempotencia, IdempotenciaMiddleware, PersistenciaIdempotencia
+from conexion import ConfigPool, EnrutadorConexiones, CONSULTA_RETRASO_DATAGUARD, es_timeout
+from asignacion import MotorAsignacion
+import busqueda
+from jerarquia_lugar import JerarquiaLugares
+from perfilado import PerfiladoMiddleware, Perfilador
+import trazas
+from trazas import ExportadorArchivo, ExportadorOTLP, RespuestaTrazada, RutaTrazada, Trazador, TrazasMiddleware
+
+logger = logging.getLogger(__name__)
+
 # ============================================================================
 # CONFIGURACIÓN DE CONEXIÓN ORACLE
 # ============================================================================
+# Modo del driver: "thin" (sin cliente Oracle), "thick" (Instant Client) o
+# "auto" (thick solo si existe ORACLE_CLIENT_DIR). Se aplica al arrancar la
+# aplicación, no al importar este módulo.
+DB_MODO = os.getenv("DB_MODO", "auto").lower()
 # Ruta al cliente instantáneo de Oracle
-INSTANT_CLIENT_DIR = r"C:\oracle\instantclient_23_9"
+INSTANT_CLIENT_DIR = os.getenv("ORACLE_CLIENT_DIR", r"C:\oracle\instantclient_23_9")
+
+# Credenciales de conexión (CAMBIAR CON TUS DATOS o usar variables de entorno)
+DB_USER = os.getenv("DB_USER", "tu_usuario")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "tu_contraseña")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "1521"))
+DB_SERVICE = os.getenv("DB_SERVICE", "XE")  # Cambia según tu servicio Oracle
+
+# Tamaño de los pools de sesiones (por proceso)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+# Réplica / standby para lecturas (opcional). Si DB_REPLICA_HOST está vacío
+# todas las consultas van a la base primaria.
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST", "")
+DB_REPLICA_PORT = int(os.getenv("DB_REPLICA_PORT", str(DB_PORT)))
+DB_REPLICA_SERVICE = os.getenv("DB_REPLICA_SERVICE", DB_SERVICE)
+DB_REPLICA_USER = os.getenv("DB_REPLICA_USER", DB_USER)
+DB_REPLICA_PASSWORD = os.getenv("DB_REPLICA_PASSWORD", DB_PASSWORD)
+
+# Retraso máximo tolerado de la réplica (segundos) antes de leer de la primaria
+DB_REPLICA_TOLERANCIA_SEG = float(os.getenv("DB_REPLICA_TOLERANCIA_SEG", "30"))
+# Consulta que mide el retraso en segundos (vacía = no medir)
+DB_REPLICA_CONSULTA_RETRASO = os.getenv("DB_REPLICA_CONSULTA_RETRASO", CONSULTA_RETRASO_DATAGUARD)
+
+# Tiempo máximo por llamada a Oracle (milisegundos, 0 = sin límite)
+DB_TIMEOUT_MS = int(os.getenv("DB_TIMEOUT_MS", "15000"))
+# Límites por endpoint: "buscar_cliente=3000,obtener_expediente_detalle=5000"
+def leer_timeouts_endpoint(texto: str) -> Dict[str, int]:
+    """
+    Interpreta DB_TIMEOUTS_ENDPOINT. Las entradas mal formadas (sin '=',
+    con más de un '=' o con milisegundos que no son un entero >= 0) se
+    informan en el log y se ignoran.
+    """
+    timeouts = {}
+    for par in texto.split(","):
+        if not par.strip():
+            continue
+        partes = par.split("=")
+        nombre = partes[0].strip()
+        ms = partes[1].strip() if len(partes) == 2 else ""
+        if not nombre or not ms.isdigit():
+            logger.warning("DB_TIMEOUTS_ENDPOINT: se ignora la entrada inválida %r", par.strip())
+            continue
+        timeouts[nombre] = int(ms)
+    return timeouts
+
+DB_TIMEOUTS_ENDPOINT = leer_timeouts_endpoint(os.getenv("DB_TIMEOUTS_ENDPOINT", ""))
+# Cada cuánto se verifica si el cliente HTTP cerró la conexión (segundos)
+DB_VERIFICAR_DESCONEXION_SEG = float(os.getenv("DB_VERIFICAR_DESCONEXION_SEG", "0.5"))
+
+# Control de admisión: solicitudes simultáneas y cola de espera por clase
+# de ruta. Procurar que la suma de límites no supere DB_POOL_MAX.
+ADMISION_CATALOGO_LIMITE = int(os.getenv("ADMISION_CATALOGO_LIMITE", "4"))
+ADMISION_CATALOGO_COLA = int(os.getenv("ADMISION_CATALOGO_COLA", "20"))
+ADMISION_DETALLE_LIMITE = int(os.getenv("ADMISION_DETALLE_LIMITE", "4"))
+ADMISION_DETALLE_COLA = int(os.getenv("ADMISION_DETALLE_COLA", "10"))
+ADMISION_ESCRITURA_LIMITE = int(os.getenv("ADMISION_ESCRITURA_LIMITE", "2"))
+ADMISION_ESCRITURA_COLA = int(os.getenv("ADMISION_ESCRITURA_COLA", "10"))
+# Tiempo máximo en cola antes de rechazar con 503 (segundos)
+ADMISION_ESPERA_SEG = float(os.getenv("ADMISION_ESPERA_SEG", "0.5"))
+
+# Registro de consultas lentas
+CONSULTAS_UMBRAL_MS = float(os.getenv("CONSULTAS_UMBRAL_MS", "500"))
+# Fracción de consultas rápidas que también se escriben en el log
+CONSULTAS_MUESTREO = float(os.getenv("CONSULTAS_MUESTREO", "0.01"))
+# Binds cuyo valor se escribe en el log ("*" = todos); los demás se ocultan
+CONSULTAS_BINDS_VISIBLES = os.getenv(
+    "CONSULTAS_BINDS_VISIBLES",
+    "noCaso,codEsp,codEspecializacion,pasoEtapa,consecExpe,codCliente,codLugar,codEtapa,"
+    "conSuceso,conResul,conDoc,limite,offset,mes,desde,inicio,fin",
+)
+# Log rotativo (vacío = solo agregación en memoria)
+CONSULTAS_LOG = os.getenv("CONSULTAS_LOG", os.path.join("logs", "consultas_lentas.log"))
+
+# Intervalo mínimo entre verificaciones de cambios en LUGAR (segundos)
+LUGAR_REFRESCO_SEG = float(os.getenv("LUGAR_REFRESCO_SEG", "60"))
+# Recarga completa periódica de LUGAR, aunque la marca de cambios no varíe (segundos)
+LUGAR_RECARGA_SEG = float(os.getenv("LUGAR_RECARGA_SEG", "3600"))
+# Cada cuánto se recalculan desde la base las cargas de los abogados (segundos)
+ASIGNACION_RESINCRONIZAR_SEG = float(os.getenv("ASIGNACION_RESINCRONIZAR_SEG", "300"))
+# Vigencia de la caché de analítica de etapas (segundos)
+ANALITICA_TTL_SEG = float(os.getenv("ANALITICA_TTL_SEG", "600"))
+# Vigencia de la copia en memoria de CASO_RESUMEN_MES (segundos)
+RESUMEN_TTL_SEG = float(os.getenv("RESUMEN_TTL_SEG", "300"))
+# Máximo de pagos por lote y vigencia de los totales en memoria (segundos)
+PAGOS_LOTE_MAX = int(os.getenv("PAGOS_LOTE_MAX", "5000"))
+PAGOS_TTL_SEG = float(os.getenv("PAGOS_TTL_SEG", "300"))
+# Directorio del almacén de documentos y tamaño máximo por archivo (MB)
+DOCUMENTOS_DIR = os.getenv("DOCUMENTOS_DIR", "documentos")
+DOCUMENTOS_MAX_MB = int(os.getenv("DOCUMENTOS_MAX_MB", "100"))
+# Eventos SSE: máximo de suscripciones, eventos distintos en búfer por
+# suscripción, ventana de agrupación (ms) y latido para mantener la conexión (s)
+EVENTOS_MAX_SUSCRIPCIONES = int(os.getenv("EVENTOS_MAX_SUSCRIPCIONES", "200"))
+EVENTOS_BUFER = int(os.getenv("EVENTOS_BUFER", "100"))
+EVENTOS_VENTANA_MS = float(os.getenv("EVENTOS_VENTANA_MS", "250"))
+EVENTOS_LATIDO_SEG = float(os.getenv("EVENTOS_LATIDO_SEG", "15"))
+# Compresión de respuestas: tamaño mínimo, algoritmos en orden de preferencia,
+# niveles y tamaño de bloque a partir del cual se comprime en el threadpool
+COMPRESION_MINIMO_BYTES = int(os.getenv("COMPRESION_MINIMO_BYTES", "1024"))
+COMPRESION_ALGORITMOS = [a.strip() for a in os.getenv("COMPRESION_ALGORITMOS", "zstd,br,gzip").split(",") if a.strip()]
+COMPRESION_NIVELES = {
+    "gzip": int(os.getenv("COMPRESION_NIVEL_GZIP", "6")),
+    "br": int(os.getenv("COMPRESION_NIVEL_BR", "4")),
+    "zstd": int(os.getenv("COMPRESION_NIVEL_ZSTD", "3")),
+}
+COMPRESION_HILO_BYTES = int(os.getenv("COMPRESION_HILO_BYTES", "65536"))
+# Instantánea de catálogos compartida entre workers (vacío = cada proceso
+# consulta Oracle) y antigüedad a partir de la cual se reconstruye (segundos)
+CATALOGO_ARCHIVO = os.getenv("CATALOGO_ARCHIVO", os.path.join("cache", "catalogo.bin"))
+CATALOGO_REFRESCO_SEG = float(os.getenv("CATALOGO_REFRESCO_SEG", "3600"))
+CATALOGO_VERIFICAR_SEG = float(os.getenv("CATALOGO_VERIFICAR_SEG", "30"))
+# Caché de clientes por documento: entradas, vigencia y vigencia de los
+# documentos no encontrados (segundos)
+CLIENTES_CACHE_MAX = int(os.getenv("CLIENTES_CACHE_MAX", "10000"))
+CLIENTES_CACHE_TTL_SEG = float(os.getenv("CLIENTES_CACHE_TTL_SEG", "300"))
+CLIENTES_CACHE_TTL_404_SEG = float(os.getenv("CLIENTES_CACHE_TTL_404_SEG", "30"))
+# Idempotency-Key: claves recordadas, vigencia (s), espera máxima de un
+# reintento mientras la original sigue en curso (s) y guardado en la tabla
+# IDEMPOTENCIA (compartida entre workers y reinicios)
+IDEMPOTENCIA_MAX = int(os.getenv("IDEMPOTENCIA_MAX", "10000"))
+IDEMPOTENCIA_TTL_SEG = float(os.getenv("IDEMPOTENCIA_TTL_SEG", "86400"))
+IDEMPOTENCIA_ESPERA_SEG = float(os.getenv("IDEMPOTENCIA_ESPERA_SEG", "10"))
+IDEMPOTENCIA_PERSISTIR = os.getenv("IDEMPOTENCIA_PERSISTIR", "false").lower() == "true"
+# Escritura diferida de sucesos y documentos (Prefer: respond-async):
+# habilitada, directorio del diario, entradas por transacción y máximo
+# pendiente antes de responder 503 (MB)
+ESCRITURA_DIFERIDA = os.getenv("ESCRITURA_DIFERIDA", "false").lower() == "true"
+ESCRITURA_DIFERIDA_DIR = os.getenv("ESCRITURA_DIFERIDA_DIR", "cola")
+ESCRITURA_DIFERIDA_LOTE = int(os.getenv("ESCRITURA_DIFERIDA_LOTE", "500"))
+ESCRITURA_DIFERIDA_MAX_MB = int(os.getenv("ESCRITURA_DIFERIDA_MAX_MB", "64"))
+ESCRITURA_DIFERIDA_MAX_INTENTOS = int(os.getenv("ESCRITURA_DIFERIDA_MAX_INTENTOS", "5"))
+# Perfilado: token de la cabecera X-Perfilar (vacío = sin perfiles bajo
+# demanda), fracción de solicitudes perfiladas de forma continua, intervalo
+# de muestreo (ms), directorio y perfiles bajo demanda que se conservan
+PERFILADO_TOKEN = os.getenv("PERFILADO_TOKEN", "")
+PERFILADO_MUESTREO = float(os.getenv("PERFILADO_MUESTREO", "0"))
+PERFILADO_INTERVALO_MS = float(os.getenv("PERFILADO_INTERVALO_MS", "2"))
+PERFILADO_DIR = os.getenv("PERFILADO_DIR", "perfiles")
+PERFILADO_MAX_ARCHIVOS = int(os.getenv("PERFILADO_MAX_ARCHIVOS", "200"))
+# Trazas: archivo de spans y/o colector OTLP/HTTP (ambos vacíos = sin
+# trazas), fracción de solicitudes trazadas (también las que piden traza
+# con traceparent, salvo que se confíe en él) y nombre del servicio en el
+# colector
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "")
+TRAZAS_OTLP_URL = os.getenv("TRAZAS_OTLP_URL", "")
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "0.1"))
+TRAZAS_CONFIAR_TRACEPARENT = os.getenv("TRAZAS_CONFIAR_TRACEPARENT", "false").lower() == "true"
+TRAZAS_SERVICIO = os.getenv("TRAZAS_SERVICIO", "abogados-api")
 
-# Inicializar cliente Oracle si existe
-if os.path.isdir(INSTANT_CLIENT_DIR):
-    oracledb.init_oracle_client(lib_dir=INSTANT_CLIENT_DIR)
+registro_consultas = consultas_lentas.configurar(
+    umbral_ms=CONSULTAS_UMBRAL_MS,
+    muestreo=CONSULTAS_MUESTREO,
+    visibles=CONSULTAS_BINDS_VISIBLES,
+    archivo=CONSULTAS_LOG or None,
+)
 
-# Credenciales de conexión (CAMBIAR CON TUS DATOS)
-DB_USER = "tu_usuario"
-DB_PASSWORD = "tu_contraseña"
-DB_HOST = "localhost"
-DB_PORT = 1521
-DB_SERVICE = "XE"  # Cambia según tu servicio Oracle
+enrutador = EnrutadorConexiones(
+    primaria=ConfigPool(
+        user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+        service=DB_SERVICE, min=DB_POOL_MIN, max=DB_POOL_MAX,
+    ),
+    replica=ConfigPool(
+        user=DB_REPLICA_USER, password=DB_REPLICA_PASSWORD, host=DB_REPLICA_HOST,
+        port=DB_REPLICA_PORT, service=DB_REPLICA_SERVICE, min=DB_POOL_MIN, max=DB_POOL_MAX,
+    ) if DB_REPLICA_HOST else None,
+    tolerancia_retraso=DB_REPLICA_TOLERANCIA_SEG,
+    consulta_retraso=DB_REPLICA_CONSULTA_RETRASO,
+    tipo_conexion=consultas_lentas.ConexionInstrumentada,
+)
+
+jerarquia_lugares = JerarquiaLugares(intervalo_refresco=LUGAR_REFRESCO_SEG, intervalo_recarga=LUGAR_RECARGA_SEG)
+motor_asignacion = MotorAsignacion(intervalo_resincronizacion=ASIGNACION_RESINCRONIZAR_SEG)
+cache_resumen = resumen_casos.CacheResumen(ttl=RESUMEN_TTL_SEG)
+totales_pago = pagos.TotalesPago(ttl=PAGOS_TTL_SEG)
+bus_eventos = BusEventos(max_suscripciones=EVENTOS_MAX_SUSCRIPCIONES, max_pendientes=EVENTOS_BUFER)
+almacen = AlmacenDocumentos(DOCUMENTOS_DIR, tamano_max=DOCUMENTOS_MAX_MB * 1024 * 1024)
+almacen_idempotencia = AlmacenIdempotencia(
+    capacidad=IDEMPOTENCIA_MAX, ttl=IDEMPOTENCIA_TTL_SEG, espera=IDEMPOTENCIA_ESPERA_SEG,
+    persistencia=PersistenciaIdempotencia(enrutador, ttl=IDEMPOTENCIA_TTL_SEG) if IDEMPOTENCIA_PERSISTIR else None,
+)
+cache_clientes = CacheClientes(
+    capacidad=CLIENTES_CACHE_MAX, ttl=CLIENTES_CACHE_TTL_SEG, ttl_negativo=CLIENTES_CACHE_TTL_404_SEG
+)
+catalogo = CatalogoCompartido(CATALOGO_ARCHIVO, refresco=CATALOGO_REFRESCO_SEG) if CATALOGO_ARCHIVO else None
+
+# Los demás workers aplican las invalidaciones de la caché de clientes
+bus_eventos.al_recibir("invalidar_clientes", cache_clientes.invalidar)
+
+def invalidar_clientes(documento: Optional[str] = None) -> bool:
+    """
+    Invalida la caché de clientes en este worker y la difunde a los demás.
+    Toda escritura de CLIENTE hecha por la API debe llamarla después del
+    commit. Retorna False si no hay relevo (un solo proceso o maestro caído).
+    """
+    cache_clientes.invalidar(documento)
+    return bus_eventos.difundir("invalidar_clientes", documento)
+
+def instantanea_catalogo():
+    """Versión vigente de la instantánea de catálogos, o None si se consulta Oracle."""
+    return catalogo.instantanea() if catalogo else None
+
+# La analítica usa NumPy: se importa en la primera consulta, no al arrancar
+_analitica_etapas = None
+_lock_analitica = threading.Lock()
+
+def analitica():
+    global _analitica_etapas
+    if _analitica_etapas is None:
+        with _lock_analitica:
+            if _analitica_etapas is None:
+                from analitica_etapas import AnaliticaEtapas
+                _analitica_etapas = AnaliticaEtapas(ttl=ANALITICA_TTL_SEG)
+    return _analitica_etapas
+
+# ============================================================================
+# ARRANQUE Y APAGADO
+# ============================================================================
+
+def cargar_jerarquia(connection):
+    instantanea = instantanea_catalogo()
+    if instantanea is not None:
+        jerarquia_lugares.cargar_filas(instantanea["lugar"], instantanea.version)
+    else:
+        jerarquia_lugares.cargar(connection)
+
+def reconstruir_catalogo(connection):
+    """
+    Reconstruye la instantánea si venció o cambiaron los catálogos (otro
+    worker puede estar haciéndolo).
+    """
+    if catalogo is not None:
+        catalogo.reconstruir(connection)
+
+# Estructuras en memoria que se precargan al arrancar (en paralelo)
+PRECARGAS = {
+    "Catálogo compartido": reconstruir_catalogo,
+    "Jerarquía de lugares": cargar_jerarquia,
+    "Cargas de abogados": motor_asignacion.cargar,
+    "Resumen de casos": cache_resumen.cargar,
+    "Totales de pago": totales_pago.cargar,
+}
+
+estado_arranque: Dict[str, Any] = {"modoDriver": None, "precarga": {}}
+
+def inicializar_driver():
+    """
+    Activa el modo thick del driver si DB_MODO lo pide. Debe ejecutarse
+    antes de abrir la primera conexión (los pools se crean en el primer uso).
+    """
+    if not oracledb.is_thin_mode():
+        return
+    existe_cliente = os.path.isdir(INSTANT_CLIENT_DIR)
+    if DB_MODO == "thick" or (DB_MODO == "auto" and existe_cliente):
+        oracledb.init_oracle_client(lib_dir=INSTANT_CLIENT_DIR if existe_cliente else None)
+    estado_arranque["modoDriver"] = "thin" if oracledb.is_thin_mode() else "thick"
+
+def precargar(nombre: str, cargar):
+    """Carga una estructura con su propia conexión (corre en el threadpool)."""
+    inicio = time.perf_counter()
+    try:
+        connection, pool = enrutador.adquirir(solo_lectura=True)
+        try:
+            cargar(connection)
+        finally:
+            enrutador.liberar(connection, pool)
+        estado_arranque["precarga"][nombre] = {"ms": round((time.perf_counter() - inicio) * 1000, 1)}
+    except oracledb.Error as e:
+        logger.warning("%s no cargada al iniciar: %s", nombre, e)
+        estado_arranque["precarga"][nombre] = {"error": str(e)}
+    except Exception as e:
+        # Un error de programación o de datos en una estructura no debe
+        # impedir la carga de las demás ni el arranque del servidor
+        logger.exception("%s no cargada al iniciar", nombre)
+        estado_arranque["precarga"][nombre] = {"error": f"{type(e).__name__}: {e}"}
+
+async def precargar_estructuras():
+    await asyncio.gather(*(run_in_threadpool(precargar, nombre, cargar) for nombre, cargar in PRECARGAS.items()))
+
+def refrescar_catalogo():
+    try:
+        connection, pool = enrutador.adquirir(solo_lectura=True)
+        try:
+            catalogo.reconstruir(connection)
+        finally:
+            enrutador.liberar(connection, pool)
+    except oracledb.Error as e:
+        logger.warning("No se pudo reconstruir el catálogo compartido: %s", e)
+    except Exception:
+        # La tarea de mantenimiento sigue con el próximo intervalo
+        logger.exception("No se pudo reconstruir el catálogo compartido")
+
+async def mantener_catalogo():
+    """
+    Cada CATALOGO_VERIFICAR_SEG compara la marca de cambios de los
+    catálogos con la de la instantánea y la reconstruye si difiere o si
+    superó CATALOGO_REFRESCO_SEG. Solo el worker que toma el cerrojo
+    consulta la base; los demás devuelven la conexión sin usarla.
+    """
+    while True:
+        await asyncio.sleep(CATALOGO_VERIFICAR_SEG)
+        await run_in_threadpool(refrescar_catalogo)
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """
+    Arranque: modo del driver, precarga de estructuras y mantenimiento del
+    catálogo compartido y drenador de la escritura diferida en segundo plano.
+    El servidor atiende solicitudes de inmediato; lo que aún no esté cargado
+    se carga en la primera consulta que lo necesite.
+    Apagado: cierra los pools de conexiones.
+    """
+    inicializar_driver()
+    if eventos.canal_relevo is not None:
+        bus_eventos.conectar(eventos.canal_relevo)
+    tareas = [asyncio.create_task(precargar_estructuras())]
+    if catalogo is not None:
+        tareas.append(asyncio.create_task(mantener_catalogo()))
+    if cola_diferida is not None:
+        tareas.append(asyncio.create_task(cola_diferida.drenar()))
+    yield
+    for tarea in tareas:
+        tarea.cancel()
+    if cola_diferida is not None:
+        cola_diferida.cerrar()
+    perfilador.cerrar()
+    trazador.cerrar()
+    enrutador.cerrar()
 
 # ============================================================================
 # INICIALIZAR APLICACIÓN FASTAPI
 # ============================================================================
-app = FastAPI(title="Gestión de Casos y Expedientes", version="1.0.0")
+
+def al_terminar_endpoint(request: Request, liberar):
+    """
+    Registra `liberar` (función o corrutina sin argumentos) para ejecutarla
+    cuando el endpoint retorna, antes de enviar la respuesta. Las
+    dependencias con yield terminan recién después de enviar el cuerpo.
+    """
+    if not hasattr(request.state, "al_terminar"):
+        request.state.al_terminar = []
+    request.state.al_terminar.append(liberar)
+
+class RutaSolicitud(RutaTrazada):
+    """
+    Ruta que ejecuta lo registrado con al_terminar_endpoint (en orden
+    inverso) apenas el endpoint retorna o falla.
+    """
+
+    def get_route_handler(self):
+        manejador = super().get_route_handler()
+
+        async def ejecutar(request: Request):
+            try:
+                return await manejador(request)
+            finally:
+                for liberar in reversed(getattr(request.state, "al_terminar", [])):
+                    resultado = liberar()
+                    if asyncio.iscoroutine(resultado):
+                        await resultado
+
+        return ejecutar
+
+app = FastAPI(
+    title="Gestión de Casos y Expedientes",
+    version="1.0.0",
+    lifespan=ciclo_de_vida,
+    default_response_class=RespuestaTrazada,
+)
+# Spans del manejador y de la función de cada endpoint, y liberación al
+# retornar el endpoint (antes de declarar las rutas)
+app.router.route_class = RutaSolicitud
+
+# Endpoints de creación que aceptan Idempotency-Key. Se agrega primero para
+# que quede dentro de CORS y de la compresión: guarda la respuesta sin
+# comprimir y las repeticiones reciben las cabeceras CORS.
+RUTAS_IDEMPOTENTES = (
+    "/api/caso/crear",
+    "/api/expediente/crear",
+    "/api/suceso/crear",
+    "/api/resultado/crear",
+    "/api/documento/crear",
+    "/api/pago/lote",
+)
+app.add_middleware(IdempotenciaMiddleware, almacen=almacen_idempotencia, rutas=RUTAS_IDEMPOTENTES)
 
 # Configurar CORS para permitir solicitudes desde el frontend
 app.add_middleware(
@@ -44,7 +449,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Idempotent-Replayed", "Location", "Preference-Applied", "X-Perfil", "traceresponse"],
+)
+
+metricas_compresion = MetricasCompresion()
+app.add_middleware(
+    CompresionMiddleware,
+    minimo=COMPRESION_MINIMO_BYTES,
+    niveles=COMPRESION_NIVELES,
+    preferencia=COMPRESION_ALGORITMOS,
+    umbral_hilo=COMPRESION_HILO_BYTES,
+    metricas=metricas_compresion,
+)
+
+# El perfilado va por fuera de todo lo demás para incluir la codificación
+# JSON y la compresión en el perfil
+perfilador = Perfilador(
+    directorio=PERFILADO_DIR,
+    token=PERFILADO_TOKEN,
+    muestreo=PERFILADO_MUESTREO,
+    intervalo_ms=PERFILADO_INTERVALO_MS,
+    max_archivos=PERFILADO_MAX_ARCHIVOS,
 )
+app.add_middleware(PerfiladoMiddleware, perfilador=perfilador)
+
+# Las trazas van por fuera del perfilado: el span raíz cubre la solicitud completa
+exportadores_trazas = []
+if TRAZAS_ARCHIVO:
+    exportadores_trazas.append(ExportadorArchivo(TRAZAS_ARCHIVO))
+if TRAZAS_OTLP_URL:
+    exportadores_trazas.append(ExportadorOTLP(TRAZAS_OTLP_URL, servicio=TRAZAS_SERVICIO))
+trazador = Trazador(exportadores_trazas, muestreo=TRAZAS_MUESTREO,
+                    confiar_traceparent=TRAZAS_CONFIAR_TRACEPARENT)
+app.add_middleware(TrazasMiddleware, trazador=trazador)
 
 # ============================================================================
 # MODELOS PYDANTIC PARA VALIDACIÓN
@@ -104,6 +541,18 @@ class Documento(BaseModel):
     conDoc: Optional[int] = None  # Consecutivo del documento
     ubicaDoc: str
 
+# Modelo para Pago - Tabla: PAGO (consecPago lo asigna PAGO_SEQ)
+class Pago(BaseModel):
+    idFormaPago: str
+    codFranquicia: Optional[str] = None
+    fechaPago: Optional[date] = None  # Por defecto, la fecha actual
+    valorPago: int
+    nTarjeta: Optional[int] = None
+
+# Lote de pagos para ingreso masivo
+class LotePagos(BaseModel):
+    pagos: List[Pago]
+
 # Modelo para Especialización - Tabla: ESPECIALIZACION
 class Especializacion(BaseModel):
     codEspecializacion: str
@@ -151,85 +600,340 @@ class EspeciaEtapa(BaseModel):
 # ============================================================================
 # FUNCIÓN PARA OBTENER CONEXIÓN A ORACLE
 # ============================================================================
-def get_db_connection():
+# Métodos HTTP que se atienden desde el pool de lectura (réplica)
+METODOS_LECTURA = {"GET", "HEAD"}
+
+# Endpoints de catálogos (tablas pequeñas y estables)
+ENDPOINTS_CATALOGO = {
+    "obtener_especializaciones",
+    "obtener_abogados_especializacion",
+    "recomendar_abogado",
+    "obtener_ciudades",
+    "obtener_entidades_por_ciudad",
+    "obtener_lugar",
+    "obtener_ancestros_lugar",
+    "obtener_descendientes_lugar",
+    "obtener_arbol_lugar",
+    "obtener_etapas_especializacion",
+    "obtener_etapa_especifica",
+    "obtener_resumen_casos",
+    "obtener_totales_pago",
+}
+
+control_admision = ControlAdmision({
+    "catalogo": (ADMISION_CATALOGO_LIMITE, ADMISION_CATALOGO_COLA, ADMISION_ESPERA_SEG),
+    "detalle": (ADMISION_DETALLE_LIMITE, ADMISION_DETALLE_COLA, ADMISION_ESPERA_SEG),
+    "escritura": (ADMISION_ESCRITURA_LIMITE, ADMISION_ESCRITURA_COLA, ADMISION_ESPERA_SEG),
+})
+
+def clase_ruta(request: Request) -> str:
     """
-    Obtiene una conexión a la base de datos Oracle.
-    Se usa como dependencia en los endpoints.
+    Clasifica la solicitud para el control de admisión.
     """
+    if request.method not in METODOS_LECTURA:
+        return "escritura"
+    endpoint = getattr(request.scope.get("endpoint"), "__name__", "")
+    return "catalogo" if endpoint in ENDPOINTS_CATALOGO else "detalle"
+
+async def admitir_solicitud(request: Request):
+    """
+    Reserva un cupo de la clase de ruta antes de tomar una conexión.
+    Si la cola está llena responde 503 con Retry-After.
+    El cupo se devuelve cuando el endpoint retorna, sin esperar a que el
+    cliente reciba la respuesta.
+    """
+    clase = clase_ruta(request)
     try:
-        connection = oracledb.connect(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            dsn=f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
+        with trazas.span("admision", clase=clase):
+            inicio = await control_admision.entrar(clase)
+    except SolicitudRechazada as r:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servidor ocupado ({r.motivo}), reintente en {r.reintentar_en}s",
+            headers={"Retry-After": str(r.reintentar_en)}
         )
-        return connection
+    liberado = False
+
+    def salir():
+        nonlocal liberado
+        if not liberado:
+            liberado = True
+            control_admision.salir(clase, inicio)
+
+    al_terminar_endpoint(request, salir)
+    try:
+        yield
+    finally:
+        salir()
+
+async def vigilar_desconexion(request: Request, connection, estado: dict):
+    """
+    Cancela en el servidor la llamada en curso si el cliente HTTP se desconecta.
+    """
+    while True:
+        if await request.is_disconnected():
+            estado["cancelada"] = True
+            try:
+                connection.cancel()
+            except oracledb.Error:
+                pass
+            return
+        await asyncio.sleep(DB_VERIFICAR_DESCONEXION_SEG)
+
+async def get_db_connection(request: Request, _cupo = Depends(admitir_solicitud)):
+    """
+    Obtiene una conexión a la base de datos Oracle desde el pool.
+    Se usa como dependencia en los endpoints.
+    Las lecturas (GET) usan la réplica si está disponible; el resto, la primaria.
+    Solo se toma una conexión si el control de admisión concede un cupo.
+    Cada llamada a Oracle queda limitada por el timeout del endpoint.
+    La conexión se devuelve al pool cuando el endpoint retorna.
+    """
+    solo_lectura = request.method in METODOS_LECTURA
+    try:
+        with trazas.span("db.adquirir", soloLectura=solo_lectura):
+            connection, pool = await run_in_threadpool(enrutador.adquirir, solo_lectura)
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Error al conectar a Oracle: {str(e)}")
 
+    endpoint = getattr(request.scope.get("endpoint"), "__name__", "")
+    connection.endpoint = endpoint
+    connection.call_timeout = DB_TIMEOUTS_ENDPOINT.get(endpoint, DB_TIMEOUT_MS)
+    estado = {"cancelada": False}
+    # El vigilante dura lo que el endpoint: después de enviar la respuesta
+    # el servidor informa http.disconnect aunque el cliente no haya abortado
+    vigilante = asyncio.create_task(vigilar_desconexion(request, connection, estado))
+    devuelta = False
+
+    async def devolver():
+        nonlocal devuelta
+        if devuelta:
+            return
+        devuelta = True
+        vigilante.cancel()
+        # Una conexión cancelada se descarta en lugar de volver al pool
+        if not estado["cancelada"]:
+            connection.call_timeout = 0
+        await run_in_threadpool(enrutador.liberar, connection, pool, estado["cancelada"])
+
+    al_terminar_endpoint(request, devolver)
+    try:
+        yield connection
+    finally:
+        await devolver()
+
+@asynccontextmanager
+async def conexion_admitida(request: Request):
+    """
+    Admisión y conexión como get_db_connection, para los endpoints que
+    solo a veces necesitan la base (p. ej. cuando no está en caché).
+    """
+    async with asynccontextmanager(admitir_solicitud)(request) as cupo:
+        async with asynccontextmanager(get_db_connection)(request, cupo) as connection:
+            yield connection
+
+async def conexion_catalogo(request: Request):
+    """
+    Dependencia de los endpoints de catálogos: si la instantánea compartida
+    está disponible se lee de ella y no se toma conexión (retorna None);
+    si no, se consulta Oracle con admisión y conexión como de costumbre.
+    """
+    if instantanea_catalogo() is not None:
+        yield None
+        return
+    async with conexion_admitida(request) as connection:
+        yield connection
+
+def diferir(request: Request) -> bool:
+    """La solicitud pide escritura diferida (Prefer: respond-async) y está habilitada."""
+    return cola_diferida is not None and "respond-async" in request.headers.get("prefer", "").lower()
+
+async def conexion_escritura(request: Request):
+    """
+    Dependencia de crear suceso y crear documento: si la solicitud se
+    difiere, el endpoint la agrega a la cola y no se toma conexión
+    (retorna None); si no, admisión y conexión como de costumbre.
+    """
+    if diferir(request):
+        yield None
+        return
+    async with conexion_admitida(request) as connection:
+        yield connection
+
+def error_bd(e: oracledb.Error, mensaje: str = "Error") -> HTTPException:
+    """
+    Convierte un error de Oracle en la respuesta HTTP correspondiente.
+    Los timeouts y cancelaciones se reportan como 504.
+    """
+    if es_timeout(e):
+        return HTTPException(
+            status_code=504,
+            detail=f"{mensaje}: la consulta excedió el tiempo límite y fue cancelada"
+        )
+    return HTTPException(status_code=500, detail=f"{mensaje}: {str(e)}")
+
 # ============================================================================
 # ENDPOINTS - CLIENTE
 # ============================================================================
 
+def leer_clientes(connection, documentos: List[str]) -> Dict[str, List[dict]]:
+    """Clientes de cada documento, ordenados por codCliente."""
+    cursor = connection.cursor()
+    try:
+        lista = connection.gettype("SYS.ODCIVARCHAR2LIST").newobject(documentos)
+        cursor.execute("""
+            SELECT codCliente, nomCliente, apellCliente, nDocumento
+            FROM Cliente
+            WHERE nDocumento IN (SELECT column_value FROM TABLE(:documentos))
+            ORDER BY codCliente
+        """, {"documentos": lista})
+        resultado: Dict[str, List[dict]] = {}
+        for row in cursor.fetchall():
+            resultado.setdefault(row[3], []).append({
+                "codCliente": row[0],
+                "nomCliente": row[1],
+                "apellCliente": row[2],
+                "nDocumento": row[3]
+            })
+        return resultado
+    finally:
+        cursor.close()
+
 @app.get("/api/cliente/buscar/{nombre}/{apellido}")
 def buscar_cliente(nombre: str, apellido: str, connection = Depends(get_db_connection)):
     """
     Busca un cliente por nombre y apellido.
     Retorna la información del cliente si existe.
+    La búsqueda solo obtiene los códigos; los datos se completan desde la
+    caché de clientes (los documentos que no estén se leen en una consulta).
     """
     try:
         cursor = connection.cursor()
         query = """
-            SELECT codCliente, nomCliente, apellCliente, nDocumento
+            SELECT codCliente, nDocumento
             FROM Cliente
             WHERE UPPER(nomCliente) LIKE UPPER(:nombre || '%')
             AND UPPER(apellCliente) LIKE UPPER(:apellido || '%')
         """
         cursor.execute(query, {"nombre": nombre, "apellido": apellido})
-        result = cursor.fetchall()
+        encontrados = cursor.fetchall()
         cursor.close()
-        
-        if result:
-            return [
-                {
-                    "codCliente": row[0],
-                    "nomCliente": row[1],
-                    "apellCliente": row[2],
-                    "nDocumento": row[3]
-                }
-                for row in result
-            ]
-        else:
+        if not encontrados:
             return []
+
+        cargar = partial(leer_clientes, connection)
+        clientes = {
+            c["codCliente"]: c
+            for lista in cache_clientes.obtener_varios((d for _, d in encontrados), cargar).values()
+            for c in lista
+        }
+        # Un cliente que no está en la entrada de su documento es más nuevo que la caché
+        desactualizados = {d for cod, d in encontrados if cod not in clientes}
+        if desactualizados:
+            for documento in desactualizados:
+                cache_clientes.invalidar(documento)
+            for lista in cache_clientes.obtener_varios(desactualizados, cargar).values():
+                clientes.update((c["codCliente"], c) for c in lista)
+        return [clientes[cod] for cod, _ in encontrados if cod in clientes]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error en búsqueda: {str(e)}")
+        raise error_bd(e, "Error en búsqueda")
 
 @app.get("/api/cliente/{documento}")
-def obtener_cliente_por_documento(documento: str, connection = Depends(get_db_connection)):
+async def obtener_cliente_por_documento(documento: str, request: Request):
     """
     Obtiene información de un cliente por número de documento.
+    Se responde desde la caché de clientes (también los 404, por menos
+    tiempo); solo al no encontrarlo en caché se toma conexión, y las
+    solicitudes simultáneas por el mismo documento comparten la consulta.
     """
+    async def cargar():
+        async with conexion_admitida(request) as connection:
+            try:
+                clientes = await run_in_threadpool(leer_clientes, connection, [documento])
+            except oracledb.Error as e:
+                raise error_bd(e)
+        return clientes.get(documento, [])
+
+    clientes = await cache_clientes.obtener(documento, cargar)
+    if not clientes:
+        raise HTTPException(status_code=404, detail="Cliente no encontrado")
+    return clientes[0]
+
+# Cliente, contactos y casos activos (con sus expedientes) en una sola
+# sentencia: las listas llegan como arreglos JSON de subconsultas escalares,
+# así que la vista completa es un viaje a la base con una sola conexión.
+CONSULTA_RESUMEN_CLIENTE = """
+    SELECT c.codCliente, c.nomCliente, c.apellCliente, c.idTipoDoc, c.nDocumento,
+           (SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                       'conseContacto' VALUE co.conseContacto,
+                       'idTipoConta' VALUE co.idTipoConta,
+                       'descTipoConta' VALUE t.descTipoConta,
+                       'valorContacto' VALUE co.valorContacto,
+                       'notificacion' VALUE co.notificacion
+                   NULL ON NULL) ORDER BY co.conseContacto RETURNING CLOB)
+            FROM Contacto co
+            INNER JOIN TipoContact t ON t.idTipoConta = co.idTipoConta
+            WHERE co.codCliente = c.codCliente) AS contactos,
+           (SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                       'noCaso' VALUE ca.noCaso,
+                       'fechaInicio' VALUE TO_CHAR(ca.fechaInicio, 'YYYY-MM-DD HH24:MI:SS'),
+                       'valor' VALUE ca.valor,
+                       'codEspecializacion' VALUE ca.codEspecializacion,
+                       'expedientesAbiertos' VALUE (SELECT COUNT(*) FROM Expediente e
+                                                    WHERE e.noCaso = ca.noCaso)
+                   NULL ON NULL) ORDER BY ca.noCaso DESC RETURNING CLOB)
+            FROM Caso ca
+            WHERE ca.codCliente = c.codCliente
+            AND ca.fechaFin IS NULL) AS casosActivos
+    FROM Cliente c
+    WHERE c.codCliente = :codCliente
+"""
+
+def leer_arreglo_json(valor) -> list:
+    """Arreglo JSON de JSON_ARRAYAGG (CLOB); NULL cuando la subconsulta no tiene filas."""
+    if valor is None:
+        return []
+    return json.loads(valor.read() if hasattr(valor, "read") else valor)
+
+def leer_resumen_cliente(connection, codCliente: str) -> Optional[dict]:
+    cursor = connection.cursor()
     try:
-        cursor = connection.cursor()
-        query = """
-            SELECT codCliente, nomCliente, apellCliente, nDocumento
-            FROM Cliente
-            WHERE nDocumento = :documento
-        """
-        cursor.execute(query, {"documento": documento})
-        result = cursor.fetchone()
+        cursor.execute(CONSULTA_RESUMEN_CLIENTE, {"codCliente": codCliente})
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        # Los CLOB se leen antes de cerrar el cursor
+        contactos, casos = leer_arreglo_json(row[5]), leer_arreglo_json(row[6])
+    finally:
         cursor.close()
-        
-        if result:
-            return {
-                "codCliente": result[0],
-                "nomCliente": result[1],
-                "apellCliente": result[2],
-                "nDocumento": result[3]
-            }
-        else:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
-    except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return {
+        "codCliente": row[0],
+        "nomCliente": row[1],
+        "apellCliente": row[2],
+        "idTipoDoc": row[3],
+        "nDocumento": row[4],
+        "contactos": contactos,
+        "casosActivos": casos,
+        "ultimoCasoActivo": casos[0] if casos else None,
+        "expedientesAbiertos": sum(caso["expedientesAbiertos"] for caso in casos)
+    }
+
+@app.get("/api/cliente/{codCliente}/resumen")
+async def obtener_resumen_cliente(codCliente: str, request: Request):
+    """
+    Vista completa del cliente para recepción en una sola llamada: datos,
+    contactos, casos activos con su cantidad de expedientes, último caso
+    activo y total de expedientes abiertos. Es una sola sentencia: un cupo
+    de admisión, una conexión y un viaje a la base.
+    """
+    async with conexion_admitida(request) as connection:
+        try:
+            resumen = await run_in_threadpool(leer_resumen_cliente, connection, codCliente)
+        except oracledb.Error as e:
+            raise error_bd(e)
+    if resumen is None:
+        raise HTTPException(status_code=404, detail="Cliente no encontrado")
+    return resumen
 
 # ============================================================================
 # ENDPOINTS - CASO
@@ -264,15 +968,12 @@ def obtener_ultimo_caso_activo(codCliente: str, connection = Depends(get_db_conn
         else:
             return None
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
-@app.get("/api/caso/activos/{codCliente}")
-def obtener_casos_activos(codCliente: str, connection = Depends(get_db_connection)):
-    """
-    Obtiene todos los casos activos (sin fecha fin) del cliente.
-    """
+def leer_casos_activos(connection, codCliente: str) -> List[dict]:
+    """Casos sin fecha fin del cliente, del más reciente al más antiguo."""
+    cursor = connection.cursor()
     try:
-        cursor = connection.cursor()
         query = """
             SELECT noCaso, fechaInicio, valor, codEspecializacion
             FROM Caso
@@ -281,9 +982,6 @@ def obtener_casos_activos(codCliente: str, connection = Depends(get_db_connectio
             ORDER BY noCaso DESC
         """
         cursor.execute(query, {"codCliente": codCliente})
-        results = cursor.fetchall()
-        cursor.close()
-        
         return [
             {
                 "noCaso": row[0],
@@ -291,16 +989,28 @@ def obtener_casos_activos(codCliente: str, connection = Depends(get_db_connectio
                 "valor": row[2],
                 "codEspecializacion": row[3]
             }
-            for row in results
+            for row in cursor.fetchall()
         ]
+    finally:
+        cursor.close()
+
+@app.get("/api/caso/activos/{codCliente}")
+def obtener_casos_activos(codCliente: str, connection = Depends(get_db_connection)):
+    """
+    Obtiene todos los casos activos (sin fecha fin) del cliente.
+    """
+    try:
+        return leer_casos_activos(connection, codCliente)
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 @app.post("/api/caso/crear")
 def crear_caso(caso: Caso, connection = Depends(get_db_connection)):
     """
     Crea un nuevo caso. Genera automáticamente el número de caso (consecutivo).
     """
+    if resumen_casos.parsear_valor(caso.valor) is None:
+        raise HTTPException(status_code=400, detail="valor no es un monto válido (dígitos con punto y hasta dos decimales, ej: 1000000.50)")
     try:
         cursor = connection.cursor()
         
@@ -322,8 +1032,15 @@ def crear_caso(caso: Caso, connection = Depends(get_db_connection)):
             "codEspecializacion": caso.codEspecializacion,
             "codCliente": caso.codCliente
         })
-        connection.commit()
+        
+        # Resumen por especialización, cliente y mes (misma transacción)
+        deltas = resumen_casos.deltas_caso(
+            caso.codEspecializacion, caso.codCliente, caso.fechaInicio, None, caso.valor
+        )
+        resumen_casos.aplicar(cursor, deltas)
+        cache_resumen.confirmar(connection, deltas)
         cursor.close()
+        bus_eventos.publicar("caso", nuevo_noCaso, codCliente=caso.codCliente)
         
         return {
             "success": True,
@@ -332,19 +1049,24 @@ def crear_caso(caso: Caso, connection = Depends(get_db_connection)):
         }
     except oracledb.Error as e:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al crear caso: {str(e)}")
+        raise error_bd(e, "Error al crear caso")
 
 @app.get("/api/caso/{noCaso}")
 def obtener_caso(noCaso: int, connection = Depends(get_db_connection)):
     """
-    Obtiene información de un caso específico.
+    Obtiene información de un caso específico con los totales de sus
+    expedientes (suma de los contadores de EXPEDIENTE, sin contar filas hijas).
     """
     try:
         cursor = connection.cursor()
         query = """
-            SELECT noCaso, fechaInicio, fechaFin, valor, codEspecializacion, codCliente
-            FROM Caso
-            WHERE noCaso = :noCaso
+            SELECT c.noCaso, c.fechaInicio, c.fechaFin, c.valor, c.codEspecializacion, c.codCliente,
+                   COUNT(e.consecExpe), NVL(SUM(e.nSucesos), 0),
+                   NVL(SUM(e.nResultados), 0), NVL(SUM(e.nDocumentos), 0)
+            FROM Caso c
+            LEFT JOIN Expediente e ON e.noCaso = c.noCaso
+            WHERE c.noCaso = :noCaso
+            GROUP BY c.noCaso, c.fechaInicio, c.fechaFin, c.valor, c.codEspecializacion, c.codCliente
         """
         cursor.execute(query, {"noCaso": noCaso})
         result = cursor.fetchone()
@@ -357,24 +1079,34 @@ def obtener_caso(noCaso: int, connection = Depends(get_db_connection)):
                 "fechaFin": str(result[2]) if result[2] else None,
                 "valor": result[3],
                 "codEspecializacion": result[4],
-                "codCliente": result[5]
+                "codCliente": result[5],
+                "totalExpedientes": result[6],
+                "totalSucesos": result[7],
+                "totalResultados": result[8],
+                "totalDocumentos": result[9]
             }
         else:
             raise HTTPException(status_code=404, detail="Caso no encontrado")
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 @app.put("/api/caso/{noCaso}")
 def actualizar_caso(noCaso: int, caso: Caso, connection = Depends(get_db_connection)):
     """
     Actualiza un caso existente (solo si no tiene fecha fin).
     """
+    if resumen_casos.parsear_valor(caso.valor) is None:
+        raise HTTPException(status_code=400, detail="valor no es un monto válido (dígitos con punto y hasta dos decimales, ej: 1000000.50)")
     try:
         cursor = connection.cursor()
         
         # Verificar si el caso existe y no tiene fecha fin
         cursor.execute(
-            "SELECT fechaFin FROM Caso WHERE noCaso = :noCaso",
+            """
+            SELECT fechaFin, codEspecializacion, codCliente, fechaInicio, valor
+            FROM Caso WHERE noCaso = :noCaso
+            FOR UPDATE
+            """,
             {"noCaso": noCaso}
         )
         result = cursor.fetchone()
@@ -383,6 +1115,7 @@ def actualizar_caso(noCaso: int, caso: Caso, connection = Depends(get_db_connect
             raise HTTPException(status_code=404, detail="Caso no encontrado")
         
         if result[0] is not None:
+            connection.rollback()
             raise HTTPException(status_code=400, detail="No se puede actualizar un caso cerrado (con fecha fin)")
         
         # Actualizar caso
@@ -399,13 +1132,23 @@ def actualizar_caso(noCaso: int, caso: Caso, connection = Depends(get_db_connect
             "valor": caso.valor,
             "codEspecializacion": caso.codEspecializacion
         })
-        connection.commit()
+        
+        # Retirar el aporte anterior al resumen y sumar el nuevo
+        deltas = resumen_casos.deltas_caso(
+            result[1], result[2], result[3], None, result[4], signo=-1
+        ) + resumen_casos.deltas_caso(
+            caso.codEspecializacion, result[2], caso.fechaInicio, None, caso.valor
+        )
+        resumen_casos.aplicar(cursor, deltas)
+        cedulas = cedulas_caso(cursor, noCaso)
+        cache_resumen.confirmar(connection, deltas)
         cursor.close()
+        bus_eventos.publicar("caso", noCaso, cedulas=cedulas, codCliente=result[2])
         
         return {"success": True, "mensaje": f"Caso {noCaso} actualizado"}
     except oracledb.Error as e:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 # ============================================================================
 # ENDPOINTS - EXPEDIENTE Y ETAPA
@@ -414,12 +1157,13 @@ def actualizar_caso(noCaso: int, caso: Caso, connection = Depends(get_db_connect
 @app.get("/api/expediente/caso/{noCaso}")
 def obtener_expedientes_caso(noCaso: int, connection = Depends(get_db_connection)):
     """
-    Obtiene todos los expedientes de un caso específico.
+    Obtiene todos los expedientes de un caso específico, con la cantidad
+    de sucesos, resultados y documentos de cada uno (contadores de EXPEDIENTE).
     """
     try:
         cursor = connection.cursor()
         query = """
-            SELECT consecExpe, noCaso, fechaEtapa
+            SELECT consecExpe, noCaso, fechaEtapa, nSucesos, nResultados, nDocumentos
             FROM Expediente
             WHERE noCaso = :noCaso
             ORDER BY consecExpe
@@ -432,12 +1176,15 @@ def obtener_expedientes_caso(noCaso: int, connection = Depends(get_db_connection
             {
                 "consecExpe": row[0],
                 "noCaso": row[1],
-                "fechaEtapa": str(row[2])
+                "fechaEtapa": str(row[2]),
+                "nSucesos": row[3],
+                "nResultados": row[4],
+                "nDocumentos": row[5]
             }
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 @app.get("/api/expediente/{codEsp}/{pasoEtapa}/{noCaso}/{consecExpe}")
 def obtener_expediente_detalle(codEsp: str, pasoEtapa: int, noCaso: int, consecExpe: int, connection = Depends(get_db_connection)):
@@ -526,7 +1273,15 @@ def obtener_expediente_detalle(codEsp: str, pasoEtapa: int, noCaso: int, consecE
         else:
             raise HTTPException(status_code=404, detail="Expediente no encontrado")
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
+
+def cedulas_caso(cursor, noCaso: int) -> List[str]:
+    """Abogados con expedientes del caso (destinatarios de sus eventos)."""
+    cursor.execute("""
+        SELECT DISTINCT cedula FROM Expediente
+        WHERE noCaso = :noCaso AND cedula IS NOT NULL
+    """, {"noCaso": noCaso})
+    return [fila[0] for fila in cursor.fetchall()]
 
 @app.post("/api/expediente/crear")
 def crear_expediente(expediente: Expediente, connection = Depends(get_db_connection)):
@@ -567,8 +1322,15 @@ def crear_expediente(expediente: Expediente, connection = Depends(get_db_connect
             "codEtapa": primera_etapa,
             "fechaEtapa": expediente.fechaEtapa
         })
+        cedulas = cedulas_caso(cursor, expediente.noCaso)
         connection.commit()
         cursor.close()
+        bus_eventos.publicar("expediente", expediente.noCaso, {
+            "codEsp": esp_result[0],
+            "pasoEtapa": expediente.pasoEtapa,
+            "noCaso": expediente.noCaso,
+            "consecExpe": nuevo_consecExpe
+        }, cedulas=cedulas)
         
         return {
             "success": True,
@@ -577,7 +1339,7 @@ def crear_expediente(expediente: Expediente, connection = Depends(get_db_connect
         }
     except oracledb.Error as e:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al crear expediente: {str(e)}")
+        raise error_bd(e, "Error al crear expediente")
 
 @app.put("/api/expediente/{consecExpe}")
 def actualizar_etapa_expediente(consecExpe: int, etapa: Expediente, connection = Depends(get_db_connection)):
@@ -586,6 +1348,25 @@ def actualizar_etapa_expediente(consecExpe: int, etapa: Expediente, connection =
     """
     try:
         cursor = connection.cursor()
+        clave = {
+            "codEsp": etapa.codEspecializacion,
+            "pasoEtapa": etapa.pasoEtapa,
+            "noCaso": etapa.noCaso,
+            "consecExpe": etapa.consecExpe
+        }
+        
+        # Abogado asignado antes del cambio (para ajustar las cargas)
+        cursor.execute("""
+            SELECT e.cedula, c.fechaFin
+            FROM Expediente e
+            INNER JOIN Caso c ON c.noCaso = e.noCaso
+            WHERE e.codEspecializacion = :codEsp
+            AND e.pasoEtapa = :pasoEtapa
+            AND e.noCaso = :noCaso
+            AND e.consecExpe = :consecExpe
+            FOR UPDATE OF e.cedula
+        """, clave)
+        anterior = cursor.fetchone()
         
         # Actualizar expediente con datos de lugar y abogado
         query = """
@@ -599,10 +1380,7 @@ def actualizar_etapa_expediente(consecExpe: int, etapa: Expediente, connection =
             AND consecExpe = :consecExpe
         """
         cursor.execute(query, {
-            "codEsp": etapa.codEspecializacion,
-            "pasoEtapa": etapa.pasoEtapa,
-            "noCaso": etapa.noCaso,
-            "consecExpe": etapa.consecExpe,
+            **clave,
             "codLugar": etapa.codLugar,
             "cedula": etapa.cedula,
             "fechaEtapa": etapa.fechaEtapa
@@ -610,55 +1388,87 @@ def actualizar_etapa_expediente(consecExpe: int, etapa: Expediente, connection =
         connection.commit()
         cursor.close()
         
+        # Solo los expedientes de casos abiertos cuentan como carga
+        if anterior and anterior[1] is None:
+            motor_asignacion.reasignar(anterior[0], etapa.cedula)
+        bus_eventos.publicar(
+            "etapa", etapa.noCaso, clave,
+            cedulas=(anterior[0] if anterior else None, etapa.cedula),
+            codLugar=etapa.codLugar, cedula=etapa.cedula, fechaEtapa=etapa.fechaEtapa
+        )
+        
         return {"success": True, "mensaje": f"Expediente {etapa.consecExpe} actualizado"}
     except oracledb.Error as e:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 # ============================================================================
 # ENDPOINTS - SUCESO
 # ============================================================================
 
+def clave_expediente(modelo) -> dict:
+    return {
+        "codEsp": modelo.codEspecializacion,
+        "pasoEtapa": modelo.pasoEtapa,
+        "noCaso": modelo.noCaso,
+        "consecExpe": modelo.consecExpe
+    }
+
+def insertar_suceso(cursor, suceso: Suceso) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Inserta el suceso con el siguiente consecutivo del expediente, sin
+    confirmar. Retorna (conSuceso, cédula del abogado), o (None, None) si
+    el expediente no existe.
+    """
+    clave = clave_expediente(suceso)
+
+    # Incrementar el contador del expediente (bloquea la fila del expediente)
+    existe, cedula = incrementar_contador(cursor, "Suceso", clave)
+    if not existe:
+        return None, None
+
+    # Obtener el próximo número de suceso para este expediente
+    cursor.execute("""
+        SELECT MAX(conSuceso) FROM Suceso
+        WHERE codEspecializacion = :codEsp
+        AND pasoEtapa = :pasoEtapa
+        AND noCaso = :noCaso
+        AND consecExpe = :consecExpe
+    """, clave)
+    max_suceso = cursor.fetchone()[0]
+    nuevo_conSuceso = (max_suceso if max_suceso else 0) + 1
+
+    # Insertar suceso
+    query = """
+        INSERT INTO Suceso (codEspecializacion, pasoEtapa, noCaso, consecExpe, conSuceso, descSuceso)
+        VALUES (:codEsp, :pasoEtapa, :noCaso, :consecExpe, :conSuceso, :descSuceso)
+    """
+    cursor.execute(query, {
+        **clave,
+        "conSuceso": nuevo_conSuceso,
+        "descSuceso": suceso.descSuceso
+    })
+    return nuevo_conSuceso, cedula
+
 @app.post("/api/suceso/crear")
-def crear_suceso(suceso: Suceso, connection = Depends(get_db_connection)):
+def crear_suceso(suceso: Suceso, connection = Depends(conexion_escritura)):
     """
     Crea un nuevo suceso en un expediente.
     Clave compuesta: (codEspecializacion, pasoEtapa, noCaso, consecExpe, conSuceso)
+    Con Prefer: respond-async (y ESCRITURA_DIFERIDA=true) se encola y responde 202.
     """
+    if connection is None:
+        return encolar("suceso", suceso)
     try:
         cursor = connection.cursor()
-        
-        # Obtener el próximo número de suceso para este expediente
-        cursor.execute("""
-            SELECT MAX(conSuceso) FROM Suceso
-            WHERE codEspecializacion = :codEsp
-            AND pasoEtapa = :pasoEtapa
-            AND noCaso = :noCaso
-            AND consecExpe = :consecExpe
-        """, {
-            "codEsp": suceso.codEspecializacion,
-            "pasoEtapa": suceso.pasoEtapa,
-            "noCaso": suceso.noCaso,
-            "consecExpe": suceso.consecExpe
-        })
-        max_suceso = cursor.fetchone()[0]
-        nuevo_conSuceso = (max_suceso if max_suceso else 0) + 1
-        
-        # Insertar suceso
-        query = """
-            INSERT INTO Suceso (codEspecializacion, pasoEtapa, noCaso, consecExpe, conSuceso, descSuceso)
-            VALUES (:codEsp, :pasoEtapa, :noCaso, :consecExpe, :conSuceso, :descSuceso)
-        """
-        cursor.execute(query, {
-            "codEsp": suceso.codEspecializacion,
-            "pasoEtapa": suceso.pasoEtapa,
-            "noCaso": suceso.noCaso,
-            "consecExpe": suceso.consecExpe,
-            "conSuceso": nuevo_conSuceso,
-            "descSuceso": suceso.descSuceso
-        })
+        nuevo_conSuceso, cedula = insertar_suceso(cursor, suceso)
+        if nuevo_conSuceso is None:
+            connection.rollback()
+            raise HTTPException(status_code=404, detail="Expediente no encontrado")
         connection.commit()
         cursor.close()
+        bus_eventos.publicar("suceso", suceso.noCaso, clave_expediente(suceso), cedulas=(cedula,),
+                             conSuceso=nuevo_conSuceso)
         
         return {
             "success": True,
@@ -667,7 +1477,7 @@ def crear_suceso(suceso: Suceso, connection = Depends(get_db_connection)):
         }
     except oracledb.Error as e:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al crear suceso: {str(e)}")
+        raise error_bd(e, "Error al crear suceso")
 
 @app.get("/api/suceso/{codEsp}/{pasoEtapa}/{noCaso}/{consecExpe}")
 def obtener_sucesos_expediente(codEsp: str, pasoEtapa: int, noCaso: int, consecExpe: int, connection = Depends(get_db_connection)):
@@ -702,7 +1512,7 @@ def obtener_sucesos_expediente(codEsp: str, pasoEtapa: int, noCaso: int, consecE
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 # ============================================================================
 # ENDPOINTS - RESULTADO
@@ -716,6 +1526,18 @@ def crear_resultado(resultado: Resultado, connection = Depends(get_db_connection
     """
     try:
         cursor = connection.cursor()
+        clave = {
+            "codEsp": resultado.codEspecializacion,
+            "pasoEtapa": resultado.pasoEtapa,
+            "noCaso": resultado.noCaso,
+            "consecExpe": resultado.consecExpe
+        }
+        
+        # Incrementar el contador del expediente (bloquea la fila del expediente)
+        existe, cedula = incrementar_contador(cursor, "Resultado", clave)
+        if not existe:
+            connection.rollback()
+            raise HTTPException(status_code=404, detail="Expediente no encontrado")
         
         # Obtener el próximo número de resultado
         cursor.execute("""
@@ -724,12 +1546,7 @@ def crear_resultado(resultado: Resultado, connection = Depends(get_db_connection
             AND pasoEtapa = :pasoEtapa
             AND noCaso = :noCaso
             AND consecExpe = :consecExpe
-        """, {
-            "codEsp": resultado.codEspecializacion,
-            "pasoEtapa": resultado.pasoEtapa,
-            "noCaso": resultado.noCaso,
-            "consecExpe": resultado.consecExpe
-        })
+        """, clave)
         max_resultado = cursor.fetchone()[0]
         nuevo_conResul = (max_resultado if max_resultado else 0) + 1
         
@@ -739,15 +1556,13 @@ def crear_resultado(resultado: Resultado, connection = Depends(get_db_connection
             VALUES (:codEsp, :pasoEtapa, :noCaso, :consecExpe, :conResul, :descResul)
         """
         cursor.execute(query, {
-            "codEsp": resultado.codEspecializacion,
-            "pasoEtapa": resultado.pasoEtapa,
-            "noCaso": resultado.noCaso,
-            "consecExpe": resultado.consecExpe,
+            **clave,
             "conResul": nuevo_conResul,
             "descResul": resultado.descResul
         })
         connection.commit()
         cursor.close()
+        bus_eventos.publicar("resultado", resultado.noCaso, clave, cedulas=(cedula,), conResul=nuevo_conResul)
         
         return {
             "success": True,
@@ -756,7 +1571,7 @@ def crear_resultado(resultado: Resultado, connection = Depends(get_db_connection
         }
     except oracledb.Error as e:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al crear resultado: {str(e)}")
+        raise error_bd(e, "Error al crear resultado")
 
 @app.get("/api/resultado/{codEsp}/{pasoEtapa}/{noCaso}/{consecExpe}")
 def obtener_resultados_expediente(codEsp: str, pasoEtapa: int, noCaso: int, consecExpe: int, connection = Depends(get_db_connection)):
@@ -791,52 +1606,71 @@ def obtener_resultados_expediente(codEsp: str, pasoEtapa: int, noCaso: int, cons
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 # ============================================================================
 # ENDPOINTS - DOCUMENTO
 # ============================================================================
 
+def insertar_documento(cursor, documento: Documento) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Inserta el documento con el siguiente consecutivo del expediente, sin
+    confirmar. Retorna (conDoc, cédula del abogado), o (None, None) si el
+    expediente no existe.
+    """
+    clave = clave_expediente(documento)
+
+    # Incrementar el contador del expediente (bloquea la fila del expediente)
+    existe, cedula = incrementar_contador(cursor, "Documento", clave)
+    if not existe:
+        return None, None
+
+    # Obtener el próximo número de documento
+    cursor.execute("""
+        SELECT MAX(conDoc) FROM Documento
+        WHERE codEspecializacion = :codEsp
+        AND pasoEtapa = :pasoEtapa
+        AND noCaso = :noCaso
+        AND consecExpe = :consecExpe
+    """, clave)
+    max_doc = cursor.fetchone()[0]
+    nuevo_conDoc = (max_doc if max_doc else 0) + 1
+
+    # Insertar documento
+    query = """
+        INSERT INTO Documento (codEspecializacion, pasoEtapa, noCaso, consecExpe, conDoc, ubicaDoc)
+        VALUES (:codEsp, :pasoEtapa, :noCaso, :consecExpe, :conDoc, :ubicaDoc)
+    """
+    cursor.execute(query, {
+        **clave,
+        "conDoc": nuevo_conDoc,
+        "ubicaDoc": documento.ubicaDoc
+    })
+    return nuevo_conDoc, cedula
+
 @app.post("/api/documento/crear")
-def crear_documento(documento: Documento, connection = Depends(get_db_connection)):
+def crear_documento(documento: Documento, connection = Depends(conexion_escritura)):
     """
     Crea un nuevo documento en un expediente.
     Clave compuesta: (codEspecializacion, pasoEtapa, noCaso, consecExpe, conDoc)
+    ubicaDoc puede ser "sha256:<hash>" de un contenido ya subido al almacén.
+    Con Prefer: respond-async (y ESCRITURA_DIFERIDA=true) se encola y responde 202.
     """
+    hash_contenido = almacen_documentos.hash_de_ubicacion(documento.ubicaDoc)
+    if hash_contenido is not None and not almacen.existe(hash_contenido):
+        raise HTTPException(status_code=400, detail="El contenido indicado en ubicaDoc no está en el almacén")
+    if connection is None:
+        return encolar("documento", documento)
     try:
         cursor = connection.cursor()
-        
-        # Obtener el próximo número de documento
-        cursor.execute("""
-            SELECT MAX(conDoc) FROM Documento
-            WHERE codEspecializacion = :codEsp
-            AND pasoEtapa = :pasoEtapa
-            AND noCaso = :noCaso
-            AND consecExpe = :consecExpe
-        """, {
-            "codEsp": documento.codEspecializacion,
-            "pasoEtapa": documento.pasoEtapa,
-            "noCaso": documento.noCaso,
-            "consecExpe": documento.consecExpe
-        })
-        max_doc = cursor.fetchone()[0]
-        nuevo_conDoc = (max_doc if max_doc else 0) + 1
-        
-        # Insertar documento
-        query = """
-            INSERT INTO Documento (codEspecializacion, pasoEtapa, noCaso, consecExpe, conDoc, ubicaDoc)
-            VALUES (:codEsp, :pasoEtapa, :noCaso, :consecExpe, :conDoc, :ubicaDoc)
-        """
-        cursor.execute(query, {
-            "codEsp": documento.codEspecializacion,
-            "pasoEtapa": documento.pasoEtapa,
-            "noCaso": documento.noCaso,
-            "consecExpe": documento.consecExpe,
-            "conDoc": nuevo_conDoc,
-            "ubicaDoc": documento.ubicaDoc
-        })
+        nuevo_conDoc, cedula = insertar_documento(cursor, documento)
+        if nuevo_conDoc is None:
+            connection.rollback()
+            raise HTTPException(status_code=404, detail="Expediente no encontrado")
         connection.commit()
         cursor.close()
+        bus_eventos.publicar("documento", documento.noCaso, clave_expediente(documento), cedulas=(cedula,),
+                             conDoc=nuevo_conDoc)
         
         return {
             "success": True,
@@ -845,7 +1679,7 @@ def crear_documento(documento: Documento, connection = Depends(get_db_connection
         }
     except oracledb.Error as e:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al crear documento: {str(e)}")
+        raise error_bd(e, "Error al crear documento")
 
 @app.get("/api/documento/{codEsp}/{pasoEtapa}/{noCaso}/{consecExpe}")
 def obtener_documentos_expediente(codEsp: str, pasoEtapa: int, noCaso: int, consecExpe: int, connection = Depends(get_db_connection)):
@@ -880,17 +1714,277 @@ def obtener_documentos_expediente(codEsp: str, pasoEtapa: int, noCaso: int, cons
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
+
+@app.post("/api/documento/contenido")
+async def subir_contenido_documento(request: Request):
+    """
+    Sube el archivo enviado como cuerpo de la solicitud (en streaming, sin
+    cargarlo completo en memoria). Si el mismo contenido ya existe no se
+    guarda de nuevo. Retorna el ubicaDoc a usar en /api/documento/crear.
+    """
+    try:
+        hash_contenido, tamano, nuevo = await almacen.guardar(request.stream())
+    except ArchivoDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return {
+        "success": True,
+        "hash": hash_contenido,
+        "ubicaDoc": almacen_documentos.PREFIJO + hash_contenido,
+        "tamano": tamano,
+        "nuevo": nuevo
+    }
+
+@app.api_route("/api/documento/contenido/{hash}", methods=["GET", "HEAD"])
+def descargar_contenido_documento(hash: str, nombre: Optional[str] = None):
+    """
+    Descarga un contenido del almacén por su SHA-256. Soporta Range
+    (descargas parciales y reanudables) e If-None-Match.
+    nombre: nombre de archivo sugerido (define Content-Type y Content-Disposition).
+    """
+    ruta = almacen.ruta(hash.lower())
+    if ruta is None or not os.path.isfile(ruta):
+        raise HTTPException(status_code=404, detail="Contenido no encontrado")
+    return RespuestaContenido(ruta, hash.lower(), nombre)
+
+def leer_ubicacion_documento(connection, codEsp: str, pasoEtapa: int, noCaso: int,
+                             consecExpe: int, conDoc: int) -> Optional[tuple]:
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT ubicaDoc
+            FROM Documento
+            WHERE codEspecializacion = :codEsp
+            AND pasoEtapa = :pasoEtapa
+            AND noCaso = :noCaso
+            AND consecExpe = :consecExpe
+            AND conDoc = :conDoc
+        """, {
+            "codEsp": codEsp,
+            "pasoEtapa": pasoEtapa,
+            "noCaso": noCaso,
+            "consecExpe": consecExpe,
+            "conDoc": conDoc
+        })
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+@app.api_route("/api/documento/{codEsp}/{pasoEtapa}/{noCaso}/{consecExpe}/{conDoc}/contenido", methods=["GET", "HEAD"])
+async def descargar_documento(codEsp: str, pasoEtapa: int, noCaso: int, consecExpe: int, conDoc: int,
+                              request: Request, nombre: Optional[str] = None):
+    """
+    Descarga el contenido de un documento cuyo ubicaDoc apunta al almacén.
+    La conexión y el cupo de admisión solo se ocupan durante la búsqueda
+    de ubicaDoc; se liberan antes de empezar a enviar el archivo.
+    """
+    async with conexion_admitida(request) as connection:
+        try:
+            row = await run_in_threadpool(
+                leer_ubicacion_documento, connection, codEsp, pasoEtapa, noCaso, consecExpe, conDoc
+            )
+        except oracledb.Error as e:
+            raise error_bd(e)
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    hash_contenido = almacen_documentos.hash_de_ubicacion(row[0])
+    if hash_contenido is None:
+        raise HTTPException(status_code=404, detail="El documento no tiene contenido en el almacén")
+    if not await run_in_threadpool(almacen.existe, hash_contenido):
+        raise HTTPException(status_code=404, detail="Contenido no encontrado")
+    return RespuestaContenido(almacen.ruta(hash_contenido), hash_contenido, nombre)
+
+# ============================================================================
+# ESCRITURA DIFERIDA (SUCESOS Y DOCUMENTOS)
+# ============================================================================
+
+def aplicar_suceso(cursor, datos: dict):
+    """Aplicador de la cola diferida; el evento se publica después del COMMIT."""
+    suceso = Suceso(**datos)
+    conSuceso, cedula = insertar_suceso(cursor, suceso)
+    if conSuceso is None:
+        raise EntradaRechazada("Expediente no encontrado")
+    return partial(bus_eventos.publicar, "suceso", suceso.noCaso, clave_expediente(suceso),
+                   cedulas=(cedula,), conSuceso=conSuceso)
+
+def aplicar_documento(cursor, datos: dict):
+    documento = Documento(**datos)
+    conDoc, cedula = insertar_documento(cursor, documento)
+    if conDoc is None:
+        raise EntradaRechazada("Expediente no encontrado")
+    return partial(bus_eventos.publicar, "documento", documento.noCaso, clave_expediente(documento),
+                   cedulas=(cedula,), conDoc=conDoc)
+
+cola_diferida = ColaDiferida(
+    ESCRITURA_DIFERIDA_DIR, enrutador,
+    aplicadores={"suceso": aplicar_suceso, "documento": aplicar_documento},
+    lote=ESCRITURA_DIFERIDA_LOTE, max_bytes=ESCRITURA_DIFERIDA_MAX_MB * 1024 * 1024,
+    max_intentos=ESCRITURA_DIFERIDA_MAX_INTENTOS,
+) if ESCRITURA_DIFERIDA else None
+
+def encolar(tipo: str, modelo: BaseModel) -> JSONResponse:
+    """
+    Agrega la solicitud a la cola diferida y responde 202 con el ticket.
+    Si la cola está llena responde 503 con Retry-After.
+    """
+    try:
+        ticket = cola_diferida.agregar(tipo, modelo.model_dump())
+    except ColaLlena as r:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Cola de escritura diferida llena ({r.pendientes} bytes pendientes), reintente en {r.reintentar_en}s",
+            headers={"Retry-After": str(r.reintentar_en)}
+        )
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Error al escribir en la cola diferida: {str(e)}")
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": f"/api/escritura-diferida/{ticket}", "Preference-Applied": "respond-async"},
+        content={
+            "success": True,
+            "ticket": ticket,
+            "mensaje": f"{tipo.capitalize()} en cola, se aplicará en segundo plano"
+        },
+    )
+
+@app.get("/api/escritura-diferida/{ticket}")
+def obtener_estado_ticket(ticket: str):
+    """
+    Estado de una entrada diferida: pendiente, aplicada o rechazada (con el motivo).
+    """
+    if cola_diferida is None:
+        raise HTTPException(status_code=404, detail="La escritura diferida no está habilitada")
+    estado = cola_diferida.estado_ticket(ticket)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Ticket no encontrado")
+    return estado
+
+# ============================================================================
+# ENDPOINTS - PAGO
+# ============================================================================
+
+@app.post("/api/pago/lote")
+def crear_lote_pagos(lote: LotePagos, connection = Depends(get_db_connection)):
+    """
+    Registra un lote de pagos en una sola transacción.
+    Los consecutivos salen de PAGO_SEQ y las filas se insertan con
+    executemany; el resumen diario se actualiza en la misma transacción.
+    """
+    if not lote.pagos or len(lote.pagos) > PAGOS_LOTE_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El lote debe tener entre 1 y {PAGOS_LOTE_MAX} pagos"
+        )
+    if any(pago.valorPago <= 0 for pago in lote.pagos):
+        raise HTTPException(status_code=400, detail="valorPago debe ser mayor que cero")
+    hoy = date.today()
+    filas = [
+        {**pago.model_dump(), "fechaPago": pago.fechaPago or hoy}
+        for pago in lote.pagos
+    ]
+    try:
+        cursor = connection.cursor()
+        consecutivos, deltas = pagos.ingresar_lote(cursor, filas)
+        totales_pago.confirmar(connection, deltas)
+        cursor.close()
+        
+        return {
+            "success": True,
+            "cantidad": len(consecutivos),
+            "consecutivos": consecutivos,
+            "mensaje": f"{len(consecutivos)} pagos registrados exitosamente"
+        }
+    except oracledb.Error as e:
+        connection.rollback()
+        raise error_bd(e, "Error al registrar pagos")
+
+@app.get("/api/pago")
+def obtener_pagos(desde: date, hasta: date, idFormaPago: Optional[str] = None,
+                  limite: int = 100, offset: int = 0, connection = Depends(get_db_connection)):
+    """
+    Obtiene los pagos entre dos fechas (inclusivas), opcionalmente de una
+    forma de pago. Usa el índice PAGO_FECHA_IDX.
+    """
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="hasta no puede ser anterior a desde")
+    if hasta >= date.max:
+        # El rango inclusivo se consulta con fechaPago < hasta + 1 día
+        raise HTTPException(status_code=400, detail=f"hasta debe ser anterior a {date.max}")
+    if limite < 1 or limite > 1000 or offset < 0:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 1000 y offset >= 0")
+    try:
+        cursor = connection.cursor()
+        results = pagos.consultar(cursor, desde, hasta, idFormaPago, limite, offset)
+        cursor.close()
+        
+        return [
+            {
+                "consecPago": row[0],
+                "fechaPago": str(row[1]),
+                "idFormaPago": row[2],
+                "descFormaPago": row[3],
+                "codFranquicia": row[4],
+                "nomFranquicia": row[5],
+                "valorPago": row[6]
+            }
+            for row in results
+        ]
+    except oracledb.Error as e:
+        raise error_bd(e)
+
+@app.get("/api/pago/totales")
+async def obtener_totales_pago(request: Request):
+    """
+    Totales acumulados por forma de pago y franquicia (desde memoria).
+    Solo cuando vence PAGOS_TTL_SEG se pasa por admisión y se toma una
+    conexión; si la recarga falla se responde con los totales que ya estaban.
+    """
+    if totales_pago.necesita_recarga():
+        try:
+            async with conexion_admitida(request) as connection:
+                await run_in_threadpool(totales_pago.recargar, connection)
+        except oracledb.Error as e:
+            if not totales_pago.cargado:
+                raise error_bd(e)
+        except HTTPException:
+            # Sin cupo o sin conexión: sirven los totales en memoria si los hay
+            if not totales_pago.cargado:
+                raise
+    return totales_pago.consultar()
+
+@app.get("/api/pago/conciliacion")
+def conciliar_pagos(mes: date, connection = Depends(get_db_connection)):
+    """
+    Compara el resumen diario con el detalle de PAGO para el mes de la
+    fecha indicada. Retorna las diferencias por día, forma y franquicia.
+    """
+    if (mes.year, mes.month) == (date.max.year, date.max.month):
+        # El mes se consulta hasta el primer día del mes siguiente
+        raise HTTPException(status_code=400, detail=f"mes debe ser anterior a {date.max:%Y-%m}")
+    try:
+        cursor = connection.cursor()
+        diferencias = pagos.conciliar(cursor, mes)
+        cursor.close()
+        return {
+            "mes": str(date(mes.year, mes.month, 1)),
+            "cuadra": not diferencias,
+            "diferencias": diferencias
+        }
+    except oracledb.Error as e:
+        raise error_bd(e)
 
 # ============================================================================
 # ENDPOINTS - ESPECIALIZACIÓN
 # ============================================================================
 
 @app.get("/api/especializacion/")
-def obtener_especializaciones(connection = Depends(get_db_connection)):
+def obtener_especializaciones(connection = Depends(conexion_catalogo)):
     """
     Obtiene todas las especializaciones disponibles.
     """
+    if connection is None:
+        return list(instantanea_catalogo()["especializacion"])
     try:
         cursor = connection.cursor()
         query = "SELECT codEspecializacion, nomEspecializacion FROM Especializacion"
@@ -906,18 +2000,23 @@ def obtener_especializaciones(connection = Depends(get_db_connection)):
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 # ============================================================================
 # ENDPOINTS - ABOGADO
 # ============================================================================
 
 @app.get("/api/abogado/especializacion/{codEspecializacion}")
-def obtener_abogados_especializacion(codEspecializacion: str, connection = Depends(get_db_connection)):
+def obtener_abogados_especializacion(codEspecializacion: str, connection = Depends(conexion_catalogo)):
     """
     Obtiene todos los abogados con una especialización específica.
     Usa la tabla ESPECIALIZACION_ABOGADO para la relación.
     """
+    if connection is None:
+        return instantanea_catalogo()["abogado_especializacion"].buscar(
+            "especializacion", codEspecializacion,
+            columnas=["cedula", "nombre", "apellido", "nTarjetaProfesional"]
+        )
     try:
         cursor = connection.cursor()
         query = """
@@ -941,17 +2040,109 @@ def obtener_abogados_especializacion(codEspecializacion: str, connection = Depen
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
+
+@app.get("/api/abogado/{cedula}/agenda")
+def obtener_agenda_abogado(cedula: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                           limite: int = 50, offset: int = 0,
+                           connection = Depends(get_db_connection)):
+    """
+    Obtiene las etapas de expediente asignadas a un abogado, en orden de fecha.
+    Por defecto desde la fecha actual (próximas etapas); hasta es inclusivo.
+    Usa la vista V_AGENDA_ABOGADO y el índice EXPEDIENTE_AGENDA_IDX
+    (cedula, fechaEtapa, noCaso, consecExpe), que entrega las filas ya ordenadas.
+    """
+    if limite < 1 or limite > 500 or offset < 0:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 500 y offset >= 0")
+    desde = desde or date.today()
+    if hasta is not None and hasta < desde:
+        raise HTTPException(status_code=400, detail="hasta no puede ser anterior a desde")
+    if hasta is not None and hasta >= date.max:
+        # hasta inclusivo se consulta como fechaEtapa < hasta + 1 día; sin hasta no hay tope
+        raise HTTPException(status_code=400, detail=f"hasta debe ser anterior a {date.max}")
+    try:
+        cursor = connection.cursor()
+        query = """
+            SELECT fechaEtapa, noCaso, consecExpe, codEspecializacion, pasoEtapa,
+                   codEtapa, nomEtapa, codLugar, nomLugar
+            FROM V_AGENDA_ABOGADO
+            WHERE cedula = :cedula
+            AND fechaEtapa >= :desde
+            AND fechaEtapa < :antesDe
+            ORDER BY fechaEtapa, noCaso, consecExpe
+            OFFSET :offset ROWS FETCH NEXT :limite ROWS ONLY
+        """
+        cursor.execute(query, {
+            "cedula": cedula,
+            "desde": desde,
+            "antesDe": hasta + timedelta(days=1) if hasta else date(9999, 12, 31),
+            "offset": offset,
+            "limite": limite
+        })
+        results = cursor.fetchall()
+        cursor.close()
+
+        return [
+            {
+                "fechaEtapa": str(row[0]),
+                "noCaso": row[1],
+                "consecExpe": row[2],
+                "codEspecializacion": row[3],
+                "pasoEtapa": row[4],
+                "codEtapa": row[5],
+                "nomEtapa": row[6],
+                "codLugar": row[7],
+                "nomLugar": row[8]
+            }
+            for row in results
+        ]
+    except oracledb.Error as e:
+        raise error_bd(e)
+
+@app.get("/api/abogado/especializacion/{codEspecializacion}/recomendado")
+async def recomendar_abogado(codEspecializacion: str, request: Request, cantidad: int = 1):
+    """
+    Recomienda los abogados de la especialización con menos expedientes
+    abiertos. Las cargas se mantienen en memoria (ver asignacion.py) y se
+    resincronizan con la base cada ASIGNACION_RESINCRONIZAR_SEG; solo
+    entonces se pasa por admisión y se toma una conexión. Si la
+    resincronización falla se responde con las cargas que ya estaban.
+    """
+    if cantidad < 1 or cantidad > 50:
+        raise HTTPException(status_code=400, detail="cantidad debe estar entre 1 y 50")
+    if motor_asignacion.necesita_sincronizacion():
+        try:
+            async with conexion_admitida(request) as connection:
+                await run_in_threadpool(motor_asignacion.sincronizar, connection)
+        except oracledb.Error as e:
+            if not motor_asignacion.cargado:
+                raise error_bd(e, "Error al cargar cargas de abogados")
+        except HTTPException:
+            # Sin cupo o sin conexión: sirven las cargas en memoria si las hay
+            if not motor_asignacion.cargado:
+                raise
+    recomendados = motor_asignacion.recomendar(codEspecializacion, cantidad)
+    if not recomendados:
+        raise HTTPException(status_code=404, detail="No hay abogados para la especialización")
+    return recomendados
 
 # ============================================================================
 # ENDPOINTS - LUGAR
 # ============================================================================
 
 @app.get("/api/lugar/ciudades")
-def obtener_ciudades(connection = Depends(get_db_connection)):
+def obtener_ciudades(connection = Depends(conexion_catalogo)):
     """
     Obtiene todas las ciudades (lugares raíz sin lugCodLugar).
     """
+    if connection is None:
+        return [
+            lugar
+            for lugar in instantanea_catalogo()["lugar"].buscar(
+                "padre", None, columnas=["codLugar", "nomLugar", "direLugar", "telLugar", "idTipoLugar"]
+            )
+            if lugar.pop("idTipoLugar") == "CIUDAD"
+        ]
     try:
         cursor = connection.cursor()
         query = """
@@ -975,13 +2166,17 @@ def obtener_ciudades(connection = Depends(get_db_connection)):
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 @app.get("/api/lugar/entidades/{codCiudad}")
-def obtener_entidades_por_ciudad(codCiudad: str, connection = Depends(get_db_connection)):
+def obtener_entidades_por_ciudad(codCiudad: str, connection = Depends(conexion_catalogo)):
     """
     Obtiene todas las entidades (juzgados, tribunales, etc.) de una ciudad.
     """
+    if connection is None:
+        return instantanea_catalogo()["lugar"].buscar(
+            "padre", codCiudad, columnas=["codLugar", "nomLugar", "direLugar", "telLugar", "idTipoLugar"]
+        )
     try:
         cursor = connection.cursor()
         query = """
@@ -1005,13 +2200,105 @@ def obtener_entidades_por_ciudad(codCiudad: str, connection = Depends(get_db_con
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
+
+def verificar_lugar_jerarquia(codLugar: str, connection):
+    """
+    Aplica los cambios pendientes de LUGAR al árbol en memoria y
+    verifica que el lugar exista. Con la instantánea de catálogos el árbol
+    se rearma cuando cambia su versión; si no, se consulta Oracle.
+    """
+    instantanea = instantanea_catalogo()
+    if instantanea is not None:
+        jerarquia_lugares.cargar_filas(instantanea["lugar"], instantanea.version)
+    else:
+        try:
+            jerarquia_lugares.refrescar(connection)
+        except oracledb.Error as e:
+            if not jerarquia_lugares.cargada:
+                raise error_bd(e, "Error al cargar jerarquía de lugares")
+    if not jerarquia_lugares.existe(codLugar):
+        raise HTTPException(status_code=404, detail="Lugar no encontrado")
+
+@app.get("/api/lugar/{codLugar}/ancestros")
+def obtener_ancestros_lugar(codLugar: str, connection = Depends(conexion_catalogo)):
+    """
+    Obtiene la cadena de lugares desde el padre inmediato hasta la raíz.
+    """
+    verificar_lugar_jerarquia(codLugar, connection)
+    return jerarquia_lugares.ancestros(codLugar)
+
+@app.get("/api/lugar/{codLugar}/descendientes")
+def obtener_descendientes_lugar(codLugar: str, tipo: Optional[str] = None,
+                                connection = Depends(conexion_catalogo)):
+    """
+    Obtiene todos los lugares bajo codLugar, a cualquier profundidad.
+    Opcional: filtrar por idTipoLugar. "nivel" es relativo a codLugar.
+    """
+    verificar_lugar_jerarquia(codLugar, connection)
+    return jerarquia_lugares.descendientes(codLugar, tipo)
+
+@app.get("/api/lugar/{codLugar}/arbol")
+def obtener_arbol_lugar(codLugar: str, connection = Depends(conexion_catalogo)):
+    """
+    Obtiene el subárbol de codLugar con los hijos anidados.
+    """
+    verificar_lugar_jerarquia(codLugar, connection)
+    return jerarquia_lugares.subarbol(codLugar)
+
+@app.get("/api/lugar/{codLugar}/expedientes")
+def obtener_expedientes_subarbol(codLugar: str, limite: int = 100, offset: int = 0,
+                                 connection = Depends(get_db_connection)):
+    """
+    Obtiene los expedientes registrados en codLugar o en cualquiera de sus
+    lugares descendientes, del más reciente al más antiguo.
+    """
+    if limite < 1 or limite > 1000 or offset < 0:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 1000 y offset >= 0")
+    verificar_lugar_jerarquia(codLugar, connection)
+    codigos = jerarquia_lugares.codigos_subarbol(codLugar)
+    try:
+        cursor = connection.cursor()
+        lista = connection.gettype("SYS.ODCIVARCHAR2LIST").newobject(codigos)
+        query = """
+            SELECT e.noCaso, e.consecExpe, e.codEspecializacion, e.pasoEtapa,
+                   e.codLugar, l.nomLugar, e.cedula, e.fechaEtapa
+            FROM Expediente e
+            JOIN Lugar l ON l.codLugar = e.codLugar
+            WHERE e.codLugar IN (SELECT column_value FROM TABLE(:codigos))
+            ORDER BY e.fechaEtapa DESC, e.noCaso, e.consecExpe
+            OFFSET :offset ROWS FETCH NEXT :limite ROWS ONLY
+        """
+        cursor.execute(query, {"codigos": lista, "offset": offset, "limite": limite})
+        results = cursor.fetchall()
+        cursor.close()
+
+        return [
+            {
+                "noCaso": row[0],
+                "consecExpe": row[1],
+                "codEspecializacion": row[2],
+                "pasoEtapa": row[3],
+                "codLugar": row[4],
+                "nomLugar": row[5],
+                "cedula": row[6],
+                "fechaEtapa": str(row[7])
+            }
+            for row in results
+        ]
+    except oracledb.Error as e:
+        raise error_bd(e)
 
 @app.get("/api/lugar/{codLugar}")
-def obtener_lugar(codLugar: str, connection = Depends(get_db_connection)):
+def obtener_lugar(codLugar: str, connection = Depends(conexion_catalogo)):
     """
     Obtiene detalles de un lugar específico.
     """
+    if connection is None:
+        lugares = instantanea_catalogo()["lugar"].buscar("pk", codLugar)
+        if not lugares:
+            raise HTTPException(status_code=404, detail="Lugar no encontrado")
+        return lugares[0]
     try:
         cursor = connection.cursor()
         query = """
@@ -1036,18 +2323,23 @@ def obtener_lugar(codLugar: str, connection = Depends(get_db_connection)):
         else:
             raise HTTPException(status_code=404, detail="Lugar no encontrado")
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 # ============================================================================
 # ENDPOINTS - ESPECIA_ETAPA (Workflow de etapas por especialización)
 # ============================================================================
 
 @app.get("/api/especia-etapa/{codEspecializacion}")
-def obtener_etapas_especializacion(codEspecializacion: str, connection = Depends(get_db_connection)):
+def obtener_etapas_especializacion(codEspecializacion: str, connection = Depends(conexion_catalogo)):
     """
     Obtiene todas las etapas del flujo de trabajo para una especialización.
     Muestra las etapas en orden secuencial.
     """
+    if connection is None:
+        return instantanea_catalogo()["especia_etapa"].buscar(
+            "pk", codEspecializacion,
+            columnas=["pasoEtapa", "codEtapa", "nomEtapa", "idImpugna", "nInstancia", "codEspecializacion"]
+        )
     try:
         cursor = connection.cursor()
         query = """
@@ -1074,13 +2366,21 @@ def obtener_etapas_especializacion(codEspecializacion: str, connection = Depends
             for row in results
         ]
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
 
 @app.get("/api/especia-etapa/{codEspecializacion}/{pasoEtapa}")
-def obtener_etapa_especifica(codEspecializacion: str, pasoEtapa: int, connection = Depends(get_db_connection)):
+def obtener_etapa_especifica(codEspecializacion: str, pasoEtapa: int, connection = Depends(conexion_catalogo)):
     """
     Obtiene los detalles de una etapa específica en el flujo de una especialización.
     """
+    if connection is None:
+        etapas = instantanea_catalogo()["especia_etapa"].buscar(
+            "pk", codEspecializacion, pasoEtapa,
+            columnas=["pasoEtapa", "codEtapa", "nomEtapa", "idImpugna", "nInstancia"]
+        )
+        if not etapas:
+            raise HTTPException(status_code=404, detail="Etapa no encontrada")
+        return etapas[0]
     try:
         cursor = connection.cursor()
         query = """
@@ -1109,7 +2409,134 @@ def obtener_etapa_especifica(codEspecializacion: str, pasoEtapa: int, connection
         else:
             raise HTTPException(status_code=404, detail="Etapa no encontrada")
     except oracledb.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        raise error_bd(e)
+
+# ============================================================================
+# ENDPOINTS - EVENTOS
+# ============================================================================
+
+@app.get("/api/eventos")
+async def suscribir_eventos(noCaso: Optional[int] = None, cedula: Optional[str] = None):
+    """
+    Flujo SSE (text/event-stream) de cambios de un caso o de los
+    expedientes de un abogado: caso, expediente, etapa, suceso, resultado
+    y documento. Los eventos repetidos del mismo expediente se agrupan
+    (campo n); "resync" indica que el cliente debe volver a consultar.
+    """
+    if noCaso is None and cedula is None:
+        raise HTTPException(status_code=400, detail="Indique noCaso o cedula")
+    try:
+        suscripcion = bus_eventos.suscribir(noCaso, cedula)
+    except LimiteSuscripciones as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    async def flujo():
+        try:
+            yield f"retry: {int(EVENTOS_LATIDO_SEG * 1000)}\n\n"
+            while True:
+                eventos = await suscripcion.siguiente(EVENTOS_VENTANA_MS / 1000, EVENTOS_LATIDO_SEG)
+                if not eventos:
+                    # Latido: mantiene la conexión abierta a través de proxies
+                    yield ": latido\n\n"
+                    continue
+                for evento in eventos:
+                    yield bus_eventos.formato_sse(evento)
+        finally:
+            bus_eventos.cancelar(suscripcion)
+
+    return StreamingResponse(
+        flujo(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============================================================================
+# ENDPOINTS - BÚSQUEDA
+# ============================================================================
+
+@app.get("/api/busqueda")
+def buscar_texto(q: str, modo: str = "frase", tipos: Optional[str] = None,
+                 noCaso: Optional[int] = None, codCliente: Optional[str] = None,
+                 codEspecializacion: Optional[str] = None, limite: int = 20, offset: int = 0,
+                 connection = Depends(get_db_connection)):
+    """
+    Busca texto en sucesos, resultados y documentos (índices Oracle Text).
+    Resultados ordenados por puntaje; opcionalmente acotados por caso,
+    cliente o especialización. tipos: "suceso,resultado,documento".
+    """
+    if modo not in busqueda.MODOS:
+        raise HTTPException(status_code=400, detail=f"modo debe ser uno de: {', '.join(busqueda.MODOS)}")
+    lista_tipos = [t.strip() for t in tipos.split(",") if t.strip()] if tipos else None
+    if lista_tipos is not None and (not lista_tipos or set(lista_tipos) - set(busqueda.TIPOS)):
+        raise HTTPException(status_code=400, detail=f"tipos debe combinar: {', '.join(busqueda.TIPOS)}")
+    if limite < 1 or limite > 100 or offset < 0:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 100 y offset >= 0")
+    if busqueda.expresion_texto(q, modo) is None:
+        raise HTTPException(status_code=400, detail="q debe contener al menos una palabra")
+    try:
+        return busqueda.buscar(
+            connection, q, modo, lista_tipos, noCaso, codCliente, codEspecializacion, limite, offset
+        )
+    except oracledb.Error as e:
+        raise error_bd(e, "Error en la búsqueda")
+
+# ============================================================================
+# ENDPOINTS - ANALÍTICA
+# ============================================================================
+
+@app.get("/api/analytics/etapas")
+def obtener_duracion_etapas(agrupar: str = "especializacion", desde: Optional[date] = None,
+                            hasta: Optional[date] = None, connection = Depends(get_db_connection)):
+    """
+    Duración en días (promedio, p50, p90, máximo) de cada etapa procesal por
+    especialización o por lugar, para las etapas iniciadas entre desde y hasta.
+    El historial se lee en bloque y se cachea ANALITICA_TTL_SEG segundos.
+    """
+    from analitica_etapas import AGRUPACIONES
+    if agrupar not in AGRUPACIONES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"agrupar debe ser uno de: {', '.join(AGRUPACIONES)}"
+        )
+    if desde and hasta and hasta < desde:
+        raise HTTPException(status_code=400, detail="hasta no puede ser anterior a desde")
+    try:
+        return analitica().duraciones(connection, agrupar, desde, hasta)
+    except oracledb.Error as e:
+        raise error_bd(e, "Error al calcular duración de etapas")
+
+@app.get("/api/resumen/casos")
+async def obtener_resumen_casos(request: Request, agrupar: str = "especializacion,mes",
+                                codEspecializacion: Optional[str] = None, codCliente: Optional[str] = None,
+                                desde: Optional[date] = None, hasta: Optional[date] = None):
+    """
+    Casos abiertos, cerrados y suma de valor agrupados por cualquier
+    combinación de especializacion, cliente y mes. Se sirve desde la copia
+    en memoria de CASO_RESUMEN_MES (ver resumen_casos.py); solo cuando
+    vence RESUMEN_TTL_SEG se pasa por admisión y se toma una conexión.
+    Si la recarga falla se responde con la copia que ya estaba.
+    """
+    dimensiones = [d.strip() for d in agrupar.split(",") if d.strip()]
+    invalidas = [d for d in dimensiones if d not in resumen_casos.DIMENSIONES]
+    if not dimensiones or invalidas or len(set(dimensiones)) != len(dimensiones):
+        raise HTTPException(
+            status_code=400,
+            detail=f"agrupar debe combinar: {', '.join(resumen_casos.DIMENSIONES)}"
+        )
+    if cache_resumen.necesita_recarga():
+        try:
+            async with conexion_admitida(request) as connection:
+                await run_in_threadpool(cache_resumen.recargar, connection)
+        except oracledb.Error as e:
+            if not cache_resumen.cargado:
+                raise error_bd(e, "Error al consultar resumen de casos")
+        except HTTPException:
+            # Sin cupo o sin conexión: sirve la copia en memoria si la hay
+            if not cache_resumen.cargado:
+                raise
+    return await run_in_threadpool(
+        cache_resumen.consultar, dimensiones, codEspecializacion, codCliente, desde, hasta
+    )
 
 @app.get("/api/health")
 def health_check():
@@ -1118,6 +2545,165 @@ def health_check():
     """
     return {"status": "ok", "mensaje": "API de Gestión de Casos funcionando"}
 
+# ============================================================================
+# ENDPOINTS - ADMINISTRACIÓN
+# ============================================================================
+
+@app.get("/api/admin/conexiones")
+def estado_conexiones():
+    """
+    Estado de los pools de conexiones y del enrutamiento a la réplica.
+    """
+    return enrutador.estado()
+
+@app.get("/api/admin/admision")
+def metricas_admision():
+    """
+    Cupos activos, profundidad de cola y rechazos por clase de ruta.
+    """
+    return control_admision.metricas()
+
+@app.get("/api/admin/arranque")
+def estado_de_arranque():
+    """
+    Modo del driver y resultado de la precarga de estructuras en memoria.
+    """
+    return estado_arranque
+
+@app.get("/api/admin/catalogo")
+def estado_catalogo():
+    """
+    Versión, tamaño y filas de la instantánea de catálogos compartida.
+    """
+    if catalogo is None:
+        return {"disponible": False, "archivo": None}
+    catalogo.instantanea()
+    return catalogo.estado()
+
+@app.post("/api/admin/catalogo/reconstruir")
+def reconstruir_catalogo_ahora(connection = Depends(get_db_connection)):
+    """
+    Reconstruye la instantánea de catálogos (p. ej. después de modificar
+    lugares o abogados directamente en la base).
+    """
+    if catalogo is None:
+        raise HTTPException(status_code=400, detail="El catálogo compartido está desactivado (CATALOGO_ARCHIVO vacío)")
+    try:
+        filas = catalogo.reconstruir(connection, forzar=True)
+    except oracledb.Error as e:
+        raise error_bd(e, "Error al reconstruir el catálogo")
+    if filas is None:
+        raise HTTPException(status_code=409, detail="Otro proceso está reconstruyendo el catálogo")
+    return {"success": True, "version": catalogo.instantanea().version, "filas": filas}
+
+@app.get("/api/admin/cache-clientes")
+def estado_cache_clientes():
+    """
+    Aciertos, fallos y entradas de la caché de clientes por documento.
+    """
+    return cache_clientes.estado()
+
+@app.delete("/api/admin/cache-clientes")
+def invalidar_cache_clientes(documento: Optional[str] = None):
+    """
+    Descarta un documento de la caché de clientes (o todos) en todos los
+    workers, p. ej. después de modificar clientes directamente en la base.
+    """
+    difundida = invalidar_clientes(documento)
+    return {"success": True, "mensaje": "Caché de clientes invalidada", "todosLosWorkers": difundida}
+
+@app.get("/api/admin/idempotencia")
+def estado_idempotencia():
+    """
+    Claves de idempotencia recordadas, repeticiones servidas y conflictos.
+    """
+    return almacen_idempotencia.estado()
+
+@app.get("/api/admin/escritura-diferida")
+def estado_escritura_diferida():
+    """
+    Cola de escritura diferida: bytes pendientes, fsync agrupados, lotes
+    aplicados, entradas rechazadas y último error del drenador.
+    """
+    if cola_diferida is None:
+        return {"habilitada": False}
+    return {"habilitada": True, **cola_diferida.estado()}
+
+def exigir_token_perfilado(x_perfilar: Optional[str] = Header(None)):
+    """
+    Los perfiles muestran rutas, parámetros y código del servidor: se
+    consultan con el mismo token X-Perfilar que los pide.
+    """
+    if not perfilador.token_valido(x_perfilar):
+        raise HTTPException(status_code=403, detail="Se requiere la cabecera X-Perfilar con el token de perfilado")
+
+@app.get("/api/admin/perfiles", dependencies=[Depends(exigir_token_perfilado)])
+def estado_perfilado():
+    """
+    Perfiles guardados (más recientes primero) y cuántas solicitudes se
+    perfilaron bajo demanda y por muestreo.
+    """
+    return perfilador.estado()
+
+@app.get("/api/admin/perfiles/{nombre}", dependencies=[Depends(exigir_token_perfilado)])
+def descargar_perfil(nombre: str):
+    """
+    Un perfil en formato collapsed (flamegraph.pl, speedscope).
+    """
+    ruta = perfilador.ruta_archivo(nombre)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(ruta, media_type="text/plain; charset=utf-8")
+
+@app.get("/api/admin/trazas")
+def estado_trazas():
+    """
+    Solicitudes trazadas (por muestreo o por traceparent) y spans
+    exportados, en cola o descartados por cada exportador.
+    """
+    return trazador.estado()
+
+@app.get("/api/admin/compresion")
+def estado_compresion():
+    """
+    Algoritmos disponibles, bytes ahorrados y tiempo de CPU de compresión.
+    """
+    disponibles = algoritmos_disponibles(COMPRESION_ALGORITMOS)
+    return {
+        "disponibles": disponibles,
+        "minimoBytes": COMPRESION_MINIMO_BYTES,
+        "niveles": {a: COMPRESION_NIVELES[a] for a in disponibles},
+        **metricas_compresion.resumen()
+    }
+
+@app.get("/api/admin/eventos")
+def estado_eventos():
+    """
+    Suscripciones SSE abiertas y eventos publicados y entregados.
+    """
+    return bus_eventos.estado()
+
+@app.get("/api/admin/consultas")
+def reporte_consultas(top: int = 10, orden: str = "totalMs"):
+    """
+    Sentencias SQL más costosas agregadas por texto normalizado.
+    orden: totalMs, maxMs, promedioMs, ejecuciones, lentas o filas.
+    """
+    if orden not in ("totalMs", "maxMs", "promedioMs", "ejecuciones", "lentas", "filas"):
+        raise HTTPException(status_code=400, detail=f"Orden no válido: {orden}")
+    return {
+        "umbralMs": registro_consultas.umbral_ms,
+        "sentencias": registro_consultas.top(top, orden)
+    }
+
+@app.delete("/api/admin/consultas")
+def reiniciar_consultas():
+    """
+    Reinicia las estadísticas agregadas de consultas.
+    """
+    registro_consultas.reiniciar()
+    return {"success": True, "mensaje": "Estadísticas de consultas reiniciadas"}
+
 # ============================================================================
 # ENDPOINT RAÍZ
 # ============================================================================
@@ -1133,5 +2719,6 @@ def root():
     }
 
 if __name__ == "__main__":
+    # Desarrollo: un solo proceso. En producción usar servidor.py (varios workers)
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,250 @@
+"""
+Libro de Pagos
+Ingreso por lotes, consultas por rango y totales acumulados de PAGO
+
+- Los consecutivos salen de la secuencia PAGO_SEQ, reservados en bloque
+  para todo el lote (CONSECPAGO se amplió a NUMBER(12)).
+- Cada lote se inserta con executemany (binds en arreglo) y en la misma
+  transacción se actualiza PAGO_RESUMEN_DIA por (fecha, forma, franquicia).
+- Los totales por forma de pago y franquicia se sirven desde memoria y se
+  incrementan con cada lote confirmado.
+- La conciliación de un mes compara PAGO_RESUMEN_DIA con PAGO usando solo
+  el índice PAGO_FECHA_IDX (fecha, forma, franquicia, valor), sin recorrer
+  la tabla completa.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Franquicia registrada en el resumen para pagos sin tarjeta
+SIN_FRANQUICIA = "-"
+
+MERGE_RESUMEN = """
+    MERGE INTO Pago_Resumen_Dia r
+    USING (
+        SELECT :fechaPago AS fechaPago, :idFormaPago AS idFormaPago, :codFranquicia AS codFranquicia,
+               :nPagos AS nPagos, :totalPago AS totalPago
+        FROM dual
+    ) d
+    ON (r.fechaPago = d.fechaPago AND r.idFormaPago = d.idFormaPago AND r.codFranquicia = d.codFranquicia)
+    WHEN MATCHED THEN UPDATE SET
+        r.nPagos = r.nPagos + d.nPagos,
+        r.totalPago = r.totalPago + d.totalPago
+    WHEN NOT MATCHED THEN INSERT (fechaPago, idFormaPago, codFranquicia, nPagos, totalPago)
+        VALUES (d.fechaPago, d.idFormaPago, d.codFranquicia, d.nPagos, d.totalPago)
+"""
+
+
+def reservar_consecutivos(cursor, cantidad: int) -> List[int]:
+    """Reserva `cantidad` valores de PAGO_SEQ en una sola ida a la base."""
+    cursor.execute(
+        "SELECT PAGO_SEQ.NEXTVAL FROM dual CONNECT BY LEVEL <= :cantidad",
+        {"cantidad": cantidad}
+    )
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def ingresar_lote(cursor, pagos: List[dict]) -> Tuple[List[int], Dict[tuple, list]]:
+    """
+    Inserta el lote y actualiza el resumen diario dentro de la transacción
+    actual (el llamador hace commit). Retorna los consecutivos asignados y
+    los deltas {(fecha, forma, franquicia): [pagos, total]}.
+    """
+    consecutivos = reservar_consecutivos(cursor, len(pagos))
+    filas = []
+    deltas: Dict[tuple, list] = defaultdict(lambda: [0, 0])
+    for consec, pago in zip(consecutivos, pagos):
+        filas.append((
+            consec, pago["idFormaPago"], pago["codFranquicia"],
+            pago["fechaPago"], pago["valorPago"], pago["nTarjeta"],
+        ))
+        delta = deltas[(pago["fechaPago"], pago["idFormaPago"], pago["codFranquicia"] or SIN_FRANQUICIA)]
+        delta[0] += 1
+        delta[1] += pago["valorPago"]
+
+    cursor.executemany("""
+        INSERT INTO Pago (consecPago, idFormaPago, codFranquicia, fechaPago, valorPago, nTarjeta)
+        VALUES (:1, :2, :3, :4, :5, :6)
+    """, filas)
+    filas_resumen = [
+        {"fechaPago": fecha, "idFormaPago": forma, "codFranquicia": franquicia, "nPagos": n, "totalPago": total}
+        for (fecha, forma, franquicia), (n, total) in deltas.items()
+    ]
+    # Otro lote puede insertar la misma (fecha, forma, franquicia) entre la
+    # búsqueda y el INSERT del MERGE (ORA-00001). Con batcherrors solo esas
+    # filas fallan; se reintentan una vez, ya por WHEN MATCHED, y sin
+    # batcherrors para que un error persistente se propague al llamador.
+    cursor.executemany(MERGE_RESUMEN, filas_resumen, batcherrors=True)
+    fallidas = [filas_resumen[error.offset] for error in cursor.getbatcherrors()]
+    if fallidas:
+        cursor.executemany(MERGE_RESUMEN, fallidas)
+    return consecutivos, dict(deltas)
+
+
+def consultar(cursor, desde: date, hasta: date, id_forma_pago: Optional[str],
+              limite: int, offset: int) -> List[tuple]:
+    """Pagos entre desde y hasta (inclusivos), opcionalmente de una forma de pago."""
+    cursor.execute("""
+        SELECT p.consecPago, p.fechaPago, p.idFormaPago, f.descFormaPago,
+               p.codFranquicia, fr.nomFranquicia, p.valorPago
+        FROM Pago p
+        INNER JOIN FormaPago f ON f.idFormaPago = p.idFormaPago
+        LEFT JOIN Franquicia fr ON fr.codFranquicia = p.codFranquicia
+        WHERE p.fechaPago >= :desde
+        AND p.fechaPago < :antesDe
+        AND (:idFormaPago IS NULL OR p.idFormaPago = :idFormaPago)
+        ORDER BY p.fechaPago, p.consecPago
+        OFFSET :offset ROWS FETCH NEXT :limite ROWS ONLY
+    """, {
+        "desde": desde,
+        "antesDe": hasta + timedelta(days=1),
+        "idFormaPago": id_forma_pago,
+        "offset": offset,
+        "limite": limite,
+    })
+    return cursor.fetchall()
+
+
+def conciliar(cursor, mes: date) -> List[dict]:
+    """
+    Diferencias del mes entre PAGO_RESUMEN_DIA y PAGO por día, forma y
+    franquicia. Lista vacía = el resumen cuadra con el detalle.
+    """
+    inicio = date(mes.year, mes.month, 1)
+    fin = date(mes.year + (mes.month == 12), mes.month % 12 + 1, 1)
+    cursor.execute("""
+        SELECT NVL(d.fechaPago, r.fechaPago), NVL(d.idFormaPago, r.idFormaPago),
+               NVL(d.codFranquicia, r.codFranquicia),
+               NVL(r.nPagos, 0), NVL(d.nPagos, 0), NVL(r.totalPago, 0), NVL(d.totalPago, 0)
+        FROM (
+            SELECT TRUNC(fechaPago) AS fechaPago, idFormaPago,
+                   NVL(codFranquicia, :sinFranquicia) AS codFranquicia,
+                   COUNT(*) AS nPagos, SUM(valorPago) AS totalPago
+            FROM Pago
+            WHERE fechaPago >= :inicio AND fechaPago < :fin
+            GROUP BY TRUNC(fechaPago), idFormaPago, NVL(codFranquicia, :sinFranquicia)
+        ) d
+        FULL OUTER JOIN (
+            SELECT fechaPago, idFormaPago, codFranquicia, nPagos, totalPago
+            FROM Pago_Resumen_Dia
+            WHERE fechaPago >= :inicio AND fechaPago < :fin
+        ) r ON r.fechaPago = d.fechaPago
+           AND r.idFormaPago = d.idFormaPago
+           AND r.codFranquicia = d.codFranquicia
+        WHERE NVL(r.nPagos, 0) <> NVL(d.nPagos, 0)
+        OR NVL(r.totalPago, 0) <> NVL(d.totalPago, 0)
+        ORDER BY 1, 2, 3
+    """, {"inicio": inicio, "fin": fin, "sinFranquicia": SIN_FRANQUICIA})
+    return [
+        {
+            "fechaPago": str(fila[0]),
+            "idFormaPago": fila[1],
+            "codFranquicia": fila[2],
+            "pagosResumen": fila[3],
+            "pagosDetalle": fila[4],
+            "totalResumen": fila[5],
+            "totalDetalle": fila[6],
+        }
+        for fila in cursor.fetchall()
+    ]
+
+
+class TotalesPago:
+    """
+    Totales acumulados por (forma de pago, franquicia) en memoria.
+    Se cargan agregando PAGO_RESUMEN_DIA, se recargan al vencer el ttl
+    y reciben los deltas de cada lote confirmado en este proceso.
+
+    Igual que CacheResumen (resumen_casos.py): la recarga consulta sin el
+    lock de los datos, y confirmar() hace COMMIT y aplica bajo el lock que
+    la recarga toma al abrir su consulta, así cada lote se cuenta una vez.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._totales: Optional[Dict[tuple, list]] = None
+        self._pendientes: Optional[List[Dict[tuple, list]]] = None
+        self._cargado_en = 0.0
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+        self._lock_confirmacion = threading.Lock()
+
+    @property
+    def cargado(self) -> bool:
+        return self._totales is not None
+
+    @staticmethod
+    def _sumar(totales: Dict[tuple, list], deltas: Dict[tuple, list]):
+        for (_fecha, forma, franquicia), (n, total) in deltas.items():
+            acumulado = totales.setdefault((forma, franquicia), [0, 0])
+            acumulado[0] += n
+            acumulado[1] += total
+
+    def cargar(self, connection):
+        """Carga (o recarga) la copia en memoria."""
+        cursor = connection.cursor()
+        try:
+            with self._lock_confirmacion:
+                # La lectura de Oracle queda fija al abrir la consulta
+                cursor.execute("""
+                    SELECT idFormaPago, codFranquicia, SUM(nPagos), SUM(totalPago)
+                    FROM Pago_Resumen_Dia
+                    GROUP BY idFormaPago, codFranquicia
+                """)
+                with self._lock:
+                    self._pendientes = []
+            totales = {(fila[0], fila[1]): [fila[2], fila[3]] for fila in cursor.fetchall()}
+        except BaseException:
+            with self._lock:
+                self._pendientes = None
+            raise
+        finally:
+            cursor.close()
+        with self._lock:
+            for deltas in self._pendientes:
+                self._sumar(totales, deltas)
+            self._totales, self._pendientes = totales, None
+            self._cargado_en = time.monotonic()
+
+    def necesita_recarga(self) -> bool:
+        """Indica si recargar() leería la base; falso si otro hilo ya está leyendo."""
+        if self._totales is None:
+            return True
+        return time.monotonic() - self._cargado_en >= self.ttl and not self._lock_carga.locked()
+
+    def recargar(self, connection):
+        """Recarga los totales si venció el ttl; un solo hilo lee a la vez."""
+        if self._totales is not None and time.monotonic() - self._cargado_en < self.ttl:
+            return
+        if not self._lock_carga.acquire(blocking=self._totales is None):
+            return
+        try:
+            if self._totales is None or time.monotonic() - self._cargado_en >= self.ttl:
+                self.cargar(connection)
+        finally:
+            self._lock_carga.release()
+
+    def confirmar(self, connection, deltas: Dict[tuple, list]):
+        """Confirma la transacción del lote y suma sus deltas en memoria."""
+        with self._lock_confirmacion:
+            connection.commit()
+            with self._lock:
+                if self._totales is not None:
+                    self._sumar(self._totales, deltas)
+                if self._pendientes is not None:
+                    self._pendientes.append(deltas)
+
+    def consultar(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "idFormaPago": forma,
+                    "codFranquicia": None if franquicia == SIN_FRANQUICIA else franquicia,
+                    "nPagos": n,
+                    "totalPago": total,
+                }
+                for (forma, franquicia), (n, total) in sorted((self._totales or {}).items())
+            ]
@@ -0,0 +1,361 @@
+"""
+Perfilado de Solicitudes
+Perfil por muestreo de pilas de una solicitud, en formato "collapsed" para flamegraphs
+
+- Bajo demanda: la cabecera `X-Perfilar: <token>` perfila esa solicitud y
+  guarda el perfil en `directorio`; la respuesta trae el nombre del archivo
+  en `X-Perfil`. Sin token configurado no se puede pedir; con un token
+  distinto responde 403. El token va solo en la cabecera (no en la URL,
+  que queda en los logs de acceso) y es el mismo que protege la consulta
+  de los perfiles guardados.
+- Continuo: una fracción `muestreo` de las solicitudes se perfila y se suma
+  a un archivo por hora y por worker (continuo-AAAAMMDDHH-<pid>.txt), con el
+  endpoint como raíz de cada pila.
+
+Un hilo muestreador lee las pilas de todos los hilos cada `intervalo_ms`
+(sys._current_frames) y cuenta solo las de la solicitud perfilada: en el
+event loop, cuando la tarea que corre es la de la solicitud (validación,
+middleware, codificación JSON); en el threadpool, cuando el hilo ejecuta
+código de la solicitud (endpoints síncronos, llamadas al driver). Si en una
+muestra la solicitud no está corriendo en ningún hilo se cuenta como
+"(espera)" (admisión, I/O). El costo para las demás solicitudes es solo el
+del hilo muestreador mientras haya un perfil activo.
+
+Cada línea del archivo es "marco;marco;...;marco cantidad" (raíz primero);
+se visualiza con flamegraph.pl o speedscope. Los archivos se escriben en el
+threadpool, fuera del event loop.
+"""
+
+import asyncio
+import contextvars
+import hmac
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from anyio._backends._asyncio import WorkerThread
+    _CODIGO_HILO = WorkerThread.run.__code__
+except (ImportError, AttributeError):  # Otra versión de anyio: solo se perfila el event loop
+    _CODIGO_HILO = None
+_CODIGO_BUCLE = asyncio.events.Handle._run.__code__
+_ARCHIVO_COLA = queue.Queue.get.__code__.co_filename
+
+_perfil_actual: contextvars.ContextVar[Optional["Perfil"]] = contextvars.ContextVar("perfil_actual", default=None)
+
+_RE_NOMBRE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# Rutas de consulta de perfiles: exigen el token pero no se perfilan
+RUTA_PERFILES = "/api/admin/perfiles"
+
+
+class Perfil:
+    """Muestras de una solicitud: pila (tupla de marcos, raíz primero) -> cantidad."""
+
+    def __init__(self, metodo: str, ruta: str, bajo_demanda: bool):
+        self.id = uuid.uuid4().hex[:8]
+        self.metodo = metodo
+        self.ruta = ruta
+        self.bajo_demanda = bajo_demanda
+        self.fecha = datetime.now()
+        self.inicio = time.perf_counter()
+        self.fin: Optional[float] = None
+        self.muestras: Counter = Counter()
+        self.loop = asyncio.get_running_loop()
+        self.tarea = asyncio.current_task()
+        self.hilo_bucle = threading.get_ident()
+        self.nombre: Optional[str] = None
+
+    def raiz(self, scope: Scope) -> str:
+        endpoint = getattr(scope.get("endpoint"), "__name__", None)
+        return f"{self.metodo} {endpoint or self.ruta}"
+
+
+class _Muestreador:
+    """Hilo que toma las muestras de los perfiles activos (uno por proceso)."""
+
+    def __init__(self, intervalo: float):
+        self.intervalo = intervalo
+        self._activos: List[Perfil] = []
+        self._cond = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self._etiquetas: Dict[object, str] = {}
+
+    def agregar(self, perfil: Perfil):
+        with self._cond:
+            self._activos.append(perfil)
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name="perfilado", daemon=True)
+                self._hilo.start()
+            self._cond.notify()
+
+    def quitar(self, perfil: Perfil):
+        with self._cond:
+            self._activos.remove(perfil)
+
+    def _ejecutar(self):
+        propio = threading.get_ident()
+        while True:
+            with self._cond:
+                while not self._activos:
+                    self._cond.wait()
+                activos = list(self._activos)
+            self._muestrear(activos, propio)
+            time.sleep(self.intervalo)
+
+    def _muestrear(self, activos: List[Perfil], propio: int):
+        en_bucle = {p.hilo_bucle: p for p in activos if asyncio.tasks._current_tasks.get(p.loop) is p.tarea}
+        muestreados = set()
+        for hilo, marco in sys._current_frames().items():
+            if hilo == propio:
+                continue
+            perfil = en_bucle.get(hilo)
+            corte = _CODIGO_BUCLE
+            if perfil is None:
+                perfil = self._perfil_del_hilo(marco)
+                corte = _CODIGO_HILO
+                if perfil is None or perfil not in activos:
+                    continue
+            perfil.muestras[self._pila(marco, corte)] += 1
+            muestreados.add(perfil.id)
+        for perfil in activos:
+            if perfil.id not in muestreados:
+                perfil.muestras[("(espera)",)] += 1
+
+    @staticmethod
+    def _perfil_del_hilo(marco) -> Optional[Perfil]:
+        """Perfil de la solicitud que ejecuta un hilo del threadpool (su contexto copiado)."""
+        if _CODIGO_HILO is None:
+            return None
+        llamado = None
+        while marco is not None:
+            if marco.f_code is _CODIGO_HILO:
+                # Un hilo libre espera en queue.get() con el contexto de su último trabajo
+                if llamado is None or llamado.f_code.co_filename == _ARCHIVO_COLA:
+                    return None
+                contexto = marco.f_locals.get("context")
+                return contexto.get(_perfil_actual) if isinstance(contexto, contextvars.Context) else None
+            llamado, marco = marco, marco.f_back
+        return None
+
+    def _pila(self, marco, corte) -> tuple:
+        """Marcos desde el corte (Handle._run o WorkerThread.run) hasta la hoja."""
+        marcos = []
+        while marco is not None and marco.f_code is not corte:
+            marcos.append(self._etiqueta(marco.f_code))
+            marco = marco.f_back
+        marcos.reverse()
+        return tuple(marcos)
+
+    def _etiqueta(self, codigo) -> str:
+        etiqueta = self._etiquetas.get(codigo)
+        if etiqueta is None:
+            archivo = codigo.co_filename.replace("\\", "/")
+            archivo = archivo.split("site-packages/")[-1] if "site-packages/" in archivo else os.path.basename(archivo)
+            etiqueta = f"{archivo}:{codigo.co_qualname}".replace(";", ",").replace(" ", "_")
+            self._etiquetas[codigo] = etiqueta
+        return etiqueta
+
+
+def _lineas(muestras: Counter, raiz: Optional[str] = None) -> List[str]:
+    prefijo = (raiz.replace(";", ",").replace(" ", "_"),) if raiz else ()
+    return [f"{';'.join(prefijo + pila)} {n}" for pila, n in muestras.most_common()]
+
+
+class Perfilador:
+    """Configuración, almacenamiento y métricas del perfilado."""
+
+    def __init__(self, directorio: str = "perfiles", token: str = "", muestreo: float = 0.0,
+                 intervalo_ms: float = 2.0, max_archivos: int = 200, escribir_cada: float = 60.0):
+        self.directorio = directorio
+        self.token = token
+        self.muestreo = muestreo
+        self.max_archivos = max_archivos
+        self.escribir_cada = escribir_cada
+        self.muestreador = _Muestreador(intervalo_ms / 1000)
+        self._lock = threading.Lock()
+        self._continuo: Counter = Counter()
+        self._hora_continuo: Optional[str] = None
+        self._escrito_continuo = time.monotonic()
+        self.bajo_demanda = 0
+        self.muestreadas = 0
+        self.rechazadas = 0
+        self.muestras = 0
+
+    def decidir(self, scope: Scope) -> Optional[bool]:
+        """
+        True: perfil bajo demanda; False: perfil del muestreo continuo;
+        None: sin perfil. Lanza PermissionError si el token no coincide.
+        """
+        pedido = Headers(scope=scope).get("x-perfilar")
+        if pedido is not None and self.token:
+            if not self.token_valido(pedido):
+                self.rechazadas += 1
+                raise PermissionError("Token de perfilado inválido")
+            return None if scope["path"].startswith(RUTA_PERFILES) else True
+        if self.muestreo and random.random() < self.muestreo:
+            return False
+        return None
+
+    def token_valido(self, pedido: Optional[str]) -> bool:
+        """Indica si `pedido` es el token configurado (False si no hay token)."""
+        if not self.token or pedido is None:
+            return False
+        return hmac.compare_digest(pedido.encode(), self.token.encode())
+
+    def iniciar(self, perfil: Perfil):
+        self.muestreador.agregar(perfil)
+
+    def nombrar(self, perfil: Perfil, scope: Scope) -> str:
+        if perfil.nombre is None:
+            raiz = _RE_NOMBRE.sub("_", perfil.raiz(scope))
+            perfil.nombre = f"{perfil.fecha:%Y%m%d-%H%M%S}_{raiz}_{perfil.id}.txt"
+        return perfil.nombre
+
+    def terminar(self, perfil: Perfil, scope: Scope):
+        """
+        Guarda el perfil (bajo demanda) o lo suma al archivo continuo. Escribe
+        archivos: se llama desde el threadpool, no desde el event loop.
+        """
+        total = sum(perfil.muestras.values())
+        with self._lock:
+            self.muestras += total
+            if perfil.bajo_demanda:
+                self.bajo_demanda += 1
+            else:
+                self.muestreadas += 1
+        if perfil.bajo_demanda:
+            ms = ((perfil.fin or time.perf_counter()) - perfil.inicio) * 1000
+            encabezado = (f"# {perfil.metodo} {perfil.ruta} {ms:.1f} ms, {total} muestras "
+                          f"cada {self.muestreador.intervalo * 1000:g} ms, {perfil.fecha:%Y-%m-%d %H:%M:%S}")
+            self._escribir(self.nombrar(perfil, scope), [encabezado] + _lineas(perfil.muestras, perfil.raiz(scope)))
+            self._podar()
+            return
+        raiz = perfil.raiz(scope)
+        with self._lock:
+            hora = f"{perfil.fecha:%Y%m%d%H}"
+            if self._hora_continuo != hora:
+                self._escribir_continuo()
+                self._continuo, self._hora_continuo = Counter(), hora
+            for pila, n in perfil.muestras.items():
+                self._continuo[(raiz,) + pila] += n
+            if time.monotonic() - self._escrito_continuo >= self.escribir_cada:
+                self._escribir_continuo()
+
+    def _escribir_continuo(self):
+        """Reescribe el archivo continuo de la hora en curso (con self._lock tomado)."""
+        self._escrito_continuo = time.monotonic()
+        if self._continuo:
+            self._escribir(f"continuo-{self._hora_continuo}-{os.getpid()}.txt", _lineas(self._continuo))
+
+    def _escribir(self, nombre: str, lineas: List[str]):
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = os.path.join(self.directorio, f".{nombre}.tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write("\n".join(lineas) + "\n")
+        os.replace(temporal, os.path.join(self.directorio, nombre))
+
+    def _podar(self):
+        """Borra los perfiles bajo demanda más antiguos por sobre max_archivos."""
+        archivos = sorted(
+            (e for e in os.scandir(self.directorio) if e.is_file() and not e.name.startswith((".", "continuo-"))),
+            key=lambda e: e.stat().st_mtime,
+        )
+        for entrada in archivos[:max(0, len(archivos) - self.max_archivos)]:
+            try:
+                os.unlink(entrada.path)
+            except OSError:
+                pass
+
+    def cerrar(self):
+        with self._lock:
+            self._escribir_continuo()
+
+    def ruta_archivo(self, nombre: str) -> Optional[str]:
+        """Ruta de un perfil guardado, o None si el nombre no es válido o no existe."""
+        if os.path.basename(nombre) != nombre or nombre.startswith("."):
+            return None
+        ruta = os.path.join(self.directorio, nombre)
+        return ruta if os.path.isfile(ruta) else None
+
+    def archivos(self, cantidad: int = 50) -> List[dict]:
+        try:
+            entradas = [e for e in os.scandir(self.directorio) if e.is_file() and not e.name.startswith(".")]
+        except FileNotFoundError:
+            return []
+        entradas.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        return [
+            {"nombre": e.name, "bytes": e.stat().st_size,
+             "fecha": datetime.fromtimestamp(e.stat().st_mtime).isoformat(timespec="seconds")}
+            for e in entradas[:cantidad]
+        ]
+
+    def estado(self) -> dict:
+        return {
+            "directorio": self.directorio,
+            "bajoDemandaHabilitado": bool(self.token),
+            "muestreo": self.muestreo,
+            "intervaloMs": self.muestreador.intervalo * 1000,
+            "bajoDemanda": self.bajo_demanda,
+            "muestreadas": self.muestreadas,
+            "tokenInvalido": self.rechazadas,
+            "muestras": self.muestras,
+            "archivos": self.archivos(),
+        }
+
+
+class PerfiladoMiddleware:
+    """
+    Perfila las solicitudes elegidas por el Perfilador. Debe ser el
+    middleware más externo para incluir la codificación y la compresión.
+    """
+
+    def __init__(self, app: ASGIApp, perfilador: Perfilador):
+        self.app = app
+        self.perfilador = perfilador
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            bajo_demanda = self.perfilador.decidir(scope)
+        except PermissionError as e:
+            await JSONResponse({"detail": str(e)}, status_code=403)(scope, receive, send)
+            return
+        if bajo_demanda is None:
+            await self.app(scope, receive, send)
+            return
+
+        perfil = Perfil(scope["method"], scope["path"], bajo_demanda)
+
+        async def enviar(mensaje: Message):
+            if bajo_demanda and mensaje["type"] == "http.response.start":
+                MutableHeaders(raw=mensaje["headers"])["x-perfil"] = self.perfilador.nombrar(perfil, scope)
+            await send(mensaje)
+
+        marca = _perfil_actual.set(perfil)
+        self.perfilador.iniciar(perfil)
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _perfil_actual.reset(marca)
+            perfil.fin = time.perf_counter()
+            self.perfilador.muestreador.quitar(perfil)
+            # Protegido: si la solicitud se cancela el perfil igual se guarda
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self.perfilador.terminar, perfil, scope)
@@ -0,0 +1,346 @@
+"""
+Regresión de Planes de Ejecución y Asesor de Índices
+Sistema de Gestión de Casos y Expedientes
+
+Extrae las sentencias SQL que emite la API (literales SQL de los módulos
+del backend), ejecuta EXPLAIN PLAN para cada una y señala los accesos
+FULL y los SORT sobre tablas grandes, proponiendo índices compuestos.
+Los planes se guardan como línea base, identificados por la huella del
+texto SQL (no por su posición en el código); una verificación posterior
+falla si alguna sentencia regresa a un acceso completo o a un ordenamiento.
+Las sentencias armadas en tiempo de ejecución (f-strings, concatenación)
+no se pueden explicar y se informan como no verificables.
+
+Uso (desde src/backend):
+    python planes_consultas.py                 # Reporte y sugerencias
+    python planes_consultas.py --guardar       # Guardar línea base
+    python planes_consultas.py --verificar     # Comparar contra línea base (exit 1 si hay regresión)
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import oracledb
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.abspath(__file__))
+ARCHIVO_BASELINE = os.path.join(DIRECTORIO_BACKEND, "..", "db", "planes_baseline.json")
+
+# Tablas de catálogo pequeñas donde un acceso FULL es aceptable
+TABLAS_CATALOGO = {
+    "ESPECIALIZACION", "ETAPAPROCESAL", "IMPUGNACION", "INSTANCIA",
+    "TIPOCONTACT", "TIPODOCUMENTO", "TIPOLUGAR", "FORMAPAGO", "FRANQUICIA",
+}
+
+_RE_SQL = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|MERGE|WITH)\b", re.I)
+_RE_PREDICADO = re.compile(r'"(\w+)"\s*(=|IS NULL|IS NOT NULL|LIKE|>=|<=|>|<)', re.I)
+_RE_ORDER_BY = re.compile(r"\bORDER\s+BY\s+(.+?)(?:\bOFFSET\b|\bFETCH\b|$)", re.I | re.S)
+
+
+# ============================================================================
+# EXTRACCIÓN DE SENTENCIAS
+# ============================================================================
+
+def _es_sql(nodo: ast.AST) -> bool:
+    return isinstance(nodo, ast.Constant) and isinstance(nodo.value, str) and bool(_RE_SQL.match(nodo.value))
+
+
+def _es_sql_dinamico(nodo: ast.AST) -> bool:
+    """f-string o concatenación cuya primera parte literal es SQL."""
+    if isinstance(nodo, ast.JoinedStr):
+        return bool(nodo.values) and _es_sql(nodo.values[0])
+    if isinstance(nodo, ast.BinOp) and isinstance(nodo.op, (ast.Add, ast.Mod)):
+        return _es_sql(nodo.left) or _es_sql_dinamico(nodo.left)
+    return False
+
+
+def _nodos_propios(funcion: ast.AST):
+    """Nodos de la función sin entrar en las funciones anidadas (se recorren aparte)."""
+    pendientes = list(ast.iter_child_nodes(funcion))
+    while pendientes:
+        nodo = pendientes.pop()
+        if isinstance(nodo, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        yield nodo
+        pendientes.extend(ast.iter_child_nodes(nodo))
+
+
+def extraer_sentencias(directorio: str = DIRECTORIO_BACKEND) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    Retorna ({huella: {"sql", "ubicaciones"}}, no_verificables).
+    Una sentencia repetida en varias funciones tiene una sola entrada con
+    todas sus ubicaciones ("modulo.funcion:linea"). `no_verificables` son
+    las ubicaciones de SQL armado con f-strings o concatenación.
+    """
+    sentencias: Dict[str, dict] = {}
+    no_verificables: List[str] = []
+    for archivo in sorted(os.listdir(directorio)):
+        if not archivo.endswith(".py") or archivo == os.path.basename(__file__):
+            continue
+        ruta = os.path.join(directorio, archivo)
+        with open(ruta, encoding="utf-8") as f:
+            arbol = ast.parse(f.read(), filename=ruta)
+        modulo = archivo[:-3]
+        for funcion in ast.walk(arbol):
+            if not isinstance(funcion, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            # Partes literales de SQL dinámico: no son sentencias completas
+            nodos = list(_nodos_propios(funcion))
+            partes = set()
+            for nodo in nodos:
+                if _es_sql_dinamico(nodo):
+                    no_verificables.append(f"{modulo}.{funcion.name}:{nodo.lineno}")
+                    partes.update(id(hijo) for hijo in ast.walk(nodo))
+            for nodo in nodos:
+                if not _es_sql(nodo) or id(nodo) in partes:
+                    continue
+                sql = " ".join(nodo.value.split())
+                entrada = sentencias.setdefault(huella(sql), {"sql": sql, "ubicaciones": []})
+                ubicacion = f"{modulo}.{funcion.name}:{nodo.lineno}"
+                if ubicacion not in entrada["ubicaciones"]:
+                    entrada["ubicaciones"].append(ubicacion)
+    return sentencias, sorted(set(no_verificables))
+
+
+def huella(sql: str) -> str:
+    """Identificador estable de una sentencia: no cambia si se mueve en el código."""
+    return hashlib.sha1(" ".join(sql.split()).encode("utf-8")).hexdigest()[:12]
+
+
+# ============================================================================
+# EXPLAIN PLAN
+# ============================================================================
+
+def explicar(connection, sql: str) -> List[dict]:
+    """Ejecuta EXPLAIN PLAN y retorna las operaciones del plan."""
+    statement_id = huella(sql)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM plan_table WHERE statement_id = :id", {"id": statement_id})
+        cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}")
+        cursor.execute("""
+            SELECT id, operation, options, object_name, cost, cardinality,
+                   access_predicates, filter_predicates
+            FROM plan_table
+            WHERE statement_id = :id
+            ORDER BY id
+        """, {"id": statement_id})
+        columnas = ["id", "operacion", "opciones", "objeto", "costo", "filas", "acceso", "filtro"]
+        plan = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+        cursor.execute("DELETE FROM plan_table WHERE statement_id = :id", {"id": statement_id})
+        connection.commit()
+        return plan
+    finally:
+        cursor.close()
+
+
+def hallazgos(plan: List[dict], umbral_filas: int, umbral_costo: int) -> dict:
+    """Accesos FULL y ordenamientos relevantes dentro de un plan."""
+    completos, ordenamientos = [], []
+    for paso in plan:
+        filas = paso["filas"] or 0
+        costo = paso["costo"] or 0
+        if paso["operacion"] == "TABLE ACCESS" and paso["opciones"] == "FULL":
+            if paso["objeto"] not in TABLAS_CATALOGO and (filas >= umbral_filas or costo >= umbral_costo):
+                completos.append(paso["objeto"])
+        elif paso["operacion"] == "SORT" and paso["opciones"] in ("ORDER BY", "GROUP BY"):
+            if filas >= umbral_filas or costo >= umbral_costo:
+                ordenamientos.append(paso["opciones"])
+    return {"accesosCompletos": sorted(set(completos)), "ordenamientos": ordenamientos}
+
+
+# ============================================================================
+# ASESOR DE ÍNDICES
+# ============================================================================
+
+def indices_existentes(connection) -> Dict[str, List[List[str]]]:
+    """{TABLA: [[col1, col2, ...], ...]} de los índices del esquema."""
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT table_name, index_name, column_name
+        FROM user_ind_columns
+        ORDER BY table_name, index_name, column_position
+    """)
+    indices: Dict[str, Dict[str, List[str]]] = {}
+    for tabla, indice, columna in cursor.fetchall():
+        indices.setdefault(tabla, {}).setdefault(indice, []).append(columna)
+    cursor.close()
+    return {tabla: list(por_indice.values()) for tabla, por_indice in indices.items()}
+
+
+def columnas_order_by(sql: str) -> List[str]:
+    coincidencia = _RE_ORDER_BY.search(sql)
+    if not coincidencia:
+        return []
+    columnas = []
+    for parte in coincidencia.group(1).split(","):
+        nombre = parte.strip().split()[0] if parte.strip() else ""
+        nombre = nombre.split(".")[-1].upper()
+        if re.fullmatch(r"\w+", nombre):
+            columnas.append(nombre)
+    return columnas
+
+
+def sugerir_indice(tabla: str, plan: List[dict], sql: str,
+                   existentes: Dict[str, List[List[str]]]) -> Optional[str]:
+    """
+    Propone un índice compuesto para `tabla`: primero columnas con
+    igualdad, luego IS NULL / rangos y al final las del ORDER BY.
+    Retorna None si un índice existente ya cubre ese prefijo.
+    """
+    igualdad, otros = [], []
+    for paso in plan:
+        if paso["objeto"] != tabla:
+            continue
+        for texto in (paso["acceso"], paso["filtro"]):
+            for columna, operador in _RE_PREDICADO.findall(texto or ""):
+                destino = igualdad if operador == "=" else otros
+                if columna not in igualdad + otros:
+                    destino.append(columna)
+    if not igualdad and not otros:
+        return None
+    columnas = igualdad + otros
+    hay_sort = any(p["operacion"] == "SORT" and p["opciones"] == "ORDER BY" for p in plan)
+    if hay_sort:
+        columnas += [c for c in columnas_order_by(sql) if c not in columnas]
+
+    for indice in existentes.get(tabla, []):
+        if indice[:len(columnas)] == columnas:
+            return None
+    nombre = f"{tabla}_{'_'.join(c[:4] for c in columnas)}_IDX"[:30]
+    return f"CREATE INDEX {nombre} ON {tabla} ({', '.join(columnas)});"
+
+
+# ============================================================================
+# EJECUCIÓN
+# ============================================================================
+
+def analizar(connection, sentencias: Dict[str, dict], umbral_filas: int, umbral_costo: int) -> Dict[str, dict]:
+    """{huella: resultado} con el plan de cada sentencia."""
+    existentes = indices_existentes(connection)
+    resultados = {}
+    for clave, sentencia in sentencias.items():
+        sql = sentencia["sql"]
+        base = {"ubicaciones": sentencia["ubicaciones"], "sql": sql}
+        try:
+            plan = explicar(connection, sql)
+        except oracledb.Error as e:
+            resultados[clave] = {**base, "error": str(e)}
+            continue
+        encontrado = hallazgos(plan, umbral_filas, umbral_costo)
+        sugerencias = [
+            s for s in (sugerir_indice(t, plan, sql, existentes) for t in encontrado["accesosCompletos"]) if s
+        ]
+        resultados[clave] = {
+            **base,
+            "costo": plan[0]["costo"] if plan else None,
+            "operaciones": [
+                " ".join(filter(None, (p["operacion"], p["opciones"], p["objeto"]))) for p in plan
+            ],
+            **encontrado,
+            "sugerencias": sugerencias,
+        }
+    return resultados
+
+
+def _nombre(resultado: dict) -> str:
+    return ", ".join(resultado.get("ubicaciones", [])) or "?"
+
+
+def verificar(actual: Dict[str, dict], baseline: Dict[str, dict]) -> List[str]:
+    """
+    Regresiones: nuevos accesos FULL u ordenamientos respecto a la línea
+    base, y sentencias de la línea base que ahora no se pueden explicar.
+    """
+    regresiones = []
+    for clave, resultado in actual.items():
+        base = baseline.get(clave)
+        if base is None:
+            continue
+        if "error" in resultado:
+            if "error" not in base:
+                regresiones.append(f"{_nombre(resultado)}: EXPLAIN PLAN falla ({resultado['error']})")
+            continue
+        nuevos = set(resultado["accesosCompletos"]) - set(base.get("accesosCompletos", []))
+        if nuevos:
+            regresiones.append(f"{_nombre(resultado)}: nuevo acceso FULL en {', '.join(sorted(nuevos))}")
+        if len(resultado["ordenamientos"]) > len(base.get("ordenamientos", [])):
+            regresiones.append(f"{_nombre(resultado)}: nuevo SORT {', '.join(resultado['ordenamientos'])}")
+    return regresiones
+
+
+def imprimir_reporte(resultados: Dict[str, dict], no_verificables: List[str]):
+    for clave, r in resultados.items():
+        if "error" in r:
+            print(f"[ERROR] {clave} {_nombre(r)}: {r['error']}")
+            continue
+        marca = "!!" if r["accesosCompletos"] or r["ordenamientos"] else "ok"
+        print(f"[{marca}] {clave} {_nombre(r)} (costo {r['costo']})")
+        for tabla in r["accesosCompletos"]:
+            print(f"      acceso FULL: {tabla}")
+        for sort in r["ordenamientos"]:
+            print(f"      SORT {sort}")
+        for sugerencia in r["sugerencias"]:
+            print(f"      sugerido: {sugerencia}")
+    if no_verificables:
+        print(f"\nSQL dinámico no verificable (f-string o concatenación): {len(no_verificables)}")
+        for ubicacion in no_verificables:
+            print(f"  - {ubicacion}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regresión de planes de ejecución")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--guardar", action="store_true", help="Guardar los planes como línea base")
+    grupo.add_argument("--verificar", action="store_true", help="Fallar si hay regresiones")
+    parser.add_argument("--baseline", default=ARCHIVO_BASELINE)
+    parser.add_argument("--umbral-filas", type=int, default=1000,
+                        help="Filas estimadas a partir de las cuales se señala FULL/SORT")
+    parser.add_argument("--umbral-costo", type=int, default=100,
+                        help="Costo a partir del cual se señala FULL/SORT")
+    args = parser.parse_args()
+
+    connection = oracledb.connect(
+        user=os.getenv("DB_USER", "tu_usuario"),
+        password=os.getenv("DB_PASSWORD", "tu_contraseña"),
+        dsn=f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '1521')}/{os.getenv('DB_SERVICE', 'XE')}",
+    )
+    sentencias, no_verificables = extraer_sentencias()
+    try:
+        resultados = analizar(connection, sentencias, args.umbral_filas, args.umbral_costo)
+    finally:
+        connection.close()
+
+    imprimir_reporte(resultados, no_verificables)
+
+    if args.guardar:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"\nLínea base guardada en {args.baseline}")
+    elif args.verificar:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regresiones = verificar(resultados, baseline)
+        nuevas = sorted(set(resultados) - set(baseline))
+        if nuevas:
+            print("\nSentencias sin línea base (nuevas o modificadas):")
+            for clave in nuevas:
+                print(f"  - {clave} {_nombre(resultados[clave])}")
+        obsoletas = sorted(set(baseline) - set(resultados))
+        if obsoletas:
+            print(f"\nEntradas de la línea base que ya no están en el código: {len(obsoletas)}")
+        if regresiones:
+            print("\nREGRESIONES DE PLAN:")
+            for r in regresiones:
+                print(f"  - {r}")
+            sys.exit(1)
+        print("\nSin regresiones de plan.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Resumen de Casos
+Agregados de casos abiertos, cerrados y valor por especialización, cliente y mes
+
+CASO_RESUMEN_MES guarda por (especialización, cliente, mes) la cantidad de
+casos abiertos (mes de fechaInicio), cerrados (mes de fechaFin) y la suma
+de `valor`, que en CASO es VARCHAR2 y se interpreta una sola vez al
+escribir. crear_caso y actualizar_caso aplican deltas en la misma
+transacción; la reconstrucción completa corre como tarea programada para
+recoger cierres y cambios hechos fuera de la API. Los endpoints leen una
+copia en memoria de la tabla, que es pequeña comparada con CASO.
+
+Uso (desde src/backend):
+    python resumen_casos.py --reconstruir
+"""
+
+import argparse
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import oracledb
+
+DIMENSIONES = {
+    "especializacion": 0,
+    "cliente": 1,
+    "mes": 2,
+}
+
+# Único formato aceptado: dígitos y, opcionalmente, punto y hasta dos decimales
+_RE_MONTO = re.compile(r"^\d+(?:\.\d{1,2})?$")
+
+
+def parsear_valor(texto) -> Optional[Decimal]:
+    """
+    Interpreta el VARCHAR2 `valor` de CASO como monto. El único formato
+    aceptado son dígitos sin separadores de miles, con punto decimal y a lo
+    sumo dos decimales ("1500000", "1500000.50"); se ignoran espacios al
+    inicio y al final. Cualquier otro texto ("1.500.000", "1,50", "$100")
+    retorna None y se cuenta como valor inválido.
+    """
+    if texto is None:
+        return None
+    limpio = str(texto).strip()
+    if not _RE_MONTO.match(limpio):
+        return None
+    return Decimal(limpio)
+
+
+def mes_de(fecha) -> Optional[date]:
+    """Primer día del mes de una fecha (o None)."""
+    if fecha is None:
+        return None
+    return date(fecha.year, fecha.month, 1)
+
+
+# ============================================================================
+# ESCRITURA
+# ============================================================================
+
+MERGE_DELTA = """
+    MERGE INTO Caso_Resumen_Mes r
+    USING (SELECT :codEsp AS codEspecializacion, :codCliente AS codCliente, :mes AS mes FROM dual) d
+    ON (r.codEspecializacion = d.codEspecializacion AND r.codCliente = d.codCliente AND r.mes = d.mes)
+    WHEN MATCHED THEN UPDATE SET
+        r.abiertos = r.abiertos + :abiertos,
+        r.cerrados = r.cerrados + :cerrados,
+        r.valorTotal = r.valorTotal + :valor
+    WHEN NOT MATCHED THEN INSERT (codEspecializacion, codCliente, mes, abiertos, cerrados, valorTotal)
+        VALUES (d.codEspecializacion, d.codCliente, d.mes, :abiertos, :cerrados, :valor)
+"""
+
+
+def deltas_caso(cod_esp, cod_cliente, fecha_inicio, fecha_fin, valor, signo: int = 1) -> List[tuple]:
+    """
+    Deltas (clave, abiertos, cerrados, valor) que un caso aporta al resumen.
+    signo=-1 retira el aporte (antes de una actualización).
+    """
+    monto = parsear_valor(valor) or Decimal(0)
+    deltas = [((cod_esp, cod_cliente, mes_de(fecha_inicio)), signo, 0, signo * monto)]
+    if fecha_fin is not None:
+        deltas.append(((cod_esp, cod_cliente, mes_de(fecha_fin)), 0, signo, Decimal(0)))
+    return deltas
+
+
+def aplicar(cursor, deltas: List[tuple]):
+    """
+    Aplica los deltas a CASO_RESUMEN_MES dentro de la transacción actual.
+    Si otra transacción inserta la misma clave entre la búsqueda y el INSERT
+    del MERGE, éste falla con ORA-00001; se reintenta una vez, ya por la
+    rama WHEN MATCHED (Oracle deshace solo la sentencia fallida).
+    """
+    for (cod_esp, cod_cliente, mes), abiertos, cerrados, valor in deltas:
+        binds = {
+            "codEsp": cod_esp,
+            "codCliente": cod_cliente,
+            "mes": mes,
+            "abiertos": abiertos,
+            "cerrados": cerrados,
+            "valor": valor,
+        }
+        try:
+            cursor.execute(MERGE_DELTA, binds)
+        except oracledb.IntegrityError:
+            cursor.execute(MERGE_DELTA, binds)
+
+
+def reconstruir(connection) -> Tuple[int, int]:
+    """
+    Recalcula CASO_RESUMEN_MES desde CASO.
+    Retorna (filas del resumen, casos con valor no interpretable).
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.arraysize = 5000
+        cursor.execute("""
+            SELECT codEspecializacion, codCliente, fechaInicio, fechaFin, valor
+            FROM Caso
+        """)
+        totales: Dict[tuple, list] = defaultdict(lambda: [0, 0, Decimal(0)])
+        invalidos = 0
+        for cod_esp, cod_cliente, inicio, fin, valor in cursor:
+            if parsear_valor(valor) is None:
+                invalidos += 1
+            for clave, abiertos, cerrados, monto in deltas_caso(cod_esp, cod_cliente, inicio, fin, valor):
+                fila = totales[clave]
+                fila[0] += abiertos
+                fila[1] += cerrados
+                fila[2] += monto
+        cursor.execute("DELETE FROM Caso_Resumen_Mes")
+        cursor.executemany("""
+            INSERT INTO Caso_Resumen_Mes (codEspecializacion, codCliente, mes, abiertos, cerrados, valorTotal)
+            VALUES (:1, :2, :3, :4, :5, :6)
+        """, [(*clave, *valores) for clave, valores in totales.items()])
+        connection.commit()
+        return len(totales), invalidos
+    except oracledb.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# ============================================================================
+# LECTURA (CACHÉ EN MEMORIA)
+# ============================================================================
+
+class CacheResumen:
+    """
+    Copia en memoria de CASO_RESUMEN_MES. Se recarga al vencer el ttl
+    (para ver cambios de otros procesos) y recibe los deltas locales.
+
+    La consulta de recarga corre sin el lock de los datos: las lecturas
+    siguen sirviendo la copia anterior y la nueva se instala al final.
+    Para que un delta no se cuente dos veces (o ninguna), confirmar() hace
+    COMMIT y aplica bajo _lock_confirmacion, el mismo que toma la recarga
+    mientras abre su consulta: lo confirmado antes ya viene en la lectura
+    y lo confirmado después se guarda en _pendientes y se suma a la copia
+    nueva antes de instalarla.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._filas: Optional[Dict[tuple, list]] = None
+        self._pendientes: Optional[List[List[tuple]]] = None
+        self._cargado_en = 0.0
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+        self._lock_confirmacion = threading.Lock()
+
+    @property
+    def cargado(self) -> bool:
+        return self._filas is not None
+
+    @staticmethod
+    def _sumar(filas: Dict[tuple, list], deltas: List[tuple]):
+        for clave, abiertos, cerrados, valor in deltas:
+            fila = filas.setdefault(clave, [0, 0, Decimal(0)])
+            fila[0] += abiertos
+            fila[1] += cerrados
+            fila[2] += valor
+
+    def cargar(self, connection):
+        """Carga (o recarga) la copia en memoria."""
+        cursor = connection.cursor()
+        try:
+            with self._lock_confirmacion:
+                # La lectura de Oracle queda fija al abrir la consulta
+                cursor.execute("""
+                    SELECT codEspecializacion, codCliente, mes, abiertos, cerrados, valorTotal
+                    FROM Caso_Resumen_Mes
+                """)
+                with self._lock:
+                    self._pendientes = []
+            filas = {
+                (fila[0], fila[1], mes_de(fila[2])): [fila[3], fila[4], Decimal(str(fila[5]))]
+                for fila in cursor.fetchall()
+            }
+        except BaseException:
+            with self._lock:
+                self._pendientes = None
+            raise
+        finally:
+            cursor.close()
+        with self._lock:
+            for deltas in self._pendientes:
+                self._sumar(filas, deltas)
+            self._filas, self._pendientes = filas, None
+            self._cargado_en = time.monotonic()
+
+    def necesita_recarga(self) -> bool:
+        """
+        Indica si la próxima llamada a recargar() leería la base (para
+        tomar una conexión solo entonces). Falso si otro hilo ya está leyendo.
+        """
+        if self._filas is None:
+            return True
+        return time.monotonic() - self._cargado_en >= self.ttl and not self._lock_carga.locked()
+
+    def recargar(self, connection):
+        """Recarga la copia si venció el ttl; un solo hilo lee a la vez."""
+        if self._filas is not None and time.monotonic() - self._cargado_en < self.ttl:
+            return
+        # Sin copia cargada se espera al hilo que la está cargando
+        if not self._lock_carga.acquire(blocking=self._filas is None):
+            return
+        try:
+            if self._filas is None or time.monotonic() - self._cargado_en >= self.ttl:
+                self.cargar(connection)
+        finally:
+            self._lock_carga.release()
+
+    def confirmar(self, connection, deltas: List[tuple]):
+        """
+        Confirma la transacción del llamador (que ya aplicó los deltas a
+        CASO_RESUMEN_MES) y los refleja en memoria.
+        """
+        with self._lock_confirmacion:
+            connection.commit()
+            with self._lock:
+                if self._filas is not None:
+                    self._sumar(self._filas, deltas)
+                if self._pendientes is not None:
+                    self._pendientes.append(deltas)
+
+    def invalidar(self):
+        with self._lock:
+            self._filas = None
+
+    def consultar(self, agrupar: List[str], cod_esp: Optional[str] = None,
+                  cod_cliente: Optional[str] = None, desde: Optional[date] = None,
+                  hasta: Optional[date] = None) -> List[dict]:
+        """
+        Totales agrupados por las dimensiones indicadas, desde la copia en
+        memoria (el llamador la carga antes con recargar()).
+        """
+        with self._lock:
+            filas = [(clave, list(valores)) for clave, valores in (self._filas or {}).items()]
+
+        desde, hasta = mes_de(desde), mes_de(hasta)
+        posiciones = [DIMENSIONES[d] for d in agrupar]
+        grupos: Dict[tuple, list] = defaultdict(lambda: [0, 0, Decimal(0)])
+        for clave, (abiertos, cerrados, valor) in filas:
+            if cod_esp is not None and clave[0] != cod_esp:
+                continue
+            if cod_cliente is not None and clave[1] != cod_cliente:
+                continue
+            if (desde is not None and clave[2] < desde) or (hasta is not None and clave[2] > hasta):
+                continue
+            grupo = grupos[tuple(clave[p] for p in posiciones)]
+            grupo[0] += abiertos
+            grupo[1] += cerrados
+            grupo[2] += valor
+
+        nombres = {"especializacion": "codEspecializacion", "cliente": "codCliente", "mes": "mes"}
+        resultado = []
+        for clave in sorted(grupos):
+            abiertos, cerrados, valor = grupos[clave]
+            fila = {nombres[d]: (str(v) if d == "mes" else v) for d, v in zip(agrupar, clave)}
+            fila.update({"abiertos": abiertos, "cerrados": cerrados, "valorTotal": float(valor)})
+            resultado.append(fila)
+        return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumen de casos por especialización, cliente y mes")
+    parser.add_argument("--reconstruir", action="store_true", required=True,
+                        help="Recalcular CASO_RESUMEN_MES desde CASO")
+    parser.parse_args()
+
+    connection = oracledb.connect(
+        user=os.getenv("DB_USER", "tu_usuario"),
+        password=os.getenv("DB_PASSWORD", "tu_contraseña"),
+        dsn=f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '1521')}/{os.getenv('DB_SERVICE', 'XE')}",
+    )
+    try:
+        filas, invalidos = reconstruir(connection)
+    finally:
+        connection.close()
+    print(f"Resumen reconstruido: {filas} filas")
+    if invalidos:
+        print(f"Advertencia: {invalidos} casos con valor no interpretable (sumados como 0)")
+
+
+if __name__ == "__main__":
+    main()
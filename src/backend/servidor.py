@@ -0,0 +1,264 @@
+"""
+Servidor de Producción
+Varios procesos uvicorn sobre un mismo socket, con reinicio escalonado
+
+El proceso maestro abre el socket (TCP o Unix) una sola vez y lanza N
+workers con el método "spawn": cada worker importa main.py desde cero,
+de modo que los pools de Oracle, los hilos y las estructuras en memoria
+se crean dentro del worker y nunca se comparten entre procesos. El
+maestro conserva el socket abierto, así que las conexiones que llegan
+mientras un worker se reinicia esperan en la cola del socket y las
+atiende otro worker.
+
+- SIGHUP: reinicio escalonado. Por cada worker se lanza uno nuevo (con
+  el código actual), se espera a que termine de arrancar y luego se
+  detiene el anterior, que deja de aceptar conexiones y termina las
+  solicitudes en curso (hasta --gracia segundos).
+- SIGTERM / SIGINT: apagado ordenado de todos los workers.
+- Un worker que termina inesperadamente se reemplaza.
+- Eventos SSE: cada worker envía al maestro, por un Pipe propio, los
+  eventos que publica; un hilo del maestro los retransmite a los demás
+  workers (ver eventos.py).
+
+Cada worker tiene su propio pool: el total de conexiones a Oracle es
+workers x DB_POOL_MAX. Los catálogos se leen de un archivo que todos los
+workers mapean en memoria (ver catalogo_compartido.py).
+
+Uso (desde src/backend):
+    python servidor.py                              # un worker por CPU en 0.0.0.0:8000
+    python servidor.py --workers 8 --port 9000
+    python servidor.py --uds /run/abogados/api.sock # detrás del proxy inverso
+    kill -HUP <pid del maestro>                     # reinicio escalonado (despliegue)
+"""
+
+import argparse
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+from typing import List
+
+import uvicorn
+
+import eventos
+
+multiprocessing.allow_connection_pickling()
+_spawn = multiprocessing.get_context("spawn")
+
+logger = logging.getLogger("servidor")
+
+
+class _ServidorWorker(uvicorn.Server):
+    """Servidor uvicorn que avisa al maestro cuando terminó de arrancar."""
+
+    def __init__(self, config: uvicorn.Config, listo):
+        super().__init__(config)
+        self.listo = listo
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.listo.set()
+
+
+def _ejecutar_worker(opciones: dict, sockets: list, listo, canal):
+    """Punto de entrada de cada worker (proceso nuevo)."""
+    eventos.canal_relevo = canal
+    config = uvicorn.Config("main:app", **opciones)
+    _ServidorWorker(config, listo).run(sockets=sockets)
+
+
+class _RelevoEventos:
+    """
+    Hilo del maestro que recibe los eventos publicados por cada worker y
+    los reenvía a todos los demás.
+    """
+
+    def __init__(self):
+        self._extremos = []
+        self._lock = threading.Lock()
+        threading.Thread(target=self._ejecutar, daemon=True, name="relevo-eventos").start()
+
+    def nuevo_canal(self):
+        """Crea el Pipe de un worker; retorna el extremo que se le entrega."""
+        propio, del_worker = _spawn.Pipe()
+        with self._lock:
+            self._extremos.append(propio)
+        return del_worker
+
+    def _quitar(self, extremo):
+        with self._lock:
+            if extremo in self._extremos:
+                self._extremos.remove(extremo)
+        extremo.close()
+
+    def _ejecutar(self):
+        while True:
+            with self._lock:
+                extremos = list(self._extremos)
+            if not extremos:
+                time.sleep(0.5)
+                continue
+            # Con timeout, para incluir los workers lanzados mientras tanto
+            for origen in multiprocessing.connection.wait(extremos, timeout=0.5):
+                try:
+                    mensaje = origen.recv()
+                except (EOFError, OSError):
+                    # El worker terminó
+                    self._quitar(origen)
+                    continue
+                for destino in extremos:
+                    if destino is origen or destino.closed:
+                        continue
+                    try:
+                        destino.send(mensaje)
+                    except OSError:
+                        self._quitar(destino)
+
+
+class _Worker:
+    def __init__(self, opciones: dict, sockets: list, canal):
+        self.listo = _spawn.Event()
+        self.canal = canal
+        self.proceso = _spawn.Process(
+            target=_ejecutar_worker, args=(opciones, sockets, self.listo, canal), daemon=False
+        )
+        self.deteniendo = False
+
+    def iniciar(self) -> "_Worker":
+        self.proceso.start()
+        # El worker tiene su propia copia; al cerrar ésta, su salida se ve como EOF
+        self.canal.close()
+        return self
+
+    def detener(self, gracia: float):
+        """SIGTERM y espera el cierre ordenado; si no termina, se mata."""
+        self.deteniendo = True
+        if self.proceso.is_alive():
+            self.proceso.terminate()
+        self.proceso.join(gracia + 5)
+        if self.proceso.is_alive():
+            logger.warning("Worker %s no terminó en %.0fs, se mata", self.proceso.pid, gracia + 5)
+            self.proceso.kill()
+            self.proceso.join()
+
+
+class Maestro:
+    """Supervisa los workers y atiende las señales de reinicio y apagado."""
+
+    def __init__(self, workers: int, opciones: dict, sockets: list, gracia: float,
+                 espera_arranque: float = 120.0):
+        self.cantidad = workers
+        self.opciones = opciones
+        self.sockets = sockets
+        self.gracia = gracia
+        self.espera_arranque = espera_arranque
+        self.workers: List[_Worker] = []
+        self._salir = False
+        self._reiniciar = False
+        self.relevo = _RelevoEventos()
+
+    def _lanzar(self) -> _Worker:
+        worker = _Worker(self.opciones, self.sockets, self.relevo.nuevo_canal()).iniciar()
+        logger.info("Worker %s iniciado", worker.proceso.pid)
+        return worker
+
+    def _senal_salir(self, *_):
+        self._salir = True
+
+    def _senal_reiniciar(self, *_):
+        self._reiniciar = True
+
+    def reiniciar_escalonado(self):
+        logger.info("Reinicio escalonado de %d workers", len(self.workers))
+        for anterior in list(self.workers):
+            if self._salir:
+                return
+            nuevo = self._lanzar()
+            if not nuevo.listo.wait(self.espera_arranque):
+                # El código nuevo no arranca: se conservan los workers actuales
+                logger.error("El worker %s no arrancó; se cancela el reinicio", nuevo.proceso.pid)
+                nuevo.detener(self.gracia)
+                return
+            self.workers.append(nuevo)
+            self.workers.remove(anterior)
+            anterior.detener(self.gracia)
+            logger.info("Worker %s reemplazado por %s", anterior.proceso.pid, nuevo.proceso.pid)
+
+    def _reemplazar_caidos(self):
+        for worker in list(self.workers):
+            if worker.proceso.is_alive() or worker.deteniendo:
+                continue
+            logger.warning("Worker %s terminó (código %s), se reemplaza",
+                           worker.proceso.pid, worker.proceso.exitcode)
+            self.workers.remove(worker)
+            self.workers.append(self._lanzar())
+            # Evita un ciclo de reinicios si el worker falla al arrancar
+            time.sleep(1)
+
+    def ejecutar(self):
+        signal.signal(signal.SIGINT, self._senal_salir)
+        signal.signal(signal.SIGTERM, self._senal_salir)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._senal_reiniciar)
+
+        self.workers = [self._lanzar() for _ in range(self.cantidad)]
+        while not self._salir:
+            time.sleep(0.5)
+            if self._reiniciar:
+                self._reiniciar = False
+                self.reiniciar_escalonado()
+            self._reemplazar_caidos()
+
+        logger.info("Deteniendo %d workers", len(self.workers))
+        for worker in self.workers:
+            worker.deteniendo = True
+            if worker.proceso.is_alive():
+                worker.proceso.terminate()
+        for worker in self.workers:
+            worker.detener(self.gracia)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de producción con varios workers")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("SERVIDOR_WORKERS", "0")) or os.cpu_count() or 1,
+                        help="Cantidad de procesos (por defecto, uno por CPU)")
+    parser.add_argument("--host", default=os.getenv("SERVIDOR_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVIDOR_PORT", "8000")))
+    parser.add_argument("--uds", default=os.getenv("SERVIDOR_UDS") or None,
+                        help="Ruta de un socket Unix (reemplaza host y puerto)")
+    parser.add_argument("--gracia", type=float, default=float(os.getenv("SERVIDOR_GRACIA_SEG", "30")),
+                        help="Segundos para terminar las solicitudes en curso al detener un worker")
+    parser.add_argument("--forwarded-allow-ips", default=os.getenv("SERVIDOR_PROXY_IPS", "127.0.0.1"),
+                        help="IPs del proxy inverso de las que se aceptan X-Forwarded-*")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(name)s] %(message)s")
+
+    if args.uds and os.path.exists(args.uds):
+        os.unlink(args.uds)
+    socket_servidor = uvicorn.Config(
+        "main:app", host=args.host, port=args.port, uds=args.uds
+    ).bind_socket()
+
+    opciones = {
+        "proxy_headers": True,
+        "forwarded_allow_ips": args.forwarded_allow_ips,
+        "timeout_graceful_shutdown": args.gracia,
+        "log_level": args.log_level,
+    }
+    try:
+        Maestro(args.workers, opciones, [socket_servidor], args.gracia).ejecutar()
+    finally:
+        socket_servidor.close()
+        if args.uds and os.path.exists(args.uds):
+            os.unlink(args.uds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Configuración común de las pruebas del backend.
+
+Las pruebas no necesitan Oracle: `enrutador_falso` reemplaza el enrutador de
+conexiones de main por uno que entrega ConexionFalsa, cuyos cursores
+responden según el texto de la sentencia.
+"""
+
+import os
+import threading
+import time
+
+# Antes de importar main: sin archivos de log ni instantánea de catálogos
+os.environ.setdefault("CONSULTAS_LOG", "")
+os.environ.setdefault("CATALOGO_ARCHIVO", "")
+os.environ.setdefault("TRAZAS_ARCHIVO", "")
+os.environ.setdefault("TRAZAS_OTLP_URL", "")
+
+import pytest
+
+
+class CursorFalso:
+    """Cursor que responde con las filas de la primera clave contenida en la sentencia."""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.connection = conexion
+        self._filas = []
+        self.rowcount = 0
+        self.description = None
+        self._errores_lote = []
+
+    def execute(self, sql, parametros=None, **kwargs):
+        self.conexion.sentencias.append((sql, parametros if parametros is not None else kwargs))
+        if self.conexion.demora:
+            time.sleep(self.conexion.demora)
+        for clave, respuesta in self.conexion.respuestas.items():
+            if clave in sql:
+                if isinstance(respuesta, Exception):
+                    raise respuesta
+                self._filas = list(respuesta(parametros) if callable(respuesta) else respuesta)
+                self.description = [("c",)] if self._filas else None
+                break
+        else:
+            self._filas = []
+        self.rowcount = len(self._filas)
+
+    def executemany(self, sql, filas, **kwargs):
+        self.conexion.sentencias.append((sql, filas))
+        self.rowcount = len(filas)
+        self._errores_lote = []
+        if kwargs.get("batcherrors") and self.conexion.errores_lote:
+            self._errores_lote = self.conexion.errores_lote.pop(0)
+
+    def getbatcherrors(self):
+        return self._errores_lote
+
+    def fetchone(self):
+        return self._filas.pop(0) if self._filas else None
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+    def fetchmany(self, n=1):
+        filas, self._filas = self._filas[:n], self._filas[n:]
+        return filas
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def var(self, *args, **kwargs):
+        return VariableFalsa()
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+
+class VariableFalsa:
+    def __init__(self):
+        self.valor = None
+
+    def getvalue(self, *args):
+        return self.valor
+
+
+class TipoFalso:
+    """Tipo de colección de Oracle (SYS.ODCIVARCHAR2LIST): sus objetos son listas."""
+
+    def newobject(self, valores=()):
+        return list(valores)
+
+
+class ConexionFalsa:
+    def __init__(self, respuestas=None, demora: float = 0.0):
+        self.respuestas = respuestas if respuestas is not None else {}
+        self.demora = demora
+        self.sentencias = []
+        self.commits = 0
+        self.rollbacks = 0
+        # Errores por fila (objetos con `offset`) de cada executemany con batcherrors
+        self.errores_lote = []
+        self.endpoint = None
+        self.call_timeout = 0
+        self.sana = True
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def gettype(self, nombre):
+        return TipoFalso()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def cancel(self):
+        pass
+
+    def ping(self):
+        pass
+
+    def is_healthy(self):
+        return self.sana
+
+
+class EnrutadorFalso:
+    """Entrega siempre conexiones con las mismas respuestas y lleva la cuenta."""
+
+    def __init__(self, respuestas=None, demora: float = 0.0):
+        self.respuestas = respuestas if respuestas is not None else {}
+        self.demora = demora
+        self.conexiones = []
+        self.liberadas = []
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self._lock = threading.Lock()
+
+    def adquirir(self, solo_lectura: bool):
+        conexion = ConexionFalsa(self.respuestas, self.demora)
+        with self._lock:
+            self.conexiones.append(conexion)
+            self.en_uso += 1
+            self.max_en_uso = max(self.max_en_uso, self.en_uso)
+        return conexion, None
+
+    def liberar(self, connection, pool, descartar: bool = False):
+        with self._lock:
+            self.en_uso -= 1
+            self.liberadas.append((connection, descartar))
+
+    def cerrar(self):
+        pass
+
+    def estado(self):
+        return {}
+
+
+@pytest.fixture
+def enrutador_falso(monkeypatch):
+    import main
+    enrutador = EnrutadorFalso()
+    monkeypatch.setattr(main, "enrutador", enrutador)
+    monkeypatch.setattr(main, "PRECARGAS", {})
+    return enrutador
+
+
+@pytest.fixture
+def cliente(enrutador_falso):
+    import main
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as c:
+        yield c
@@ -0,0 +1,58 @@
+"""Agenda del abogado: rango de fechas, paginación y validación de parámetros."""
+
+from datetime import date, timedelta
+
+import oracledb
+import pytest
+
+
+def sentencia_agenda(enrutador):
+    return next(p for c in enrutador.conexiones for sql, p in c.sentencias if "V_AGENDA_ABOGADO" in sql)
+
+
+def test_agenda_por_defecto_desde_hoy(cliente, enrutador_falso):
+    enrutador_falso.respuestas["V_AGENDA_ABOGADO"] = [
+        (date(2030, 1, 10), 7, 2, "CIV", 3, "E03", "Audiencia", "L01", "Bogotá"),
+    ]
+    respuesta = cliente.get("/api/abogado/123/agenda")
+    assert respuesta.status_code == 200
+    assert respuesta.json() == [{
+        "fechaEtapa": "2030-01-10", "noCaso": 7, "consecExpe": 2, "codEspecializacion": "CIV",
+        "pasoEtapa": 3, "codEtapa": "E03", "nomEtapa": "Audiencia", "codLugar": "L01", "nomLugar": "Bogotá",
+    }]
+    parametros = sentencia_agenda(enrutador_falso)
+    assert parametros["desde"] == date.today()
+    assert (parametros["offset"], parametros["limite"]) == (0, 50)
+
+
+def test_agenda_hasta_es_inclusivo(cliente, enrutador_falso):
+    respuesta = cliente.get("/api/abogado/123/agenda",
+                            params={"desde": "2030-01-01", "hasta": "2030-01-31", "limite": 10, "offset": 20})
+    assert respuesta.status_code == 200 and respuesta.json() == []
+    parametros = sentencia_agenda(enrutador_falso)
+    assert parametros["antesDe"] == date(2030, 1, 31) + timedelta(days=1)
+    assert (parametros["offset"], parametros["limite"]) == (20, 10)
+
+
+def test_agenda_hasta_en_el_ultimo_dia_del_calendario(cliente, enrutador_falso):
+    respuesta = cliente.get("/api/abogado/123/agenda", params={"hasta": "9999-12-31"})
+    assert respuesta.status_code == 400
+    assert not any("V_AGENDA_ABOGADO" in sql for c in enrutador_falso.conexiones for sql, _ in c.sentencias)
+    # El día anterior todavía tiene día siguiente para cerrar el rango
+    assert cliente.get("/api/abogado/123/agenda", params={"hasta": "9999-12-30"}).status_code == 200
+    assert sentencia_agenda(enrutador_falso)["antesDe"] == date(9999, 12, 31)
+
+
+@pytest.mark.parametrize("params", [
+    {"limite": 0}, {"limite": 501}, {"offset": -1},
+    {"desde": "2030-02-01", "hasta": "2030-01-31"},
+])
+def test_agenda_rechaza_parametros_invalidos(cliente, enrutador_falso, params):
+    assert cliente.get("/api/abogado/123/agenda", params=params).status_code == 400
+    assert not any("V_AGENDA_ABOGADO" in sql for c in enrutador_falso.conexiones for sql, _ in c.sentencias)
+
+
+def test_agenda_error_de_oracle(cliente, enrutador_falso):
+    enrutador_falso.respuestas["V_AGENDA_ABOGADO"] = oracledb.DatabaseError("ORA-00942: table or view does not exist")
+    respuesta = cliente.get("/api/abogado/123/agenda")
+    assert respuesta.status_code == 500 and "ORA-00942" in respuesta.json()["detail"]
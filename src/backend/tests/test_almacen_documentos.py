@@ -0,0 +1,146 @@
+"""Almacén de documentos: carga por bloques, Range, ETag y nombre sugerido."""
+
+import hashlib
+import os
+import threading
+
+import anyio
+import pytest
+
+import almacen_documentos
+import main
+from almacen_documentos import (
+    AlmacenDocumentos, ArchivoDemasiadoGrande, RespuestaContenido, disposicion_contenido, rango_solicitado,
+)
+
+CONTENIDO = b"%PDF-1.4 " + bytes(range(256)) * 40
+HASH = hashlib.sha256(CONTENIDO).hexdigest()
+
+
+async def _bloques(datos: bytes, tamano: int = 1000):
+    for i in range(0, len(datos), tamano):
+        yield datos[i:i + tamano]
+
+
+def _guardar(almacen, datos):
+    return anyio.run(almacen.guardar, _bloques(datos))
+
+
+@pytest.fixture
+def almacen(tmp_path, monkeypatch):
+    almacen = AlmacenDocumentos(str(tmp_path), tamano_max=len(CONTENIDO))
+    monkeypatch.setattr(main, "almacen", almacen)
+    return almacen
+
+
+def test_guardar_deduplica_por_hash(almacen):
+    assert _guardar(almacen, CONTENIDO) == (HASH, len(CONTENIDO), True)
+    assert _guardar(almacen, CONTENIDO) == (HASH, len(CONTENIDO), False)
+    with open(almacen.ruta(HASH), "rb") as archivo:
+        assert archivo.read() == CONTENIDO
+    assert os.listdir(os.path.join(almacen.directorio, "tmp")) == []
+
+
+def test_guardar_descarta_el_temporal_si_supera_el_maximo(almacen):
+    with pytest.raises(ArchivoDemasiadoGrande):
+        _guardar(almacen, CONTENIDO + b"x")
+    assert os.listdir(os.path.join(almacen.directorio, "tmp")) == []
+    assert not almacen.existe(HASH)
+
+
+@pytest.mark.parametrize("cabecera, esperado", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-10", (990, 999)),
+    ("bytes=990-5000", (990, 999)),
+])
+def test_rango_solicitado(cabecera, esperado):
+    assert rango_solicitado(cabecera, 1000) == esperado
+
+
+@pytest.mark.parametrize("cabecera", ["bytes=1000-", "bytes=5-2", "bytes=-0", "bytes=-", "items=0-1", "bytes=0-1,4-5"])
+def test_rango_no_satisfacible(cabecera):
+    with pytest.raises(ValueError):
+        rango_solicitado(cabecera, 1000)
+
+
+def test_disposicion_sanea_el_nombre():
+    cabecera = disposicion_contenido('acta"\r\nSet-Cookie: x=1 ñ.pdf').decode("ascii")
+    assert "\r" not in cabecera and "\n" not in cabecera
+    assert cabecera == (
+        'inline; filename="actaSet-Cookie: x=1 _.pdf"; '
+        "filename*=UTF-8''actaSet-Cookie%3A%20x%3D1%20%C3%B1.pdf"
+    )
+
+
+def test_descarga_completa_parcial_y_condicional(cliente, almacen):
+    _guardar(almacen, CONTENIDO)
+    url = f"/api/documento/contenido/{HASH}?nombre=demanda.pdf"
+
+    completa = cliente.get(url)
+    assert completa.status_code == 200 and completa.content == CONTENIDO
+    assert completa.headers["content-type"] == "application/pdf"
+    assert completa.headers["etag"] == f'"{HASH}"'
+
+    parcial = cliente.get(url, headers={"Range": "bytes=10-19"})
+    assert parcial.status_code == 206 and parcial.content == CONTENIDO[10:20]
+    assert parcial.headers["content-range"] == f"bytes 10-19/{len(CONTENIDO)}"
+
+    assert cliente.get(url, headers={"Range": f"bytes={len(CONTENIDO)}-"}).status_code == 416
+    assert cliente.get(url, headers={"If-None-Match": f'"{HASH}"'}).status_code == 304
+    assert cliente.get(f"/api/documento/contenido/{'0' * 64}").status_code == 404
+
+
+def test_descarga_de_documento_libera_la_conexion_antes_de_enviar(cliente, almacen, enrutador_falso, monkeypatch):
+    _guardar(almacen, CONTENIDO)
+    enrutador_falso.respuestas["FROM Documento"] = [(f"sha256:{HASH}",)]
+    en_uso_al_enviar = []
+
+    class RespuestaObservada(RespuestaContenido):
+        async def __call__(self, scope, receive, send):
+            en_uso_al_enviar.append(enrutador_falso.en_uso)
+            await super().__call__(scope, receive, send)
+
+    monkeypatch.setattr(main, "RespuestaContenido", RespuestaObservada)
+    respuesta = cliente.get("/api/documento/CIV/1/10001/1/1/contenido", headers={"Range": "bytes=0-4"})
+    assert respuesta.status_code == 206 and respuesta.content == b"%PDF-"
+    assert en_uso_al_enviar == [0]
+    assert main.control_admision.metricas()["detalle"]["activos"] == 0
+
+    enrutador_falso.respuestas["FROM Documento"] = [("https://externo/doc.pdf",)]
+    assert cliente.get("/api/documento/CIV/1/10001/1/1/contenido").status_code == 404
+    assert enrutador_falso.en_uso == 0
+
+
+def test_descarga_lee_el_archivo_fuera_del_event_loop(cliente, almacen, monkeypatch):
+    _guardar(almacen, CONTENIDO)
+    hilos = {"loop": set(), "archivo": []}
+    leer_bloque, abrir = almacen_documentos._leer_bloque, RespuestaContenido._abrir
+
+    class RespuestaObservada(RespuestaContenido):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.tamano_bloque = 1000
+
+        async def __call__(self, scope, receive, send):
+            hilos["loop"].add(threading.get_ident())
+            await super().__call__(scope, receive, send)
+
+        def _abrir(self):
+            hilos["archivo"].append(threading.get_ident())
+            return abrir(self)
+
+    def leer_observado(archivo, posicion, largo):
+        hilos["archivo"].append(threading.get_ident())
+        return leer_bloque(archivo, posicion, largo)
+
+    monkeypatch.setattr(main, "RespuestaContenido", RespuestaObservada)
+    monkeypatch.setattr(almacen_documentos, "_leer_bloque", leer_observado)
+    respuesta = cliente.get(f"/api/documento/contenido/{HASH}", headers={"Range": "bytes=5-2504"})
+
+    assert respuesta.status_code == 206 and respuesta.content == CONTENIDO[5:2505]
+    assert respuesta.headers["content-type"] == "application/pdf"
+    # Apertura, tamaño y firma en una llamada; el rango en bloques de 1000, 1000 y 500
+    assert len(hilos["archivo"]) == 4
+    assert not hilos["loop"] & set(hilos["archivo"])
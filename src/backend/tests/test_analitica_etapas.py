@@ -0,0 +1,62 @@
+"""Analítica de etapas: duraciones entre expedientes consecutivos, percentiles y caché."""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from analitica_etapas import AnaliticaEtapas
+from conftest import ConexionFalsa
+
+# (noCaso, día desde 1970, codEspecializacion, codEtapa, codLugar), en el orden de CONSULTA_HISTORIAL
+HISTORIAL = [
+    (1, 0, "CIV", "E1", "L1"), (1, 10, "CIV", "E2", "L1"), (1, 15, "CIV", "E3", "L1"),
+    (2, 0, "CIV", "E1", "L2"), (2, 4, "CIV", "E2", "L2"),
+    (3, 100, "PEN", "E1", "L1"), (3, 130, "PEN", "E2", "L1"),
+]
+
+
+def conexion():
+    return ConexionFalsa({
+        "FROM EtapaProcesal": [("E1", "Demanda"), ("E2", "Audiencia"), ("E3", "Fallo")],
+        "FROM Expediente e": HISTORIAL,
+    })
+
+
+def test_duraciones_por_especializacion():
+    resultado = AnaliticaEtapas().duraciones(conexion(), "especializacion")
+    p50, p90 = np.percentile([4, 10], [50, 90])
+    assert resultado == [
+        {"codEtapa": "E1", "nomEtapa": "Demanda", "codEspecializacion": "CIV", "n": 2,
+         "promedioDias": 7.0, "maxDias": 10.0, "p50Dias": round(p50, 2), "p90Dias": round(p90, 2)},
+        {"codEtapa": "E1", "nomEtapa": "Demanda", "codEspecializacion": "PEN", "n": 1,
+         "promedioDias": 30.0, "maxDias": 30.0, "p50Dias": 30.0, "p90Dias": 30.0},
+        {"codEtapa": "E2", "nomEtapa": "Audiencia", "codEspecializacion": "CIV", "n": 1,
+         "promedioDias": 5.0, "maxDias": 5.0, "p50Dias": 5.0, "p90Dias": 5.0},
+    ]
+
+
+def test_duraciones_por_lugar_y_rango_de_fechas():
+    resultado = AnaliticaEtapas().duraciones(conexion(), "lugar", desde=date(1970, 1, 5), hasta=date(1970, 12, 31))
+    # Solo las etapas iniciadas en el rango: E2 del caso 1 (día 10) y E1 del caso 3 (día 100)
+    assert [(f["codEtapa"], f["codLugar"], f["n"], f["maxDias"]) for f in resultado] == [
+        ("E1", "L1", 1, 30.0), ("E2", "L1", 1, 5.0),
+    ]
+    assert AnaliticaEtapas().duraciones(conexion(), desde=date(2000, 1, 1)) == []
+
+
+def test_historial_y_resultados_en_cache_hasta_el_ttl():
+    analitica, origen = AnaliticaEtapas(ttl=600), conexion()
+    primero = analitica.duraciones(origen)
+    assert analitica.duraciones(origen) is primero
+    assert len([s for s, _ in origen.sentencias if "FROM Expediente e" in s]) == 1
+    assert analitica.estado()["etapasCerradas"] == 4
+
+    analitica.ttl = 0
+    analitica.duraciones(origen)
+    assert len([s for s, _ in origen.sentencias if "FROM Expediente e" in s]) == 2
+
+
+@pytest.mark.parametrize("params", [{"agrupar": "abogado"}, {"desde": "2024-02-01", "hasta": "2024-01-01"}])
+def test_endpoint_valida_parametros(cliente, enrutador_falso, params):
+    assert cliente.get("/api/analytics/etapas", params=params).status_code == 400
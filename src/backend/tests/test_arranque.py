@@ -0,0 +1,32 @@
+"""Precarga de estructuras al arrancar: un fallo no detiene a las demás."""
+
+import asyncio
+
+import oracledb
+
+import main
+
+
+def test_precarga_continua_si_una_estructura_falla(enrutador_falso, monkeypatch):
+    cargadas = []
+
+    def con_error_de_datos(connection):
+        raise ValueError("fecha inválida")
+
+    def sin_tabla(connection):
+        raise oracledb.DatabaseError("ORA-00942: table or view does not exist")
+
+    monkeypatch.setattr(main, "PRECARGAS", {
+        "Con error": con_error_de_datos,
+        "Sin tabla": sin_tabla,
+        "Correcta": cargadas.append,
+    })
+    monkeypatch.setitem(main.estado_arranque, "precarga", {})
+    asyncio.run(main.precargar_estructuras())
+
+    precarga = main.estado_arranque["precarga"]
+    assert precarga["Con error"] == {"error": "ValueError: fecha inválida"}
+    assert "ORA-00942" in precarga["Sin tabla"]["error"]
+    assert "ms" in precarga["Correcta"] and len(cargadas) == 1
+    # Cada carga devolvió su conexión
+    assert enrutador_falso.en_uso == 0 and len(enrutador_falso.liberadas) == 3
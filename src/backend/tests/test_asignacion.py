@@ -0,0 +1,86 @@
+"""Motor de asignación: recomendaciones por carga y conexión solo al resincronizar."""
+
+import oracledb
+import pytest
+
+import main
+from asignacion import MotorAsignacion
+from conftest import ConexionFalsa
+
+RESPUESTAS = {
+    "Especializacion_Abogado": [
+        ("100", "Ana", "Ruiz", "PEN"),
+        ("200", "Luis", "Gómez", "PEN"),
+        ("300", "Eva", "Díaz", "PEN"),
+        ("300", "Eva", "Díaz", "CIV"),
+    ],
+    "GROUP BY e.cedula": [("100", 3), ("200", 1)],
+}
+
+
+@pytest.fixture
+def motor():
+    motor = MotorAsignacion(intervalo_resincronizacion=300)
+    motor.cargar(ConexionFalsa(RESPUESTAS))
+    return motor
+
+
+def _cedulas(recomendados):
+    return [(r["cedula"], r["expedientesAbiertos"]) for r in recomendados]
+
+
+def test_recomienda_los_menos_cargados(motor):
+    assert _cedulas(motor.recomendar("PEN")) == [("300", 0)]
+    assert _cedulas(motor.recomendar("PEN", 3)) == [("300", 0), ("200", 1), ("100", 3)]
+    assert motor.recomendar("LAB") == []
+
+
+def test_ajustes_actualizan_todas_las_especializaciones(motor):
+    motor.ajustar("300", 2)
+    assert _cedulas(motor.recomendar("PEN")) == [("200", 1)]
+    assert _cedulas(motor.recomendar("CIV")) == [("300", 2)]
+    motor.reasignar("200", "300")
+    assert _cedulas(motor.recomendar("PEN", 2)) == [("200", 0), ("100", 3)]
+    motor.ajustar("999", 1)  # Cédula sin especialización: se ignora
+    assert motor.carga("999") is None
+
+
+def test_monticulo_se_compacta(motor):
+    for _ in range(100):
+        motor.ajustar("100", 1)
+        motor.ajustar("100", -1)
+    assert motor.estado()["especializaciones"]["PEN"]["entradasHeap"] <= 4 * 3 + 16
+    assert _cedulas(motor.recomendar("PEN", 3))[-1] == ("100", 3)
+
+
+def test_necesita_sincronizacion(motor):
+    assert MotorAsignacion().necesita_sincronizacion()
+    assert not motor.necesita_sincronizacion()
+    motor.intervalo_resincronizacion = 0
+    assert motor.necesita_sincronizacion()
+
+
+def test_endpoint_no_toma_conexion_con_cargas_en_memoria(cliente, enrutador_falso, monkeypatch, motor):
+    monkeypatch.setattr(main, "motor_asignacion", motor)
+    respuesta = cliente.get("/api/abogado/especializacion/PEN/recomendado?cantidad=2")
+    assert respuesta.status_code == 200
+    assert [r["cedula"] for r in respuesta.json()] == ["300", "200"]
+    assert enrutador_falso.conexiones == []
+
+
+def test_endpoint_carga_con_una_conexion(cliente, enrutador_falso, monkeypatch):
+    monkeypatch.setattr(main, "motor_asignacion", MotorAsignacion())
+    enrutador_falso.respuestas.update(RESPUESTAS)
+    assert cliente.get("/api/abogado/especializacion/CIV/recomendado").json()[0]["cedula"] == "300"
+    assert len(enrutador_falso.conexiones) == 1 and enrutador_falso.en_uso == 0
+    assert cliente.get("/api/abogado/especializacion/XYZ/recomendado").status_code == 404
+    assert len(enrutador_falso.conexiones) == 1
+
+
+def test_endpoint_responde_con_cargas_previas_si_falla_la_resincronizacion(
+        cliente, enrutador_falso, monkeypatch, motor):
+    motor.intervalo_resincronizacion = 0
+    monkeypatch.setattr(main, "motor_asignacion", motor)
+    enrutador_falso.respuestas["Especializacion_Abogado"] = oracledb.DatabaseError("ORA-03113")
+    respuesta = cliente.get("/api/abogado/especializacion/PEN/recomendado")
+    assert respuesta.status_code == 200 and respuesta.json()[0]["cedula"] == "300"
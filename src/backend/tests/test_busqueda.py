@@ -0,0 +1,61 @@
+"""Búsqueda de texto: expresión CONTAINS escapada, filtros y validación del endpoint."""
+
+import oracledb
+import pytest
+
+import busqueda
+from conftest import ConexionFalsa
+
+
+@pytest.mark.parametrize("texto, modo, esperado", [
+    ("audiencia de conciliación", "frase", "{audiencia} {de} {conciliación}"),
+    ("audiencia conciliación", "todas", "{audiencia} AND {conciliación}"),
+    ("audiencia conciliación", "alguna", "{audiencia} ACCUM {conciliación}"),
+    # Operadores y comodines de Oracle Text quedan como texto o se descartan
+    ("NOT fallo% AND {x}", "frase", "{NOT} {fallo} {AND} {x}"),
+    ("contrato_2024", "frase", "{contrato} {2024}"),
+    ("%$#_", "frase", None),
+    ("", "todas", None),
+])
+def test_expresion_texto(texto, modo, esperado):
+    assert busqueda.expresion_texto(texto, modo) == esperado
+
+
+def test_buscar_con_filtros():
+    conexion = ConexionFalsa({"CONTAINS": [("suceso", "CIV", 1, 7, 2, 3, "Audiencia fijada", 12, "001")]})
+    resultado = busqueda.buscar(conexion, "audiencia", "todas", ["suceso"], no_caso=7, cod_cliente="001",
+                                limite=5, offset=10)
+    assert resultado == [{
+        "tipo": "suceso", "codEspecializacion": "CIV", "pasoEtapa": 1, "noCaso": 7, "consecExpe": 2,
+        "consecutivo": 3, "texto": "Audiencia fijada", "puntaje": 12, "codCliente": "001",
+    }]
+    sql, parametros = conexion.sentencias[0]
+    assert "AND t.noCaso = :noCaso" in sql and "AND c.codCliente = :codCliente" in sql
+    assert ":codEsp" not in sql
+    assert parametros["tipos"] == ["suceso"] and parametros["expresion"] == "{audiencia}"
+    assert (parametros["offset"], parametros["limite"]) == (10, 5)
+
+
+def test_buscar_sin_tipos_busca_en_todos():
+    conexion = ConexionFalsa()
+    assert busqueda.buscar(conexion, "fallo") == []
+    assert conexion.sentencias[0][1]["tipos"] == list(busqueda.TIPOS)
+
+
+@pytest.mark.parametrize("params", [
+    {"q": "fallo", "modo": "exacta"},
+    {"q": "fallo", "tipos": "suceso,cliente"},
+    {"q": "fallo", "tipos": ","},
+    {"q": "fallo", "limite": 101},
+    {"q": "fallo", "offset": -1},
+    {"q": "%%"},
+])
+def test_endpoint_valida_parametros(cliente, enrutador_falso, params):
+    assert cliente.get("/api/busqueda", params=params).status_code == 400
+    assert not any("CONTAINS" in sql for c in enrutador_falso.conexiones for sql, _ in c.sentencias)
+
+
+def test_endpoint_error_de_oracle(cliente, enrutador_falso):
+    enrutador_falso.respuestas["CONTAINS"] = oracledb.DatabaseError("DRG-10599: column is not indexed")
+    respuesta = cliente.get("/api/busqueda", params={"q": "fallo", "tipos": "resultado"})
+    assert respuesta.status_code == 500 and "DRG-10599" in respuesta.json()["detail"]
@@ -0,0 +1,85 @@
+"""Caché de clientes: vigencias, consultas compartidas e invalidación entre workers."""
+
+import asyncio
+import time
+
+import main
+import servidor
+from cache_clientes import CacheClientes
+from eventos import BusEventos
+
+ANA = [{"codCliente": "00001", "nomCliente": "Ana", "apellCliente": "Ruiz", "nDocumento": "123"}]
+
+
+def test_aciertos_y_vigencia_negativa_mas_corta():
+    cache = CacheClientes(ttl=60, ttl_negativo=0.05)
+    cache.guardar("123", ANA)
+    cache.guardar("999", [])
+    assert cache.consultar("123") == (True, ANA)
+    assert cache.consultar("999") == (True, [])
+    time.sleep(0.06)
+    assert cache.consultar("999") == (False, [])
+    assert cache.consultar("123") == (True, ANA)
+
+
+def test_capacidad_expulsa_el_menos_usado():
+    cache = CacheClientes(capacidad=2)
+    for documento in ("1", "2"):
+        cache.guardar(documento, ANA)
+    cache.consultar("1")
+    cache.guardar("3", ANA)
+    assert [d for d in ("1", "2", "3") if cache.consultar(d)[0]] == ["1", "3"]
+    assert cache.estado()["expulsiones"] == 1
+
+
+def test_solicitudes_simultaneas_comparten_la_consulta():
+    cache = CacheClientes()
+    consultas = []
+
+    async def cargar():
+        consultas.append(1)
+        await asyncio.sleep(0.02)
+        return ANA
+
+    async def escenario():
+        return await asyncio.gather(*(cache.obtener("123", cargar) for _ in range(5)))
+
+    assert asyncio.run(escenario()) == [ANA] * 5
+    assert len(consultas) == 1 and cache.estado()["esperasCompartidas"] == 4
+
+
+def test_consulta_en_curso_no_guarda_si_se_invalida():
+    cache = CacheClientes()
+
+    async def cargar():
+        cache.invalidar("123")
+        return ANA
+
+    assert asyncio.run(cache.obtener("123", cargar)) == ANA
+    assert cache.consultar("123") == (False, [])
+
+
+def test_invalidacion_se_difunde_a_los_demas_workers():
+    relevo = servidor._RelevoEventos()
+    bus_a, bus_b = BusEventos(), BusEventos()
+    cache_b = CacheClientes()
+    cache_b.guardar("123", ANA)
+    cache_b.guardar("456", ANA)
+    bus_b.al_recibir("invalidar_clientes", cache_b.invalidar)
+    bus_a.conectar(relevo.nuevo_canal())
+    bus_b.conectar(relevo.nuevo_canal())
+
+    assert bus_a.difundir("invalidar_clientes", "123")
+    limite = time.monotonic() + 5
+    while cache_b.estado()["invalidaciones"] == 0 and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert cache_b.consultar("123") == (False, [])
+    assert cache_b.consultar("456") == (True, ANA)
+
+
+def test_endpoint_invalida_y_avisa_si_no_llega_a_otros_workers(cliente, monkeypatch):
+    monkeypatch.setattr(main, "cache_clientes", CacheClientes())
+    main.cache_clientes.guardar("123", ANA)
+    respuesta = cliente.delete("/api/admin/cache-clientes?documento=123")
+    assert respuesta.json()["todosLosWorkers"] is False
+    assert main.cache_clientes.consultar("123") == (False, [])
@@ -0,0 +1,94 @@
+"""Catálogo compartido: formato, búsquedas, marca de cambios y cerrojo entre procesos."""
+
+import subprocess
+import sys
+
+import pytest
+
+from catalogo_compartido import CatalogoCompartido
+from conftest import ConexionFalsa
+
+
+def _respuestas(marca_lugar=1):
+    return {
+        "UNION ALL": [("Especializacion", 2, 10), ("Lugar", 3, marca_lugar)],
+        "nomEspecializacion FROM Especializacion": [("PEN", "Penal"), ("CIV", "Civil")],
+        "Especializacion_Abogado ea": [
+            ("CIV", "300", "Eva", "Díaz", "T3"), ("CIV", "100", "Ana", "Ruiz", None), ("PEN", "200", "Luis", "Gómez", "T2"),
+        ],
+        "direLugar": [
+            ("11", None, "DEP", "Cundinamarca", None, None, None),
+            ("11001", "11", "CIU", "Bogotá", "Cra 7", None, None),
+            ("11002", "11", "CIU", "Soacha", None, None, None),
+        ],
+        "Especia_Etapa ee": [("CIV", 2, "E2", "Pruebas", None, 1), ("CIV", 1, "E1", "Demanda", None, 1)],
+    }
+
+
+@pytest.fixture
+def catalogo(tmp_path):
+    return CatalogoCompartido(str(tmp_path / "catalogo.bin"), refresco=3600, verificar_cada=0)
+
+
+def test_construye_y_busca_en_la_instantanea(catalogo):
+    assert catalogo.reconstruir(ConexionFalsa(_respuestas())) == {
+        "especializacion": 2, "abogado_especializacion": 3, "lugar": 3, "especia_etapa": 2,
+    }
+    instantanea = catalogo.instantanea()
+    assert [f["codEspecializacion"] for f in instantanea["especializacion"]] == ["CIV", "PEN"]
+    abogados = instantanea["abogado_especializacion"].buscar("especializacion", "CIV")
+    assert [(a["apellido"], a["nTarjetaProfesional"]) for a in abogados] == [("Díaz", "T3"), ("Ruiz", None)]
+    assert [l["nomLugar"] for l in instantanea["lugar"].buscar("padre", "11")] == ["Bogotá", "Soacha"]
+    assert instantanea["especia_etapa"].buscar("pk", "CIV", 2)[0] == {
+        "codEspecializacion": "CIV", "pasoEtapa": 2, "codEtapa": "E2", "nomEtapa": "Pruebas",
+        "idImpugna": None, "nInstancia": 1,
+    }
+
+
+def test_reconstruye_solo_si_cambia_la_marca(catalogo):
+    catalogo.reconstruir(ConexionFalsa(_respuestas()))
+    sin_cambios = ConexionFalsa(_respuestas())
+    assert catalogo.reconstruir(sin_cambios) is None
+    # Solo se leyó la marca
+    assert len(sin_cambios.sentencias) == 1
+    assert catalogo.reconstruir(ConexionFalsa(_respuestas(marca_lugar=2))) is not None
+    assert catalogo.instantanea().version == 2
+    assert catalogo.reconstruir(ConexionFalsa(_respuestas(marca_lugar=2)), forzar=True) is not None
+    assert catalogo.instantanea().version == 3
+
+
+def test_reconstruye_al_cumplir_la_antiguedad_maxima(catalogo):
+    catalogo.reconstruir(ConexionFalsa(_respuestas()))
+    catalogo.refresco = 0
+    assert catalogo.reconstruir(ConexionFalsa(_respuestas())) is not None
+
+
+def test_cerrojo_entre_procesos_se_libera_si_el_dueno_termina(catalogo):
+    dueno = subprocess.Popen([sys.executable, "-c", (
+        "import fcntl, os, sys, time\n"
+        f"fd = os.open({catalogo.ruta + '.lock'!r}, os.O_CREAT | os.O_RDWR)\n"
+        "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+        "print('tomado', flush=True)\n"
+        "time.sleep(60)\n"
+    )], stdout=subprocess.PIPE, text=True)
+    try:
+        assert dueno.stdout.readline().strip() == "tomado"
+        assert catalogo.reconstruir(ConexionFalsa(_respuestas()), forzar=True) is None
+    finally:
+        dueno.kill()
+        dueno.wait()
+    assert catalogo.reconstruir(ConexionFalsa(_respuestas()), forzar=True) is not None
+    # El archivo de cerrojo es permanente y no bloquea a nadie
+    cerrojo = catalogo._tomar_cerrojo()
+    assert cerrojo is not None
+    catalogo._soltar_cerrojo(cerrojo)
+
+
+def test_cerrojo_excluye_otra_instancia_del_mismo_proceso(catalogo):
+    otro = CatalogoCompartido(catalogo.ruta)
+    cerrojo = catalogo._tomar_cerrojo()
+    try:
+        assert otro.reconstruir(ConexionFalsa(_respuestas()), forzar=True) is None
+    finally:
+        catalogo._soltar_cerrojo(cerrojo)
+    assert otro.reconstruir(ConexionFalsa(_respuestas()), forzar=True) is not None
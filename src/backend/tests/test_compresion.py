@@ -0,0 +1,104 @@
+"""Compresión de respuestas: negociación, mínimo, tipos excluidos y streaming con flush."""
+
+import asyncio
+import zlib
+
+import pytest
+
+from compresion import CompresionMiddleware, _Compresor, negociar
+
+
+@pytest.mark.parametrize("accept, esperado", [
+    ("gzip, deflate, br, zstd", "zstd"),
+    ("gzip;q=1.0, zstd;q=0.5", "gzip"),
+    ("br;q=0.8, gzip;q=0.8", "br"),
+    ("*", "zstd"),
+    ("*;q=0.5, zstd;q=0", "br"),
+    ("gzip;q=0", None),
+    ("gzip;q=abc", None),
+    ("identity", None),
+    ("", None),
+])
+def test_negociar(accept, esperado):
+    assert negociar(accept, ["zstd", "br", "gzip"]) == esperado
+
+
+def aplicacion(cuerpos, tipo=b"application/json", cabeceras=(), estado=200):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": estado,
+                    "headers": [(b"content-type", tipo), *cabeceras]})
+        for i, cuerpo in enumerate(cuerpos):
+            await send({"type": "http.response.body", "body": cuerpo, "more_body": i < len(cuerpos) - 1})
+    return app
+
+
+def ejecutar(middleware, accept="gzip"):
+    mensajes = []
+
+    async def recibir():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def enviar(mensaje):
+        mensajes.append(mensaje)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept.encode())]}
+    asyncio.run(middleware(scope, recibir, enviar))
+    cabeceras = {k.decode(): v.decode() for k, v in mensajes[0]["headers"]}
+    return cabeceras, [m["body"] for m in mensajes[1:]]
+
+
+def test_comprime_json_grande_con_gzip():
+    cuerpo = b'{"datos": "' + b"x" * 5000 + b'"}'
+    middleware = CompresionMiddleware(aplicacion([cuerpo], cabeceras=[(b"content-length", b"5013")]),
+                                      preferencia=["gzip"])
+    cabeceras, cuerpos = ejecutar(middleware)
+    assert cabeceras["content-encoding"] == "gzip" and "content-length" not in cabeceras
+    assert cabeceras["vary"] == "Accept-Encoding"
+    assert zlib.decompress(b"".join(cuerpos), 31) == cuerpo
+    resumen = middleware.metricas.resumen()
+    assert resumen["algoritmos"]["gzip"]["bytesEntrada"] == len(cuerpo)
+
+
+@pytest.mark.parametrize("cuerpos, tipo, extra", [
+    ([b"{}"], b"application/json", ()),
+    ([b"x" * 2000], b"image/png", ()),
+    ([b"data: x\n\n" * 300], b"text/event-stream", ()),
+    ([b"x" * 2000], b"text/plain", ((b"content-encoding", b"gzip"),)),
+    ([b"x" * 2000], b"text/plain", ((b"content-range", b"bytes 0-1999/4000"),)),
+])
+def test_no_comprime(cuerpos, tipo, extra):
+    middleware = CompresionMiddleware(aplicacion(cuerpos, tipo, extra), preferencia=["gzip"])
+    _, salida = ejecutar(middleware)
+    assert salida == cuerpos
+    resumen = middleware.metricas.resumen()
+    assert resumen["algoritmos"] == {} and resumen["omitidasPequenas"] + resumen["omitidasTipo"] == 1
+
+
+def test_sin_accept_encoding_no_comprime():
+    middleware = CompresionMiddleware(aplicacion([b"x" * 5000], b"text/plain"), preferencia=["gzip"])
+    cabeceras, salida = ejecutar(middleware, accept="identity")
+    assert "content-encoding" not in cabeceras and salida == [b"x" * 5000]
+
+
+def test_streaming_cada_bloque_se_puede_descomprimir_al_llegar():
+    bloques = [b"a" * 600, b"b" * 600, b"c" * 600, b"d" * 10]
+    middleware = CompresionMiddleware(aplicacion(bloques, b"text/csv"), preferencia=["gzip"], umbral_hilo=700)
+    cabeceras, cuerpos = ejecutar(middleware)
+    assert cabeceras["content-encoding"] == "gzip"
+    # Los dos primeros bloques se acumulan hasta superar el mínimo
+    descompresor = zlib.decompressobj(31)
+    assert descompresor.decompress(cuerpos[0]) == bloques[0] + bloques[1]
+    assert descompresor.decompress(cuerpos[1]) == bloques[2]
+    assert descompresor.decompress(cuerpos[2]) == bloques[3] and descompresor.eof
+    assert middleware.metricas.resumen()["algoritmos"]["gzip"]["bloquesEnHilo"] == 1
+
+
+@pytest.mark.parametrize("algoritmo, modulo", [("br", "brotli"), ("zstd", "zstandard")])
+def test_compresores_opcionales(algoritmo, modulo):
+    paquete = pytest.importorskip(modulo)
+    compresor = _Compresor(algoritmo, 3)
+    datos = compresor.comprimir(b"x" * 3000, final=False) + compresor.comprimir(b"y", final=True)
+    if algoritmo == "br":
+        assert paquete.decompress(datos) == b"x" * 3000 + b"y"
+    else:
+        assert paquete.ZstdDecompressor().decompressobj().decompress(datos) == b"x" * 3000 + b"y"
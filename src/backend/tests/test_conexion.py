@@ -0,0 +1,107 @@
+"""Enrutamiento lectura/escritura: réplica para GET, primaria para mutaciones y desvío por salud."""
+
+import oracledb
+import pytest
+
+from conexion import ConfigPool, EnrutadorConexiones
+from conftest import ConexionFalsa
+
+
+class PoolFalso:
+    def __init__(self, nombre, respuestas=None, error=None):
+        self.nombre = nombre
+        self.respuestas = respuestas or {}
+        self.error = error
+        self.adquiridas = 0
+        self.devueltas = []
+        self.descartadas = []
+        self.opened, self.busy, self.max = 1, 0, 4
+
+    def acquire(self):
+        self.adquiridas += 1
+        if self.error is not None:
+            raise self.error
+        return ConexionFalsa(self.respuestas)
+
+    def release(self, connection):
+        self.devueltas.append(connection)
+
+    def drop(self, connection):
+        self.descartadas.append(connection)
+
+
+def config(servicio):
+    return ConfigPool(user="u", password="p", host="localhost", port=1521, service=servicio)
+
+
+def enrutador(replica=True, retraso=0.0, error_replica=None, **opciones):
+    pools = {
+        "XEPDB1": PoolFalso("primaria"),
+        "STBY": PoolFalso("replica", {"dataguard_stats": [(retraso,)]}, error_replica),
+    }
+
+    class Enrutador(EnrutadorConexiones):
+        def _crear_pool(self, config):
+            return pools[config.service]
+
+    return Enrutador(config("XEPDB1"), config("STBY") if replica else None, **opciones), pools
+
+
+def test_lecturas_a_la_replica_y_escrituras_a_la_primaria():
+    enr, pools = enrutador()
+    _, pool = enr.adquirir(solo_lectura=True)
+    assert pool is pools["STBY"]
+    _, pool = enr.adquirir(solo_lectura=False)
+    assert pool is pools["XEPDB1"]
+    assert enr.estado()["lecturasReplica"] == 1
+
+
+def test_sin_replica_las_lecturas_van_a_la_primaria():
+    enr, pools = enrutador(replica=False)
+    assert enr.adquirir(solo_lectura=True)[1] is pools["XEPDB1"]
+    assert pools["STBY"].adquiridas == 0
+
+
+def test_replica_atrasada_desvia_a_la_primaria_hasta_la_siguiente_medicion():
+    enr, pools = enrutador(retraso=45.0, tolerancia_retraso=30.0, intervalo_verificacion=60.0)
+    assert enr.adquirir(solo_lectura=True)[1] is pools["XEPDB1"]
+    assert len(pools["STBY"].devueltas) == 1
+    # Dentro del intervalo no se vuelve a tomar una conexión de la réplica
+    assert enr.adquirir(solo_lectura=True)[1] is pools["XEPDB1"]
+    assert pools["STBY"].adquiridas == 1
+    estado = enr.estado()
+    assert estado["retrasoReplica"] == 45.0 and estado["replicaDisponible"] is False
+
+
+def test_replica_caida_se_suspende():
+    enr, pools = enrutador(error_replica=oracledb.DatabaseError("ORA-12541: TNS:no listener"),
+                           espera_reintento=30.0)
+    assert enr.adquirir(solo_lectura=True)[1] is pools["XEPDB1"]
+    assert enr.adquirir(solo_lectura=True)[1] is pools["XEPDB1"]
+    assert pools["STBY"].adquiridas == 1
+    assert enr.estado()["replicaDisponible"] is False
+
+
+def test_retraso_desconocido_descarta_la_medicion_y_suspende():
+    enr, pools = enrutador()
+    pools["STBY"].respuestas["dataguard_stats"] = oracledb.DatabaseError("ORA-00942")
+    assert enr.adquirir(solo_lectura=True)[1] is pools["XEPDB1"]
+    assert enr.estado()["replicaDisponible"] is False
+
+
+@pytest.mark.parametrize("metodo, ruta, solo_lectura", [
+    ("get", "/api/caso/1", True),
+    ("put", "/api/caso/1", False),
+])
+def test_endpoints_piden_el_pool_segun_el_metodo(cliente, enrutador_falso, monkeypatch, metodo, ruta, solo_lectura):
+    pedidos = []
+    adquirir = enrutador_falso.adquirir
+
+    def registrar(solo_lectura):
+        pedidos.append(solo_lectura)
+        return adquirir(solo_lectura)
+
+    monkeypatch.setattr(enrutador_falso, "adquirir", registrar)
+    cuerpo = {"codCliente": "001", "codEspecializacion": "CIV", "fechaInicio": "2024-01-15"}
+    getattr(cliente, metodo)(ruta, **({"json": cuerpo} if metodo == "put" else {}))
+    assert pedidos and set(pedidos) == {solo_lectura}
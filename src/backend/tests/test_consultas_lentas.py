@@ -0,0 +1,119 @@
+"""Registro de consultas lentas: medición por cursor y redacción de binds."""
+
+import json
+
+import oracledb
+import pytest
+
+import consultas_lentas
+from consultas_lentas import CursorInstrumentado, RegistroConsultas, normalizar_sql
+
+
+class _CursorBase:
+    """Reemplaza la parte del driver de oracledb.Cursor."""
+
+    def __init__(self, connection, scrollable=False):
+        self._conexion = connection
+        self._filas_pendientes = []
+
+    def execute(self, statement, parameters=None, **kwargs):
+        self._filas_pendientes = [(i,) for i in range(3)]
+
+    def executemany(self, statement, parameters, *args, **kwargs):
+        pass
+
+    def fetchone(self):
+        return self._filas_pendientes.pop(0) if self._filas_pendientes else None
+
+    def fetchmany(self, n=1):
+        filas, self._filas_pendientes = self._filas_pendientes[:n], self._filas_pendientes[n:]
+        return filas
+
+    def fetchall(self):
+        filas, self._filas_pendientes = self._filas_pendientes, []
+        return filas
+
+    def close(self):
+        pass
+
+
+class _Conexion:
+    endpoint = "obtener_caso"
+
+
+@pytest.fixture
+def registro(monkeypatch, tmp_path):
+    for nombre in ("__init__", "execute", "executemany", "fetchone", "fetchmany", "fetchall", "close"):
+        monkeypatch.setattr(oracledb.Cursor, nombre, getattr(_CursorBase, nombre))
+    monkeypatch.setattr(oracledb.Cursor, "connection", property(lambda self: self._conexion), raising=False)
+    monkeypatch.setattr(oracledb.Cursor, "description", property(lambda self: [("c",)]), raising=False)
+    nuevo = RegistroConsultas(umbral_ms=10_000, muestreo=0, archivo=str(tmp_path / "lentas.log"),
+                              visibles="noCaso")
+    monkeypatch.setattr(consultas_lentas, "registro", nuevo)
+    return nuevo
+
+
+def test_normalizar_sql():
+    assert normalizar_sql("SELECT * FROM Caso -- c\n WHERE a = 'x' AND b = 12 AND c = :noCaso") == \
+        "SELECT * FROM Caso WHERE a = ? AND b = ? AND c = :noCaso"
+
+
+def test_cursor_abandonado_conserva_su_medicion(registro):
+    cursor = CursorInstrumentado(_Conexion())
+    cursor.execute("SELECT noCaso FROM Caso WHERE noCaso = :noCaso", {"noCaso": 1})
+    cursor.fetchone()
+    # Sin close() ni otro execute (p. ej. se lanzó HTTPException)
+    [fila] = registro.top()
+    assert fila["ejecuciones"] == 1
+    assert fila["filas"] == 1
+    assert fila["endpoints"] == {"obtener_caso": 1}
+
+
+def test_fetch_suma_a_la_misma_ejecucion(registro):
+    cursor = CursorInstrumentado(_Conexion())
+    cursor.execute("SELECT noCaso FROM Caso")
+    cursor.fetchmany(2)
+    cursor.fetchall()
+    cursor.close()
+    cursor = CursorInstrumentado(_Conexion())
+    cursor.execute("SELECT noCaso FROM Caso")
+    [fila] = registro.top()
+    assert fila["ejecuciones"] == 2
+    assert fila["filas"] == 3
+
+
+def test_lenta_se_escribe_una_vez_por_ejecucion(registro, tmp_path):
+    registro.umbral_ms = 0
+    cursor = CursorInstrumentado(_Conexion())
+    cursor.execute("SELECT noCaso FROM Caso WHERE noCaso = :noCaso", {"noCaso": 7})
+    cursor.fetchone()
+    cursor.fetchall()
+    lineas = (tmp_path / "lentas.log").read_text(encoding="utf-8").splitlines()
+    assert len(lineas) == 1
+    assert json.loads(lineas[0])["binds"] == {"noCaso": 7}
+    assert registro.top()[0]["lentas"] == 1
+
+
+def test_error_se_registra(registro, monkeypatch):
+    def fallar(self, *args, **kwargs):
+        raise oracledb.DatabaseError("ORA-00942: table or view does not exist")
+    monkeypatch.setattr(oracledb.Cursor, "execute", fallar)
+    cursor = CursorInstrumentado(_Conexion())
+    with pytest.raises(oracledb.DatabaseError):
+        cursor.execute("SELECT * FROM NoExiste")
+    assert registro.top()[0]["errores"] == 1
+
+
+def test_binds_se_ocultan_salvo_los_visibles():
+    registro = RegistroConsultas(visibles="noCaso, codEsp")
+    assert registro.redactar_binds({"noCaso": 5, "CODESP": "PEN", "descSuceso": "dato personal"}) == {
+        "noCaso": 5, "CODESP": "PEN", "descSuceso": "***",
+    }
+    assert registro.redactar_binds(["12345678", 3]) == ["***", "***"]
+    assert RegistroConsultas().redactar_binds({"noCaso": 5}) == {"noCaso": "***"}
+
+
+def test_binds_visibles_todos():
+    registro = RegistroConsultas(visibles="*")
+    assert registro.redactar_binds({"nombre": "Ana", "n": 1}) == {"nombre": "Ana", "n": 1}
+    assert registro.redactar_binds({"texto": "x" * 500})["texto"].endswith("...")
@@ -0,0 +1,76 @@
+"""Contadores de expediente: incremento antes del INSERT, verificación y reconstrucción."""
+
+from datetime import date
+
+import oracledb
+import pytest
+
+import conteos_expediente
+from conftest import ConexionFalsa
+
+CLAVE = {"codEsp": "CIV", "pasoEtapa": 1, "noCaso": 7, "consecExpe": 2}
+SUCESO = {"codEspecializacion": "CIV", "pasoEtapa": 1, "noCaso": 7, "consecExpe": 2, "descSuceso": "Audiencia"}
+
+
+def expediente_existente(cedula="123"):
+    def actualizar(parametros):
+        parametros["cedula"].valor = [cedula]
+        return [()]
+    return actualizar
+
+
+def test_incrementar_retorna_la_cedula_del_expediente():
+    conexion = ConexionFalsa({"UPDATE Expediente": expediente_existente()})
+    assert conteos_expediente.incrementar(conexion.cursor(), "Documento", CLAVE) == (True, "123")
+    sql, parametros = conexion.sentencias[0]
+    assert "nDocumentos = nDocumentos + 1" in sql
+    assert {k: parametros[k] for k in CLAVE} == CLAVE
+
+
+def test_incrementar_expediente_inexistente():
+    conexion = ConexionFalsa()
+    assert conteos_expediente.incrementar(conexion.cursor(), "Suceso", CLAVE) == (False, None)
+
+
+def test_crear_suceso_incrementa_antes_de_insertar(cliente, enrutador_falso):
+    enrutador_falso.respuestas.update({
+        "UPDATE Expediente": expediente_existente(),
+        "MAX(conSuceso)": [(4,)],
+    })
+    respuesta = cliente.post("/api/suceso/crear", json=SUCESO)
+    assert respuesta.status_code == 200 and respuesta.json()["conSuceso"] == 5
+    conexion = enrutador_falso.conexiones[-1]
+    orden = [sql for sql, _ in conexion.sentencias if "UPDATE Expediente" in sql or "INSERT INTO Suceso" in sql]
+    assert "nSucesos = nSucesos + 1" in orden[0] and "INSERT INTO Suceso" in orden[1]
+    assert conexion.commits == 1
+
+
+def test_crear_suceso_en_expediente_inexistente(cliente, enrutador_falso):
+    respuesta = cliente.post("/api/suceso/crear", json=SUCESO)
+    assert respuesta.status_code == 404
+    conexion = enrutador_falso.conexiones[-1]
+    assert conexion.rollbacks >= 1 and conexion.commits == 0
+    assert not any("INSERT INTO Suceso" in sql for sql, _ in conexion.sentencias)
+
+
+def test_obtener_caso_suma_los_contadores(cliente, enrutador_falso):
+    enrutador_falso.respuestas["FROM Caso c"] = [(7, date(2024, 1, 15), None, "100", "CIV", "001", 2, 9, 3, 4)]
+    datos = cliente.get("/api/caso/7").json()
+    assert (datos["totalExpedientes"], datos["totalSucesos"], datos["totalResultados"], datos["totalDocumentos"]) \
+        == (2, 9, 3, 4)
+
+
+def test_diferencias_y_reconstruir():
+    conexion = ConexionFalsa({"FROM Expediente e": [("CIV", 1, 7, 2, 3, 4, 0, 0, 1, 1)]})
+    assert conteos_expediente.diferencias(conexion) == [{
+        "clave": ("CIV", 1, 7, 2), "nSucesos": (3, 4), "nResultados": (0, 0), "nDocumentos": (1, 1),
+    }]
+    assert conteos_expediente.reconstruir(conexion) == 1
+    assert "MERGE INTO Expediente" in conexion.sentencias[-1][0] and conexion.commits == 1
+
+
+def test_reconstruir_revierte_si_falla():
+    conexion = ConexionFalsa({"MERGE INTO Expediente": oracledb.DatabaseError("ORA-00060: deadlock")})
+    with pytest.raises(oracledb.DatabaseError):
+        conteos_expediente.reconstruir(conexion)
+    assert (conexion.commits, conexion.rollbacks) == (0, 1)
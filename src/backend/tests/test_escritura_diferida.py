@@ -0,0 +1,119 @@
+"""Escritura diferida: aplicación de lotes, rechazos y límite de intentos por entrada."""
+
+import asyncio
+from types import SimpleNamespace
+
+import oracledb
+import pytest
+
+from conftest import EnrutadorFalso
+from escritura_diferida import ColaDiferida, EntradaRechazada
+
+
+def error_timeout():
+    return oracledb.DatabaseError(SimpleNamespace(full_code="DPY-4024", message="call timeout exceeded"))
+
+
+def aplicar_suceso(cursor, datos):
+    if datos.get("invalido"):
+        raise EntradaRechazada("Expediente no encontrado")
+    cursor.execute("INSERT INTO Suceso (descripcion) VALUES (:d)", {"d": datos["descripcion"]})
+
+
+@pytest.fixture
+def crear_cola(tmp_path):
+    colas = []
+
+    def crear(respuestas=None, **opciones):
+        enrutador = EnrutadorFalso(respuestas)
+        cola = ColaDiferida(str(tmp_path), enrutador, {"suceso": aplicar_suceso}, intervalo=0.001, **opciones)
+        colas.append(cola)
+        return cola, enrutador
+
+    yield crear
+    for cola in colas:
+        cola.cerrar()
+
+
+def insertados(enrutador):
+    return [p["d"] for c in enrutador.conexiones for sql, p in c.sentencias if "INSERT INTO Suceso" in sql]
+
+
+def test_aplica_y_rechaza_por_datos_sin_detener_el_lote(crear_cola):
+    cola, enrutador = crear_cola()
+    uno = cola.agregar("suceso", {"descripcion": "uno"})
+    malo = cola.agregar("suceso", {"descripcion": "x", "invalido": True})
+    dos = cola.agregar("suceso", {"descripcion": "dos"})
+
+    assert cola.aplicar_lote() == 3
+    assert insertados(enrutador) == ["uno", "dos"]
+    assert cola.estado_ticket(uno)["estado"] == "aplicada"
+    assert cola.estado_ticket(malo) == {"ticket": malo, "estado": "rechazada", "motivo": "Expediente no encontrado"}
+    assert cola.estado_ticket(dos)["estado"] == "aplicada"
+    assert cola.aplicar_lote() == 0
+
+
+async def drenar_hasta(cola, condicion, limite=5.0):
+    tarea = asyncio.create_task(cola.drenar())
+    try:
+        fin = asyncio.get_running_loop().time() + limite
+        while not condicion():
+            assert asyncio.get_running_loop().time() < fin, cola.estado()
+            await asyncio.sleep(0.01)
+    finally:
+        tarea.cancel()
+        await asyncio.gather(tarea, return_exceptions=True)
+
+
+def test_entrada_que_agota_sus_intentos_se_rechaza_y_la_cola_sigue(crear_cola):
+    def insertar(parametros):
+        if parametros["d"] == "lenta":
+            raise error_timeout()
+        return []
+
+    cola, enrutador = crear_cola({"INSERT INTO Suceso": insertar}, max_intentos=3)
+    antes = cola.agregar("suceso", {"descripcion": "antes"})
+    lenta = cola.agregar("suceso", {"descripcion": "lenta"})
+    despues = cola.agregar("suceso", {"descripcion": "despues"})
+
+    asyncio.run(drenar_hasta(cola, lambda: cola.estado_ticket(despues)["estado"] == "aplicada"))
+
+    estado = cola.estado_ticket(lenta)
+    assert estado["estado"] == "rechazada"
+    assert estado["motivo"].startswith("Sin aplicar tras 3 intentos: DatabaseError")
+    assert cola.estado_ticket(antes)["estado"] == "aplicada"
+    # Tres intentos fallidos de la entrada y luego un lote sin ella
+    assert insertados(enrutador).count("lenta") == 3
+    assert insertados(enrutador)[-2:] == ["antes", "despues"]
+    assert cola.estado()["reintentos"] == 3 and cola.estado()["rechazadasPorIntentos"] == 1
+
+
+def test_error_inesperado_del_aplicador_cuenta_como_intento(crear_cola):
+    cola, _ = crear_cola(max_intentos=2)
+    cola.aplicadores["suceso"] = lambda cursor, datos: datos["falta"]
+    ticket = cola.agregar("suceso", {"descripcion": "uno"})
+
+    asyncio.run(drenar_hasta(cola, lambda: cola.estado_ticket(ticket)["estado"] != "pendiente"))
+
+    assert cola.estado_ticket(ticket)["motivo"] == "Sin aplicar tras 2 intentos: KeyError: 'falta'"
+
+
+def test_conexion_caida_no_cuenta_contra_la_entrada(crear_cola):
+    cola, enrutador = crear_cola(max_intentos=1)
+
+    def caida(cursor, datos):
+        cursor.connection.sana = False
+        raise oracledb.DatabaseError("DPI-1080: connection was closed")
+
+    cola.aplicadores["suceso"] = caida
+    ticket = cola.agregar("suceso", {"descripcion": "uno"})
+    for _ in range(3):
+        with pytest.raises(oracledb.DatabaseError):
+            cola.aplicar_lote()
+        cola._contar_intento("caída")
+
+    assert cola.estado_ticket(ticket)["estado"] == "pendiente"
+    assert all(descartar for _, descartar in enrutador.liberadas)
+    cola.aplicadores["suceso"] = aplicar_suceso
+    assert cola.aplicar_lote() == 1
+    assert cola.estado_ticket(ticket)["estado"] == "aplicada"
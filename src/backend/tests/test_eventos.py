@@ -0,0 +1,72 @@
+"""Bus de eventos: filtros, fusión, retransmisión entre workers y destinatarios."""
+
+import asyncio
+
+import main
+import servidor
+from eventos import BusEventos
+
+EXPEDIENTE = {"codEsp": "CIV", "pasoEtapa": 1, "noCaso": 7, "consecExpe": 3}
+
+
+def test_suscripcion_filtra_y_fusiona_eventos():
+    async def escenario():
+        bus = BusEventos()
+        por_caso = bus.suscribir(no_caso=7)
+        por_abogado = bus.suscribir(cedula="100")
+        for _ in range(3):
+            bus.publicar("suceso", 7, EXPEDIENTE, cedulas=("200",))
+        bus.publicar("suceso", 8, EXPEDIENTE, cedulas=("100",))
+        return (await por_caso.siguiente(0.01, 1), await por_abogado.siguiente(0.01, 1))
+
+    del_caso, del_abogado = asyncio.run(escenario())
+    assert [(e["noCaso"], e["n"]) for e in del_caso] == [(7, 3)]
+    assert [(e["noCaso"], e["n"]) for e in del_abogado] == [(8, 1)]
+
+
+def test_bufer_lleno_envia_resync():
+    async def escenario():
+        bus = BusEventos(max_pendientes=2)
+        suscripcion = bus.suscribir(no_caso=7)
+        for consec in range(3):
+            bus.publicar("suceso", 7, {**EXPEDIENTE, "consecExpe": consec})
+        return await suscripcion.siguiente(0.01, 1)
+
+    assert [e["tipo"] for e in asyncio.run(escenario())] == ["resync"]
+
+
+def test_maestro_retransmite_a_los_demas_workers():
+    relevo = servidor._RelevoEventos()
+    bus_a, bus_b = BusEventos(), BusEventos()
+    bus_a.conectar(relevo.nuevo_canal())
+    bus_b.conectar(relevo.nuevo_canal())
+
+    async def escenario():
+        en_a = bus_a.suscribir(no_caso=7)
+        en_b = bus_b.suscribir(cedula="100")
+        await asyncio.to_thread(bus_a.publicar, "expediente", 7, EXPEDIENTE, cedulas=("100",))
+        return await en_b.siguiente(0.01, 5), await en_a.siguiente(0.2, 0.5)
+
+    en_b, en_a = asyncio.run(escenario())
+    assert [(e["tipo"], e["consecExpe"]) for e in en_b] == [("expediente", 3)]
+    # El worker que publicó lo entrega una sola vez (el maestro no se lo devuelve)
+    assert [e["n"] for e in en_a] == [1]
+    assert bus_a.estado()["enviadosAlMaestro"] == 1
+    assert bus_b.estado()["recibidosDeOtrosWorkers"] == 1
+
+
+def test_crear_expediente_notifica_a_los_abogados_del_caso(cliente, enrutador_falso, monkeypatch):
+    publicados = []
+    monkeypatch.setattr(main.bus_eventos, "publicar", lambda *a, **k: publicados.append((a, k)))
+    enrutador_falso.respuestas.update({
+        "MAX(consecExpe)": [(4,)],
+        "SELECT codEspecializacion FROM Caso": [("CIV",)],
+        "DISTINCT cedula": [("100",), ("200",)],
+    })
+    respuesta = cliente.post("/api/expediente/crear", json={
+        "codEspecializacion": "CIV", "pasoEtapa": 1, "noCaso": 7, "codLugar": "11001", "fechaEtapa": "2024-05-02",
+    })
+    assert respuesta.status_code == 200
+    (argumentos, opciones), = publicados
+    assert argumentos[:2] == ("expediente", 7) and argumentos[2]["consecExpe"] == 5
+    assert sorted(opciones["cedulas"]) == ["100", "200"]
@@ -0,0 +1,147 @@
+"""Idempotency-Key: repetición de la respuesta, conflictos, solicitudes en curso y persistencia."""
+
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import oracledb
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from conftest import EnrutadorFalso
+from idempotencia import (AlmacenIdempotencia, IdempotenciaMiddleware, PersistenciaIdempotencia,
+                          SolicitudEnCurso)
+
+
+def crear_app(almacen, demora=0.0):
+    llamadas = []
+
+    async def crear(request):
+        datos = await request.json()
+        llamadas.append(datos)
+        await asyncio.sleep(demora)
+        return JSONResponse({"id": len(llamadas)}, status_code=datos.get("estado", 200),
+                            headers={"Location": f"/crear/{len(llamadas)}"})
+
+    app = IdempotenciaMiddleware(Starlette(routes=[Route("/crear", crear, methods=["POST"])]),
+                                 almacen=almacen, rutas={"/crear"})
+    return app, llamadas
+
+
+def test_reintento_recibe_la_respuesta_original():
+    app, llamadas = crear_app(AlmacenIdempotencia())
+    with TestClient(app) as cliente:
+        primera = cliente.post("/crear", json={"a": 1}, headers={"Idempotency-Key": "k1"})
+        segunda = cliente.post("/crear", json={"a": 1}, headers={"Idempotency-Key": "k1"})
+        otra = cliente.post("/crear", json={"a": 1}, headers={"Idempotency-Key": "k2"})
+        sin_clave = cliente.post("/crear", json={"a": 1})
+    assert segunda.json() == primera.json() == {"id": 1}
+    assert segunda.headers["idempotent-replayed"] == "true" and segunda.headers["location"] == "/crear/1"
+    assert "idempotent-replayed" not in primera.headers
+    assert (otra.json(), sin_clave.json()) == ({"id": 2}, {"id": 3})
+    assert len(llamadas) == 3
+
+
+def test_misma_clave_con_otro_cuerpo_es_conflicto():
+    almacen = AlmacenIdempotencia()
+    app, llamadas = crear_app(almacen)
+    with TestClient(app) as cliente:
+        cliente.post("/crear", json={"a": 1}, headers={"Idempotency-Key": "k"})
+        respuesta = cliente.post("/crear", json={"a": 2}, headers={"Idempotency-Key": "k"})
+    assert respuesta.status_code == 422 and len(llamadas) == 1
+    assert almacen.estado()["conflictos"] == 1
+
+
+@pytest.mark.parametrize("estado, guardada", [(201, True), (404, True), (409, False), (500, False)])
+def test_solo_se_guardan_respuestas_definitivas(estado, guardada):
+    app, llamadas = crear_app(AlmacenIdempotencia())
+    with TestClient(app, raise_server_exceptions=False) as cliente:
+        for _ in range(2):
+            respuesta = cliente.post("/crear", json={"estado": estado}, headers={"Idempotency-Key": "k"})
+            assert respuesta.status_code == estado
+    assert len(llamadas) == (1 if guardada else 2)
+
+
+def test_clave_demasiado_larga():
+    app, llamadas = crear_app(AlmacenIdempotencia())
+    with TestClient(app) as cliente:
+        respuesta = cliente.post("/crear", json={}, headers={"Idempotency-Key": "x" * 256})
+    assert respuesta.status_code == 400 and llamadas == []
+
+
+def enviar_juntas(cliente, cantidad):
+    with ThreadPoolExecutor(cantidad) as hilos:
+        return list(hilos.map(
+            lambda _: cliente.post("/crear", json={"a": 1}, headers={"Idempotency-Key": "k"}), range(cantidad)
+        ))
+
+
+def test_reintento_concurrente_espera_a_la_original():
+    app, llamadas = crear_app(AlmacenIdempotencia(espera=5.0), demora=0.2)
+    with TestClient(app) as cliente:
+        respuestas = enviar_juntas(cliente, 3)
+    assert len(llamadas) == 1
+    assert {r.json()["id"] for r in respuestas} == {1}
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in respuestas) == 2
+
+
+def test_reintento_concurrente_sin_esperar_responde_409():
+    app, llamadas = crear_app(AlmacenIdempotencia(espera=0.01), demora=0.3)
+    with TestClient(app) as cliente:
+        respuestas = enviar_juntas(cliente, 2)
+    assert sorted(r.status_code for r in respuestas) == [200, 409]
+    assert len(llamadas) == 1
+
+
+def test_capacidad_descarta_las_claves_menos_recientes():
+    almacen = AlmacenIdempotencia(capacidad=2)
+
+    async def guardar():
+        for clave in ("a", "b", "c"):
+            assert await almacen.reservar(clave, "h") is None
+            await almacen.completar(clave, "h", 200, [], b"{}")
+        return [await almacen.reservar(clave, "h") is not None for clave in ("b", "c")], almacen._buscar("a")
+
+    repetidas, descartada = asyncio.run(guardar())
+    assert repetidas == [True, True] and descartada is None
+
+
+def test_persistencia_reserva_en_curso_en_otro_worker():
+    enrutador = EnrutadorFalso({
+        "INSERT INTO Idempotencia": oracledb.IntegrityError("ORA-00001"),
+        "FROM Idempotencia": [("h", None, None, None, 0, 0)],
+    })
+    with pytest.raises(SolicitudEnCurso):
+        PersistenciaIdempotencia(enrutador, ttl=60).reservar("k", "h")
+    assert all(not descartar for _, descartar in enrutador.liberadas)
+
+
+def test_persistencia_respuesta_guardada_en_otro_worker():
+    cuerpo = SimpleNamespace(read=lambda: '{"id": 7}')
+    enrutador = EnrutadorFalso({
+        "INSERT INTO Idempotencia": oracledb.IntegrityError("ORA-00001"),
+        "FROM Idempotencia": [("h", 201, '[["content-type", "application/json"]]', cuerpo, 0, 0)],
+    })
+    registro = PersistenciaIdempotencia(enrutador, ttl=60).reservar("k", "h")
+    assert (registro.estado, registro.cabeceras, registro.cuerpo) == (201, [("content-type", "application/json")],
+                                                                      b'{"id": 7}')
+
+
+def test_crear_suceso_con_idempotency_key_no_duplica(cliente, enrutador_falso):
+    def actualizar(parametros):
+        parametros["cedula"].valor = ["123"]
+        return [()]
+
+    enrutador_falso.respuestas.update({"UPDATE Expediente": actualizar, "MAX(conSuceso)": [(0,)]})
+    suceso = {"codEspecializacion": "CIV", "pasoEtapa": 1, "noCaso": 7, "consecExpe": 2, "descSuceso": "x"}
+    clave = {"Idempotency-Key": str(uuid.uuid4())}
+    primera = cliente.post("/api/suceso/crear", json=suceso, headers=clave)
+    segunda = cliente.post("/api/suceso/crear", json=suceso, headers=clave)
+    assert primera.status_code == segunda.status_code == 200
+    assert segunda.json() == primera.json() and segunda.headers["idempotent-replayed"] == "true"
+    inserciones = [sql for c in enrutador_falso.conexiones for sql, _ in c.sentencias if "INSERT INTO Suceso" in sql]
+    assert len(inserciones) == 1
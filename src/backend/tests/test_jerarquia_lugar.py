@@ -0,0 +1,113 @@
+"""Jerarquía de lugares: consultas sobre el árbol y detección de cambios en LUGAR."""
+
+import pytest
+
+from jerarquia_lugar import JerarquiaLugares
+
+
+class TablaLugar:
+    """LUGAR simulada: {codLugar: [padre, tipo, nombre, ora_rowscn]}."""
+
+    def __init__(self, filas):
+        self.filas = {cod: list(datos) for cod, datos in filas.items()}
+        self.lecturas = []
+
+    def cursor(self):
+        return _Cursor(self)
+
+
+class _Cursor:
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self._resultado = []
+
+    def execute(self, sql, parametros=None):
+        filas = self.tabla.filas
+        if "ORA_HASH" in sql:
+            suma = sum(hash((c, *d[:3])) % 2**32 for c, d in filas.items())
+            self._resultado = [(len(filas), max((d[3] for d in filas.values()), default=None), suma)]
+        else:
+            desde = parametros["scn"] if parametros else -1
+            self._resultado = [(c, d[0], d[1], d[2], d[3]) for c, d in filas.items() if d[3] > desde]
+            self.tabla.lecturas.append("incremental" if parametros else "completa")
+
+    def fetchone(self):
+        return self._resultado[0]
+
+    def fetchall(self):
+        return list(self._resultado)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def tabla():
+    return TablaLugar({
+        "BOG": [None, "CIU", "Bogotá", 10],
+        "J1": ["BOG", "JUZ", "Juzgado 1", 10],
+        "D1": ["J1", "DES", "Despacho 1", 10],
+        "J2": ["BOG", "JUZ", "Juzgado 2", 10],
+    })
+
+
+@pytest.fixture
+def jerarquia(tabla):
+    jerarquia = JerarquiaLugares(intervalo_refresco=0)
+    jerarquia.cargar(tabla)
+    tabla.lecturas.clear()
+    return jerarquia
+
+
+def test_consultas_del_arbol(jerarquia):
+    assert [n["codLugar"] for n in jerarquia.ancestros("D1")] == ["J1", "BOG"]
+    assert [(n["codLugar"], n["nivel"]) for n in jerarquia.descendientes("BOG")] == [
+        ("J1", 1), ("D1", 2), ("J2", 1)
+    ]
+    assert [n["codLugar"] for n in jerarquia.descendientes("BOG", tipo="JUZ")] == ["J1", "J2"]
+    assert jerarquia.es_ancestro("BOG", "D1")
+    assert not jerarquia.es_ancestro("J2", "D1")
+    assert jerarquia.subarbol("J1")["hijos"][0]["codLugar"] == "D1"
+
+
+def test_sin_cambios_no_lee_filas(jerarquia, tabla):
+    jerarquia.refrescar(tabla)
+    assert tabla.lecturas == []
+
+
+def test_cambio_con_scn_nuevo_es_incremental(jerarquia, tabla):
+    tabla.filas["D1"] = ["J2", "DES", "Despacho 1", 11]
+    jerarquia.refrescar(tabla)
+    assert tabla.lecturas == ["incremental"]
+    assert jerarquia.es_ancestro("J2", "D1")
+
+
+def test_borrado_y_alta_con_mismo_total_y_scn(jerarquia, tabla):
+    # ORA_ROWSCN por bloque: el alta puede quedar con un SCN no mayor al máximo conocido
+    del tabla.filas["J2"]
+    tabla.filas["J3"] = ["BOG", "JUZ", "Juzgado 3", 10]
+    jerarquia.refrescar(tabla)
+    assert tabla.lecturas == ["incremental", "completa"]
+    assert jerarquia.existe("J3") and not jerarquia.existe("J2")
+
+
+def test_cambio_de_contenido_sin_scn_nuevo(jerarquia, tabla):
+    tabla.filas["J1"][2] = "Juzgado Primero"
+    jerarquia.refrescar(tabla)
+    assert jerarquia.ancestros("D1")[0]["nomLugar"] == "Juzgado Primero"
+
+
+def test_recarga_completa_periodica(tabla):
+    jerarquia = JerarquiaLugares(intervalo_refresco=0, intervalo_recarga=0)
+    jerarquia.cargar(tabla)
+    tabla.lecturas.clear()
+    jerarquia.refrescar(tabla)
+    assert tabla.lecturas == ["completa"]
+
+
+def test_cargar_filas_de_la_instantanea():
+    jerarquia = JerarquiaLugares()
+    filas = [{"codLugar": "A", "lugCodLugar": None, "idTipoLugar": "CIU", "nomLugar": "A"},
+             {"codLugar": "B", "lugCodLugar": "A", "idTipoLugar": "JUZ", "nomLugar": "B"}]
+    jerarquia.cargar_filas(filas, version=3)
+    assert jerarquia.version == 3 and jerarquia.es_ancestro("A", "B")
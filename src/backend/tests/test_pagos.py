@@ -0,0 +1,104 @@
+"""Libro de pagos: ingreso por lotes y reintento del resumen diario."""
+
+import threading
+from datetime import date
+from types import SimpleNamespace
+
+import oracledb
+
+import main
+import pagos
+from conftest import ConexionFalsa, CursorFalso
+
+LOTE = [
+    {"idFormaPago": "EF", "codFranquicia": None, "fechaPago": date(2024, 5, 2), "valorPago": 100, "nTarjeta": None},
+    {"idFormaPago": "TC", "codFranquicia": "VIS", "fechaPago": date(2024, 5, 2), "valorPago": 40, "nTarjeta": "4111"},
+    {"idFormaPago": "EF", "codFranquicia": None, "fechaPago": date(2024, 5, 2), "valorPago": 60, "nTarjeta": None},
+]
+
+
+def _conexion():
+    return ConexionFalsa({"PAGO_SEQ.NEXTVAL": lambda p: [(n,) for n in range(1, p["cantidad"] + 1)]})
+
+
+def _merges(conexion):
+    return [filas for sql, filas in conexion.sentencias if "MERGE INTO Pago_Resumen_Dia" in sql]
+
+
+def test_ingresar_lote_agrupa_el_resumen_por_dia_forma_y_franquicia():
+    conexion = _conexion()
+    consecutivos, deltas = pagos.ingresar_lote(conexion.cursor(), LOTE)
+    assert consecutivos == [1, 2, 3]
+    assert deltas == {
+        (date(2024, 5, 2), "EF", pagos.SIN_FRANQUICIA): [2, 160],
+        (date(2024, 5, 2), "TC", "VIS"): [1, 40],
+    }
+    assert len(_merges(conexion)) == 1
+
+
+def test_filas_del_resumen_insertadas_por_otro_lote_se_reintentan_una_vez():
+    conexion = _conexion()
+    conexion.errores_lote.append([SimpleNamespace(offset=1, code=1, message="ORA-00001")])
+    pagos.ingresar_lote(conexion.cursor(), LOTE)
+    primera, reintento = _merges(conexion)
+    assert len(primera) == 2
+    assert reintento == [primera[1]]
+
+
+def test_totales_en_memoria_suman_los_lotes_confirmados():
+    conexion = ConexionFalsa({"FROM Pago_Resumen_Dia": [("EF", "-", 3, 300)]})
+    totales = pagos.TotalesPago(ttl=300)
+    totales.cargar(conexion)
+    totales.confirmar(conexion, {(date(2024, 5, 2), "EF", "-"): [2, 160], (date(2024, 5, 2), "TC", "VIS"): [1, 40]})
+    totales.recargar(conexion)
+    filas = {(f["idFormaPago"], f["codFranquicia"]): f for f in totales.consultar()}
+    assert (filas[("EF", None)]["nPagos"], filas[("EF", None)]["totalPago"]) == (5, 460)
+    assert filas[("TC", "VIS")]["nPagos"] == 1
+    assert conexion.commits == 1 and len(conexion.sentencias) == 1
+
+
+def test_lote_confirmado_durante_la_recarga_se_cuenta_una_vez():
+    totales = pagos.TotalesPago(ttl=0)
+    totales.cargar(ConexionFalsa({"FROM Pago_Resumen_Dia": [("EF", "-", 3, 300)]}))
+    abierta, seguir = threading.Event(), threading.Event()
+
+    class Cursor(CursorFalso):
+        def fetchall(self):
+            abierta.set()
+            assert seguir.wait(5)
+            return super().fetchall()
+
+    lectura = ConexionFalsa({"FROM Pago_Resumen_Dia": [("EF", "-", 3, 300)]})
+    lectura.cursor = lambda: Cursor(lectura)
+    hilo = threading.Thread(target=totales.recargar, args=(lectura,))
+    hilo.start()
+    assert abierta.wait(5)
+
+    # La consulta de recarga ya está abierta: el lote no viene en ella
+    totales.confirmar(ConexionFalsa(), {(date(2024, 5, 2), "EF", "-"): [1, 50]})
+    assert totales.consultar()[0]["nPagos"] == 4
+    seguir.set()
+    hilo.join(5)
+    assert (totales.consultar()[0]["nPagos"], totales.consultar()[0]["totalPago"]) == (4, 350)
+
+
+def test_totales_solo_toman_conexion_al_vencer_el_ttl(cliente, enrutador_falso, monkeypatch):
+    monkeypatch.setattr(main, "totales_pago", pagos.TotalesPago(ttl=300))
+    enrutador_falso.respuestas["FROM Pago_Resumen_Dia"] = [("EF", "-", 3, 300)]
+    for _ in range(3):
+        assert cliente.get("/api/pago/totales").json() == [
+            {"idFormaPago": "EF", "codFranquicia": None, "nPagos": 3, "totalPago": 300},
+        ]
+    assert len(enrutador_falso.conexiones) == 1
+
+    main.totales_pago.ttl = 0
+    enrutador_falso.respuestas["FROM Pago_Resumen_Dia"] = oracledb.DatabaseError("ORA-03113")
+    assert cliente.get("/api/pago/totales").json()[0]["nPagos"] == 3
+    assert len(enrutador_falso.conexiones) == 2
+
+
+def test_fechas_en_el_limite_del_calendario_responden_400(cliente, enrutador_falso):
+    assert cliente.get("/api/pago?desde=2024-01-01&hasta=9999-12-31").status_code == 400
+    assert cliente.get("/api/pago/conciliacion?mes=9999-12-15").status_code == 400
+    assert cliente.get("/api/pago?desde=2024-01-01&hasta=9999-12-30").status_code == 200
+    assert cliente.get("/api/pago/conciliacion?mes=9999-11-15").status_code == 200
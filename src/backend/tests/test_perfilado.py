@@ -0,0 +1,59 @@
+"""Perfilado: token para pedir y consultar perfiles, y escritura fuera del event loop."""
+
+import threading
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def perfilador(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.perfilador, "token", "secreto")
+    monkeypatch.setattr(main.perfilador, "directorio", str(tmp_path))
+    return main.perfilador
+
+
+def test_consultar_perfiles_exige_el_token(cliente, perfilador, tmp_path):
+    (tmp_path / "20251014-101502_GET_x_3fa85f64.txt").write_text("a;b 1\n")
+    for cabeceras in ({}, {"X-Perfilar": "otro"}):
+        assert cliente.get("/api/admin/perfiles", headers=cabeceras).status_code == 403
+        assert cliente.get("/api/admin/perfiles/20251014-101502_GET_x_3fa85f64.txt",
+                           headers=cabeceras).status_code == 403
+
+    respuesta = cliente.get("/api/admin/perfiles/20251014-101502_GET_x_3fa85f64.txt",
+                            headers={"X-Perfilar": "secreto"})
+    assert respuesta.status_code == 200 and respuesta.text == "a;b 1\n"
+    # La consulta no genera un perfil propio
+    assert "x-perfil" not in respuesta.headers
+    assert [a["nombre"] for a in cliente.get("/api/admin/perfiles", headers={"X-Perfilar": "secreto"}).json()["archivos"]] \
+        == ["20251014-101502_GET_x_3fa85f64.txt"]
+
+
+def test_sin_token_configurado_los_perfiles_no_se_consultan(cliente, perfilador, monkeypatch):
+    monkeypatch.setattr(perfilador, "token", "")
+    assert cliente.get("/api/admin/perfiles", headers={"X-Perfilar": ""}).status_code == 403
+
+
+def test_token_en_la_url_no_perfila(cliente, perfilador, tmp_path):
+    respuesta = cliente.get("/api/health?perfilar=secreto")
+    assert "x-perfil" not in respuesta.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_perfil_bajo_demanda_se_escribe_fuera_del_event_loop(cliente, perfilador, monkeypatch, tmp_path):
+    hilos = []
+    escribir = perfilador._escribir
+
+    def registrar(nombre, lineas):
+        hilos.append(threading.current_thread().name)
+        escribir(nombre, lineas)
+
+    monkeypatch.setattr(perfilador, "_escribir", registrar)
+    hilo_bucle = []
+    cliente.portal.call(lambda: hilo_bucle.append(threading.current_thread().name))
+
+    respuesta = cliente.get("/api/health", headers={"X-Perfilar": "secreto"})
+    nombre = respuesta.headers["x-perfil"]
+    assert (tmp_path / nombre).read_text().startswith("# GET /api/health")
+    assert hilos and hilo_bucle[0] not in hilos
@@ -0,0 +1,92 @@
+"""Regresión de planes: extracción de sentencias, huellas y verificación."""
+
+import textwrap
+
+import planes_consultas
+from planes_consultas import extraer_sentencias, huella, verificar
+
+
+def _modulo(directorio, codigo):
+    (directorio / "consultas.py").write_text(textwrap.dedent(codigo), encoding="utf-8")
+
+
+def test_huella_no_depende_de_la_posicion(tmp_path):
+    _modulo(tmp_path, '''
+        def listar(cursor):
+            cursor.execute("SELECT a FROM T WHERE b = :b")
+    ''')
+    antes, _ = extraer_sentencias(str(tmp_path))
+    _modulo(tmp_path, '''
+        def listar(cursor):
+            cursor.execute("SELECT x FROM Nueva")
+            cursor.execute("""
+                SELECT a FROM T
+                WHERE b = :b
+            """)
+    ''')
+    despues, _ = extraer_sentencias(str(tmp_path))
+    clave = huella("SELECT a FROM T WHERE b = :b")
+    assert set(antes) == {clave}
+    assert clave in despues and len(despues) == 2
+    assert despues[clave]["ubicaciones"] == ["consultas.listar:4"]
+
+
+def test_sentencia_repetida_tiene_una_entrada(tmp_path):
+    _modulo(tmp_path, '''
+        def uno(cursor):
+            cursor.execute("SELECT 1 FROM dual")
+
+        def dos(cursor):
+            def interna():
+                cursor.execute("SELECT 1 FROM dual")
+            interna()
+    ''')
+    sentencias, _ = extraer_sentencias(str(tmp_path))
+    [entrada] = sentencias.values()
+    assert entrada["ubicaciones"] == ["consultas.uno:3", "consultas.interna:7"]
+
+
+def test_sql_dinamico_es_no_verificable(tmp_path):
+    _modulo(tmp_path, '''
+        def filtrar(cursor, columna, extra):
+            cursor.execute(f"SELECT {columna} FROM T")
+            cursor.execute("SELECT a FROM T WHERE " + extra)
+            cursor.execute("SELECT a FROM T")
+    ''')
+    sentencias, no_verificables = extraer_sentencias(str(tmp_path))
+    assert [s["sql"] for s in sentencias.values()] == ["SELECT a FROM T"]
+    assert no_verificables == ["consultas.filtrar:3", "consultas.filtrar:4"]
+
+
+def test_backend_se_extrae_sin_duplicados():
+    sentencias, _ = extraer_sentencias(planes_consultas.DIRECTORIO_BACKEND)
+    assert sentencias
+    for clave, entrada in sentencias.items():
+        assert clave == huella(entrada["sql"])
+        assert len(entrada["ubicaciones"]) == len(set(entrada["ubicaciones"]))
+
+
+def _resultado(completos=(), ordenamientos=()):
+    return {"ubicaciones": ["m.f:1"], "accesosCompletos": list(completos),
+            "ordenamientos": list(ordenamientos)}
+
+
+def test_verificar_detecta_regresiones():
+    base = {"a": _resultado(), "b": _resultado(["CASO"]), "c": _resultado()}
+    actual = {
+        "a": _resultado(["EXPEDIENTE"]),
+        "b": _resultado(["CASO"]),
+        "c": {"ubicaciones": ["m.g:2"], "error": "ORA-00942"},
+        "nueva": _resultado(["SUCESO"]),
+    }
+    regresiones = verificar(actual, base)
+    assert regresiones == [
+        "m.f:1: nuevo acceso FULL en EXPEDIENTE",
+        "m.g:2: EXPLAIN PLAN falla (ORA-00942)",
+    ]
+
+
+def test_verificar_nuevo_sort():
+    assert verificar({"a": _resultado(ordenamientos=["ORDER BY"])}, {"a": _resultado()}) == [
+        "m.f:1: nuevo SORT ORDER BY"
+    ]
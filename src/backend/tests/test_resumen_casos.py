@@ -0,0 +1,176 @@
+"""Resumen de casos: formato de `valor`, MERGE de deltas y agregación en memoria."""
+
+import threading
+from datetime import date
+from decimal import Decimal
+
+import oracledb
+import pytest
+
+import main
+import resumen_casos
+from conftest import ConexionFalsa, CursorFalso
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("1500", Decimal("1500")),
+    ("1500000.50", Decimal("1500000.50")),
+    ("  250.5 ", Decimal("250.5")),
+    ("0", Decimal("0")),
+])
+def test_parsear_valor_acepta_el_formato_documentado(texto, esperado):
+    assert resumen_casos.parsear_valor(texto) == esperado
+
+
+@pytest.mark.parametrize("texto", [
+    None, "", "1.500", "1.500.000", "1,50", "1,000,000.50", "1.000.000,50",
+    "$100", "1 000", "-5", "1.505", "abc", ".5", "5.",
+])
+def test_parsear_valor_rechaza_lo_demas(texto):
+    assert resumen_casos.parsear_valor(texto) is None
+
+
+def test_deltas_caso_con_cierre_y_retiro():
+    deltas = resumen_casos.deltas_caso("CIV", "001", date(2024, 1, 15), date(2024, 3, 2), "100.25", signo=-1)
+    assert deltas == [
+        (("CIV", "001", date(2024, 1, 1)), -1, 0, Decimal("-100.25")),
+        (("CIV", "001", date(2024, 3, 1)), 0, -1, Decimal(0)),
+    ]
+    # Un valor inválido aporta 0 al total
+    assert resumen_casos.deltas_caso("CIV", "001", date(2024, 1, 1), None, "1.500")[0][3] == 0
+
+
+def test_aplicar_reintenta_el_merge_si_otra_transaccion_inserto_la_clave():
+    fallas = [oracledb.IntegrityError("ORA-00001: restricción única violada")]
+
+    def merge(parametros):
+        if fallas:
+            raise fallas.pop()
+        return []
+
+    conexion = ConexionFalsa({"MERGE INTO Caso_Resumen_Mes": merge})
+    deltas = resumen_casos.deltas_caso("CIV", "001", date(2024, 1, 15), None, "100")
+    resumen_casos.aplicar(conexion.cursor(), deltas)
+    assert len(conexion.sentencias) == 2
+    assert conexion.sentencias[0][1] == conexion.sentencias[1][1]
+
+
+def test_aplicar_propaga_si_el_reintento_tambien_falla():
+    conexion = ConexionFalsa({"MERGE INTO Caso_Resumen_Mes": oracledb.IntegrityError("ORA-02291")})
+    deltas = resumen_casos.deltas_caso("CIV", "001", date(2024, 1, 15), None, "100")
+    with pytest.raises(oracledb.IntegrityError):
+        resumen_casos.aplicar(conexion.cursor(), deltas)
+    assert len(conexion.sentencias) == 2
+
+
+def test_reconstruir_cuenta_valores_invalidos():
+    conexion = ConexionFalsa({"FROM Caso": [
+        ("CIV", "001", date(2024, 1, 5), None, "100"),
+        ("CIV", "001", date(2024, 1, 20), date(2024, 2, 1), "1.500"),
+    ]})
+    filas, invalidos = resumen_casos.reconstruir(conexion)
+    assert (filas, invalidos) == (2, 1)
+    insertadas = dict((fila[:3], fila[3:]) for fila in conexion.sentencias[-1][1])
+    assert insertadas[("CIV", "001", date(2024, 1, 1))] == (2, 0, Decimal("100"))
+    assert conexion.commits == 1
+
+
+def test_cache_agrupa_filtra_y_aplica_deltas():
+    conexion = ConexionFalsa({"FROM Caso_Resumen_Mes": [
+        ("CIV", "001", date(2024, 1, 1), 2, 1, 300),
+        ("CIV", "002", date(2024, 2, 1), 1, 0, 50),
+        ("PEN", "001", date(2024, 1, 1), 4, 0, 10),
+    ]})
+    cache = resumen_casos.CacheResumen(ttl=300)
+    cache.recargar(conexion)
+    assert cache.consultar(["especializacion"]) == [
+        {"codEspecializacion": "CIV", "abiertos": 3, "cerrados": 1, "valorTotal": 350.0},
+        {"codEspecializacion": "PEN", "abiertos": 4, "cerrados": 0, "valorTotal": 10.0},
+    ]
+    cache.confirmar(conexion, resumen_casos.deltas_caso("CIV", "002", date(2024, 2, 9), None, "25"))
+    cache.recargar(conexion)
+    assert cache.consultar(["mes"], cod_esp="CIV", desde=date(2024, 2, 15)) == [
+        {"mes": "2024-02-01", "abiertos": 2, "cerrados": 0, "valorTotal": 75.0},
+    ]
+    # Los deltas locales no vuelven a leer la tabla mientras no venza el ttl
+    assert len(conexion.sentencias) == 1 and conexion.commits == 1
+    assert not cache.necesita_recarga()
+
+
+class _ConexionLectura(ConexionFalsa):
+    """Su fetchall avisa que la consulta ya está abierta y espera la señal para seguir."""
+
+    def __init__(self, respuestas):
+        super().__init__(respuestas)
+        self.abierta, self.seguir = threading.Event(), threading.Event()
+
+    def cursor(self):
+        conexion = self
+
+        class Cursor(CursorFalso):
+            def fetchall(self):
+                conexion.abierta.set()
+                assert conexion.seguir.wait(5)
+                return super().fetchall()
+
+        return Cursor(self)
+
+
+def test_recarga_no_bloquea_lecturas_ni_cuenta_dos_veces_los_deltas():
+    cache = resumen_casos.CacheResumen(ttl=0)
+    cache.cargar(ConexionFalsa({"FROM Caso_Resumen_Mes": [("CIV", "001", date(2024, 1, 1), 2, 0, 100)]}))
+    # Confirmado antes de la recarga: la tabla ya lo trae y no se suma otra vez
+    cache.confirmar(ConexionFalsa(), [(("CIV", "001", date(2024, 1, 1)), 1, 0, Decimal(50))])
+
+    lectura = _ConexionLectura({"FROM Caso_Resumen_Mes": [("CIV", "001", date(2024, 1, 1), 3, 0, 150)]})
+    hilo = threading.Thread(target=cache.recargar, args=(lectura,))
+    hilo.start()
+    assert lectura.abierta.wait(5)
+
+    # Con la consulta abierta se sigue leyendo la copia anterior y se puede confirmar
+    assert cache.consultar(["especializacion"])[0]["abiertos"] == 3
+    assert not cache.necesita_recarga()
+    cache.confirmar(ConexionFalsa(), [(("CIV", "001", date(2024, 1, 1)), 1, 0, Decimal(25))])
+    assert cache.consultar(["especializacion"])[0]["abiertos"] == 4
+
+    lectura.seguir.set()
+    hilo.join(5)
+    # Lo confirmado después de abrir la consulta se suma una sola vez a la copia nueva
+    assert cache.consultar(["especializacion"]) == [
+        {"codEspecializacion": "CIV", "abiertos": 4, "cerrados": 0, "valorTotal": 175.0},
+    ]
+
+
+def test_endpoint_solo_toma_conexion_al_vencer_el_ttl(cliente, enrutador_falso, monkeypatch):
+    monkeypatch.setattr(main, "cache_resumen", resumen_casos.CacheResumen(ttl=300))
+    enrutador_falso.respuestas["FROM Caso_Resumen_Mes"] = [("CIV", "001", date(2024, 1, 1), 2, 0, 100)]
+
+    for _ in range(3):
+        respuesta = cliente.get("/api/resumen/casos?agrupar=especializacion")
+        assert respuesta.json() == [
+            {"codEspecializacion": "CIV", "abiertos": 2, "cerrados": 0, "valorTotal": 100.0},
+        ]
+    assert len(enrutador_falso.conexiones) == 1
+
+    # Vencido el ttl, si la recarga falla se sirve la copia que ya estaba
+    main.cache_resumen.ttl = 0
+    enrutador_falso.respuestas["FROM Caso_Resumen_Mes"] = oracledb.DatabaseError("ORA-03113")
+    assert cliente.get("/api/resumen/casos?agrupar=especializacion").json()[0]["abiertos"] == 2
+    assert len(enrutador_falso.conexiones) == 2
+    assert main.control_admision.metricas()["catalogo"]["activos"] == 0
+
+
+def test_endpoint_sin_copia_responde_error_si_la_carga_falla(cliente, enrutador_falso, monkeypatch):
+    monkeypatch.setattr(main, "cache_resumen", resumen_casos.CacheResumen(ttl=300))
+    enrutador_falso.respuestas["FROM Caso_Resumen_Mes"] = oracledb.DatabaseError("ORA-03113")
+    assert cliente.get("/api/resumen/casos").status_code == 500
+
+
+def test_crear_caso_rechaza_valor_con_separadores_de_miles(cliente, enrutador_falso):
+    respuesta = cliente.post("/api/caso/crear", json={
+        "codCliente": "001", "codEspecializacion": "CIV", "fechaInicio": "2024-01-15", "valor": "1.500.000",
+    })
+    assert respuesta.status_code == 400
+    assert enrutador_falso.respuestas == {} and all(
+        "INSERT" not in sql for c in enrutador_falso.conexiones for sql, _ in c.sentencias
+    )
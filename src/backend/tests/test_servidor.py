@@ -0,0 +1,90 @@
+"""Servidor: reinicio escalonado, reemplazo de workers caídos y relevo de eventos entre workers."""
+
+import itertools
+import threading
+
+import pytest
+
+import servidor
+
+
+class ProcesoFalso:
+    def __init__(self, pid):
+        self.pid = pid
+        self.vivo = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.vivo
+
+
+class WorkerFalso:
+    def __init__(self, pid, arranca, registro):
+        self.proceso = ProcesoFalso(pid)
+        self.listo = threading.Event()
+        if arranca:
+            self.listo.set()
+        self.deteniendo = False
+        self.registro = registro
+
+    def detener(self, gracia):
+        self.deteniendo = True
+        self.proceso.vivo = False
+        self.registro.append(("detener", self.proceso.pid))
+
+
+@pytest.fixture
+def maestro(monkeypatch):
+    registro, pids, arrancan = [], itertools.count(1), []
+    maestro = servidor.Maestro(2, {}, [], gracia=1.0, espera_arranque=0.01)
+
+    def lanzar():
+        worker = WorkerFalso(next(pids), arrancan.pop(0) if arrancan else True, registro)
+        registro.append(("lanzar", worker.proceso.pid))
+        return worker
+
+    monkeypatch.setattr(maestro, "_lanzar", lanzar)
+    maestro.workers = [lanzar(), lanzar()]
+    registro.clear()
+    maestro.registro, maestro.arrancan = registro, arrancan
+    return maestro
+
+
+def test_reinicio_escalonado_lanza_antes_de_detener(maestro):
+    maestro.reiniciar_escalonado()
+    assert maestro.registro == [("lanzar", 3), ("detener", 1), ("lanzar", 4), ("detener", 2)]
+    assert [w.proceso.pid for w in maestro.workers] == [3, 4]
+
+
+def test_reinicio_se_cancela_si_el_worker_nuevo_no_arranca(maestro):
+    maestro.arrancan.extend([True, False])
+    maestro.reiniciar_escalonado()
+    # El primero se reemplazó; el segundo worker nuevo no arrancó y el anterior sigue
+    assert maestro.registro == [("lanzar", 3), ("detener", 1), ("lanzar", 4), ("detener", 4)]
+    assert [w.proceso.pid for w in maestro.workers] == [2, 3]
+
+
+def test_worker_caido_se_reemplaza(maestro, monkeypatch):
+    monkeypatch.setattr(servidor.time, "sleep", lambda segundos: None)
+    maestro.workers[0].proceso.vivo = False
+    maestro.workers[0].proceso.exitcode = 1
+    maestro.workers[1].proceso.vivo = False
+    maestro.workers[1].deteniendo = True  # En reinicio: no se reemplaza
+    maestro._reemplazar_caidos()
+    assert maestro.registro == [("lanzar", 3)]
+    assert [w.proceso.pid for w in maestro.workers] == [2, 3]
+
+
+def test_relevo_reenvia_a_los_demas_workers():
+    relevo = servidor._RelevoEventos()
+    uno, dos, tres = relevo.nuevo_canal(), relevo.nuevo_canal(), relevo.nuevo_canal()
+    mensaje = ("evento", 7, ["123"], ("suceso", 7, None), {"tipo": "suceso", "noCaso": 7, "n": 1})
+    uno.send(mensaje)
+    for canal in (dos, tres):
+        assert canal.poll(5) and canal.recv() == mensaje
+    assert not uno.poll(0.2)
+
+    # Un worker que termina deja de recibir y los demás siguen conectados
+    tres.close()
+    dos.send(("aviso", "invalidar_clientes", "123"))
+    assert uno.poll(5) and uno.recv() == ("aviso", "invalidar_clientes", "123")
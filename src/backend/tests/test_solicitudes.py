@@ -0,0 +1,120 @@
+"""Ciclo de vida de una solicitud: timeouts, vigilante de desconexión, admisión."""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_timeouts_endpoint_validos():
+    assert main.leer_timeouts_endpoint("buscar_cliente=3000, obtener_caso = 500") == {
+        "buscar_cliente": 3000,
+        "obtener_caso": 500,
+    }
+
+
+def test_timeouts_endpoint_invalidos_se_ignoran(caplog):
+    with caplog.at_level(logging.WARNING):
+        timeouts = main.leer_timeouts_endpoint("a=b=c,b=x,=5,sin_igual,c=-1,,d=10")
+    assert timeouts == {"d": 10}
+    assert caplog.text.count("se ignora") == 5
+
+
+def test_vigilante_termina_antes_de_enviar_la_respuesta(enrutador_falso, monkeypatch):
+    tareas, vivo_al_responder = [], []
+
+    async def vigilar(request, connection, estado):
+        tareas.append(asyncio.current_task())
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(main, "vigilar_desconexion", vigilar)
+
+    async def app(scope, receive, send):
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                vivo_al_responder.append(not tareas[0].done() and not tareas[0].cancelling())
+            await send(mensaje)
+        await main.app(scope, receive, enviar)
+
+    with TestClient(app) as cliente:
+        assert cliente.get("/api/expediente/caso/1").status_code == 200
+    assert vivo_al_responder == [False]
+    # Terminar la solicitud no se confunde con un cliente que abortó
+    assert enrutador_falso.liberadas and not enrutador_falso.liberadas[0][1]
+
+
+def test_cupo_y_conexion_se_liberan_antes_de_enviar_la_respuesta(enrutador_falso):
+    al_responder = []
+
+    async def app(scope, receive, send):
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                al_responder.append((main.control_admision.metricas()["detalle"]["activos"],
+                                     enrutador_falso.en_uso))
+            await send(mensaje)
+        await main.app(scope, receive, enviar)
+
+    with TestClient(app) as cliente:
+        assert cliente.get("/api/expediente/caso/1").status_code == 200
+    assert al_responder == [(0, 0)]
+    # Liberar al retornar no duplica la liberación del teardown
+    assert len(enrutador_falso.liberadas) == 1
+    assert main.control_admision.metricas()["detalle"]["activos"] == 0
+
+
+def test_cupo_se_libera_si_el_endpoint_falla(cliente, enrutador_falso):
+    enrutador_falso.respuestas["FROM Caso"] = RuntimeError("falla inesperada")
+    cliente_sin_excepciones = TestClient(main.app, raise_server_exceptions=False)
+    assert cliente_sin_excepciones.get("/api/caso/1").status_code == 500
+    assert main.control_admision.metricas()["detalle"]["activos"] == 0
+    assert enrutador_falso.en_uso == 0
+
+
+def test_resumenes_simultaneos_no_dejan_sin_cupo_a_las_lecturas_de_detalle(cliente, enrutador_falso):
+    enrutador_falso.demora = 0.3
+    enrutador_falso.respuestas["FROM Cliente c"] = [("00001", "Ana", "Ruiz", "CC", "123", None, None)]
+
+    with ThreadPoolExecutor(max_workers=4) as ejecutor:
+        resumenes = [ejecutor.submit(cliente.get, "/api/cliente/00001/resumen") for _ in range(3)]
+        time.sleep(0.1)
+        detalle = ejecutor.submit(cliente.get, "/api/expediente/caso/1")
+        estados = [r.result().status_code for r in resumenes] + [detalle.result().status_code]
+
+    assert estados == [200, 200, 200, 200]
+    # Cada resumen usó un cupo, una conexión y una sola sentencia
+    assert len(enrutador_falso.conexiones) == 4
+    assert all(len(c.sentencias) == 1 for c in enrutador_falso.conexiones)
+    assert enrutador_falso.max_en_uso <= main.ADMISION_DETALLE_LIMITE
+    assert main.control_admision.metricas()["detalle"]["activos"] == 0
+
+
+def test_resumen_cliente_en_una_sola_sentencia(cliente, enrutador_falso):
+    contactos = '[{"conseContacto": 1, "idTipoConta": "CEL", "descTipoConta": "Celular", ' \
+                '"valorContacto": "300", "notificacion": "S"}]'
+    casos = '[{"noCaso": 7, "fechaInicio": "2024-03-01 00:00:00", "valor": 500, ' \
+            '"codEspecializacion": "PEN", "expedientesAbiertos": 2}, ' \
+            '{"noCaso": 3, "fechaInicio": "2024-01-01 00:00:00", "valor": 100, ' \
+            '"codEspecializacion": "CIV", "expedientesAbiertos": 1}]'
+    enrutador_falso.respuestas["FROM Cliente c"] = [("00001", "Ana", "Ruiz", "CC", "123", contactos, casos)]
+
+    resumen = cliente.get("/api/cliente/00001/resumen").json()
+
+    assert resumen["contactos"][0]["valorContacto"] == "300"
+    assert [c["noCaso"] for c in resumen["casosActivos"]] == [7, 3]
+    assert resumen["ultimoCasoActivo"]["noCaso"] == 7
+    assert resumen["expedientesAbiertos"] == 3
+    assert len(enrutador_falso.conexiones[0].sentencias) == 1
+
+
+def test_resumen_cliente_sin_contactos_ni_casos_y_cliente_inexistente(cliente, enrutador_falso):
+    enrutador_falso.respuestas["FROM Cliente c"] = [("00001", "Ana", "Ruiz", "CC", "123", None, None)]
+    resumen = cliente.get("/api/cliente/00001/resumen").json()
+    assert resumen["contactos"] == [] and resumen["casosActivos"] == []
+    assert resumen["ultimoCasoActivo"] is None and resumen["expedientesAbiertos"] == 0
+
+    enrutador_falso.respuestas["FROM Cliente c"] = []
+    assert cliente.get("/api/cliente/99999/resumen").status_code == 404
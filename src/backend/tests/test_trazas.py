@@ -0,0 +1,117 @@
+"""Trazas: muestreo de traceparent, exportadores y árbol de spans de una solicitud."""
+
+from datetime import date
+
+import oracledb
+import pytest
+
+import main
+import trazas
+from conftest import ConexionFalsa, CursorFalso
+from consultas_lentas import CursorInstrumentado
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-{}"
+
+
+def test_traceparent_muestreado_no_fuerza_la_traza(monkeypatch):
+    trazador = trazas.Trazador([], muestreo=0.1)
+    monkeypatch.setattr(trazas.random, "random", lambda: 0.5)
+    assert trazador.iniciar_solicitud(TRACEPARENT.format("01"), "GET /") is None
+
+    monkeypatch.setattr(trazas.random, "random", lambda: 0.05)
+    raiz = trazador.iniciar_solicitud(TRACEPARENT.format("01"), "GET /")
+    assert raiz.traza.trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert raiz.padre_id == "b7ad6b7169203331"
+    # -00 no se traza aunque el muestreo local lo elegiría
+    assert trazador.iniciar_solicitud(TRACEPARENT.format("00"), "GET /") is None
+    assert trazador.estado()["conTraceparent"] == 3
+
+
+def test_traceparent_confiable_respeta_la_marca(monkeypatch):
+    trazador = trazas.Trazador([], muestreo=0.0, confiar_traceparent=True)
+    monkeypatch.setattr(trazas.random, "random", lambda: 0.99)
+    assert trazador.iniciar_solicitud(TRACEPARENT.format("01"), "GET /") is not None
+    assert trazador.iniciar_solicitud(TRACEPARENT.format("00"), "GET /") is None
+
+
+def test_exportador_sin_escribir_no_se_puede_instanciar():
+    class SinEscribir(trazas._Exportador):
+        destino = "ninguno"
+
+    with pytest.raises(TypeError):
+        SinEscribir()
+
+
+class _ExportadorMemoria(trazas._Exportador):
+    destino = "memoria"
+
+    def __init__(self):
+        self.spans = []
+        super().__init__(intervalo=0)
+
+    def _escribir(self, spans):
+        self.spans.extend(spans)
+
+
+class _CursorDriver:
+    """Reemplaza la parte del driver de oracledb.Cursor con un CursorFalso."""
+
+    def __init__(self, connection, scrollable=False):
+        self._falso = CursorFalso(connection)
+
+    def execute(self, statement, parameters=None, **kwargs):
+        return self._falso.execute(statement, parameters, **kwargs)
+
+    def fetchone(self):
+        return self._falso.fetchone()
+
+    def fetchmany(self, n=1):
+        return self._falso.fetchmany(n)
+
+    def fetchall(self):
+        return self._falso.fetchall()
+
+    def close(self):
+        pass
+
+
+def test_arbol_de_spans_de_un_endpoint_trazado(cliente, enrutador_falso, monkeypatch):
+    for nombre in ("__init__", "execute", "fetchone", "fetchmany", "fetchall", "close"):
+        monkeypatch.setattr(oracledb.Cursor, nombre, getattr(_CursorDriver, nombre))
+    for nombre in ("connection", "description", "rowcount"):
+        monkeypatch.setattr(oracledb.Cursor, nombre,
+                            property(lambda self, n=nombre: getattr(self._falso, n)), raising=False)
+    monkeypatch.setattr(ConexionFalsa, "cursor", lambda self: CursorInstrumentado(self))
+    exportador = _ExportadorMemoria()
+    monkeypatch.setattr(main.trazador, "exportadores", [exportador])
+    monkeypatch.setattr(main.trazador, "muestreo", 1.0)
+    enrutador_falso.respuestas["V_AGENDA_ABOGADO"] = [
+        (date(2030, 1, 10), 7, 2, "CIV", 3, "E03", "Audiencia", "L01", "Bogotá"),
+        (date(2030, 1, 12), 8, 1, "CIV", 1, "E01", "Demanda", "L01", "Bogotá"),
+    ]
+
+    respuesta = cliente.get("/api/abogado/123/agenda", params={"desde": "2030-01-01"})
+    exportador.cerrar()
+    assert respuesta.status_code == 200 and len(respuesta.json()) == 2
+    spans = {s["nombre"]: s for s in exportador.spans}
+    assert len(spans) == len(exportador.spans) == 8
+    raiz = spans["GET obtener_agenda_abogado"]
+    assert raiz["parentSpanId"] is None
+    assert raiz["atributos"]["http.route"] == "obtener_agenda_abogado"
+    assert raiz["atributos"]["http.status_code"] == 200
+    assert {s["traceId"] for s in exportador.spans} == {raiz["traceId"]}
+    assert respuesta.headers["traceresponse"] == f"00-{raiz['traceId']}-{raiz['spanId']}-01"
+
+    def padre(nombre):
+        return next(s["nombre"] for s in exportador.spans if s["spanId"] == spans[nombre]["parentSpanId"])
+
+    assert padre("fastapi.manejador") == "GET obtener_agenda_abogado"
+    for nombre in ("admision", "db.adquirir", "obtener_agenda_abogado", "respuesta.codificar"):
+        assert padre(nombre) == "fastapi.manejador"
+    assert padre("db.execute") == padre("db.fetch") == "obtener_agenda_abogado"
+    assert spans["admision"]["atributos"] == {"clase": "detalle"}
+    assert spans["db.adquirir"]["atributos"] == {"soloLectura": True}
+    assert "FROM V_AGENDA_ABOGADO" in spans["db.execute"]["atributos"]["db.statement"]
+    assert spans["db.fetch"]["atributos"] == {"llamadas": 1, "db.filas": 2}
+    assert spans["respuesta.codificar"]["atributos"]["bytes"] == len(respuesta.content)
+    assert all(s["fin"] >= s["inicio"] and s["error"] is None for s in exportador.spans)
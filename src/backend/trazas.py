@@ -0,0 +1,560 @@
+"""
+Trazas de Solicitudes
+Spans de la solicitud, la admisión, la conexión, cada sentencia y la codificación
+
+Una traza muestreada tiene un span raíz por solicitud HTTP y, dentro:
+- fastapi.manejador: validación, dependencias, endpoint y serialización.
+- admision y db.adquirir: espera de cupo y de una conexión del pool.
+- <endpoint>: la función del endpoint (armado de diccionarios incluido).
+- db.execute y db.fetch: cada sentencia (SQL normalizado, sin binds) y sus
+  fetch, con la cantidad de filas (los crea consultas_lentas).
+- respuesta.codificar: desde que el endpoint retorna hasta tener el JSON.
+
+Propagación W3C Trace Context: si la solicitud trae `traceparent`, la traza
+continúa la del cliente (mismo traceId, su span como padre). La marca de
+muestreo del cliente no se obedece a ciegas: cualquiera puede enviar `-01`
+en cada solicitud y forzar trazas y exportaciones. Una marca `-00` no se
+traza; una `-01` se traza con la misma fracción `muestreo` que el resto,
+salvo con `confiar_traceparent` (la API detrás de un gateway propio que ya
+decide el muestreo). Las trazas muestreadas responden con `traceresponse`.
+
+Los spans se exportan al terminar la solicitud, desde un hilo en segundo
+plano, a un archivo de líneas JSON o a un colector OTLP/HTTP (JSON). Si la
+cola de exportación se llena, se descartan trazas en lugar de frenar la API.
+
+Uso (desde src/backend):
+    python trazas.py --mostrar logs/trazas.jsonl                # últimas trazas en árbol
+    python trazas.py --mostrar logs/trazas.jsonl --traza <id>   # una traza
+    python trazas.py --colector --puerto 4318 --archivo logs/trazas.jsonl
+        # colector OTLP/HTTP local de reemplazo (TRAZAS_OTLP_URL=http://localhost:4318/v1/traces)
+"""
+
+import abc
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+_span_actual: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span_actual", default=None)
+
+_RE_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _id(bytes_: int) -> str:
+    return os.urandom(bytes_).hex()
+
+
+class Span:
+    __slots__ = ("traza", "span_id", "padre_id", "nombre", "inicio", "fin", "atributos", "error")
+
+    def __init__(self, traza: "Traza", nombre: str, padre_id: Optional[str], atributos: Dict[str, Any],
+                 inicio: Optional[int] = None):
+        self.traza = traza
+        self.span_id = _id(8)
+        self.padre_id = padre_id
+        self.nombre = nombre
+        self.inicio = inicio or time.time_ns()
+        self.fin: Optional[int] = None
+        self.atributos = atributos
+        self.error: Optional[str] = None
+
+    def terminar(self, fin: Optional[int] = None):
+        self.fin = fin or time.time_ns()
+        if self is self.traza.raiz:
+            self.traza.trazador.exportar(self.traza)
+
+    def como_dict(self) -> dict:
+        fin = self.fin or self.traza.raiz.fin
+        return {
+            "traceId": self.traza.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.padre_id,
+            "nombre": self.nombre,
+            "inicio": self.inicio,
+            "fin": fin,
+            "duracionMs": round((fin - self.inicio) / 1e6, 3),
+            "atributos": self.atributos if self.fin else {**self.atributos, "incompleto": True},
+            "error": self.error,
+        }
+
+
+class Traza:
+    def __init__(self, trazador: "Trazador", trace_id: str):
+        self.trazador = trazador
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self.raiz: Optional[Span] = None
+        # Instante en que retornó el endpoint (inicio de respuesta.codificar)
+        self.fin_endpoint: Optional[int] = None
+
+    def nuevo(self, nombre: str, padre_id: Optional[str], atributos: Dict[str, Any],
+              inicio: Optional[int] = None) -> Span:
+        span = Span(self, nombre, padre_id, atributos, inicio)
+        if self.raiz is None:
+            self.raiz = span
+        self.spans.append(span)
+        return span
+
+
+def span_actual() -> Optional[Span]:
+    return _span_actual.get()
+
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """Span hijo del actual mientras dura el bloque (nada si la solicitud no se traza)."""
+    padre = _span_actual.get()
+    if padre is None:
+        yield None
+        return
+    hijo = padre.traza.nuevo(nombre, padre.span_id, atributos)
+    marca = _span_actual.set(hijo)
+    try:
+        yield hijo
+    except BaseException as e:
+        hijo.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span_actual.reset(marca)
+        hijo.terminar()
+
+
+def iniciar(nombre: str, inicio: Optional[int] = None, **atributos) -> Optional[Span]:
+    """
+    Span hijo del actual que no pasa a ser el actual; quien lo crea llama
+    a terminar() (o lo actualiza hasta que termine la traza).
+    """
+    padre = _span_actual.get()
+    if padre is None:
+        return None
+    return padre.traza.nuevo(nombre, padre.span_id, atributos, inicio)
+
+
+# ============================================================================
+# EXPORTADORES
+# ============================================================================
+
+class _Exportador(abc.ABC):
+    """Cola acotada + hilo que exporta los spans por lotes."""
+
+    destino: str
+
+    def __init__(self, max_cola: int = 10000, intervalo: float = 1.0):
+        self._cola: "queue.Queue[List[dict]]" = queue.Queue(maxsize=max_cola)
+        self.intervalo = intervalo
+        self.exportados = 0
+        self.descartados = 0
+        self.errores = 0
+        self.ultimo_error: Optional[str] = None
+        self._hilo = threading.Thread(target=self._ejecutar, name="trazas", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, spans: List[dict]):
+        try:
+            self._cola.put_nowait(spans)
+        except queue.Full:
+            self.descartados += len(spans)
+
+    def _ejecutar(self):
+        while True:
+            lote = self._cola.get()
+            if lote is None:
+                return
+            time.sleep(self.intervalo)  # Junta lo que llegue mientras tanto
+            terminar = False
+            while True:
+                try:
+                    siguiente = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    terminar = True
+                    break
+                lote.extend(siguiente)
+            try:
+                self._escribir(lote)
+                self.exportados += len(lote)
+            except Exception as e:
+                self.errores += 1
+                self.descartados += len(lote)
+                self.ultimo_error = str(e)
+                logger.warning("No se pudieron exportar %d spans: %s", len(lote), e)
+            if terminar:
+                return
+
+    @abc.abstractmethod
+    def _escribir(self, spans: List[dict]):
+        """Exporta un lote de spans (desde el hilo del exportador)."""
+
+    def cerrar(self, espera: float = 5.0):
+        """Exporta lo pendiente y detiene el hilo."""
+        try:
+            self._cola.put(None, timeout=espera)
+        except queue.Full:
+            return
+        self._hilo.join(espera + self.intervalo)
+
+    def estado(self) -> dict:
+        return {
+            "destino": self.destino,
+            "enCola": self._cola.qsize(),
+            "exportados": self.exportados,
+            "descartados": self.descartados,
+            "errores": self.errores,
+            "ultimoError": self.ultimo_error,
+        }
+
+
+class ExportadorArchivo(_Exportador):
+    """Un span por línea JSON (el formato que lee --mostrar)."""
+
+    def __init__(self, ruta: str, **opciones):
+        self.destino = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        super().__init__(**opciones)
+
+    def _escribir(self, spans: List[dict]):
+        with open(self.destino, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s, ensure_ascii=False, default=str) + "\n")
+
+
+def _valor_otlp(valor) -> dict:
+    if isinstance(valor, bool):
+        return {"boolValue": valor}
+    if isinstance(valor, int):
+        return {"intValue": str(valor)}
+    if isinstance(valor, float):
+        return {"doubleValue": valor}
+    return {"stringValue": str(valor)}
+
+
+def _de_valor_otlp(valor: dict):
+    tipo, dato = next(iter(valor.items()), (None, None))
+    return int(dato) if tipo == "intValue" else dato
+
+
+# Tipo de span OTLP: servidor para la solicitud HTTP, cliente para las
+# llamadas a Oracle e interno para el resto
+_SPANS_CLIENTE = ("db.execute", "db.executemany", "db.fetch")
+
+
+def a_otlp(spans: List[dict], servicio: str) -> dict:
+    """Spans en el formato OTLP/HTTP JSON (ExportTraceServiceRequest)."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": servicio}}]},
+        "scopeSpans": [{
+            "scope": {"name": "trazas"},
+            "spans": [{
+                "traceId": s["traceId"],
+                "spanId": s["spanId"],
+                **({"parentSpanId": s["parentSpanId"]} if s["parentSpanId"] else {}),
+                "name": s["nombre"],
+                "kind": 2 if "http.method" in s["atributos"] else 3 if s["nombre"] in _SPANS_CLIENTE else 1,
+                "startTimeUnixNano": str(s["inicio"]),
+                "endTimeUnixNano": str(s["fin"]),
+                "attributes": [{"key": k, "value": _valor_otlp(v)} for k, v in s["atributos"].items()],
+                "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 0},
+            } for s in spans],
+        }],
+    }]}
+
+
+def de_otlp(cuerpo: dict) -> List[dict]:
+    """Inverso de a_otlp (lo usa el colector de reemplazo)."""
+    spans = []
+    for recurso in cuerpo.get("resourceSpans", []):
+        for alcance in recurso.get("scopeSpans", []):
+            for s in alcance.get("spans", []):
+                inicio, fin = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+                atributos = {a["key"]: _de_valor_otlp(a["value"]) for a in s.get("attributes", [])}
+                spans.append({
+                    "traceId": s["traceId"], "spanId": s["spanId"], "parentSpanId": s.get("parentSpanId"),
+                    "nombre": s["name"], "inicio": inicio, "fin": fin,
+                    "duracionMs": round((fin - inicio) / 1e6, 3), "atributos": atributos,
+                    "error": s.get("status", {}).get("message") if s.get("status", {}).get("code") == 2 else None,
+                })
+    return spans
+
+
+class ExportadorOTLP(_Exportador):
+    """POST a un colector OTLP/HTTP con codificación JSON (p. ej. .../v1/traces)."""
+
+    def __init__(self, url: str, servicio: str = "abogados-api", timeout: float = 5.0, **opciones):
+        self.destino = url
+        self.servicio = servicio
+        self.timeout = timeout
+        super().__init__(**opciones)
+
+    def _escribir(self, spans: List[dict]):
+        solicitud = urllib.request.Request(
+            self.destino, data=json.dumps(a_otlp(spans, self.servicio)).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(solicitud, timeout=self.timeout) as respuesta:
+            respuesta.read()
+
+
+# ============================================================================
+# TRAZADOR E INSTRUMENTACIÓN HTTP
+# ============================================================================
+
+class Trazador:
+    """Decide el muestreo, crea el span raíz de cada solicitud y exporta."""
+
+    def __init__(self, exportadores: List[_Exportador], muestreo: float = 0.1,
+                 confiar_traceparent: bool = False):
+        self.exportadores = exportadores
+        self.muestreo = muestreo
+        self.confiar_traceparent = confiar_traceparent
+        self.solicitudes = 0
+        self.muestreadas = 0
+        self.propagadas = 0
+
+    @property
+    def habilitado(self) -> bool:
+        return bool(self.exportadores)
+
+    def iniciar_solicitud(self, traceparent: Optional[str], nombre: str, **atributos) -> Optional[Span]:
+        """Span raíz si la solicitud se muestrea; None si no."""
+        self.solicitudes += 1
+        padre = _RE_TRACEPARENT.match((traceparent or "").strip().lower())
+        if padre and padre.group(1) != "ff" and padre.group(2) != "0" * 32:
+            self.propagadas += 1
+            muestreada = bool(int(padre.group(4), 16) & 1)
+            if muestreada and not self.confiar_traceparent:
+                muestreada = random.random() < self.muestreo
+            trace_id, padre_id = padre.group(2), padre.group(3)
+        else:
+            muestreada = random.random() < self.muestreo
+            trace_id, padre_id = _id(16), None
+        if not muestreada:
+            return None
+        self.muestreadas += 1
+        return Traza(self, trace_id).nuevo(nombre, padre_id, atributos)
+
+    def exportar(self, traza: Traza):
+        spans = [s.como_dict() for s in traza.spans]
+        for exportador in self.exportadores:
+            exportador.enviar(spans)
+
+    def cerrar(self):
+        for exportador in self.exportadores:
+            exportador.cerrar()
+
+    def estado(self) -> dict:
+        return {
+            "habilitado": self.habilitado,
+            "muestreo": self.muestreo,
+            "confiarTraceparent": self.confiar_traceparent,
+            "solicitudes": self.solicitudes,
+            "muestreadas": self.muestreadas,
+            "conTraceparent": self.propagadas,
+            "exportadores": [e.estado() for e in self.exportadores],
+        }
+
+
+class TrazasMiddleware:
+    """Span raíz de cada solicitud HTTP muestreada."""
+
+    def __init__(self, app: ASGIApp, trazador: Trazador):
+        self.app = app
+        self.trazador = trazador
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.trazador.habilitado:
+            await self.app(scope, receive, send)
+            return
+        raiz = self.trazador.iniciar_solicitud(
+            Headers(scope=scope).get("traceparent"), f"{scope['method']} {scope['path']}",
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        if raiz is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def enviar(mensaje: Message):
+            if mensaje["type"] == "http.response.start":
+                raiz.atributos["http.status_code"] = mensaje["status"]
+                MutableHeaders(raw=mensaje["headers"])["traceresponse"] = \
+                    f"00-{raiz.traza.trace_id}-{raiz.span_id}-01"
+            await send(mensaje)
+
+        marca = _span_actual.set(raiz)
+        try:
+            await self.app(scope, receive, enviar)
+        except BaseException as e:
+            raiz.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _span_actual.reset(marca)
+            endpoint = getattr(scope.get("endpoint"), "__name__", None)
+            if endpoint:
+                raiz.nombre = f"{scope['method']} {endpoint}"
+                raiz.atributos["http.route"] = endpoint
+            raiz.terminar()
+
+
+def _marcar_fin_endpoint():
+    actual = _span_actual.get()
+    if actual is not None:
+        actual.traza.fin_endpoint = time.time_ns()
+
+
+class RutaTrazada(APIRoute):
+    """
+    Ruta de FastAPI con spans del manejador completo y de la función del
+    endpoint (la diferencia es validación, dependencias y serialización).
+    """
+
+    def __init__(self, path: str, endpoint, **opciones):
+        super().__init__(path, endpoint, **opciones)
+        llamada = self.dependant.call
+        nombre = llamada.__name__
+        if asyncio.iscoroutinefunction(llamada):
+            @functools.wraps(llamada)
+            async def trazada(*args, **kwargs):
+                with span(nombre):
+                    resultado = await llamada(*args, **kwargs)
+                _marcar_fin_endpoint()
+                return resultado
+        else:
+            @functools.wraps(llamada)
+            def trazada(*args, **kwargs):
+                with span(nombre):
+                    resultado = llamada(*args, **kwargs)
+                _marcar_fin_endpoint()
+                return resultado
+        self.dependant.call = trazada
+
+    def get_route_handler(self):
+        manejador = super().get_route_handler()
+
+        async def trazado(request):
+            if _span_actual.get() is None:
+                return await manejador(request)
+            with span("fastapi.manejador"):
+                return await manejador(request)
+
+        return trazado
+
+
+class RespuestaTrazada(JSONResponse):
+    """JSONResponse que registra respuesta.codificar (jsonable_encoder + json.dumps)."""
+
+    def render(self, content) -> bytes:
+        actual = _span_actual.get()
+        if actual is None:
+            return super().render(content)
+        inicio = actual.traza.fin_endpoint or time.time_ns()
+        cuerpo = super().render(content)
+        codificar = iniciar("respuesta.codificar", inicio=inicio, bytes=len(cuerpo))
+        codificar.terminar()
+        return cuerpo
+
+
+# ============================================================================
+# HERRAMIENTAS (--mostrar, --colector)
+# ============================================================================
+
+def _leer_spans(ruta: str) -> Dict[str, List[dict]]:
+    trazas: Dict[str, List[dict]] = {}
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                s = json.loads(linea)
+                trazas.setdefault(s["traceId"], []).append(s)
+    return trazas
+
+
+def mostrar(spans: List[dict]):
+    """Imprime una traza como árbol con inicio relativo y duración."""
+    hijos: Dict[Optional[str], List[dict]] = {}
+    ids = {s["spanId"] for s in spans}
+    for s in spans:
+        hijos.setdefault(s["parentSpanId"] if s["parentSpanId"] in ids else None, []).append(s)
+    origen = min(s["inicio"] for s in spans)
+
+    def imprimir(s: dict, nivel: int):
+        extra = {k: v for k, v in s["atributos"].items() if k not in ("http.method", "http.target")}
+        print(f"  {(s['inicio'] - origen) / 1e6:9.2f} ms {s['duracionMs']:9.2f} ms  {'  ' * nivel}{s['nombre']}"
+              f"{'  ' + json.dumps(extra, ensure_ascii=False) if extra else ''}{'  ERROR ' + s['error'] if s['error'] else ''}")
+        for h in sorted(hijos.get(s["spanId"], []), key=lambda h: h["inicio"]):
+            imprimir(h, nivel + 1)
+
+    for raiz in sorted(hijos.get(None, []), key=lambda s: s["inicio"]):
+        imprimir(raiz, 0)
+
+
+def colector(puerto: int, archivo: str):
+    """Colector OTLP/HTTP mínimo: guarda los spans recibidos en `archivo` (líneas JSON)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    exportador = ExportadorArchivo(archivo, intervalo=0.0)
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_POST(self):
+            cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            spans = de_otlp(json.loads(cuerpo or b"{}"))
+            exportador.enviar(spans)
+            print(f"{len(spans)} spans de {len({s['traceId'] for s in spans})} trazas")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Colector OTLP/HTTP en http://localhost:{puerto}/v1/traces -> {archivo}")
+    try:
+        ThreadingHTTPServer(("127.0.0.1", puerto), Manejador).serve_forever()
+    except KeyboardInterrupt:
+        exportador.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trazas de la API")
+    parser.add_argument("--mostrar", metavar="ARCHIVO", help="Mostrar trazas de un archivo de spans")
+    parser.add_argument("--traza", help="Solo la traza con este traceId")
+    parser.add_argument("-n", type=int, default=5, help="Cantidad de trazas a mostrar")
+    parser.add_argument("--colector", action="store_true", help="Colector OTLP/HTTP local de reemplazo")
+    parser.add_argument("--puerto", type=int, default=4318)
+    parser.add_argument("--archivo", default=os.path.join("logs", "trazas.jsonl"))
+    args = parser.parse_args()
+
+    if args.colector:
+        colector(args.puerto, args.archivo)
+    elif args.mostrar:
+        trazas = _leer_spans(args.mostrar)
+        elegidas = [args.traza] if args.traza else list(trazas)[-args.n:]
+        for trace_id in elegidas:
+            print(f"Traza {trace_id}")
+            mostrar(trazas.get(trace_id, []))
+            print()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,13 @@
 /*==============================================================*/
 
 
+drop view V_AGENDA_ABOGADO;
+
+begin
+   ctx_ddl.drop_preference('ABOGADOS_LEXER');
+end;
+/
+
 alter table CASO
    drop constraint FK_CASO_CASO_ESPE_ESPECIAL;
 
@@ -76,12 +83,18 @@ drop index CASO_ESPECIALIZACION_FK;
 
 drop index CLIENTE_CASO_FK;
 
+drop index CASO_CLIENTE_ACTIVO_IDX;
+
 drop table CASO cascade constraints;
 
+drop table CASO_RESUMEN_MES cascade constraints;
+
 drop index TIPODOCU_CLIENTE_FK;
 
 drop table CLIENTE cascade constraints;
 
+drop table COLA_DIFERIDA cascade constraints;
+
 drop index CLIENTE_CONTACTO_FK;
 
 drop index TIPOCONTACT_CONTACT_FK;
@@ -90,6 +103,8 @@ drop table CONTACTO cascade constraints;
 
 drop index DOCU_EXPEDIENTE_FK;
 
+drop index DOCUMENTO_UBICA_CTX;
+
 drop table DOCUMENTO cascade constraints;
 
 drop table ESPECIALIZACION cascade constraints;
@@ -116,8 +131,12 @@ drop index ESPESTA_EXPEDIENTE_FK;
 
 drop index ABOGADO_EXPEDIENTE_FK;
 
+drop index EXPEDIENTE_AGENDA_IDX;
+
 drop index CASO_EXPEDIENTE_FK;
 
+drop index EXPEDIENTE_CASO_CONSEC_IDX;
+
 drop index LUGAR_EXPEDIENTE_FK;
 
 drop table EXPEDIENTE cascade constraints;
@@ -126,6 +145,10 @@ drop table FORMAPAGO cascade constraints;
 
 drop table FRANQUICIA cascade constraints;
 
+drop index IDEMPOTENCIA_EXPIRA_IDX;
+
+drop table IDEMPOTENCIA cascade constraints;
+
 drop table IMPUGNACION cascade constraints;
 
 drop table INSTANCIA cascade constraints;
@@ -134,20 +157,32 @@ drop index LUGAR_TIPOLUGAR_FK;
 
 drop index LUGAR_LUGAR_FK;
 
+drop index LUGAR_TIPO_PADRE_IDX;
+
 drop table LUGAR cascade constraints;
 
 drop index FRANQUICIA_PAGO_FK;
 
 drop index FORMAPAGO_PAGO_FK;
 
+drop index PAGO_FECHA_IDX;
+
 drop table PAGO cascade constraints;
 
+drop table PAGO_RESUMEN_DIA cascade constraints;
+
+drop sequence PAGO_SEQ;
+
 drop index RESUELTO_EXPEDIENTE_FK;
 
+drop index RESULTADO_DESC_CTX;
+
 drop table RESULTADO cascade constraints;
 
 drop index SUCESO_EXPEDIENTE_FK;
 
+drop index SUCESO_DESC_CTX;
+
 drop table SUCESO cascade constraints;
 
 drop table TIPOCONTACT cascade constraints;
@@ -194,6 +229,28 @@ create index CASO_ESPECIALIZACION_FK on CASO (
    CODESPECIALIZACION ASC
 );
 
+/*==============================================================*/
+/* Index: CASO_CLIENTE_ACTIVO_IDX                               */
+/*==============================================================*/
+create index CASO_CLIENTE_ACTIVO_IDX on CASO (
+   CODCLIENTE ASC,
+   FECHAFIN ASC,
+   NOCASO ASC
+);
+
+/*==============================================================*/
+/* Table: CASO_RESUMEN_MES                                      */
+/*==============================================================*/
+create table CASO_RESUMEN_MES (
+   CODESPECIALIZACION   VARCHAR2(3)           not null,
+   CODCLIENTE           VARCHAR2(5)           not null,
+   MES                  DATE                  not null,
+   ABIERTOS             NUMBER(8,0)           default 0 not null,
+   CERRADOS             NUMBER(8,0)           default 0 not null,
+   VALORTOTAL           NUMBER(18,2)          default 0 not null,
+   constraint PK_CASO_RESUMEN_MES primary key (CODESPECIALIZACION, CODCLIENTE, MES)
+);
+
 /*==============================================================*/
 /* Table: CLIENTE                                               */
 /*==============================================================*/
@@ -213,6 +270,20 @@ create index TIPODOCU_CLIENTE_FK on CLIENTE (
    IDTIPODOC ASC
 );
 
+/*==============================================================*/
+/* Table: COLA_DIFERIDA                                         */
+/* Posicin aplicada del diario de escritura diferida de cada   */
+/* host (se actualiza en la misma transaccin que cada lote).   */
+/* Solo si ESCRITURA_DIFERIDA=true.                             */
+/*==============================================================*/
+create table COLA_DIFERIDA (
+   CLAVE                VARCHAR2(200)         not null,
+   DIARIO               VARCHAR2(32)          not null,
+   POSICION             NUMBER(18,0)          not null,
+   ACTUALIZADA          DATE                  not null,
+   constraint PK_COLA_DIFERIDA primary key (CLAVE)
+);
+
 /*==============================================================*/
 /* Table: CONTACTO                                              */
 /*==============================================================*/
@@ -248,7 +319,7 @@ create table DOCUMENTO (
    NOCASO               NUMBER(5,0)           not null,
    CONSECEXPE           NUMBER(4,0)           not null,
    CONDOC               NUMBER(4,0)           not null,
-   UBICADOC             VARCHAR2(50)          not null,
+   UBICADOC             VARCHAR2(100)         not null,
    constraint PK_DOCUMENTO primary key (CODESPECIALIZACION, PASOETAPA, NOCASO, CONSECEXPE, CONDOC)
 );
 
@@ -354,6 +425,9 @@ create table EXPEDIENTE (
    CODLUGAR             VARCHAR2(5)           not null,
    CEDULA               VARCHAR2(10),
    FECHAETAPA           DATE                  not null,
+   NSUCESOS             NUMBER(4,0)           default 0 not null,
+   NRESULTADOS          NUMBER(4,0)           default 0 not null,
+   NDOCUMENTOS          NUMBER(4,0)           default 0 not null,
    constraint PK_EXPEDIENTE primary key (CODESPECIALIZACION, PASOETAPA, NOCASO, CONSECEXPE)
 );
 
@@ -371,6 +445,14 @@ create index CASO_EXPEDIENTE_FK on EXPEDIENTE (
    NOCASO ASC
 );
 
+/*==============================================================*/
+/* Index: EXPEDIENTE_CASO_CONSEC_IDX                            */
+/*==============================================================*/
+create index EXPEDIENTE_CASO_CONSEC_IDX on EXPEDIENTE (
+   NOCASO ASC,
+   CONSECEXPE ASC
+);
+
 /*==============================================================*/
 /* Index: ABOGADO_EXPEDIENTE_FK                                 */
 /*==============================================================*/
@@ -378,6 +460,16 @@ create index ABOGADO_EXPEDIENTE_FK on EXPEDIENTE (
    CEDULA ASC
 );
 
+/*==============================================================*/
+/* Index: EXPEDIENTE_AGENDA_IDX                                 */
+/*==============================================================*/
+create index EXPEDIENTE_AGENDA_IDX on EXPEDIENTE (
+   CEDULA ASC,
+   FECHAETAPA ASC,
+   NOCASO ASC,
+   CONSECEXPE ASC
+);
+
 /*==============================================================*/
 /* Index: ESPESTA_EXPEDIENTE_FK                                 */
 /*==============================================================*/
@@ -404,6 +496,29 @@ create table FRANQUICIA (
    constraint PK_FRANQUICIA primary key (CODFRANQUICIA)
 );
 
+/*==============================================================*/
+/* Table: IDEMPOTENCIA                                          */
+/* Respuestas de los POST con Idempotency-Key (ESTADO NULL =    */
+/* solicitud en curso). Solo si IDEMPOTENCIA_PERSISTIR=true.    */
+/*==============================================================*/
+create table IDEMPOTENCIA (
+   CLAVE                VARCHAR2(300)         not null,
+   HUELLA               VARCHAR2(64)          not null,
+   ESTADO               NUMBER(3,0),
+   CABECERAS            VARCHAR2(1000),
+   CUERPO               CLOB,
+   RESERVADA            DATE                  not null,
+   EXPIRA               DATE                  not null,
+   constraint PK_IDEMPOTENCIA primary key (CLAVE)
+);
+
+/*==============================================================*/
+/* Index: IDEMPOTENCIA_EXPIRA_IDX                               */
+/*==============================================================*/
+create index IDEMPOTENCIA_EXPIRA_IDX on IDEMPOTENCIA (
+   EXPIRA ASC
+);
+
 /*==============================================================*/
 /* Table: IMPUGNACION                                           */
 /*==============================================================*/
@@ -449,11 +564,20 @@ create index LUGAR_TIPOLUGAR_FK on LUGAR (
    IDTIPOLUGAR ASC
 );
 
+/*==============================================================*/
+/* Index: LUGAR_TIPO_PADRE_IDX                                  */
+/*==============================================================*/
+create index LUGAR_TIPO_PADRE_IDX on LUGAR (
+   IDTIPOLUGAR ASC,
+   LUG_CODLUGAR ASC,
+   NOMLUGAR ASC
+);
+
 /*==============================================================*/
 /* Table: PAGO                                                  */
 /*==============================================================*/
 create table PAGO (
-   CONSECPAGO           NUMBER(3,0)           not null,
+   CONSECPAGO           NUMBER(12,0)          not null,
    IDFORMAPAGO          VARCHAR2(3),
    CODFRANQUICIA        VARCHAR2(3),
    FECHAPAGO            DATE,
@@ -476,6 +600,36 @@ create index FRANQUICIA_PAGO_FK on PAGO (
    CODFRANQUICIA ASC
 );
 
+/*==============================================================*/
+/* Index: PAGO_FECHA_IDX                                        */
+/*==============================================================*/
+create index PAGO_FECHA_IDX on PAGO (
+   FECHAPAGO ASC,
+   IDFORMAPAGO ASC,
+   CODFRANQUICIA ASC,
+   VALORPAGO ASC
+);
+
+/*==============================================================*/
+/* Table: PAGO_RESUMEN_DIA                                      */
+/*==============================================================*/
+create table PAGO_RESUMEN_DIA (
+   FECHAPAGO            DATE                  not null,
+   IDFORMAPAGO          VARCHAR2(3)           not null,
+   CODFRANQUICIA        VARCHAR2(3)           default '-' not null,
+   NPAGOS               NUMBER(10,0)          default 0 not null,
+   TOTALPAGO            NUMBER(18,0)          default 0 not null,
+   constraint PK_PAGO_RESUMEN_DIA primary key (FECHAPAGO, IDFORMAPAGO, CODFRANQUICIA)
+);
+
+/*==============================================================*/
+/* Sequence: PAGO_SEQ                                           */
+/*==============================================================*/
+create sequence PAGO_SEQ
+   start with 1000
+   increment by 1
+   cache 1000;
+
 /*==============================================================*/
 /* Table: RESULTADO                                             */
 /*==============================================================*/
@@ -637,3 +791,64 @@ alter table SUCESO
    add constraint FK_SUCESO_SUCESO_EX_EXPEDIEN foreign key (CODESPECIALIZACION, PASOETAPA, NOCASO, CONSECEXPE)
       references EXPEDIENTE (CODESPECIALIZACION, PASOETAPA, NOCASO, CONSECEXPE);
 
+/*==============================================================*/
+/* View: V_AGENDA_ABOGADO                                       */
+/*==============================================================*/
+create or replace view V_AGENDA_ABOGADO as
+select
+   E.CEDULA,
+   E.FECHAETAPA,
+   E.NOCASO,
+   E.CONSECEXPE,
+   E.CODESPECIALIZACION,
+   E.PASOETAPA,
+   EE.CODETAPA,
+   EP.NOMETAPA,
+   E.CODLUGAR,
+   L.NOMLUGAR
+from EXPEDIENTE E
+   join ESPECIA_ETAPA EE
+      on EE.CODESPECIALIZACION = E.CODESPECIALIZACION
+     and EE.PASOETAPA = E.PASOETAPA
+   join ETAPAPROCESAL EP
+      on EP.CODETAPA = EE.CODETAPA
+   join LUGAR L
+      on L.CODLUGAR = E.CODLUGAR
+where E.CEDULA is not null;
+
+/*==============================================================*/
+/* Preference: ABOGADOS_LEXER                                   */
+/*==============================================================*/
+begin
+   ctx_ddl.create_preference('ABOGADOS_LEXER', 'BASIC_LEXER');
+   ctx_ddl.set_attribute('ABOGADOS_LEXER', 'BASE_LETTER', 'YES');
+end;
+/
+
+/*==============================================================*/
+/* Index: SUCESO_DESC_CTX                                       */
+/*==============================================================*/
+create index SUCESO_DESC_CTX on SUCESO (
+   DESCSUCESO
+)
+indextype is CTXSYS.CONTEXT
+parameters ('LEXER ABOGADOS_LEXER SYNC (ON COMMIT)');
+
+/*==============================================================*/
+/* Index: RESULTADO_DESC_CTX                                    */
+/*==============================================================*/
+create index RESULTADO_DESC_CTX on RESULTADO (
+   DESCRESUL
+)
+indextype is CTXSYS.CONTEXT
+parameters ('LEXER ABOGADOS_LEXER SYNC (ON COMMIT)');
+
+/*==============================================================*/
+/* Index: DOCUMENTO_UBICA_CTX                                   */
+/*==============================================================*/
+create index DOCUMENTO_UBICA_CTX on DOCUMENTO (
+   UBICADOC
+)
+indextype is CTXSYS.CONTEXT
+parameters ('LEXER ABOGADOS_LEXER SYNC (ON COMMIT)');
+
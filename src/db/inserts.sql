@@ -368,4 +368,16 @@ VALUES ('001', 7, 10001, 1, 1, 'El Tribunal Superior confirma la sentencia de pr
 INSERT INTO SUCESO (CODESPECIALIZACION, PASOETAPA, NOCASO, CONSECEXPE, CONSUCESO, DESCSUCESO) 
 VALUES ('001', 7, 10001, 1, 2, 'Sentencia ejecutoriada. Caso concluido favorablemente para el cliente');
 
+-- Contadores desnormalizados de EXPEDIENTE (ver src/backend/conteos_expediente.py)
+UPDATE EXPEDIENTE E SET
+   NSUCESOS = (SELECT COUNT(*) FROM SUCESO S
+               WHERE S.CODESPECIALIZACION = E.CODESPECIALIZACION AND S.PASOETAPA = E.PASOETAPA
+               AND S.NOCASO = E.NOCASO AND S.CONSECEXPE = E.CONSECEXPE),
+   NRESULTADOS = (SELECT COUNT(*) FROM RESULTADO R
+                  WHERE R.CODESPECIALIZACION = E.CODESPECIALIZACION AND R.PASOETAPA = E.PASOETAPA
+                  AND R.NOCASO = E.NOCASO AND R.CONSECEXPE = E.CONSECEXPE),
+   NDOCUMENTOS = (SELECT COUNT(*) FROM DOCUMENTO D
+                  WHERE D.CODESPECIALIZACION = E.CODESPECIALIZACION AND D.PASOETAPA = E.PASOETAPA
+                  AND D.NOCASO = E.NOCASO AND D.CONSECEXPE = E.CONSECEXPE);
+
 COMMIT;
@@ -17,6 +17,8 @@ let clienteSeleccionado = null;
 let casoSeleccionado = null;
 let expedienteSeleccionado = null;
 let modoEdicion = false;
+let eventosCaso = null; // Suscripción SSE a los cambios del caso seleccionado
+let claveCrearCaso = null; // Idempotency-Key del caso que se está creando
 
 // ============================================================================
 // INICIALIZACIÓN
@@ -134,11 +136,15 @@ function inicializarEventosCaso() {
             return;
         }
 
+        // La misma clave en un reintento o doble clic evita crear el caso dos veces
+        claveCrearCaso = claveCrearCaso || crypto.randomUUID();
+
         try {
             const response = await fetch(`${API_BASE_URL}/caso/crear`, {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
+                    "Idempotency-Key": claveCrearCaso,
                 },
                 body: JSON.stringify({
                     fechaInicio: fechaInicio,
@@ -150,6 +156,8 @@ function inicializarEventosCaso() {
             });
 
             const result = await response.json();
+            // Hubo respuesta: el próximo envío es un caso distinto
+            claveCrearCaso = null;
             if (result.success) {
                 alert(`Caso ${result.noCaso} creado exitosamente`);
                 casoSeleccionado = result;
@@ -345,12 +353,43 @@ async function cargarCaso(noCaso) {
             document.getElementById("valor").disabled = true;
             document.getElementById("btnGuardarCaso").disabled = true;
         }
+
+        suscribirCambiosCaso(caso.noCaso);
     } catch (error) {
         console.error("Error al cargar caso:", error);
         alert("Error al cargar caso");
     }
 }
 
+// Recibe los cambios del caso por SSE en lugar de volver a consultar:
+// solo se recarga lo que cambió y cuando la pestaña lo muestra
+function suscribirCambiosCaso(noCaso) {
+    if (eventosCaso && eventosCaso.noCaso === noCaso) {
+        return;
+    }
+    if (eventosCaso) {
+        eventosCaso.close();
+    }
+
+    eventosCaso = new EventSource(`${API_BASE_URL}/eventos?noCaso=${noCaso}`);
+    eventosCaso.noCaso = noCaso;
+
+    const recargarExpedientes = () => {
+        if (document.getElementById("expediente").classList.contains("active")) {
+            cargarExpedientesCaso(noCaso);
+        }
+    };
+
+    eventosCaso.addEventListener("caso", () => cargarCaso(noCaso));
+    ["expediente", "etapa", "suceso", "resultado", "documento"].forEach((tipo) =>
+        eventosCaso.addEventListener(tipo, recargarExpedientes)
+    );
+    eventosCaso.addEventListener("resync", () => {
+        cargarCaso(noCaso);
+        recargarExpedientes();
+    });
+}
+
 async function cargarEspecializaciones() {
     try {
         const response = await fetch(`${API_BASE_URL}/especializacion/`);